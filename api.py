@@ -0,0 +1,83 @@
+"""
+Apoio à API JSON (/api/v1): tokens de acesso e ETags
+
+Clientes da API se autenticam com `Authorization: Bearer <token>` em vez do
+cookie de sessão. O token é aleatório (256 bits) e só o seu SHA-256 fica em
+`token_api`, consultado pela chave primária a cada requisição.
+
+As ETags são fortes e saem de contadores que os gatilhos mantêm na própria
+transação do lançamento: `conta.ultima_transacao_id` (conta e extrato) e
+`usuario.versao` (lista de contas, que também muda quando uma conta é
+criada). Para responder 304 basta ler a conta ou o usuário pela chave
+primária; a tabela `transacao` só é consultada quando a representação
+mudou.
+"""
+
+import hashlib
+import secrets
+
+# Validade padrão de um token emitido, em dias
+VALIDADE_DIAS = 30
+
+
+def _hash(token):
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+def emitir_token(db, usuario_id, validade_dias=VALIDADE_DIAS):
+    """Cria um token para o usuário; devolve o token em texto (mostrado uma vez)"""
+    token = secrets.token_urlsafe(32)
+    db.execute('''
+        INSERT INTO token_api (hash, usuario_id, expira_em)
+        VALUES (?, ?, datetime('now', ?))
+    ''', (_hash(token), usuario_id, f'+{validade_dias} days'))
+    return token
+
+
+def usuario_do_token(db, token):
+    """Id do usuário dono do token, ou None se inválido ou expirado"""
+    if not token:
+        return None
+    linha = db.execute('''
+        SELECT usuario_id FROM token_api WHERE hash = ? AND expira_em > datetime('now')
+    ''', (_hash(token),)).fetchone()
+    return linha[0] if linha else None
+
+
+def revogar_token(db, token):
+    """Apaga o token; devolve True se ele existia"""
+    return db.execute('DELETE FROM token_api WHERE hash = ?', (_hash(token),)).rowcount > 0
+
+
+def etag_contas(usuario_id, versao):
+    return f'contas-{usuario_id}-{versao}'
+
+
+def etag_conta(conta):
+    return f'conta-{conta["id"]}-{conta["ultima_transacao_id"]}'
+
+
+def etag_extrato(conta, *parametros):
+    """ETag de uma página do extrato: última transação da conta + página pedida"""
+    pagina = hashlib.blake2b(repr(parametros).encode(), digest_size=8).hexdigest()
+    return f'extrato-{conta["id"]}-{conta["ultima_transacao_id"]}-{pagina}'
+
+
+def conta_json(conta):
+    return {
+        'id': conta['id'],
+        'tipo': conta['tipo'],
+        'saldo_centavos': conta['saldo_centavos'],
+        'ultima_transacao_id': conta['ultima_transacao_id'],
+    }
+
+
+def transacao_json(transacao):
+    return {
+        'id': transacao['id'],
+        'data': transacao['data'],
+        'tipo': transacao['tipo'],
+        'descricao': transacao['descricao'],
+        'valor_centavos': transacao['valor_centavos'],
+        'saldo_apos_centavos': transacao['saldo_apos_centavos'],
+    }
@@ -1,59 +1,230 @@
-from flask import Flask, render_template, request, redirect, url_for, flash, session
-from werkzeug.security import generate_password_hash, check_password_hash
-from datetime import datetime
+from flask import (Flask, Response, before_render_template, g, jsonify, render_template, request,
+                   redirect, template_rendered, url_for, flash, session, stream_with_context)
+from datetime import datetime, timedelta
+from contextlib import closing
+from werkzeug.middleware.proxy_fix import ProxyFix
+import hmac
+import logging
+import math
+import secrets
 import sqlite3
 import os
+import threading
+import time
+
+from database import (DATABASE, SQLITE_PRAGMAS, caminho_do_usuario, conectar, get_db, get_diretorio,
+                      get_leitura, get_replica, get_shards, close_db)
+import api
+import arquivo
+import busca
+import consultas_lentas
+import dinheiro
+import exportacao
+from group_commit import GroupCommit
+import idempotencia
+import ingestao
+import ledger
+from limitador import Limitador, ler_regra
+import metricas
+import migracoes
+import painel
+import resumos
+import saude
+import senhas
+import shards
+from cache import AUSENTE, CacheLRU
 
 app = Flask(__name__)
 app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'sua_chave_secreta_aqui')
 
+# Atrás do proxy do Render o IP do cliente vem em X-Forwarded-For
+app.config['PROXIES_CONFIAVEIS'] = int(os.environ.get('PROXIES_CONFIAVEIS', 0))
+if app.config['PROXIES_CONFIAVEIS']:
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=app.config['PROXIES_CONFIAVEIS'])
+
 # Configuração do banco SQLite
-DATABASE = 'banco.db'
+app.config['DATABASE'] = DATABASE
+app.config['SQLITE_PRAGMAS'] = dict(SQLITE_PRAGMAS)
+
+# Transações por página no extrato
+app.config['EXTRATO_POR_PAGINA'] = int(os.environ.get('EXTRATO_POR_PAGINA', 20))
+
+# Token exigido pela importação em lote (sem token a rota fica desligada)
+app.config['LOTE_TOKEN'] = os.environ.get('LOTE_TOKEN')
+
+# Busca nas transações: resultados por página e token do suporte (sem token a rota do suporte fica desligada)
+app.config['BUSCA_POR_PAGINA'] = int(os.environ.get('BUSCA_POR_PAGINA', busca.POR_PAGINA))
+app.config['SUPORTE_TOKEN'] = os.environ.get('SUPORTE_TOKEN')
+
+# API JSON (/api/v1): validade dos tokens e maior página de extrato aceita
+app.config['API_TOKEN_VALIDADE_DIAS'] = int(os.environ.get('API_TOKEN_VALIDADE_DIAS', api.VALIDADE_DIAS))
+app.config['API_LIMITE_MAXIMO'] = int(os.environ.get('API_LIMITE_MAXIMO', 100))
+
+# Cache do dashboard por usuário (LRU com TTL, um por worker)
+app.config['PAINEL_CACHE_MAXIMO'] = int(os.environ.get('PAINEL_CACHE_MAXIMO', 1024))
+app.config['PAINEL_CACHE_TTL'] = float(os.environ.get('PAINEL_CACHE_TTL', 30))
+cache_painel = CacheLRU(app.config['PAINEL_CACHE_MAXIMO'], app.config['PAINEL_CACHE_TTL'])
+
+# Meses do arquivo de transações já descomprimidos (segmentos de uma conta) para as páginas
+# do extrato, por worker; o limite é o total de transações guardadas, não de meses
+app.config['ARQUIVO_CACHE_LINHAS'] = int(os.environ.get('ARQUIVO_CACHE_LINHAS', 20000))
+cache_arquivo = CacheLRU(app.config['ARQUIVO_CACHE_LINHAS'], ttl=3600, peso=len)
+
+# Hash de senhas num pool de processos limitado (503 quando saturado)
+app.config['SENHA_METODO'] = os.environ.get('SENHA_METODO', senhas.METODO_PADRAO)
+app.config['SENHA_PROCESSOS'] = int(os.environ.get('SENHA_PROCESSOS', 1))
+app.config['SENHA_FILA_MAXIMA'] = int(os.environ.get('SENHA_FILA_MAXIMA', 8))
+app.config['SENHA_TIMEOUT'] = float(os.environ.get('SENHA_TIMEOUT', 10))
+pool_senhas = senhas.PoolSenhas(app.config['SENHA_METODO'], app.config['SENHA_PROCESSOS'],
+                                app.config['SENHA_FILA_MAXIMA'], app.config['SENHA_TIMEOUT'])
+
+# Limite de tentativas em /login e /registro ('tentativas/segundos'), compartilhado
+# entre workers por um arquivo mapeado em memória (padrão: ao lado do banco)
+app.config['LIMITE_ATIVO'] = os.environ.get('LIMITE_ATIVO', '1') == '1'
+app.config['LIMITE_ARQUIVO'] = os.environ.get('LIMITE_ARQUIVO')
+app.config['LIMITE_REGRAS'] = {
+    'login_ip': ler_regra(os.environ.get('LIMITE_LOGIN_IP', '20/60')),
+    'login_email': ler_regra(os.environ.get('LIMITE_LOGIN_EMAIL', '5/60')),
+    'registro_ip': ler_regra(os.environ.get('LIMITE_REGISTRO_IP', '5/600')),
+}
+
+# Idempotency-Key dos lançamentos: validade (segundos) e expurgo das chaves vencidas
+app.config['IDEMPOTENCIA_TTL'] = int(os.environ.get('IDEMPOTENCIA_TTL', 24 * 3600))
+app.config['IDEMPOTENCIA_LOTE_EXPURGO'] = int(os.environ.get('IDEMPOTENCIA_LOTE_EXPURGO', 500))
+registro_idempotencia = idempotencia.Idempotencia(app.config['IDEMPOTENCIA_TTL'],
+                                                  app.config['IDEMPOTENCIA_LOTE_EXPURGO'])
+
+# Métricas Prometheus em /metrics, somadas entre os workers por arquivos
+# mapeados em memória (padrão: diretório ao lado do banco); com METRICAS_TOKEN
+# a rota exige `Authorization: Bearer`
+app.config['METRICAS_ATIVAS'] = os.environ.get('METRICAS_ATIVAS', '1') == '1'
+app.config['METRICAS_DIRETORIO'] = os.environ.get('METRICAS_DIRETORIO') or app.config['DATABASE'] + '-metricas'
+app.config['METRICAS_TOKEN'] = os.environ.get('METRICAS_TOKEN')
+metricas_app = metricas.Metricas(app.config['METRICAS_DIRETORIO'])
+metricas_app.contador('banco_http_requisicoes_total', 'Requisições por rota, método e status')
+metricas_app.histograma('banco_http_duracao_segundos', 'Duração das requisições por rota',
+                        metricas.BUCKETS_HTTP)
+metricas_app.histograma('banco_template_duracao_segundos', 'Renderização de cada template',
+                        metricas.BUCKETS_HTTP)
+metricas_app.histograma('banco_sql_duracao_segundos',
+                        'Comandos SQL por tipo (BEGIN mede a espera pelo lock de escrita)',
+                        metricas.BUCKETS_SQL)
+metricas_app.contador('banco_sql_bloqueios_total', "Comandos SQL que falharam com 'database is locked'")
+metricas_app.contador('banco_sql_lentos_total', 'Comandos SQL acima de CONSULTAS_LENTAS_MS')
+
+# Comandos SQL acima do limite vão para o log 'banco.consultas_lentas' (uma
+# linha JSON com SQL, tipos dos parâmetros e plano); 0 desliga
+app.config['CONSULTAS_LENTAS_MS'] = float(os.environ.get('CONSULTAS_LENTAS_MS', 100))
+app.config['CONSULTAS_LENTAS_ARQUIVO'] = os.environ.get('CONSULTAS_LENTAS_ARQUIVO')
+if app.config['CONSULTAS_LENTAS_ARQUIVO']:
+    consultas_lentas.logger.addHandler(logging.FileHandler(app.config['CONSULTAS_LENTAS_ARQUIVO']))
+
+if app.config['METRICAS_ATIVAS'] or app.config['CONSULTAS_LENTAS_MS'] > 0:
+    app.config['SQLITE_FABRICA'] = metricas.fabrica_conexao(
+        metricas_app if app.config['METRICAS_ATIVAS'] else None,
+        consultas_lentas.RegistroLento(app.config['CONSULTAS_LENTAS_MS'])
+        if app.config['CONSULTAS_LENTAS_MS'] > 0 else None)
+
+# Aplica as migrações na subida em vez de só conferir (desenvolvimento local)
+app.config['MIGRAR_AO_INICIAR'] = os.environ.get('MIGRAR_AO_INICIAR', '0') == '1'
 
-def get_db():
-    """Conecta ao banco de dados SQLite"""
-    db = sqlite3.connect(DATABASE)
-    db.row_factory = sqlite3.Row
-    return db
+# Group commit: lançamentos de threads do mesmo worker dividem um COMMIT
+app.config['GROUP_COMMIT'] = os.environ.get('GROUP_COMMIT', '0') == '1'
+app.config['GROUP_COMMIT_INTERVALO_MS'] = float(os.environ.get('GROUP_COMMIT_INTERVALO_MS', 2))
+app.config['GROUP_COMMIT_MAXIMO_ITENS'] = int(os.environ.get('GROUP_COMMIT_MAXIMO_ITENS', 64))
+app.config['GROUP_COMMIT_TIMEOUT'] = float(os.environ.get('GROUP_COMMIT_TIMEOUT', 10))
+
+# Shards: com SHARDS (arquivos separados por vírgula) os dados de cada usuário
+# moram num dos arquivos e SHARDS_DIRETORIO guarda o roteamento (ver shards.py)
+app.config['SHARDS'] = list(shards.SHARDS)
+app.config['SHARDS_DIRETORIO'] = shards.DIRETORIO
+
+# Exportações de períodos já copiados leem da réplica `<banco>-replica`,
+# refeita por `python atualizar_replica.py` (ver replica.py)
+app.config['REPLICA_ATIVA'] = os.environ.get('REPLICA_ATIVA', '0') == '1'
+
+# Sondas de saúde: atraso máximo do checkpoint do WAL (quadros), espaço livre
+# mínimo em disco e validade do instantâneo das contagens de /health
+app.config['SAUDE_WAL_MAXIMO_QUADROS'] = int(os.environ.get('SAUDE_WAL_MAXIMO_QUADROS', 10000))
+app.config['SAUDE_DISCO_MINIMO_MB'] = int(os.environ.get('SAUDE_DISCO_MINIMO_MB', 100))
+app.config['SAUDE_CONTAGENS_TTL'] = float(os.environ.get('SAUDE_CONTAGENS_TTL', 300))
+cache_contagens = CacheLRU(1, app.config['SAUDE_CONTAGENS_TTL'])
+
+# Templates decidem o sinal (+/-) de cada transação e formatam centavos
+app.jinja_env.globals['TIPOS_DEBITO'] = ledger.TIPOS_DEBITO
+app.jinja_env.filters['moeda'] = dinheiro.formatar
+
+# Devolve a conexão da requisição ao pool da thread
+app.teardown_appcontext(close_db)
+
+@app.before_request
+def _iniciar_medicao():
+    g.inicio_requisicao = time.perf_counter()
+
+@app.after_request
+def _medir_requisicao(resposta):
+    inicio = g.pop('inicio_requisicao', None)
+    if inicio is not None and app.config['METRICAS_ATIVAS']:
+        # Respostas em streaming (exportação) medem só até o início do corpo
+        endpoint = request.endpoint or 'nao_encontrado'
+        metricas_app.incrementar('banco_http_requisicoes_total', endpoint=endpoint,
+                                 metodo=request.method, status=resposta.status_code)
+        metricas_app.observar('banco_http_duracao_segundos', time.perf_counter() - inicio,
+                              endpoint=endpoint)
+    return resposta
+
+def _antes_do_template(remetente, template, context, **extra):
+    g.setdefault('inicio_templates', []).append(time.perf_counter())
+
+def _template_renderizado(remetente, template, context, **extra):
+    inicios = g.get('inicio_templates')
+    if inicios and app.config['METRICAS_ATIVAS']:
+        metricas_app.observar('banco_template_duracao_segundos', time.perf_counter() - inicios.pop(),
+                              template=template.name)
+
+before_render_template.connect(_antes_do_template, app)
+template_rendered.connect(_template_renderizado, app)
+
+def _bancos():
+    """Arquivos com dados de usuários: os shards ou o banco único"""
+    return app.config['SHARDS'] or [app.config['DATABASE']]
 
 def init_db():
-    """Inicializa o banco de dados com as tabelas"""
+    """Aplica as migrações pendentes nos bancos configurados (testes e desenvolvimento)
+    
+    Em produção quem migra é `python -m migracoes`, antes de subir o app.
+    """
     try:
-        with get_db() as db:
-            db.executescript('''
-                CREATE TABLE IF NOT EXISTS usuario (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    nome TEXT NOT NULL,
-                    email TEXT UNIQUE NOT NULL,
-                    senha TEXT NOT NULL,
-                    saldo REAL DEFAULT 0.0,
-                    data_criacao TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                );
-                
-                CREATE TABLE IF NOT EXISTS conta (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    tipo TEXT NOT NULL,
-                    saldo REAL DEFAULT 0.0,
-                    usuario_id INTEGER NOT NULL,
-                    FOREIGN KEY (usuario_id) REFERENCES usuario (id)
-                );
-                
-                CREATE TABLE IF NOT EXISTS transacao (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    tipo TEXT NOT NULL,
-                    valor REAL NOT NULL,
-                    descricao TEXT,
-                    data TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    conta_id INTEGER NOT NULL,
-                    FOREIGN KEY (conta_id) REFERENCES conta (id)
-                );
-            ''')
-            print("✅ Banco de dados SQLite inicializado com sucesso!")
+        # Conexões dedicadas: não deixam conexão aberta no processo mestre antes do fork
+        for caminho in _bancos():
+            with closing(conectar(caminho, app.config['SQLITE_PRAGMAS'])) as db:
+                migracoes.migrar(db)
+        if app.config['SHARDS']:
+            with closing(conectar(app.config['SHARDS_DIRETORIO'], app.config['SQLITE_PRAGMAS'])) as db:
+                shards.preparar_diretorio(db)
+        print("✅ Banco de dados SQLite inicializado com sucesso!")
     except Exception as e:
         print(f"❌ Erro ao inicializar banco: {e}")
 
-# Inicializa o banco quando o app é criado
-init_db()
+def _faltando():
+    faltando = {}
+    for caminho in _bancos():
+        for migracao in migracoes.verificar(caminho):
+            faltando[migracao.versao] = migracao
+    return sorted(faltando.values())
+
+def verificar_esquema():
+    """Na subida só confere a versão do esquema (uma leitura por banco, sem DDL)"""
+    faltando = _faltando()
+    if faltando and app.config['MIGRAR_AO_INICIAR']:
+        init_db()
+        faltando = _faltando()
+    if faltando:
+        versoes = ', '.join(f'{m.versao:04d}' for m in faltando)
+        print(f"❌ Esquema desatualizado (faltam {versoes}): execute `python -m migracoes`")
+    return not faltando
+
+verificar_esquema()
 
 # Rotas
 @app.route('/')
@@ -69,66 +240,147 @@ def registro():
         email = request.form['email']
         senha = request.form['senha']
         
+        espera = _limitar(('registro_ip', request.remote_addr))
+        if espera:
+            return _muitas_tentativas('registro.html', espera)
+        
         try:
-            with get_db() as db:
-                # Verifica se email já existe
-                cursor = db.execute('SELECT id FROM usuario WHERE email = ?', (email,))
-                if cursor.fetchone():
-                    flash('Email já cadastrado!', 'error')
-                    return redirect(url_for('registro'))
-                
-                # Cria novo usuário
-                senha_hash = generate_password_hash(senha)
-                db.execute('INSERT INTO usuario (nome, email, senha) VALUES (?, ?, ?)',
-                          (nome, email, senha_hash))
-                db.commit()
+            if not _registrar(nome, email, senha):
+                flash('Email já cadastrado!', 'error')
+                return redirect(url_for('registro'))
             
             flash('Conta criada com sucesso!', 'success')
             return redirect(url_for('login'))
+        except senhas.PoolSaturado:
+            return _servidor_ocupado('registro.html')
         except sqlite3.OperationalError as e:
-            if "no such table" in str(e):
-                # Se a tabela não existe, tenta criar novamente
-                init_db()
-                flash('Erro temporário. Tente novamente.', 'error')
-                return redirect(url_for('registro'))
-            else:
-                flash('Erro no banco de dados!', 'error')
-                return redirect(url_for('registro'))
+            flash('Erro no banco de dados!', 'error')
+            return redirect(url_for('registro'))
         except Exception as e:
             flash('Erro inesperado!', 'error')
             return redirect(url_for('registro'))
     
     return render_template('registro.html')
 
+def _registrar(nome, email, senha):
+    """Cria o usuário (hash calculado no pool de senhas); False se o email já existe
+    
+    Com shards o id e o shard saem do diretório, cuja transação só termina
+    depois do usuário gravado no shard: nenhum email fica reservado sem dono.
+    """
+    if not app.config['SHARDS']:
+        with get_db() as db:
+            # Verifica se email já existe
+            cursor = db.execute('SELECT id FROM usuario WHERE email = ?', (email,))
+            if cursor.fetchone():
+                return False
+            
+            senha_hash = pool_senhas.gerar(senha)
+            db.execute('INSERT INTO usuario (nome, email, senha) VALUES (?, ?, ?)',
+                      (nome, email, senha_hash))
+        return True
+    
+    diretorio = get_diretorio()
+    if shards.usuario_do_email(diretorio, email) is not None:
+        return False
+    # Hash fora da transação do diretório, que trava o registro de todos
+    senha_hash = pool_senhas.gerar(senha)
+    with diretorio:
+        try:
+            usuario_id = shards.reservar_usuario(diretorio, email, len(app.config['SHARDS']))
+        except sqlite3.IntegrityError:
+            return False
+        with get_db(usuario_id) as db:
+            # REPLACE: um id desfeito no diretório pode ter deixado a linha no shard
+            db.execute('INSERT OR REPLACE INTO usuario (id, nome, email, senha) VALUES (?, ?, ?, ?)',
+                      (usuario_id, nome, email, senha_hash))
+    return True
+
 @app.route('/login', methods=['GET', 'POST'])
 def login():
     if request.method == 'POST':
         email = request.form['email']
         senha = request.form['senha']
         
+        # Antes de consultar o banco ou calcular hash
+        espera = _limitar(('login_ip', request.remote_addr), ('login_email', email.strip().lower()))
+        if espera:
+            return _muitas_tentativas('login.html', espera)
+        
         try:
-            with get_db() as db:
-                cursor = db.execute('SELECT * FROM usuario WHERE email = ?', (email,))
-                usuario = cursor.fetchone()
-                
-                if usuario and check_password_hash(usuario['senha'], senha):
-                    session['usuario_id'] = usuario['id']
-                    session['usuario_nome'] = usuario['nome']
-                    flash('Login realizado com sucesso!', 'success')
-                    return redirect(url_for('dashboard'))
-                else:
-                    flash('Email ou senha incorretos!', 'error')
-        except sqlite3.OperationalError as e:
-            if "no such table" in str(e):
-                init_db()
-                flash('Erro temporário. Tente novamente.', 'error')
+            usuario = _autenticar(email, senha)
+            
+            if usuario:
+                session['usuario_id'] = usuario['id']
+                session['usuario_nome'] = usuario['nome']
+                flash('Login realizado com sucesso!', 'success')
+                return redirect(url_for('dashboard'))
             else:
-                flash('Erro no banco de dados!', 'error')
+                flash('Email ou senha incorretos!', 'error')
+        except senhas.PoolSaturado:
+            return _servidor_ocupado('login.html')
+        except sqlite3.OperationalError as e:
+            flash('Erro no banco de dados!', 'error')
         except Exception as e:
             flash('Erro inesperado!', 'error')
     
     return render_template('login.html')
 
+def _autenticar(email, senha):
+    """Confere email e senha no pool de senhas; devolve o usuário ou None
+    
+    Pode levantar senhas.PoolSaturado. Um hash com custo antigo é trocado
+    pelo atual, calculado na mesma ida ao pool. Com shards o email passa
+    primeiro pelo diretório.
+    """
+    if app.config['SHARDS']:
+        usuario_id = shards.usuario_do_email(get_diretorio(), email)
+        if usuario_id is None:
+            return None
+        db = get_db(usuario_id)
+    else:
+        db = get_db()
+    
+    with db:
+        usuario = db.execute('SELECT * FROM usuario WHERE email = ?', (email,)).fetchone()
+        confere, novo_hash = (pool_senhas.verificar(usuario['senha'], senha)
+                              if usuario else (False, None))
+        if not confere:
+            return None
+        if novo_hash:
+            db.execute('UPDATE usuario SET senha = ? WHERE id = ? AND senha = ?',
+                      (novo_hash, usuario['id'], usuario['senha']))
+    return usuario
+
+_limitador = None
+
+def _obter_limitador():
+    global _limitador
+    caminho = app.config['LIMITE_ARQUIVO'] or app.config['DATABASE'] + '-limites'
+    if _limitador is None or _limitador.caminho != caminho:
+        _limitador = Limitador(caminho, app.config['LIMITE_REGRAS'])
+    return _limitador
+
+def _limitar(*chaves):
+    """Gasta uma ficha de cada (regra, valor); devolve segundos de espera ou 0"""
+    if not app.config['LIMITE_ATIVO']:
+        return 0
+    limitador = _obter_limitador()
+    for regra, valor in chaves:
+        espera = limitador.consumir(regra, valor)
+        if espera:
+            return espera
+    return 0
+
+def _muitas_tentativas(template, espera):
+    flash('Muitas tentativas. Aguarde um pouco e tente novamente.', 'error')
+    return render_template(template), 429, {'Retry-After': str(math.ceil(espera))}
+
+def _servidor_ocupado(template):
+    """Resposta rápida quando o pool de senhas está cheio"""
+    flash('Muitas tentativas no momento. Tente novamente em instantes.', 'error')
+    return render_template(template), 503, {'Retry-After': '1'}
+
 @app.route('/logout')
 def logout():
     session.clear()
@@ -141,29 +393,25 @@ def dashboard():
         return redirect(url_for('login'))
     
     try:
-        with get_db() as db:
-            # Busca usuário
-            cursor = db.execute('SELECT * FROM usuario WHERE id = ?', (session['usuario_id'],))
-            usuario = cursor.fetchone()
-            
-            if not usuario:
-                session.clear()
-                flash('Usuário não encontrado!', 'error')
-                return redirect(url_for('login'))
-            
-            # Busca contas do usuário
-            cursor = db.execute('SELECT * FROM conta WHERE usuario_id = ?', (usuario['id'],))
-            contas = cursor.fetchall()
+        # Usuário, contas e totais do mês numa consulta, com cache por usuário
+        usuario_id = session['usuario_id']
+        dados = painel.carregar(get_leitura(usuario_id), usuario_id, cache_painel,
+                                (caminho_do_usuario(usuario_id), usuario_id))
         
-        return render_template('dashboard.html', usuario=usuario, contas=contas)
-    except sqlite3.OperationalError as e:
-        if "no such table" in str(e):
-            init_db()
-            flash('Erro temporário. Recarregue a página.', 'error')
-            return redirect(url_for('login'))
-        else:
-            flash('Erro no banco de dados!', 'error')
+        if not dados:
+            session.clear()
+            flash('Usuário não encontrado!', 'error')
             return redirect(url_for('login'))
+        
+        return render_template('dashboard.html', usuario=dados['usuario'], contas=dados['contas'],
+                               meses=dados['meses'])
+    except shards.UsuarioSemShard:
+        session.clear()
+        flash('Usuário não encontrado!', 'error')
+        return redirect(url_for('login'))
+    except sqlite3.OperationalError as e:
+        flash('Erro no banco de dados!', 'error')
+        return redirect(url_for('login'))
     except Exception as e:
         flash('Erro inesperado!', 'error')
         return redirect(url_for('login'))
@@ -178,19 +426,24 @@ def criar_conta():
         usuario_id = session['usuario_id']
         
         try:
-            with get_db() as db:
-                db.execute('INSERT INTO conta (tipo, usuario_id) VALUES (?, ?)',
-                          (tipo, usuario_id))
-                db.commit()
+            if app.config['SHARDS']:
+                # O id da conta sai do diretório (único entre os shards). A transação do
+                # diretório só é confirmada depois da linha no shard: se o INSERT falhar,
+                # o id não fica no diretório apontando para uma conta que não existe
+                with get_diretorio() as diretorio:
+                    conta_id = shards.reservar_conta(diretorio, usuario_id)
+                    with get_db(usuario_id) as db:
+                        # REPLACE: um id desfeito no diretório pode ter deixado a linha no shard
+                        db.execute('INSERT OR REPLACE INTO conta (id, tipo, usuario_id) VALUES (?, ?, ?)',
+                                  (conta_id, tipo, usuario_id))
+            else:
+                with get_db(usuario_id) as db:
+                    db.execute('INSERT INTO conta (tipo, usuario_id) VALUES (?, ?)', (tipo, usuario_id))
             
             flash('Conta criada com sucesso!', 'success')
             return redirect(url_for('dashboard'))
         except sqlite3.OperationalError as e:
-            if "no such table" in str(e):
-                init_db()
-                flash('Erro temporário. Tente novamente.', 'error')
-            else:
-                flash('Erro no banco de dados!', 'error')
+            flash('Erro no banco de dados!', 'error')
             return redirect(url_for('dashboard'))
         except Exception as e:
             flash('Erro inesperado!', 'error')
@@ -203,110 +456,275 @@ def deposito(conta_id):
     if 'usuario_id' not in session:
         return redirect(url_for('login'))
     
-    try:
-        with get_db() as db:
-            # Verifica se a conta pertence ao usuário
-            cursor = db.execute('SELECT * FROM conta WHERE id = ? AND usuario_id = ?',
-                              (conta_id, session['usuario_id']))
-            conta = cursor.fetchone()
-            
-            if not conta:
-                flash('Acesso negado!', 'error')
-                return redirect(url_for('dashboard'))
-    except sqlite3.OperationalError as e:
-        if "no such table" in str(e):
-            init_db()
-            flash('Erro temporário. Tente novamente.', 'error')
-        else:
-            flash('Erro no banco de dados!', 'error')
-        return redirect(url_for('dashboard'))
-    
     if request.method == 'POST':
         try:
-            valor = float(request.form['valor'])
+            valor = dinheiro.centavos(request.form['valor'])
             if valor > 0:
-                with get_db() as db:
-                    # Atualiza saldo
-                    db.execute('UPDATE conta SET saldo = saldo + ? WHERE id = ?',
-                              (valor, conta_id))
-                    
-                    # Registra transação
-                    db.execute('INSERT INTO transacao (tipo, valor, descricao, conta_id) VALUES (?, ?, ?, ?)',
-                              ('deposito', valor, 'Depósito', conta_id))
-                    db.commit()
-                
+                # Verifica o dono, atualiza o saldo e registra a transação de uma vez
+                _postar_idempotente(('deposito', conta_id, valor), ledger.aplicar_lancamento,
+                                    conta_id, 'deposito', valor, 'Depósito',
+                                    usuario_id=session['usuario_id'])
                 flash('Depósito realizado com sucesso!', 'success')
             else:
                 flash('Valor deve ser maior que zero!', 'error')
+        except idempotencia.ChaveInvalida:
+            flash('Chave de idempotência inválida!', 'error')
+        except idempotencia.ChaveReutilizada:
+            flash('Esta operação já foi enviada com outros dados!', 'error')
         except ValueError:
             flash('Valor inválido!', 'error')
+        except ledger.ContaNaoEncontrada:
+            flash('Acesso negado!', 'error')
         except sqlite3.OperationalError as e:
-            if "no such table" in str(e):
-                init_db()
-                flash('Erro temporário. Tente novamente.', 'error')
-            else:
-                flash('Erro no banco de dados!', 'error')
+            flash('Erro no banco de dados!', 'error')
         except Exception as e:
             flash('Erro inesperado!', 'error')
         
         return redirect(url_for('dashboard'))
     
-    return render_template('deposito.html', conta=conta)
+    conta = _buscar_conta(conta_id)
+    if not conta:
+        return redirect(url_for('dashboard'))
+    return render_template('deposito.html', conta=conta, chave_idempotencia=secrets.token_urlsafe(16))
 
 @app.route('/saque/<int:conta_id>', methods=['GET', 'POST'])
 def saque(conta_id):
     if 'usuario_id' not in session:
         return redirect(url_for('login'))
     
-    try:
-        with get_db() as db:
-            # Verifica se a conta pertence ao usuário
-            cursor = db.execute('SELECT * FROM conta WHERE id = ? AND usuario_id = ?',
-                              (conta_id, session['usuario_id']))
-            conta = cursor.fetchone()
-            
-            if not conta:
-                flash('Acesso negado!', 'error')
-                return redirect(url_for('dashboard'))
-    except sqlite3.OperationalError as e:
-        if "no such table" in str(e):
-            init_db()
-            flash('Erro temporário. Tente novamente.', 'error')
-        else:
-            flash('Erro no banco de dados!', 'error')
-        return redirect(url_for('dashboard'))
-    
     if request.method == 'POST':
         try:
-            valor = float(request.form['valor'])
-            if valor > 0 and valor <= conta['saldo']:
-                with get_db() as db:
-                    # Atualiza saldo
-                    db.execute('UPDATE conta SET saldo = saldo - ? WHERE id = ?',
-                              (valor, conta_id))
-                    
-                    # Registra transação
-                    db.execute('INSERT INTO transacao (tipo, valor, descricao, conta_id) VALUES (?, ?, ?, ?)',
-                              ('saque', valor, 'Saque', conta_id))
-                    db.commit()
-                
+            valor = dinheiro.centavos(request.form['valor'])
+            if valor > 0:
+                # O UPDATE só debita se houver saldo: sem janela para saques concorrentes
+                _postar_idempotente(('saque', conta_id, valor), ledger.aplicar_lancamento,
+                                    conta_id, 'saque', valor, 'Saque',
+                                    usuario_id=session['usuario_id'])
                 flash('Saque realizado com sucesso!', 'success')
             else:
                 flash('Valor inválido ou saldo insuficiente!', 'error')
+        except idempotencia.ChaveInvalida:
+            flash('Chave de idempotência inválida!', 'error')
+        except idempotencia.ChaveReutilizada:
+            flash('Esta operação já foi enviada com outros dados!', 'error')
         except ValueError:
             flash('Valor inválido!', 'error')
+        except ledger.SaldoInsuficiente:
+            flash('Valor inválido ou saldo insuficiente!', 'error')
+        except ledger.ContaNaoEncontrada:
+            flash('Acesso negado!', 'error')
         except sqlite3.OperationalError as e:
-            if "no such table" in str(e):
-                init_db()
-                flash('Erro temporário. Tente novamente.', 'error')
-            else:
-                flash('Erro no banco de dados!', 'error')
+            flash('Erro no banco de dados!', 'error')
         except Exception as e:
             flash('Erro inesperado!', 'error')
         
         return redirect(url_for('dashboard'))
     
-    return render_template('saque.html', conta=conta)
+    conta = _buscar_conta(conta_id)
+    if not conta:
+        return redirect(url_for('dashboard'))
+    return render_template('saque.html', conta=conta, chave_idempotencia=secrets.token_urlsafe(16))
+
+@app.route('/transferencia/<int:conta_id>', methods=['GET', 'POST'])
+def transferencia(conta_id):
+    if 'usuario_id' not in session:
+        return redirect(url_for('login'))
+
+    if request.method == 'POST':
+        try:
+            valor = dinheiro.centavos(request.form['valor'])
+            destino_id = int(request.form['conta_destino'])
+            if valor > 0:
+                _transferir(conta_id, destino_id, valor)
+                flash('Transferência realizada com sucesso!', 'success')
+            else:
+                flash('Valor deve ser maior que zero!', 'error')
+        except idempotencia.ChaveInvalida:
+            flash('Chave de idempotência inválida!', 'error')
+        except idempotencia.ChaveReutilizada:
+            flash('Esta operação já foi enviada com outros dados!', 'error')
+        except ValueError:
+            flash('Valor ou conta de destino inválidos!', 'error')
+        except ledger.TransferenciaInvalida:
+            flash('Escolha uma conta de destino diferente da origem!', 'error')
+        except ledger.SaldoInsuficiente:
+            flash('Saldo insuficiente!', 'error')
+        except ledger.ContaDestinoNaoEncontrada:
+            flash('Conta de destino não encontrada!', 'error')
+        except ledger.ContaNaoEncontrada:
+            flash('Acesso negado!', 'error')
+        except sqlite3.OperationalError as e:
+            flash('Erro no banco de dados!', 'error')
+        except Exception as e:
+            flash('Erro inesperado!', 'error')
+
+        return redirect(url_for('dashboard'))
+
+    conta = _buscar_conta(conta_id)
+    if not conta:
+        return redirect(url_for('dashboard'))
+    return render_template('transferencia.html', conta=conta, chave_idempotencia=secrets.token_urlsafe(16))
+
+def _transferir(origem_id, destino_id, centavos):
+    """Transferência do usuário logado
+    
+    No mesmo banco, débito e crédito vão na mesma transação, contas travadas
+    em ordem de id. Com o destino em outro shard o débito é gravado com uma
+    saída pendente e o crédito entregue em seguida (ver shards.py).
+    """
+    usuario_id = session['usuario_id']
+    funcao = ledger.aplicar_transferencia
+    if app.config['SHARDS'] and origem_id != destino_id:
+        dono = shards.usuario_da_conta(get_diretorio(), destino_id)
+        if dono is None:
+            raise ledger.ContaDestinoNaoEncontrada(destino_id)
+        if caminho_do_usuario(dono) != caminho_do_usuario(usuario_id):
+            funcao = shards.iniciar_transferencia
+    
+    _postar_idempotente(('transferencia', origem_id, destino_id, centavos),
+                        funcao, origem_id, destino_id, centavos, usuario_id=usuario_id)
+    if funcao is shards.iniciar_transferencia:
+        _entregar_transferencias(get_db(usuario_id))
+
+def _conexao_da_conta(conta_id):
+    """Conexão do shard do dono da conta, ou None se a conta não existe"""
+    dono = shards.usuario_da_conta(get_diretorio(), conta_id)
+    return get_db(dono) if dono is not None else None
+
+def _leitura_da_conta(conta_id):
+    """Conexão de leitura do banco ou shard da conta, ou None se a conta não existe"""
+    if not app.config['SHARDS']:
+        return get_leitura()
+    dono = shards.usuario_da_conta(get_diretorio(), conta_id)
+    return get_leitura(dono) if dono is not None else None
+
+def _entregar_transferencias(db):
+    """Credita nos destinos as transferências pendentes do shard
+    
+    O débito já está gravado: uma entrega que falha fica pendente para a
+    próxima transferência do shard ou para `rebalancear_shards.py --entregar`.
+    """
+    try:
+        shards.entregar_transferencias(db, _conexao_da_conta)
+    except sqlite3.OperationalError:
+        pass
+
+_group_commits = {}
+# Cria no máximo um GroupCommit (e um escritor) por arquivo entre as threads do worker
+_trava_group_commits = threading.Lock()
+
+def _postar(funcao, *args, **kwargs):
+    """Aplica um lançamento do ledger no banco do usuário logado, com COMMIT
+    próprio ou via group commit (um por arquivo)"""
+    usuario_id = session['usuario_id']
+    if not app.config['GROUP_COMMIT']:
+        return ledger.em_transacao(get_db(usuario_id), funcao, *args, **kwargs)
+    
+    caminho = caminho_do_usuario(usuario_id)
+    group_commit = _group_commits.get(caminho)
+    if group_commit is None:
+        with _trava_group_commits:
+            group_commit = _group_commits.get(caminho)
+            if group_commit is None:
+                group_commit = _group_commits[caminho] = GroupCommit(
+                    caminho, app.config['SQLITE_PRAGMAS'], app.config['GROUP_COMMIT_INTERVALO_MS'],
+                    app.config['GROUP_COMMIT_MAXIMO_ITENS'], app.config['GROUP_COMMIT_TIMEOUT'])
+    return group_commit.submeter(funcao, *args, **kwargs)
+
+def _postar_idempotente(pedido, funcao, *args, **kwargs):
+    """_postar com a Idempotency-Key do cabeçalho ou do formulário, se houver
+
+    `pedido` (tipo, contas, valor) identifica o que a chave autoriza. Um
+    reenvio com a mesma chave devolve o resultado gravado (ou levanta o
+    mesmo erro do ledger) sem lançar de novo.
+    """
+    # Transferências devolvem o id em transferencia; depósitos e saques, em transacao
+    tabela = 'transferencia' if pedido[0] == 'transferencia' else 'transacao'
+    chave = request.headers.get('Idempotency-Key') or request.form.get('idempotency_key')
+    if chave is None:
+        return _postar(funcao, *args, **kwargs)
+    if not chave or len(chave) > idempotencia.TAMANHO_MAXIMO:
+        raise idempotencia.ChaveInvalida(chave)
+    resposta = _postar(registro_idempotencia.aplicar, session['usuario_id'], chave,
+                       idempotencia.impressao(*pedido), funcao, *args, tabela=tabela, **kwargs)
+    return idempotencia.reproduzir(resposta)
+
+def _buscar_conta(conta_id):
+    """Busca a conta do usuário logado; em caso de erro registra o flash e devolve None"""
+    try:
+        # Verifica se a conta pertence ao usuário
+        cursor = get_leitura(session['usuario_id']).execute(
+            'SELECT * FROM conta WHERE id = ? AND usuario_id = ?', (conta_id, session['usuario_id']))
+        conta = cursor.fetchone()
+    except sqlite3.OperationalError as e:
+        flash('Erro no banco de dados!', 'error')
+        return None
+    
+    if not conta:
+        flash('Acesso negado!', 'error')
+    return conta
+
+# Colunas exibidas no extrato
+_COLUNAS_EXTRATO = '''id, tipo, valor_centavos, saldo_apos_centavos, descricao, conta_id, data,
+                    strftime('%d/%m/%Y %H:%M', data) as data_formatada'''
+
+def _cursor_de(transacao):
+    """Monta o cursor de paginação a partir da posição (data, id) da transação"""
+    return f"{transacao['data']}|{transacao['id']}"
+
+def _ler_cursor(valor):
+    """Lê um cursor 'data|id'; devolve None se ausente ou inválido"""
+    if not valor:
+        return None
+    data, _, transacao_id = valor.rpartition('|')
+    if not data or not transacao_id.isdigit():
+        return None
+    return data, int(transacao_id)
+
+def _arquivo_do_usuario(usuario_id):
+    return arquivo.diretorio_do_banco(caminho_do_usuario(usuario_id))
+
+def _pagina_extrato(db, conta_id, antes, depois, por_pagina, diretorio_arquivo):
+    """Uma página do extrato, da mais recente para a mais antiga
+
+    Devolve (transações, cursores 'antes'/'depois' das páginas vizinhas).
+    Transações arquivadas entram na página quando a faixa chega nelas.
+    """
+    if depois:
+        cursor = db.execute(f'''
+            SELECT {_COLUNAS_EXTRATO}
+            FROM transacao 
+            WHERE conta_id = ? AND (data, id) > (?, ?)
+            ORDER BY data, id
+            LIMIT ?
+        ''', (conta_id, *depois, por_pagina + 1))
+        transacoes = arquivo.completar(cursor.fetchall(), db, diretorio_arquivo, conta_id, por_pagina + 1,
+                                       desde=(depois[0], depois[1] + 1), cache=cache_arquivo)
+        tem_mais_recentes = len(transacoes) > por_pagina
+        transacoes = transacoes[:por_pagina][::-1]
+        tem_mais_antigas = True
+    else:
+        filtro, parametros = '', (conta_id,)
+        if antes:
+            filtro, parametros = 'AND (data, id) < (?, ?)', (conta_id, *antes)
+        cursor = db.execute(f'''
+            SELECT {_COLUNAS_EXTRATO}
+            FROM transacao 
+            WHERE conta_id = ? {filtro}
+            ORDER BY data DESC, id DESC
+            LIMIT ?
+        ''', (*parametros, por_pagina + 1))
+        transacoes = arquivo.completar(cursor.fetchall(), db, diretorio_arquivo, conta_id, por_pagina + 1,
+                                       ate=antes or arquivo.FIM, decrescente=True, cache=cache_arquivo)
+        tem_mais_antigas = len(transacoes) > por_pagina
+        transacoes = transacoes[:por_pagina]
+        tem_mais_recentes = antes is not None
+    
+    paginacao = {
+        'antes': _cursor_de(transacoes[-1]) if transacoes and tem_mais_antigas else None,
+        'depois': _cursor_de(transacoes[0]) if transacoes and tem_mais_recentes else None,
+    }
+    return transacoes, paginacao
 
 @app.route('/extrato/<int:conta_id>')
 def extrato(conta_id):
@@ -314,60 +732,413 @@ def extrato(conta_id):
         return redirect(url_for('login'))
     
     try:
-        with get_db() as db:
-            # Verifica se a conta pertence ao usuário
-            cursor = db.execute('SELECT * FROM conta WHERE id = ? AND usuario_id = ?',
-                              (conta_id, session['usuario_id']))
-            conta = cursor.fetchone()
-            
-            if not conta:
-                flash('Acesso negado!', 'error')
-                return redirect(url_for('dashboard'))
-            
-            # Busca transações com formatação de data
-            cursor = db.execute('''
-                SELECT 
-                    id, tipo, valor, descricao, conta_id,
-                    strftime('%d/%m/%Y %H:%M', data) as data_formatada
-                FROM transacao 
-                WHERE conta_id = ? 
-                ORDER BY data DESC
-            ''', (conta_id,))
-            transacoes = cursor.fetchall()
+        # Conta e página saem do mesmo instantâneo, numa conexão só de leitura
+        db = get_leitura(session['usuario_id'])
+        cursor = db.execute('SELECT * FROM conta WHERE id = ? AND usuario_id = ?',
+                          (conta_id, session['usuario_id']))
+        conta = cursor.fetchone()
+        
+        if not conta:
+            flash('Acesso negado!', 'error')
+            return redirect(url_for('dashboard'))
+        
+        # Busca uma página de transações (keyset pela posição (data, id))
+        transacoes, paginacao = _pagina_extrato(
+            db, conta_id, _ler_cursor(request.args.get('antes')),
+            _ler_cursor(request.args.get('depois')), app.config['EXTRATO_POR_PAGINA'],
+            _arquivo_do_usuario(session['usuario_id']))
         
-        return render_template('extrato.html', conta=conta, transacoes=transacoes)
+        # Entradas e saídas por mês pelo resumo mensal (algumas linhas por mês)
+        meses = resumos.meses_da_conta(db, conta_id)
+        
+        return render_template('extrato.html', conta=conta, transacoes=transacoes,
+                               paginacao=paginacao, meses=meses)
     except sqlite3.OperationalError as e:
-        if "no such table" in str(e):
-            init_db()
-            flash('Erro temporário. Tente novamente.', 'error')
-        else:
-            flash('Erro no banco de dados!', 'error')
+        flash('Erro no banco de dados!', 'error')
         return redirect(url_for('dashboard'))
     except Exception as e:
         flash('Erro inesperado!', 'error')
         return redirect(url_for('dashboard'))
 
-# Rota de health check para o Render
+@app.route('/extrato/<int:conta_id>/exportar')
+def exportar_extrato(conta_id):
+    if 'usuario_id' not in session:
+        return redirect(url_for('login'))
+    
+    formato = request.args.get('formato', 'csv')
+    inicio = request.args.get('inicio') or None
+    fim = request.args.get('fim') or None
+    try:
+        if formato not in exportacao.FORMATOS:
+            raise ValueError(formato)
+        for data in (inicio, fim):
+            if data:
+                datetime.strptime(data, '%Y-%m-%d')
+    except ValueError:
+        flash('Formato ou período inválido!', 'error')
+        return redirect(url_for('extrato', conta_id=conta_id))
+    
+    try:
+        db = get_leitura(session['usuario_id'])
+        cursor = db.execute('SELECT * FROM conta WHERE id = ? AND usuario_id = ?',
+                          (conta_id, session['usuario_id']))
+        conta = cursor.fetchone()
+        
+        if not conta:
+            flash('Acesso negado!', 'error')
+            return redirect(url_for('dashboard'))
+        
+        # Período que a réplica já cobre inteiro: lido de lá
+        copia = get_replica(session['usuario_id']) if fim else None
+        if copia and _dia_seguinte(fim) <= copia[1]:
+            db = copia[0]
+        # Sem cache_arquivo: cada mês arquivado é lido, exportado e descartado (memória constante)
+        diretorio_arquivo = _arquivo_do_usuario(session['usuario_id'])
+        cursor = exportacao.consultar_transacoes(db, conta_id, inicio, fim, diretorio_arquivo)
+    except sqlite3.OperationalError as e:
+        flash('Erro no banco de dados!', 'error')
+        return redirect(url_for('dashboard'))
+    
+    if formato == 'csv':
+        blocos = exportacao.gerar_csv(cursor)
+    elif formato == 'ndjson':
+        blocos = exportacao.gerar_ndjson(cursor)
+    else:
+        saldo_final = None
+        if fim:
+            # Saldo ao fim do período: checkpoint anterior + poucas transações
+            saldo_final = arquivo.saldo_em(db, diretorio_arquivo, conta_id, _dia_seguinte(fim))
+        blocos = exportacao.gerar_ofx(cursor, conta, inicio, fim, saldo_final)
+    
+    mimetype, extensao = exportacao.FORMATOS[formato]
+    return Response(stream_with_context(blocos), mimetype=mimetype, headers={
+        'Content-Disposition': f'attachment; filename=extrato_{conta_id}.{extensao}'
+    })
+
+def _pagina_da_busca():
+    return max(1, min(request.args.get('pagina', 1, type=int), busca.PAGINA_MAXIMA))
+
+@app.route('/extrato/<int:conta_id>/busca')
+def buscar_extrato(conta_id):
+    if 'usuario_id' not in session:
+        return redirect(url_for('login'))
+    
+    try:
+        filtros = busca.ler_filtros(request.args)
+    except ValueError:
+        flash('Filtro de busca inválido!', 'error')
+        return redirect(url_for('extrato', conta_id=conta_id))
+    pagina = _pagina_da_busca()
+    
+    try:
+        db = get_leitura(session['usuario_id'])
+        cursor = db.execute('SELECT * FROM conta WHERE id = ? AND usuario_id = ?',
+                          (conta_id, session['usuario_id']))
+        conta = cursor.fetchone()
+        
+        if not conta:
+            flash('Acesso negado!', 'error')
+            return redirect(url_for('dashboard'))
+        
+        # Pelo índice de texto quando há termo; senão pelo índice do extrato
+        transacoes, tem_mais = busca.buscar(db, conta_id, pagina=pagina,
+                                            por_pagina=app.config['BUSCA_POR_PAGINA'], **filtros)
+    except busca.IndiceIndisponivel:
+        # Migração 0012 ainda carregando: a página abre, só a busca por descrição espera
+        flash('Busca por descrição indisponível no momento. Tente de novo em instantes ou use só os filtros.', 'error')
+        transacoes, tem_mais = [], False
+    except sqlite3.OperationalError as e:
+        flash('Erro no banco de dados!', 'error')
+        return redirect(url_for('extrato', conta_id=conta_id))
+    
+    # Parâmetros da busca repetidos nos links das páginas
+    parametros = {chave: request.args[chave] for chave in busca.PARAMETROS if request.args.get(chave)}
+    return render_template('busca.html', conta=conta, transacoes=transacoes, parametros=parametros,
+                           pagina=pagina, tem_mais=tem_mais, tipos=busca.TIPOS)
+
+def _dia_seguinte(data):
+    return (datetime.strptime(data, '%Y-%m-%d') + timedelta(days=1)).strftime('%Y-%m-%d')
+
+@app.route('/lancamentos/lote', methods=['POST'])
+def importar_lote():
+    token = app.config['LOTE_TOKEN']
+    if not token:
+        return {'status': 'error', 'message': 'Importação em lote desativada'}, 404
+    
+    token_enviado = request.headers.get('Authorization', '').removeprefix('Bearer ')
+    if not hmac.compare_digest(token_enviado.encode(), token.encode()):
+        return {'status': 'error', 'message': 'Token inválido'}, 401
+    
+    enviado = request.files.get('arquivo')
+    nome = enviado.filename if enviado else ''
+    formato = request.args.get('formato') or ('ndjson' if nome.endswith(('.ndjson', '.jsonl')) else 'csv')
+    if formato not in ingestao.LEITORES:
+        return {'status': 'error', 'message': f'Formato inválido: {formato}'}, 400
+    
+    fluxo = enviado.stream if enviado else request.stream
+    try:
+        # Com shards cada linha vai para o shard do dono da conta
+        if app.config['SHARDS']:
+            relatorio = ingestao.importar(None, ingestao.abrir_texto(fluxo), formato,
+                                          roteador=_conexao_da_conta)
+        else:
+            relatorio = ingestao.importar(get_db(), ingestao.abrir_texto(fluxo), formato)
+    except UnicodeDecodeError:
+        return {'status': 'error', 'message': 'Arquivo deve estar em UTF-8'}, 400
+    except sqlite3.OperationalError as e:
+        return {'status': 'error', 'message': 'Erro no banco de dados!'}, 503
+    
+    return {'status': 'ok', **relatorio}
+
+# API JSON: token Bearer no lugar da sessão e GET condicional por ETag
+def _erro_api(mensagem, status, headers=None):
+    return {'status': 'error', 'message': mensagem}, status, headers or {}
+
+def _token_enviado():
+    autorizacao = request.headers.get('Authorization', '')
+    return autorizacao[len('Bearer '):].strip() if autorizacao.startswith('Bearer ') else None
+
+def _nao_autorizado():
+    return _erro_api('Token ausente, inválido ou expirado', 401, {'WWW-Authenticate': 'Bearer'})
+
+def _leitura_api():
+    """(id do usuário do token, conexão numa transação de leitura)
+
+    ETag e corpo saem do mesmo instantâneo do WAL; o teardown desfaz a
+    transação, que só leu. Os tokens ficam no diretório quando há shards.
+    """
+    usuario_id = api.usuario_do_token(get_diretorio(), _token_enviado())
+    if usuario_id is None:
+        return None, None
+    try:
+        return usuario_id, get_leitura(usuario_id)
+    except shards.UsuarioSemShard:
+        return None, None
+
+def _condicional(etag, gerar):
+    """304 se o cliente já tem a representação `etag`; senão o JSON de gerar()"""
+    if request.if_none_match.contains_weak(etag):
+        resposta = Response(status=304)
+    else:
+        resposta = jsonify(gerar())
+    resposta.set_etag(etag)
+    resposta.headers['Cache-Control'] = 'private, no-cache'
+    return resposta
+
+_COLUNAS_CONTA_API = 'id, tipo, saldo_centavos, ultima_transacao_id'
+
+@app.route('/api/v1/tokens', methods=['POST'])
+def api_emitir_token():
+    dados = request.get_json(silent=True) or request.form
+    email, senha = dados.get('email'), dados.get('senha')
+    if not isinstance(email, str) or not isinstance(senha, str):
+        return _erro_api('Informe email e senha', 400)
+    
+    espera = _limitar(('login_ip', request.remote_addr), ('login_email', email.strip().lower()))
+    if espera:
+        return _erro_api('Muitas tentativas', 429, {'Retry-After': str(math.ceil(espera))})
+    
+    try:
+        usuario = _autenticar(email, senha)
+        if not usuario:
+            return _erro_api('Email ou senha incorretos', 401)
+        with get_diretorio() as db:
+            token = api.emitir_token(db, usuario['id'], app.config['API_TOKEN_VALIDADE_DIAS'])
+    except senhas.PoolSaturado:
+        return _erro_api('Servidor ocupado', 503, {'Retry-After': '1'})
+    except sqlite3.OperationalError as e:
+        return _erro_api('Erro no banco de dados!', 503)
+    
+    return {'status': 'ok', 'token': token, 'validade_dias': app.config['API_TOKEN_VALIDADE_DIAS']}, 201
+
+@app.route('/api/v1/tokens', methods=['DELETE'])
+def api_revogar_token():
+    token = _token_enviado()
+    try:
+        with get_diretorio() as db:
+            revogado = bool(token) and api.revogar_token(db, token)
+    except sqlite3.OperationalError as e:
+        return _erro_api('Erro no banco de dados!', 503)
+    
+    if not revogado:
+        return _nao_autorizado()
+    return '', 204
+
+@app.route('/api/v1/contas')
+def api_contas():
+    try:
+        usuario_id, db = _leitura_api()
+        if usuario_id is None:
+            return _nao_autorizado()
+        
+        # usuario.versao muda a cada lançamento e a cada conta criada
+        linha = db.execute('SELECT versao FROM usuario WHERE id = ?', (usuario_id,)).fetchone()
+        if linha is None:
+            return _nao_autorizado()
+        
+        def gerar():
+            contas = db.execute(f'''
+                SELECT {_COLUNAS_CONTA_API} FROM conta WHERE usuario_id = ? ORDER BY id
+            ''', (usuario_id,)).fetchall()
+            return {'contas': [api.conta_json(c) for c in contas]}
+        
+        return _condicional(api.etag_contas(usuario_id, linha[0]), gerar)
+    except sqlite3.OperationalError as e:
+        return _erro_api('Erro no banco de dados!', 503)
+
+def _conta_api(db, conta_id, usuario_id):
+    return db.execute(f'SELECT {_COLUNAS_CONTA_API} FROM conta WHERE id = ? AND usuario_id = ?',
+                      (conta_id, usuario_id)).fetchone()
+
+@app.route('/api/v1/contas/<int:conta_id>')
+def api_conta(conta_id):
+    try:
+        usuario_id, db = _leitura_api()
+        if usuario_id is None:
+            return _nao_autorizado()
+        
+        conta = _conta_api(db, conta_id, usuario_id)
+        if not conta:
+            return _erro_api('Conta não encontrada', 404)
+        return _condicional(api.etag_conta(conta), lambda: {'conta': api.conta_json(conta)})
+    except sqlite3.OperationalError as e:
+        return _erro_api('Erro no banco de dados!', 503)
+
+@app.route('/api/v1/contas/<int:conta_id>/extrato')
+def api_extrato(conta_id):
+    try:
+        usuario_id, db = _leitura_api()
+        if usuario_id is None:
+            return _nao_autorizado()
+        
+        # Só a conta (chave primária) decide o 304; transacao fica para o 200
+        conta = _conta_api(db, conta_id, usuario_id)
+        if not conta:
+            return _erro_api('Conta não encontrada', 404)
+        
+        antes = _ler_cursor(request.args.get('antes'))
+        depois = _ler_cursor(request.args.get('depois'))
+        limite = request.args.get('limite', app.config['EXTRATO_POR_PAGINA'], type=int)
+        limite = max(1, min(limite, app.config['API_LIMITE_MAXIMO']))
+        
+        def gerar():
+            transacoes, paginacao = _pagina_extrato(db, conta_id, antes, depois, limite,
+                                                    _arquivo_do_usuario(usuario_id))
+            return {'conta': api.conta_json(conta),
+                    'transacoes': [api.transacao_json(t) for t in transacoes],
+                    'paginacao': paginacao}
+        
+        return _condicional(api.etag_extrato(conta, antes, depois, limite), gerar)
+    except sqlite3.OperationalError as e:
+        return _erro_api('Erro no banco de dados!', 503)
+
+# Busca do suporte: qualquer conta, com o token SUPORTE_TOKEN no lugar do token do usuário
+@app.route('/suporte/contas/<int:conta_id>/busca')
+def suporte_buscar(conta_id):
+    token = app.config['SUPORTE_TOKEN']
+    if not token:
+        return _erro_api('Busca do suporte desativada', 404)
+    if not hmac.compare_digest((_token_enviado() or '').encode(), token.encode()):
+        return _nao_autorizado()
+    
+    try:
+        filtros = busca.ler_filtros(request.args)
+    except ValueError as e:
+        return _erro_api(f'Filtro inválido: {e}', 400)
+    pagina = _pagina_da_busca()
+    limite = request.args.get('limite', app.config['BUSCA_POR_PAGINA'], type=int)
+    limite = max(1, min(limite, app.config['API_LIMITE_MAXIMO']))
+    
+    try:
+        db = _leitura_da_conta(conta_id)
+        conta = db.execute(f'SELECT {_COLUNAS_CONTA_API} FROM conta WHERE id = ?',
+                           (conta_id,)).fetchone() if db is not None else None
+        if not conta:
+            return _erro_api('Conta não encontrada', 404)
+        transacoes, tem_mais = busca.buscar(db, conta_id, pagina=pagina, por_pagina=limite, **filtros)
+    except busca.IndiceIndisponivel:
+        return _erro_api('Busca por descrição indisponível: índice de texto em carga', 503, {'Retry-After': '60'})
+    except sqlite3.OperationalError as e:
+        return _erro_api('Erro no banco de dados!', 503)
+    
+    return {'conta': api.conta_json(conta),
+            'transacoes': [dict(api.transacao_json(t), relevancia=t['relevancia']) for t in transacoes],
+            'paginacao': {'pagina': pagina, 'proxima': pagina + 1 if tem_mais else None}}
+
+@app.route('/metrics')
+def metrics():
+    if not app.config['METRICAS_ATIVAS']:
+        return {'status': 'error', 'message': 'Métricas desativadas'}, 404
+    
+    token = app.config['METRICAS_TOKEN']
+    if token:
+        enviado = request.headers.get('Authorization', '').removeprefix('Bearer ')
+        if not hmac.compare_digest(enviado.encode(), token.encode()):
+            return {'status': 'error', 'message': 'Token inválido'}, 401
+    
+    return Response(metricas_app.exposicao(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+# Sondas de saúde: /health/live (o worker responde) e /health/ready (pode
+# receber tráfego); nenhuma delas custa proporcional ao tamanho do banco
+@app.route('/health/live')
+def health_live():
+    return {'status': 'alive'}
+
+def _prontidao():
+    """Prontidão do banco ou, com shards, do diretório e de cada shard"""
+    limites = (app.config['SAUDE_WAL_MAXIMO_QUADROS'], app.config['SAUDE_DISCO_MINIMO_MB'] * 1024 * 1024)
+    if not app.config['SHARDS']:
+        return saude.verificar_prontidao(get_db(), app.config['DATABASE'], *limites)
+    
+    get_diretorio().execute('SELECT 1 FROM diretorio_usuario LIMIT 1').fetchall()
+    resultados = {caminho: saude.verificar_prontidao(db, caminho, *limites)
+                  for caminho, db in zip(app.config['SHARDS'], get_shards())}
+    verificacoes = {'diretorio': {'ok': True},
+                    'shards': {caminho: itens for caminho, (_, itens) in resultados.items()}}
+    return all(pronto for pronto, _ in resultados.values()), verificacoes
+
+@app.route('/health/ready')
+def health_ready():
+    try:
+        pronto, verificacoes = _prontidao()
+    except sqlite3.Error as e:
+        return {'status': 'not_ready', 'message': f'Erro no banco de dados: {str(e)}'}, 503
+    return {'status': 'ready' if pronto else 'not_ready', 'verificacoes': verificacoes}, 200 if pronto else 503
+
+def _contagens():
+    """Contagens do instantâneo do worker, refeito a cada SAUDE_CONTAGENS_TTL segundos"""
+    chave = tuple(_bancos())
+    valor = cache_contagens.obter(chave)
+    if valor is AUSENTE:
+        valor = saude.contagens(*get_shards(somente_leitura=True))
+        cache_contagens.gravar(chave, valor)
+    return valor
+
+# Visão detalhada para pessoas (prontidão, contagens e estatísticas do worker)
 @app.route('/health')
 def health_check():
     try:
-        # Testa conexão com banco
-        with get_db() as db:
-            cursor = db.execute('SELECT COUNT(*) as count FROM usuario')
-            user_count = cursor.fetchone()['count']
+        pronto, verificacoes = _prontidao()
+        contagens = _contagens()
         
         return {
-            'status': 'healthy', 
+            'status': 'healthy' if pronto else 'unhealthy',
             'message': 'Banco Digital API está funcionando!',
             'database': 'connected',
-            'users_count': user_count
-        }
+            'verificacoes': verificacoes,
+            'users_count': contagens['usuarios'],
+            'contagens': contagens,
+            'cache_painel': cache_painel.estatisticas(),
+            'cache_arquivo': cache_arquivo.estatisticas(),
+            'senhas': pool_senhas.estatisticas(),
+            'limites': _obter_limitador().estatisticas() if app.config['LIMITE_ATIVO'] else None
+        }, 200 if pronto else 503
     except Exception as e:
         return {
             'status': 'error',
             'message': f'Erro no banco de dados: {str(e)}',
             'database': 'disconnected'
-        }
+        }, 503
 
 if __name__ == '__main__':
     port = int(os.environ.get('PORT', 5000))
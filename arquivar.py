@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+"""
+Script para mover as transações antigas para o arquivo mensal comprimido
+Execute: python arquivar.py [--banco banco.db] [--meses 24] [--simular]
+
+Arquiva os meses inteiros anteriores ao horizonte (`--meses`, padrão
+ARQUIVO_HORIZONTE_MESES) de cada banco (ou shard) em `<banco>-arquivo/`.
+Pode rodar com o app no ar e de novo sem efeito (ver arquivo.py).
+"""
+
+import argparse
+import sys
+import time
+
+import arquivo
+import database
+import shards
+
+
+def simular(db, ate):
+    """Transações por mês que seriam arquivadas (varre a tabela)"""
+    return db.execute('''
+        SELECT substr(data, 1, 7), COUNT(*) FROM transacao WHERE data < ? GROUP BY 1 ORDER BY 1
+    ''', (ate,)).fetchall()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Arquiva as transações antigas')
+    parser.add_argument('--banco', action='append', help='repetível (padrão: os SHARDS ou DATABASE_PATH)')
+    parser.add_argument('--meses', type=int, default=arquivo.HORIZONTE_MESES,
+                        help='meses inteiros, além do corrente, que ficam no banco')
+    parser.add_argument('--contas-por-lote', type=int, default=arquivo.CONTAS_POR_LOTE)
+    parser.add_argument('--simular', action='store_true', help='só mostra o que seria arquivado')
+    args = parser.parse_args()
+
+    bancos = args.banco or shards.SHARDS or [database.DATABASE]
+    try:
+        ate = arquivo.limite_do_horizonte(args.meses)
+        print(f"📦 Arquivando transações anteriores a {ate}")
+        for caminho in bancos:
+            db = database.conectar(caminho)
+            try:
+                if args.simular:
+                    for mes, quantidade in simular(db, ate):
+                        print(f"   {caminho} {mes}: {quantidade} transações")
+                    continue
+                inicio = time.perf_counter()
+                total = arquivo.arquivar(db, arquivo.diretorio_do_banco(caminho), ate, args.contas_por_lote)
+                print(f"✅ {caminho}: {total} transações arquivadas em {time.perf_counter() - inicio:.2f}s")
+            finally:
+                db.close()
+    except Exception as e:
+        print(f"❌ Erro ao arquivar: {e}")
+        print(f"Tipo do erro: {type(e).__name__}")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
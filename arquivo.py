@@ -0,0 +1,357 @@
+"""
+Arquivo das transações antigas: um banco SQLite comprimido por mês
+
+`transacao` só cresce, e cada índice, cópia (réplica, backup) e checkpoint
+do WAL paga por anos de linhas que quase ninguém lê. `arquivar()` (rodado
+por `python arquivar.py`) move as transações de meses inteiros anteriores
+ao horizonte (`ARQUIVO_HORIZONTE_MESES`) para `<banco>-arquivo/AAAA-MM.db`.
+Lá cada conta vira um segmento com as linhas em JSON comprimido (zlib); no
+banco ficam uma linha de resumo por conta e mês em `transacao_arquivada`
+(quantidade, entradas, saídas, primeira e última data) e um checkpoint de
+saldo na última transação arquivada do mês, para `saldo_em()` não precisar
+abrir meses inteiros.
+
+A ordem das gravações mantém os leitores consistentes sem lock entre os
+arquivos: o segmento é gravado (e sincronizado) primeiro, ainda invisível;
+depois, numa transação só do banco, entram o resumo e o checkpoint e saem
+as linhas de `transacao`. Quem lê o resumo no mesmo instantâneo que as
+linhas quentes nunca vê uma transação duas vezes nem deixa de ver uma.
+Segmentos sem resumo (cópia interrompida) são ignorados e regravados na
+passada seguinte; segmentos nunca são apagados, então a réplica de leitura
+também continua achando os seus.
+
+Extrato, API e exportação juntam as duas faixas com `transacoes()`, que só
+abre o segmento de um mês quando a iteração chega nele (`completar()` para
+páginas, `saldo_em()` para saldos). Só as páginas passam `cache` (um
+CacheLRU limitado pelo total de linhas): a exportação percorre os meses sem
+cache, e cada um é descartado depois de escrito. A representação não muda: o
+arquivamento não mexe em `conta.ultima_transacao_id` nem em
+`usuario.versao`, e as ETags da API e o cache do dashboard continuam
+valendo.
+"""
+
+import heapq
+import json
+import os
+import sqlite3
+import zlib
+from datetime import date
+from itertools import groupby, islice
+from urllib.parse import quote
+
+import ledger
+from cache import AUSENTE
+
+# O arquivo de `banco.db` é o diretório `banco.db-arquivo/`
+SUFIXO = '-arquivo'
+
+# Meses inteiros, além do corrente, que ficam em `transacao`
+HORIZONTE_MESES = int(os.environ.get('ARQUIVO_HORIZONTE_MESES', 24))
+
+# Contas lidas, gravadas no arquivo e apagadas do banco por transação
+CONTAS_POR_LOTE = 100
+
+# Posições (data, id) que abrem as faixas dos dois lados (datas completas: um
+# texto como '9999' ganharia afinidade numérica contra as colunas TIMESTAMP)
+INICIO = ('', 0)
+FIM = ('9999-12-31 23:59:59', 0)
+
+# Colunas de `transacao` guardadas em cada linha do segmento, nesta ordem
+_COLUNAS = ('id', 'data', 'tipo', 'valor_centavos', 'saldo_apos_centavos', 'descricao', 'transferencia_id')
+
+_ESQUEMA_MES = '''
+    CREATE TABLE IF NOT EXISTS segmento (
+        conta_id INTEGER NOT NULL,
+        lote INTEGER NOT NULL,
+        linhas INTEGER NOT NULL,
+        dados BLOB NOT NULL,
+        PRIMARY KEY (conta_id, lote)
+    );
+'''
+
+
+class SegmentoAusente(LookupError):
+    """O resumo aponta para um segmento que não está no arquivo do mês"""
+
+
+class LoteAlterado(Exception):
+    """As transações do lote mudaram entre a leitura e a remoção; nada foi apagado"""
+
+
+def diretorio_do_banco(caminho):
+    return caminho + SUFIXO
+
+
+def diretorio_da_conexao(db):
+    """Diretório do arquivo do banco principal aberto em `db`"""
+    return diretorio_do_banco(db.execute('PRAGMA database_list').fetchone()[2])
+
+
+def _caminho_do_mes(diretorio, mes):
+    return os.path.join(diretorio, f'{mes}.db')
+
+
+def limite_do_horizonte(meses=HORIZONTE_MESES, hoje=None):
+    """Primeiro dia ('AAAA-MM-01') do mês mais antigo que fica no banco"""
+    if meses < 1:
+        raise ValueError('o horizonte precisa de pelo menos um mês além do corrente')
+    hoje = hoje or date.today()
+    mes = hoje.year * 12 + hoje.month - 1 - meses
+    return f'{mes // 12:04d}-{mes % 12 + 1:02d}-01'
+
+
+def _mes_seguinte(mes):
+    ano, numero = int(mes[:4]), int(mes[5:7])
+    return f'{ano + numero // 12:04d}-{numero % 12 + 1:02d}-01'
+
+
+def posicao(transacao):
+    """Chave de ordem do extrato: (data, id)"""
+    return transacao['data'], transacao['id']
+
+
+def _com_sinal(transacao):
+    centavos = transacao['valor_centavos']
+    return -centavos if transacao['tipo'] in ledger.TIPOS_DEBITO else centavos
+
+
+def _transacao(conta_id, valores):
+    """Linha do segmento -> dicionário com as chaves das linhas de `transacao` do extrato"""
+    transacao = dict(zip(_COLUNAS, valores))
+    data = transacao['data']
+    transacao['conta_id'] = conta_id
+    transacao['data_formatada'] = f'{data[8:10]}/{data[5:7]}/{data[:4]} {data[11:16]}'
+    return transacao
+
+
+def _linhas_do_mes(diretorio, conta_id, mes, lotes, cache=None):
+    """Transações da conta arquivadas no mês, em ordem (data, id)
+
+    `lotes` são os pares (lote, ultimo_id) do resumo: linhas do segmento fora
+    dessa faixa (de uma cópia interrompida e refeita) ficam de fora.
+    """
+    chave = (diretorio, conta_id, mes, tuple(lotes))
+    if cache is not None:
+        linhas = cache.obter(chave)
+        if linhas is not AUSENTE:
+            return linhas
+
+    caminho = os.path.abspath(_caminho_do_mes(diretorio, mes))
+    arquivo = sqlite3.connect(f'file:{quote(caminho)}?mode=ro', uri=True)
+    try:
+        linhas = []
+        for lote, ultimo_id in lotes:
+            segmento = arquivo.execute('SELECT dados FROM segmento WHERE conta_id = ? AND lote = ?',
+                                       (conta_id, lote)).fetchone()
+            if segmento is None:
+                raise SegmentoAusente(mes, conta_id, lote)
+            linhas.extend(_transacao(conta_id, valores) for valores in json.loads(zlib.decompress(segmento[0]))
+                          if lote <= valores[0] <= ultimo_id)
+    finally:
+        arquivo.close()
+    linhas.sort(key=posicao)
+
+    if cache is not None:
+        cache.gravar(chave, linhas)
+    return linhas
+
+
+def transacoes(db, diretorio, conta_id, desde=INICIO, ate=FIM, decrescente=False, cache=None):
+    """Transações arquivadas da conta com desde <= (data, id) < ate, em ordem
+
+    O resumo é consultado agora (no instantâneo de `db`); o iterador
+    devolvido só abre o segmento de cada mês quando chega nele.
+    """
+    resumos = db.execute(f'''
+        SELECT mes, lote, ultimo_id FROM transacao_arquivada
+        WHERE conta_id = ? AND ultima_data >= ? AND primeira_data <= ?
+        ORDER BY mes {'DESC' if decrescente else 'ASC'}, lote {'DESC' if decrescente else 'ASC'}
+    ''', (conta_id, desde[0], ate[0])).fetchall()
+    return _percorrer(resumos, diretorio, conta_id, desde, ate, decrescente, cache)
+
+
+def _percorrer(resumos, diretorio, conta_id, desde, ate, decrescente, cache):
+    for mes, grupo in groupby(resumos, key=lambda resumo: resumo[0]):
+        linhas = _linhas_do_mes(diretorio, conta_id, mes, sorted((r[1], r[2]) for r in grupo), cache)
+        for transacao in (reversed(linhas) if decrescente else linhas):
+            if desde <= posicao(transacao) < ate:
+                yield transacao
+
+
+def mesclar(quentes, arquivadas, decrescente=False):
+    """Intercala dois iteradores já ordenados por (data, id)"""
+    return heapq.merge(quentes, arquivadas, key=posicao, reverse=decrescente)
+
+
+def completar(quentes, db, diretorio, conta_id, limite, desde=INICIO, ate=FIM, decrescente=False, cache=None):
+    """As `limite` primeiras transações da faixa, juntando às `quentes` as arquivadas
+
+    `quentes` são as linhas de `transacao` da faixa, já ordenadas e no máximo
+    `limite`. Se elas enchem a página, só concorrem as arquivadas entre a
+    última delas e a ponta da faixa: normalmente nenhuma, sem abrir segmento.
+    """
+    if len(quentes) >= limite:
+        borda = posicao(quentes[-1])
+        if decrescente:
+            desde = max(desde, borda)
+        else:
+            ate = min(ate, (borda[0], borda[1] + 1))
+    arquivadas = transacoes(db, diretorio, conta_id, desde, ate, decrescente, cache)
+    return list(islice(mesclar(quentes, arquivadas, decrescente), limite))
+
+
+def saldo_em(db, diretorio, conta_id, data, cache=None):
+    """`ledger.saldo_em()` contando também as transações arquivadas
+
+    Com o checkpoint do fim de cada mês arquivado, no máximo um mês do
+    arquivo é aberto.
+    """
+    desde, saldo = ledger.checkpoint_anterior(db, conta_id, data)
+    saldo += ledger.movimento(db, conta_id, desde, data)
+    for transacao in transacoes(db, diretorio, conta_id, (desde[0], desde[1] + 1), (data, 0), cache=cache):
+        saldo += _com_sinal(transacao)
+    return saldo
+
+
+def _segmentos(db, diretorio, linhas):
+    """Agrupa as linhas (conta_id, *_COLUNAS) em segmentos por (mês, conta)
+
+    Cada segmento leva as linhas, o resumo e o saldo após a última linha.
+    """
+    segmentos = []
+    for conta_id, da_conta in groupby(linhas, key=lambda linha: linha[0]):
+        saldo = None
+        for mes, do_mes in groupby(da_conta, key=lambda linha: linha[2][:7]):
+            valores = [tuple(linha[1:]) for linha in do_mes]
+            entradas = saidas = 0
+            for transacao in map(lambda v: dict(zip(_COLUNAS, v)), valores):
+                if transacao['saldo_apos_centavos'] is not None:
+                    saldo = transacao['saldo_apos_centavos']
+                else:
+                    # Linhas anteriores ao registro do saldo: parte do saldo até ali
+                    if saldo is None:
+                        saldo = saldo_em(db, diretorio, conta_id, transacao['data'])
+                    saldo += _com_sinal(transacao)
+                if transacao['tipo'] in ledger.TIPOS_DEBITO:
+                    saidas += transacao['valor_centavos']
+                else:
+                    entradas += transacao['valor_centavos']
+            segmentos.append({
+                'conta_id': conta_id, 'mes': mes, 'valores': valores, 'saldo': saldo,
+                'lote': min(v[0] for v in valores), 'ultimo_id': max(v[0] for v in valores),
+                'entradas': entradas, 'saidas': saidas,
+                'primeira_data': valores[0][1], 'ultima': valores[-1],
+            })
+    return segmentos
+
+
+def _gravar_segmentos(diretorio, segmentos):
+    """Grava os segmentos nos arquivos dos meses, com fsync antes de voltar"""
+    os.makedirs(diretorio, exist_ok=True)
+    for mes, do_mes in groupby(sorted(segmentos, key=lambda s: s['mes']), key=lambda s: s['mes']):
+        arquivo = sqlite3.connect(_caminho_do_mes(diretorio, mes))
+        try:
+            arquivo.execute('PRAGMA synchronous = FULL')
+            arquivo.executescript(_ESQUEMA_MES)
+            with arquivo:
+                arquivo.executemany('''
+                    INSERT OR REPLACE INTO segmento (conta_id, lote, linhas, dados) VALUES (?, ?, ?, ?)
+                ''', [(s['conta_id'], s['lote'], len(s['valores']),
+                       zlib.compress(json.dumps(s['valores'], ensure_ascii=False,
+                                                separators=(',', ':')).encode(), 9))
+                      for s in do_mes])
+        finally:
+            arquivo.close()
+
+
+def _trocar_por_resumos(db, segmentos):
+    """Grava resumos e checkpoints e apaga as linhas arquivadas (sem abrir transação)"""
+    for s in segmentos:
+        apagadas = db.execute('''
+            DELETE FROM transacao
+            WHERE conta_id = ? AND data >= ? AND data < ? AND id BETWEEN ? AND ?
+        ''', (s['conta_id'], f"{s['mes']}-01", _mes_seguinte(s['mes']), s['lote'], s['ultimo_id'])).rowcount
+        if apagadas != len(s['valores']):
+            raise LoteAlterado(s['conta_id'], s['mes'])
+        db.execute('''
+            INSERT OR REPLACE INTO transacao_arquivada
+                (conta_id, mes, lote, ultimo_id, linhas, entradas_centavos, saidas_centavos,
+                 primeira_data, ultima_data)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', (s['conta_id'], s['mes'], s['lote'], s['ultimo_id'], len(s['valores']), s['entradas'],
+              s['saidas'], s['primeira_data'], s['ultima'][1]))
+        db.execute('''
+            INSERT OR IGNORE INTO saldo_checkpoint (conta_id, transacao_id, data, saldo_centavos)
+            VALUES (?, ?, ?, ?)
+        ''', (s['conta_id'], s['ultima'][0], s['ultima'][1], s['saldo']))
+
+
+def arquivar_contas(db, diretorio, contas, ate):
+    """Arquiva as transações das `contas` com data anterior a `ate`; devolve quantas"""
+    marcadores = ','.join('?' * len(contas))
+    linhas = db.execute(f'''
+        SELECT conta_id, {', '.join(_COLUNAS)} FROM transacao
+        WHERE conta_id IN ({marcadores}) AND data < ?
+        ORDER BY conta_id, data, id
+    ''', (*contas, ate)).fetchall()
+    if not linhas:
+        return 0
+    segmentos = _segmentos(db, diretorio, linhas)
+    _gravar_segmentos(diretorio, segmentos)
+    ledger.em_transacao(db, _trocar_por_resumos, segmentos)
+    return len(linhas)
+
+
+def arquivar(db, diretorio, ate, contas_por_lote=CONTAS_POR_LOTE, tentativas=3):
+    """Move para o arquivo as transações com data anterior a `ate` ('AAAA-MM-01')
+
+    Percorre as contas em lotes, cada um com a sua transação curta de escrita
+    no banco. Um lote alterado no meio (lançamento retroativo, usuário que
+    mudou de shard) é refeito. Devolve quantas transações foram arquivadas.
+    """
+    if ate[8:] != '01':
+        raise ValueError(f'o arquivo guarda meses inteiros: {ate!r} não é o dia 1')
+    total, ultima_conta = 0, 0
+    while True:
+        contas = [linha[0] for linha in db.execute('SELECT id FROM conta WHERE id > ? ORDER BY id LIMIT ?',
+                                                   (ultima_conta, contas_por_lote))]
+        if not contas:
+            return total
+        for tentativa in range(tentativas):
+            try:
+                total += arquivar_contas(db, diretorio, contas, ate)
+                break
+            except LoteAlterado:
+                if tentativa == tentativas - 1:
+                    raise
+        ultima_conta = contas[-1]
+
+
+def restaurar(db, diretorio, usuario_id):
+    """Devolve para `transacao` as linhas arquivadas das contas do usuário (sem COMMIT)
+
+    Usado antes de mudar o usuário de shard: os ids são os originais e os
+    segmentos ficam no arquivo, sem resumo, ignorados pelos leitores. O
+    gatilho do resumo mensal contaria as linhas de novo; a conta é desfeita.
+    """
+    resumos = db.execute('''
+        SELECT conta_id, mes, lote, ultimo_id FROM transacao_arquivada
+        WHERE conta_id IN (SELECT id FROM conta WHERE usuario_id = ?)
+        ORDER BY conta_id, mes, lote
+    ''', (usuario_id,)).fetchall()
+    restauradas = 0
+    for (conta_id, mes), grupo in groupby(resumos, key=lambda resumo: tuple(resumo[:2])):
+        linhas = _linhas_do_mes(diretorio, conta_id, mes, [tuple(r[2:]) for r in grupo])
+        db.executemany('''
+            INSERT INTO transacao (id, data, tipo, valor_centavos, saldo_apos_centavos, descricao,
+                                   transferencia_id, conta_id, valor)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', [(*(t[coluna] for coluna in _COLUNAS), conta_id, t['valor_centavos'] / 100) for t in linhas])
+        db.executemany('''
+            UPDATE resumo_mensal SET quantidade = quantidade - 1, total_centavos = total_centavos - ?
+            WHERE conta_id = ? AND mes = ? AND tipo = ?
+        ''', [(t['valor_centavos'], conta_id, mes, t['tipo']) for t in linhas])
+        restauradas += len(linhas)
+    db.execute('DELETE FROM transacao_arquivada WHERE conta_id IN (SELECT id FROM conta WHERE usuario_id = ?)',
+               (usuario_id,))
+    return restauradas
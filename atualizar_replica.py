@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+"""
+Script para refazer a réplica de leitura do banco (ou de cada shard)
+Execute: python atualizar_replica.py [--banco banco.db] [--intervalo 300]
+
+Sem --intervalo refaz uma vez e sai (para o cron); com ele fica em laço.
+O app só lê a réplica com REPLICA_ATIVA=1 (ver replica.py).
+"""
+
+import argparse
+import sys
+import time
+
+import database
+import replica
+import shards
+
+
+def atualizar_todas(bancos):
+    for caminho in bancos:
+        inicio = time.perf_counter()
+        replica.atualizar(caminho)
+        print(f"✅ {replica.caminho_da_replica(caminho)} refeita em {time.perf_counter() - inicio:.2f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Refaz a réplica de leitura')
+    parser.add_argument('--banco', action='append', help='repetível (padrão: os SHARDS ou DATABASE_PATH)')
+    parser.add_argument('--intervalo', type=float, default=0, help='segundos entre cópias (0: uma vez)')
+    args = parser.parse_args()
+
+    bancos = args.banco or shards.SHARDS or [database.DATABASE]
+    try:
+        atualizar_todas(bancos)
+        while args.intervalo > 0:
+            time.sleep(args.intervalo)
+            atualizar_todas(bancos)
+    except KeyboardInterrupt:
+        return 0
+    except Exception as e:
+        print(f"❌ Erro ao copiar: {e}")
+        print(f"Tipo do erro: {type(e).__name__}")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
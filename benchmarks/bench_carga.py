@@ -0,0 +1,293 @@
+#!/usr/bin/env python3
+"""
+Teste de carga do app sob Gunicorn com a mistura de rotas de um usuário real
+Execute: python benchmarks/bench_carga.py [--duracao 10] [--clientes 8] [--workers 2]
+         [--threads 12] [--worker-class sync]
+         [--mix registro=1,login=1,dashboard=4,deposito=2,saque=2,extrato=4]
+         [--saida resultado.json] [--base base.json] [--tolerancia 0.2]
+
+Sobe `gunicorn app:app` (com gunicorn.conf.py) num banco temporário
+populado e dispara processos clientes HTTP, cada um logado como um usuário
+próprio, sorteando a próxima rota pelos pesos de --mix. O sorteio usa
+--semente: duas execuções fazem a mesma sequência de pedidos.
+
+O resultado sai em JSON (requisições, erros, req/s e p50/p95/p99 por rota).
+Com --base, compara com um resultado salvo antes e termina com código 1 se
+alguma rota perder vazão ou ganhar latência além de --tolerancia.
+"""
+
+import argparse
+import http.client
+import json
+import multiprocessing
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from urllib.parse import urlencode
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+import database  # noqa: E402
+import ledger  # noqa: E402
+import migracoes  # noqa: E402
+import senhas  # noqa: E402
+
+MIX_PADRAO = 'registro=1,login=1,dashboard=4,deposito=2,saque=2,extrato=4'
+ROTAS = ('registro', 'login', 'dashboard', 'deposito', 'saque', 'extrato')
+PERCENTIS = (50, 95, 99)
+SENHA = 'segredo'
+
+
+def ler_mix(texto):
+    mix = {}
+    for parte in texto.split(','):
+        rota, _, peso = parte.partition('=')
+        if rota not in ROTAS:
+            raise argparse.ArgumentTypeError(f'rota desconhecida: {rota}')
+        mix[rota] = float(peso or 1)
+    return mix
+
+
+def preparar_banco(caminho, clientes, metodo):
+    """Um usuário com conta (e saldo para os saques) por cliente"""
+    db = database.conectar(caminho)
+    migracoes.migrar(db)
+    senha_hash = senhas.gerar(SENHA, metodo)
+    db.executemany("INSERT INTO usuario (nome, email, senha) VALUES (?, ?, ?)",
+                   [(f'Carga {i}', f'carga{i}@bench.com', senha_hash) for i in range(clientes)])
+    db.executemany("INSERT INTO conta (tipo, usuario_id) VALUES ('corrente', ?)",
+                   [(i + 1,) for i in range(clientes)])
+    db.commit()
+    for i in range(clientes):
+        for j in range(50):
+            ledger.lancar(db, i + 1, 'deposito', 100000, f'Inicial {j}')
+    db.close()
+
+
+def porta_livre():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def subir_gunicorn(tmp, caminho, porta, args):
+    ambiente = dict(os.environ,
+                    DATABASE_PATH=caminho,
+                    SENHA_METODO=args.metodo,
+                    LIMITE_ATIVO='0',
+                    METRICAS_DIRETORIO=os.path.join(tmp, 'metricas'),
+                    CONSULTAS_LENTAS_ARQUIVO=os.path.join(tmp, 'lentas.log'))
+    # Sem --threads/--worker-class vale o que está em gunicorn.conf.py (a configuração do deploy)
+    if args.threads:
+        ambiente['GUNICORN_THREADS'] = str(args.threads)
+    comando = [sys.executable, '-m', 'gunicorn', 'app:app', '-c', 'gunicorn.conf.py',
+               '--bind', f'127.0.0.1:{porta}', '--workers', str(args.workers)]
+    if args.worker_class:
+        comando += ['--worker-class', args.worker_class]
+    processo = subprocess.Popen(
+        comando,
+        cwd=RAIZ, env=ambiente, stdout=subprocess.DEVNULL, stderr=open(os.path.join(tmp, 'gunicorn.log'), 'w'))
+    limite = time.perf_counter() + 30
+    while time.perf_counter() < limite:
+        if processo.poll() is not None:
+            raise RuntimeError(f'gunicorn saiu com código {processo.returncode} (veja {tmp}/gunicorn.log)')
+        try:
+            conexao = http.client.HTTPConnection('127.0.0.1', porta, timeout=1)
+            conexao.request('GET', '/health/ready')
+            if conexao.getresponse().status == 200:
+                return processo
+        except OSError:
+            time.sleep(0.1)
+    processo.terminate()
+    raise RuntimeError('gunicorn não respondeu em 30 s')
+
+
+class Cliente:
+    """Conexão HTTP com o cookie de sessão do login
+
+    Só a resposta do login troca o cookie: as mensagens flash dos POSTs
+    (que não seguimos até o redirecionamento) não se acumulam na sessão.
+    """
+
+    def __init__(self, porta):
+        self.conexao = http.client.HTTPConnection('127.0.0.1', porta, timeout=30)
+        self.cookie = None
+
+    def pedir(self, metodo, caminho, dados=None, guardar_cookie=False):
+        cabecalhos = {'Cookie': self.cookie} if self.cookie else {}
+        corpo = None
+        if dados is not None:
+            corpo = urlencode(dados)
+            cabecalhos['Content-Type'] = 'application/x-www-form-urlencoded'
+        self.conexao.request(metodo, caminho, corpo, cabecalhos)
+        resposta = self.conexao.getresponse()
+        resposta.read()
+        if guardar_cookie and resposta.getheader('Set-Cookie'):
+            self.cookie = resposta.getheader('Set-Cookie').split(';', 1)[0]
+        return resposta.status
+
+
+def trabalhador(numero, porta, mix, duracao, aquecimento, semente):
+    """Roda a mistura até o fim do tempo; devolve latências e erros por rota"""
+    sorteio = random.Random(semente * 1000 + numero)
+    cliente = Cliente(porta)
+    login = {'email': f'carga{numero}@bench.com', 'senha': SENHA}
+    conta = numero + 1
+    rotas, pesos = list(mix), list(mix.values())
+    pedidos = {
+        'registro': lambda n: ('POST', '/registro',
+                               {'nome': 'Novo', 'email': f'novo{numero}-{n}@bench.com', 'senha': SENHA}),
+        'login': lambda n: ('POST', '/login', login),
+        'dashboard': lambda n: ('GET', '/dashboard', None),
+        'deposito': lambda n: ('POST', f'/deposito/{conta}',
+                               {'valor': '10.00', 'idempotency_key': f'd-{numero}-{n}'}),
+        'saque': lambda n: ('POST', f'/saque/{conta}', {'valor': '1.00', 'idempotency_key': f's-{numero}-{n}'}),
+        'extrato': lambda n: ('GET', f'/extrato/{conta}', None),
+    }
+
+    # Todos os clientes entram ao mesmo tempo: o 503 do pool de senhas cheio pede outra tentativa
+    for _ in range(100):
+        try:
+            status = cliente.pedir('POST', '/login', login, guardar_cookie=True)
+        except (OSError, http.client.HTTPException):
+            cliente.conexao.close()
+            status = 0
+        if status not in (0, 503):
+            break
+        time.sleep(0.1)
+    if status != 302:
+        raise RuntimeError(f'cliente {numero}: login inicial falhou')
+
+    latencias = {rota: [] for rota in rotas}
+    erros = {rota: 0 for rota in rotas}
+    inicio_medicao = time.perf_counter() + aquecimento
+    fim = inicio_medicao + duracao
+    n = 0
+    while True:
+        agora = time.perf_counter()
+        if agora >= fim:
+            break
+        rota = sorteio.choices(rotas, pesos)[0]
+        metodo, caminho, dados = pedidos[rota](n)
+        n += 1
+        try:
+            status = cliente.pedir(metodo, caminho, dados, guardar_cookie=rota == 'login')
+        except (OSError, http.client.HTTPException):
+            # Conexão perdida: a próxima requisição abre outra
+            cliente.conexao.close()
+            status = 0
+        if agora < inicio_medicao:
+            continue
+        latencias[rota].append(time.perf_counter() - agora)
+        if not 200 <= status < 400:
+            erros[rota] += 1
+    return latencias, erros
+
+
+def percentil(valores, p):
+    if not valores:
+        return None
+    valores = sorted(valores)
+    return valores[min(len(valores) - 1, int(len(valores) * p / 100))]
+
+
+def resumir(resultados, duracao):
+    rotas = {}
+    todas = []
+    for latencias, erros in resultados:
+        for rota, valores in latencias.items():
+            item = rotas.setdefault(rota, {'valores': [], 'erros': 0})
+            item['valores'].extend(valores)
+            item['erros'] += erros[rota]
+            todas.extend(valores)
+
+    def estatisticas(valores, erros):
+        resumo = {'requisicoes': len(valores), 'erros': erros, 'req_s': round(len(valores) / duracao, 2)}
+        for p in PERCENTIS:
+            valor = percentil(valores, p)
+            resumo[f'p{p}_ms'] = round(valor * 1000, 2) if valor is not None else None
+        return resumo
+
+    resumo = {rota: estatisticas(item['valores'], item['erros']) for rota, item in sorted(rotas.items())}
+    resumo['total'] = estatisticas(todas, sum(item['erros'] for item in rotas.values()))
+    return resumo
+
+
+def comparar(atual, base, tolerancia):
+    """Regressões de `atual` contra `base`: menos req/s ou percentis maiores além da tolerância"""
+    regressoes = []
+    for rota, medida in atual['rotas'].items():
+        anterior = base.get('rotas', {}).get(rota)
+        if not anterior:
+            continue
+        if anterior['req_s'] and medida['req_s'] < anterior['req_s'] * (1 - tolerancia):
+            regressoes.append(f"{rota}: req/s {anterior['req_s']} -> {medida['req_s']}")
+        for p in PERCENTIS:
+            chave = f'p{p}_ms'
+            if anterior.get(chave) and medida.get(chave) and medida[chave] > anterior[chave] * (1 + tolerancia):
+                regressoes.append(f"{rota}: {chave} {anterior[chave]} -> {medida[chave]}")
+        if medida['erros'] > anterior['erros']:
+            regressoes.append(f"{rota}: erros {anterior['erros']} -> {medida['erros']}")
+    return regressoes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--duracao', type=float, default=10, help='segundos medidos')
+    parser.add_argument('--aquecimento', type=float, default=2, help='segundos iniciais descartados')
+    parser.add_argument('--clientes', type=int, default=8, help='processos clientes')
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--threads', type=int, help='threads por worker (GUNICORN_THREADS; padrão: o do gunicorn.conf.py)')
+    parser.add_argument('--worker-class', help='ex.: sync (padrão: o do gunicorn.conf.py)')
+    parser.add_argument('--mix', type=ler_mix, default=ler_mix(MIX_PADRAO))
+    parser.add_argument('--metodo', default='pbkdf2:sha256:200000', help='hash das senhas (SENHA_METODO)')
+    parser.add_argument('--semente', type=int, default=42)
+    parser.add_argument('--saida', help='grava o resultado JSON neste arquivo')
+    parser.add_argument('--base', help='resultado JSON anterior para comparar')
+    parser.add_argument('--tolerancia', type=float, default=0.2, help='piora aceita (0.2 = 20%%)')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        caminho = os.path.join(tmp, 'carga.db')
+        preparar_banco(caminho, args.clientes, args.metodo)
+        porta = porta_livre()
+        servidor = subir_gunicorn(tmp, caminho, porta, args)
+        try:
+            with multiprocessing.Pool(args.clientes) as pool:
+                resultados = pool.starmap(trabalhador, [
+                    (i, porta, args.mix, args.duracao, args.aquecimento, args.semente)
+                    for i in range(args.clientes)])
+        finally:
+            servidor.terminate()
+            servidor.wait(timeout=30)
+
+    resultado = {
+        'configuracao': {'duracao': args.duracao, 'clientes': args.clientes, 'workers': args.workers,
+                         'threads': args.threads, 'worker_class': args.worker_class, 'mix': args.mix, 'metodo': args.metodo,
+                         'semente': args.semente},
+        'rotas': resumir(resultados, args.duracao),
+    }
+    texto = json.dumps(resultado, indent=2, ensure_ascii=False)
+    print(texto)
+    if args.saida:
+        with open(args.saida, 'w') as arquivo:
+            arquivo.write(texto + '\n')
+
+    if args.base:
+        with open(args.base) as arquivo:
+            regressoes = comparar(resultado, json.load(arquivo), args.tolerancia)
+        if regressoes:
+            print(f"❌ Regressões contra {args.base} (tolerância {args.tolerancia:.0%}):", file=sys.stderr)
+            for regressao in regressoes:
+                print(f"   {regressao}", file=sys.stderr)
+            sys.exit(1)
+        print(f"✅ Sem regressões contra {args.base}", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+Benchmark da camada de conexões: requisições/segundo antes e depois
+Execute: python benchmarks/bench_conexoes.py [--requisicoes 2000] [--threads 4] [--base <commit>]
+
+"antes" é o app do commit --base (padrão: o primeiro do repositório, com o
+get_db() que abria uma conexão a cada chamada, journal em modo DELETE e
+sem pragmas); "depois" é o app desta árvore, com o pool por thread e WAL.
+Os dois rodam a mesma mistura depósito/extrato, cada um num processo
+próprio: o código antigo sai do git (git archive), sem remendos no novo.
+"""
+
+import argparse
+import importlib
+import io
+import json
+import os
+import sqlite3
+import subprocess
+import sys
+import tarfile
+import tempfile
+import threading
+import time
+from contextlib import redirect_stdout
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def preparar_banco(modulo, caminho):
+    """Cria as tabelas, um usuário e uma conta"""
+    # O app antigo lê o caminho da variável do módulo; o atual, de app.config
+    modulo.DATABASE = caminho
+    modulo.app.config['DATABASE'] = caminho
+    modulo.init_db()
+    db = sqlite3.connect(caminho)
+    db.execute("INSERT INTO usuario (nome, email, senha) VALUES ('Bench', 'bench@bench.com', 'x')")
+    db.execute("INSERT INTO conta (tipo, usuario_id) VALUES ('corrente', 1)")
+    db.commit()
+    db.close()
+
+
+def rodar(app, requisicoes, threads):
+    """Dispara o mix depósito/extrato em várias threads e mede req/s"""
+    por_thread = requisicoes // threads
+    erros = []
+    database = sys.modules.get('database')
+
+    def trabalhador():
+        cliente = app.test_client()
+        with cliente.session_transaction() as sessao:
+            sessao['usuario_id'] = 1
+            sessao['usuario_nome'] = 'Bench'
+        for i in range(por_thread):
+            if i % 2:
+                resposta = cliente.post('/deposito/1', data={'valor': '1.00'})
+            else:
+                resposta = cliente.get('/extrato/1')
+            if resposta.status_code >= 400:
+                erros.append(resposta.status_code)
+        if hasattr(database, 'fechar_conexoes'):
+            database.fechar_conexoes()
+
+    inicio = time.perf_counter()
+    workers = [threading.Thread(target=trabalhador) for _ in range(threads)]
+    for t in workers:
+        t.start()
+    for t in workers:
+        t.join()
+    duracao = time.perf_counter() - inicio
+    return por_thread * threads / duracao, len(erros)
+
+
+def medir(raiz, caminho, requisicoes, threads):
+    """Roda no processo filho: importa o app de `raiz` e imprime o resultado em JSON"""
+    sys.path.insert(0, raiz)
+    with redirect_stdout(io.StringIO()):
+        modulo = importlib.import_module('app')
+        preparar_banco(modulo, caminho)
+    rps, erros = rodar(modulo.app, requisicoes, threads)
+    print(json.dumps({'rps': rps, 'erros': erros}))
+
+
+def extrair(commit, destino):
+    """Copia a árvore do commit para `destino`"""
+    arquivo = subprocess.run(['git', 'archive', commit], cwd=RAIZ, check=True, capture_output=True).stdout
+    with tarfile.open(fileobj=io.BytesIO(arquivo)) as tar:
+        tar.extractall(destino)
+
+
+def processo(raiz, caminho, args):
+    saida = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), '--medir', raiz, '--banco', caminho,
+         '--requisicoes', str(args.requisicoes), '--threads', str(args.threads)],
+        cwd=raiz, check=True, capture_output=True, text=True).stdout
+    resultado = json.loads(saida.strip().splitlines()[-1])
+    return resultado['rps'], resultado['erros']
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--requisicoes', type=int, default=2000)
+    parser.add_argument('--threads', type=int, default=4)
+    parser.add_argument('--base', help='commit do "antes" (padrão: o primeiro do repositório)')
+    parser.add_argument('--medir', help=argparse.SUPPRESS)
+    parser.add_argument('--banco', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.medir:
+        medir(args.medir, args.banco, args.requisicoes, args.threads)
+        return
+
+    base = args.base or subprocess.run(['git', 'rev-list', '--max-parents=0', 'HEAD'], cwd=RAIZ, check=True,
+                                       capture_output=True, text=True).stdout.split()[0]
+    with tempfile.TemporaryDirectory() as tmp:
+        antigo = os.path.join(tmp, 'antes')
+        extrair(base, antigo)
+        rps_antes, erros_antes = processo(antigo, os.path.join(tmp, 'antes.db'), args)
+        rps_depois, erros_depois = processo(RAIZ, os.path.join(tmp, 'depois.db'), args)
+
+    print(f"📊 {args.requisicoes} requisições, {args.threads} threads")
+    print(f"   antes:  {rps_antes:8.1f} req/s ({erros_antes} erros, commit {base[:7]})")
+    print(f"   depois: {rps_depois:8.1f} req/s ({erros_depois} erros)")
+    print(f"   ganho:  {rps_depois / rps_antes:8.2f}x")
+
+
+if __name__ == '__main__':
+    main()
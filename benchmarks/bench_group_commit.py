@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+Benchmark do group commit contra um COMMIT por lançamento
+Execute: python benchmarks/bench_group_commit.py [--threads 16] [--operacoes 200] [--synchronous FULL]
+
+Simula um worker gthread: várias threads fazendo depósitos ao mesmo tempo.
+Com synchronous=FULL cada COMMIT custa um fsync, que é onde o agrupamento
+mais aparece.
+"""
+
+import argparse
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import database  # noqa: E402
+import ledger  # noqa: E402
+from group_commit import GroupCommit  # noqa: E402
+
+
+def preparar_banco(caminho, pragmas, contas):
+    from app import app, init_db
+    app.config['DATABASE'] = caminho
+    app.config['SQLITE_PRAGMAS'] = pragmas
+    init_db()
+    db = database.conectar(caminho, pragmas)
+    db.execute("INSERT INTO usuario (nome, email, senha) VALUES ('Bench', 'bench@bench.com', 'x')")
+    db.executemany("INSERT INTO conta (tipo, usuario_id) VALUES ('corrente', 1)", [()] * contas)
+    db.commit()
+    db.close()
+
+
+def rodar(caminho, pragmas, threads, operacoes, agrupado, intervalo_ms, maximo):
+    grupo = GroupCommit(caminho, pragmas, intervalo_ms, maximo) if agrupado else None
+
+    def trabalhador(numero):
+        db = None if agrupado else database.conectar(caminho, pragmas)
+        conta_id = 1 + numero % threads
+        for _ in range(operacoes):
+            if agrupado:
+                grupo.submeter(ledger.aplicar_lancamento, conta_id, 'deposito', 100, 'Depósito')
+            else:
+                ledger.lancar(db, conta_id, 'deposito', 100, 'Depósito')
+        if db is not None:
+            db.close()
+
+    inicio = time.perf_counter()
+    workers = [threading.Thread(target=trabalhador, args=(i,)) for i in range(threads)]
+    for t in workers:
+        t.start()
+    for t in workers:
+        t.join()
+    return threads * operacoes / (time.perf_counter() - inicio)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--operacoes', type=int, default=200)
+    parser.add_argument('--synchronous', default='FULL')
+    parser.add_argument('--intervalo-ms', type=float, default=2)
+    parser.add_argument('--maximo-itens', type=int, default=64)
+    args = parser.parse_args()
+
+    pragmas = dict(database.SQLITE_PRAGMAS, synchronous=args.synchronous)
+    resultados = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for agrupado in (False, True):
+            caminho = os.path.join(tmp, f'group_commit_{agrupado}.db')
+            preparar_banco(caminho, pragmas, args.threads)
+            resultados[agrupado] = rodar(caminho, pragmas, args.threads, args.operacoes, agrupado,
+                                         args.intervalo_ms, args.maximo_itens)
+            db = sqlite3.connect(caminho)
+            total = db.execute('SELECT SUM(saldo_centavos) FROM conta').fetchone()[0]
+            db.close()
+            assert total == args.threads * args.operacoes * 100, total
+
+    print(f"📊 {args.threads} threads x {args.operacoes} depósitos, synchronous={args.synchronous}")
+    print(f"   commit por lançamento: {resultados[False]:8.0f} ops/s")
+    print(f"   group commit:          {resultados[True]:8.0f} ops/s "
+          f"({args.intervalo_ms} ms / {args.maximo_itens} itens)")
+    print(f"   ganho:                 {resultados[True] / resultados[False]:8.2f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+Teste de estresse multiprocesso dos lançamentos (depósito/saque)
+Execute: python benchmarks/bench_lancamentos.py [--processos 8] [--operacoes 500]
+
+Vários processos depositam e sacam na mesma conta ao mesmo tempo. No fim
+confere que o saldo nunca ficou negativo e que bate com a soma exata dos
+lançamentos bem-sucedidos e com o histórico em `transacao`.
+"--modo antigo" reproduz o fluxo anterior (lê o saldo em uma conexão e
+debita em outra) para comparação.
+"""
+
+import argparse
+import multiprocessing
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import database  # noqa: E402
+import ledger  # noqa: E402
+
+SALDO_INICIAL = 1000  # reais; o fluxo antigo grava só as colunas REAL
+
+
+def preparar_banco(caminho):
+    from app import app, init_db
+    app.config['DATABASE'] = caminho
+    init_db()
+    db = sqlite3.connect(caminho)
+    db.execute("INSERT INTO usuario (nome, email, senha) VALUES ('Bench', 'bench@bench.com', 'x')")
+    db.execute("INSERT INTO conta (tipo, saldo, saldo_centavos, usuario_id) VALUES ('corrente', ?, ?, 1)",
+               (SALDO_INICIAL, SALDO_INICIAL * 100))
+    db.execute("INSERT INTO transacao (tipo, valor, valor_centavos, descricao, conta_id) "
+               "VALUES ('deposito', ?, ?, 'Inicial', 1)", (SALDO_INICIAL, SALDO_INICIAL * 100))
+    db.commit()
+    db.close()
+
+
+def lancar_antigo(caminho, tipo, valor):
+    """Fluxo anterior do saque: leitura e escrita em conexões separadas"""
+    db = database.conectar(caminho)
+    saldo = db.execute('SELECT saldo FROM conta WHERE id = 1 AND usuario_id = 1').fetchone()['saldo']
+    db.close()
+    if tipo == 'saque' and valor > saldo:
+        raise ledger.SaldoInsuficiente(1)
+    db = database.conectar(caminho)
+    sinal = '-' if tipo == 'saque' else '+'
+    db.execute(f'UPDATE conta SET saldo = saldo {sinal} ? WHERE id = 1', (valor,))
+    db.execute('INSERT INTO transacao (tipo, valor, descricao, conta_id) VALUES (?, ?, ?, 1)',
+               (tipo, valor, tipo))
+    db.commit()
+    db.close()
+
+
+def trabalhador(caminho, modo, operacoes, semente):
+    """Executa operações aleatórias; devolve o efeito líquido das que passaram"""
+    aleatorio = random.Random(semente)
+    db = database.conectar(caminho)
+    liquido, recusados = 0, 0
+    for _ in range(operacoes):
+        tipo = 'saque' if aleatorio.random() < 0.7 else 'deposito'
+        valor = aleatorio.randint(1, 50)
+        try:
+            if modo == 'antigo':
+                lancar_antigo(caminho, tipo, valor)
+            else:
+                ledger.lancar(db, 1, tipo, valor * 100, tipo, usuario_id=1)
+        except ledger.SaldoInsuficiente:
+            recusados += 1
+            continue
+        liquido += -valor if tipo == 'saque' else valor
+    db.close()
+    return liquido, recusados
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--processos', type=int, default=8)
+    parser.add_argument('--operacoes', type=int, default=500)
+    parser.add_argument('--modo', choices=['novo', 'antigo'], default='novo')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        caminho = os.path.join(tmp, 'estresse.db')
+        preparar_banco(caminho)
+
+        inicio = time.perf_counter()
+        with multiprocessing.Pool(args.processos) as pool:
+            resultados = pool.starmap(trabalhador, [
+                (caminho, args.modo, args.operacoes, semente) for semente in range(args.processos)])
+        duracao = time.perf_counter() - inicio
+
+        db = sqlite3.connect(caminho)
+        saldo = db.execute('SELECT saldo_centavos FROM conta WHERE id = 1').fetchone()[0] / 100
+        historico = db.execute('''
+            SELECT SUM(CASE WHEN tipo = 'saque' THEN -valor_centavos ELSE valor_centavos END)
+            FROM transacao WHERE conta_id = 1
+        ''').fetchone()[0] / 100
+        db.close()
+
+    total = args.processos * args.operacoes
+    esperado = SALDO_INICIAL + sum(liquido for liquido, _ in resultados)
+    recusados = sum(r for _, r in resultados)
+    print(f"📊 modo {args.modo}: {total} operações em {duracao:.2f}s = {total / duracao:.0f} ops/s "
+          f"({recusados} saques recusados)")
+    print(f"   saldo final {saldo:.2f} | esperado {esperado:.2f} | histórico {historico:.2f}")
+
+    ok = saldo >= 0 and saldo == esperado == historico
+    print("✅ Nenhum saldo perdido ou negativo" if ok else "❌ Inconsistência de saldo!")
+    return 0 if ok else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+Benchmark de login sob carga mista: p50/p99 do login e das demais rotas
+Execute: python benchmarks/bench_login.py [--duracao 5] [--logins 8] [--outros 4] [--processos 2]
+
+Threads de login (parte delas com a senha errada) disputam o worker com
+threads que navegam em dashboard/extrato. "inline" calcula o hash dentro
+da requisição; "pool" usa o pool de processos limitado, e as recusas
+por saturação (503) são contadas à parte.
+"""
+
+import argparse
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import database  # noqa: E402
+import senhas  # noqa: E402
+from app import app, init_db, pool_senhas  # noqa: E402
+
+
+def preparar_banco(caminho, metodo):
+    app.config['DATABASE'] = caminho
+    init_db()
+    db = sqlite3.connect(caminho)
+    db.execute("INSERT INTO usuario (nome, email, senha) VALUES ('Bench', 'bench@bench.com', ?)",
+               (senhas.gerar('segredo', metodo),))
+    db.execute("INSERT INTO conta (tipo, usuario_id) VALUES ('corrente', 1)")
+    db.commit()
+    db.close()
+
+
+def percentil(valores, p):
+    if not valores:
+        return float('nan')
+    valores = sorted(valores)
+    return valores[min(len(valores) - 1, int(len(valores) * p / 100))]
+
+
+def rodar(duracao, logins, outros):
+    latencias = {'login': [], 'outros': []}
+    recusados = [0]
+    fim = time.perf_counter() + duracao
+
+    def trabalhador_login(numero):
+        cliente = app.test_client()
+        senha = 'errada' if numero % 4 == 3 else 'segredo'
+        while time.perf_counter() < fim:
+            inicio = time.perf_counter()
+            resposta = cliente.post('/login', data={'email': 'bench@bench.com', 'senha': senha})
+            if resposta.status_code == 503:
+                recusados[0] += 1
+                continue
+            latencias['login'].append(time.perf_counter() - inicio)
+        database.fechar_conexoes()
+
+    def trabalhador_outros(numero):
+        cliente = app.test_client()
+        with cliente.session_transaction() as sessao:
+            sessao['usuario_id'] = 1
+        rotas = ['/dashboard', '/extrato/1']
+        i = numero
+        while time.perf_counter() < fim:
+            inicio = time.perf_counter()
+            cliente.get(rotas[i % 2])
+            latencias['outros'].append(time.perf_counter() - inicio)
+            i += 1
+        database.fechar_conexoes()
+
+    threads = [threading.Thread(target=trabalhador_login, args=(i,)) for i in range(logins)]
+    threads += [threading.Thread(target=trabalhador_outros, args=(i,)) for i in range(outros)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return latencias, recusados[0]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--duracao', type=float, default=5)
+    parser.add_argument('--logins', type=int, default=8)
+    parser.add_argument('--outros', type=int, default=4)
+    parser.add_argument('--processos', type=int, default=2)
+    parser.add_argument('--fila-maxima', type=int, default=8)
+    parser.add_argument('--metodo', default='pbkdf2:sha256:200000')
+    args = parser.parse_args()
+
+    pool_senhas.metodo = args.metodo
+    pool_senhas.fila_maxima = args.fila_maxima
+    with tempfile.TemporaryDirectory() as tmp:
+        for modo, processos in (('inline', 0), ('pool', args.processos)):
+            pool_senhas.encerrar()
+            pool_senhas.processos = processos
+            preparar_banco(os.path.join(tmp, f'login_{modo}.db'), args.metodo)
+            if processos:
+                pool_senhas.gerar('aquecimento')
+            latencias, recusados = rodar(args.duracao, args.logins, args.outros)
+            print(f"📊 {modo:6} ({args.metodo}, {args.logins} threads de login + {args.outros} de navegação)")
+            for rota, valores in latencias.items():
+                print(f"   {rota:6}: {len(valores):6d} req | p50 {percentil(valores, 50) * 1000:7.1f} ms"
+                      f" | p99 {percentil(valores, 99) * 1000:7.1f} ms")
+            print(f"   503 por saturação: {recusados}")
+    pool_senhas.encerrar()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+Vazão de escrita com 1, 2 e 4 shards
+Execute: python benchmarks/bench_shards.py [--processos 8] [--operacoes 300] [--shards 1,2,4] [--synchronous FULL]
+
+Vários processos fazem depósitos, cada um nas contas dos seus usuários,
+roteando cada lançamento pelo diretório como o app faz. Com um shard todos
+disputam o mesmo lock de escrita; com N shards os usuários se dividem em N
+arquivos (`id % N`) e as escritas de shards diferentes correm em paralelo.
+`--transferencias` é a fração das operações que vira transferência para a
+conta de outro usuário (entre shards: débito + crédito entregue em seguida).
+No fim confere que o total em conta bate com os depósitos.
+"""
+
+import argparse
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import database  # noqa: E402
+import ledger  # noqa: E402
+import migracoes  # noqa: E402
+import shards  # noqa: E402
+
+USUARIOS_POR_PROCESSO = 4
+
+
+def preparar(tmp, total_shards, usuarios, pragmas):
+    """Cria os shards e o diretório com `usuarios` usuários de uma conta cada"""
+    caminhos = [os.path.join(tmp, f'shard-{total_shards}-{numero}.db') for numero in range(total_shards)]
+    diretorio_caminho = os.path.join(tmp, f'diretorio-{total_shards}.db')
+    conexoes = [database.conectar(caminho, pragmas) for caminho in caminhos]
+    for db in conexoes:
+        migracoes.migrar(db)
+    diretorio = database.conectar(diretorio_caminho, pragmas)
+    shards.preparar_diretorio(diretorio)
+    with diretorio:
+        for numero in range(usuarios):
+            usuario_id = shards.reservar_usuario(diretorio, f'u{numero}@bench.com', total_shards)
+            conta_id = shards.reservar_conta(diretorio, usuario_id)
+            db = conexoes[shards.shard_do_usuario(diretorio, usuario_id)]
+            db.execute("INSERT INTO usuario (id, nome, email, senha) VALUES (?, 'Bench', ?, 'x')",
+                       (usuario_id, f'u{numero}@bench.com'))
+            db.execute("INSERT INTO conta (id, tipo, usuario_id) VALUES (?, 'corrente', ?)", (conta_id, usuario_id))
+    for db in (diretorio, *conexoes):
+        db.commit()
+        db.close()
+    return caminhos, diretorio_caminho
+
+
+def trabalhador(caminhos, diretorio_caminho, pragmas, primeiro, usuarios, total_usuarios, operacoes,
+                transferencias, semente):
+    """Deposita (e transfere) nas contas dos usuários [primeiro, primeiro + usuarios)"""
+    aleatorio = random.Random(semente)
+    diretorio = database.conectar(diretorio_caminho, pragmas)
+    conexoes = [database.conectar(caminho, pragmas) for caminho in caminhos]
+
+    def conexao_da_conta(conta_id):
+        dono = shards.usuario_da_conta(diretorio, conta_id)
+        return conexoes[shards.shard_do_usuario(diretorio, dono)]
+
+    depositado = 0
+    for _ in range(operacoes):
+        usuario_id = primeiro + aleatorio.randrange(usuarios)
+        db = conexoes[shards.shard_do_usuario(diretorio, usuario_id)]
+        if aleatorio.random() < transferencias:
+            destino_id = aleatorio.randrange(1, total_usuarios + 1)
+            if destino_id != usuario_id:
+                mesmo = conexao_da_conta(destino_id) is db
+                funcao = ledger.aplicar_transferencia if mesmo else shards.iniciar_transferencia
+                try:
+                    ledger.em_transacao(db, funcao, usuario_id, destino_id, 100, usuario_id)
+                except ledger.SaldoInsuficiente:
+                    pass
+                if not mesmo:
+                    shards.entregar_transferencias(db, conexao_da_conta)
+                continue
+        ledger.lancar(db, usuario_id, 'deposito', 1000, 'Depósito', usuario_id)
+        depositado += 1000
+
+    # O que ficou pendente (corrida entre processos) é entregue no fim
+    for db in conexoes:
+        while shards.entregar_transferencias(db, conexao_da_conta):
+            pass
+    for db in (diretorio, *conexoes):
+        db.close()
+    return depositado
+
+
+def rodar(tmp, total_shards, args, pragmas):
+    usuarios = args.processos * USUARIOS_POR_PROCESSO
+    caminhos, diretorio = preparar(tmp, total_shards, usuarios, pragmas)
+
+    inicio = time.perf_counter()
+    with multiprocessing.Pool(args.processos) as pool:
+        depositado = sum(pool.starmap(trabalhador, [
+            (caminhos, diretorio, pragmas, 1 + numero * USUARIOS_POR_PROCESSO, USUARIOS_POR_PROCESSO,
+             usuarios, args.operacoes, args.transferencias, numero) for numero in range(args.processos)]))
+    duracao = time.perf_counter() - inicio
+
+    total = 0
+    for caminho in caminhos:
+        db = database.conectar(caminho)
+        total += db.execute('SELECT COALESCE(SUM(saldo_centavos), 0) FROM conta').fetchone()[0]
+        db.close()
+    return args.processos * args.operacoes / duracao, total == depositado
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--processos', type=int, default=8)
+    parser.add_argument('--operacoes', type=int, default=300)
+    parser.add_argument('--shards', default='1,2,4')
+    parser.add_argument('--transferencias', type=float, default=0.1)
+    parser.add_argument('--synchronous', default='FULL')
+    args = parser.parse_args()
+
+    pragmas = dict(database.SQLITE_PRAGMAS, synchronous=args.synchronous)
+    print(f"📊 {args.processos} processos x {args.operacoes} operações "
+          f"({args.transferencias:.0%} transferências), synchronous={args.synchronous}")
+    base, ok = None, True
+    with tempfile.TemporaryDirectory() as tmp:
+        for total_shards in (int(n) for n in args.shards.split(',')):
+            vazao, confere = rodar(tmp, total_shards, args, pragmas)
+            base = base or vazao
+            ok = ok and confere
+            print(f"   {total_shards} shard(s): {vazao:8.0f} ops/s  ({vazao / base:.2f}x)"
+                  f"{'' if confere else '  ❌ total em conta não confere'}")
+
+    print("✅ Totais conferem" if ok else "❌ Inconsistência de saldo!")
+    return 0 if ok else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Benchmark de transferências concorrentes entre contas
+Execute: python benchmarks/bench_transferencias.py [--processos 8] [--operacoes 500] [--contas 50]
+
+Cada processo simula um worker do Gunicorn fazendo transferências entre
+pares aleatórios de contas. No fim confere que o dinheiro total não mudou,
+que nenhuma conta ficou negativa e que toda transferência tem as duas
+pernas em `transacao`; também conta quantas vezes o banco respondeu
+"database is locked".
+"""
+
+import argparse
+import multiprocessing
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import database  # noqa: E402
+import ledger  # noqa: E402
+
+SALDO_INICIAL = 100000  # centavos
+
+
+def preparar_banco(caminho, contas):
+    from app import app, init_db
+    app.config['DATABASE'] = caminho
+    init_db()
+    db = sqlite3.connect(caminho)
+    db.execute("INSERT INTO usuario (nome, email, senha) VALUES ('Bench', 'bench@bench.com', 'x')")
+    db.executemany("INSERT INTO conta (tipo, saldo_centavos, usuario_id) VALUES ('corrente', ?, 1)",
+                   [(SALDO_INICIAL,)] * contas)
+    db.commit()
+    db.close()
+
+
+def trabalhador(caminho, operacoes, contas, semente):
+    aleatorio = random.Random(semente)
+    db = database.conectar(caminho)
+    feitas, recusadas, travadas = 0, 0, 0
+    for _ in range(operacoes):
+        origem, destino = aleatorio.sample(range(1, contas + 1), 2)
+        try:
+            ledger.transferir(db, origem, destino, aleatorio.randint(1, 10000))
+            feitas += 1
+        except ledger.SaldoInsuficiente:
+            recusadas += 1
+        except sqlite3.OperationalError as e:
+            if 'locked' not in str(e):
+                raise
+            travadas += 1
+    db.close()
+    return feitas, recusadas, travadas
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--processos', type=int, default=8)
+    parser.add_argument('--operacoes', type=int, default=500)
+    parser.add_argument('--contas', type=int, default=50)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        caminho = os.path.join(tmp, 'transferencias.db')
+        preparar_banco(caminho, args.contas)
+
+        inicio = time.perf_counter()
+        with multiprocessing.Pool(args.processos) as pool:
+            resultados = pool.starmap(trabalhador, [
+                (caminho, args.operacoes, args.contas, semente) for semente in range(args.processos)])
+        duracao = time.perf_counter() - inicio
+
+        db = sqlite3.connect(caminho)
+        total = db.execute('SELECT SUM(saldo_centavos) FROM conta').fetchone()[0]
+        negativas = db.execute('SELECT COUNT(*) FROM conta WHERE saldo_centavos < 0').fetchone()[0]
+        incompletas = db.execute('''
+            SELECT COUNT(*) FROM (
+                SELECT t.id FROM transferencia t
+                LEFT JOIN transacao x ON x.transferencia_id = t.id
+                GROUP BY t.id HAVING COUNT(x.id) != 2
+            )
+        ''').fetchone()[0]
+        db.close()
+
+    feitas = sum(r[0] for r in resultados)
+    recusadas = sum(r[1] for r in resultados)
+    travadas = sum(r[2] for r in resultados)
+    print(f"📊 {feitas} transferências em {duracao:.2f}s = {feitas / duracao:.0f} transf/s "
+          f"({recusadas} sem saldo, {travadas} 'database is locked')")
+
+    ok = total == SALDO_INICIAL * args.contas and negativas == 0 and incompletas == 0
+    print(f"   total {total / 100:.2f} | contas negativas {negativas} | transferências incompletas {incompletas}")
+    print("✅ Dinheiro conservado" if ok else "❌ Inconsistência!")
+    return 0 if ok else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
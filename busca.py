@@ -0,0 +1,183 @@
+"""
+Busca nas transações de uma conta: texto da descrição, tipo, valor e data
+
+`transacao_busca` (migração 0012) é um índice FTS5 de conteúdo externo
+sobre `transacao`: guarda os termos de `descricao` e de `conta_id`, e os
+gatilhos o mantêm na mesma transação de cada INSERT, DELETE e UPDATE.
+Enquanto a migração não termina de indexar as linhas antigas (ou ainda
+não rodou), a busca por termo levanta IndiceIndisponivel; os filtros sem
+termo continuam funcionando.
+
+Com termo, o MATCH cruza as listas de linhas das palavras e da conta
+dentro do índice (uma palavra comum não faz ler as linhas das outras
+contas) e os filtros de tipo, valor e data são conferidos só nessas
+linhas. Sem termo a busca percorre o índice (conta_id, data, id) na faixa
+de datas pedida.
+
+Palavras inteiras, sem diferença de acento ou maiúscula: um prefixo
+("transf"*) faz o FTS5 juntar a lista inteira de cada termo, de todas as
+contas, antes de cruzar com a conta. Pelo mesmo motivo a relevância não é
+o bm25(), que lê as listas inteiras dos termos em toda consulta para o
+IDF (~60 ms por busca numa conta pequena com 1 milhão de transações no
+banco, contra 0,2 ms); como todas as palavras são obrigatórias, o IDF é
+igual em todas as linhas do resultado, e o que ordena é a fração da
+descrição coberta pelo termo (a descrição mais curta que contém as
+palavras vem primeiro) e, no empate, a transação mais recente.
+
+Ordenar por relevância todas as linhas que casam custaria uma B-tree
+temporária do tamanho da conta (~140 ms numa conta com 69 mil transações).
+Em vez disso o FTS5 devolve as linhas da mais recente para a mais antiga,
+na ordem do próprio índice, e a consulta para nas `CANDIDATOS` primeiras:
+a relevância ordena só essas. O custo fica limitado por `CANDIDATOS`, não
+pelo tamanho da conta, e transações mais antigas que elas só aparecem
+refinando o termo ou a faixa de datas.
+
+As páginas são numeradas (a ordem por relevância não tem cursor) e
+limitadas em `PAGINA_MAXIMA`. Transações arquivadas (arquivo.py)
+saíram de `transacao` e não aparecem na busca.
+"""
+
+import re
+import sqlite3
+from datetime import datetime
+
+import dinheiro
+
+TIPOS = ('deposito', 'saque', 'transferencia_enviada', 'transferencia_recebida')
+
+# Parâmetros da requisição lidos por ler_filtros()
+PARAMETROS = ('q', 'tipo', 'valor_min', 'valor_max', 'inicio', 'fim')
+
+# Resultados por página e última página servida
+POR_PAGINA = 20
+PAGINA_MAXIMA = 50
+
+# Com termo, quantas transações (as mais recentes que casam) entram na ordem por relevância
+CANDIDATOS = POR_PAGINA * PAGINA_MAXIMA
+
+_COLUNAS = '''t.id, t.tipo, t.valor_centavos, t.saldo_apos_centavos, t.descricao, t.conta_id, t.data,
+              strftime('%d/%m/%Y %H:%M', t.data) as data_formatada'''
+
+_PALAVRA = re.compile(r'\w+')
+
+
+class IndiceIndisponivel(Exception):
+    """O índice de texto ainda não existe ou está sendo carregado"""
+
+
+def indice_pronto(db):
+    """True se o índice de texto existe e já cobre todas as transações"""
+    try:
+        return db.execute('SELECT 1 FROM transacao_busca_carga WHERE id = 1').fetchone() is None
+    except sqlite3.OperationalError as e:
+        if 'no such table' in str(e):
+            return False
+        raise
+
+
+def palavras(termo):
+    return _PALAVRA.findall(termo or '')
+
+
+def expressao(termo, conta_id):
+    """Expressão MATCH do FTS5: todas as palavras do termo, na conta
+
+    Só as palavras entram, entre aspas: aspas, operadores e parênteses
+    digitados não chegam à sintaxe do FTS5. Devolve None sem palavras.
+    """
+    encontradas = palavras(termo)
+    if not encontradas:
+        return None
+    texto = ' AND '.join(f'"{palavra}"' for palavra in encontradas)
+    return f'descricao : ({texto}) AND conta_id : "{int(conta_id)}"'
+
+
+def ler_filtros(argumentos):
+    """Filtros da busca a partir dos parâmetros da requisição
+
+    `q`, `tipo`, `valor_min` e `valor_max` (em reais), `inicio` e `fim`
+    (AAAA-MM-DD). Levanta ValueError para tipo, valor ou data inválidos.
+    """
+    filtros = {
+        'termo': (argumentos.get('q') or '').strip() or None,
+        'tipo': argumentos.get('tipo') or None,
+        'minimo_centavos': None,
+        'maximo_centavos': None,
+        'inicio': argumentos.get('inicio') or None,
+        'fim': argumentos.get('fim') or None,
+    }
+    if filtros['tipo'] is not None and filtros['tipo'] not in TIPOS:
+        raise ValueError(f'tipo inválido: {filtros["tipo"]!r}')
+    for parametro, chave in (('valor_min', 'minimo_centavos'), ('valor_max', 'maximo_centavos')):
+        if argumentos.get(parametro):
+            filtros[chave] = dinheiro.centavos(argumentos[parametro])
+    for chave in ('inicio', 'fim'):
+        if filtros[chave]:
+            datetime.strptime(filtros[chave], '%Y-%m-%d')
+    return filtros
+
+
+def buscar(db, conta_id, termo=None, tipo=None, minimo_centavos=None, maximo_centavos=None,
+           inicio=None, fim=None, pagina=1, por_pagina=POR_PAGINA):
+    """Uma página das transações da conta que atendem a todos os filtros
+
+    Devolve (transações, tem_mais). Com termo cada transação traz
+    `relevancia` (de 0 a 1: palavras do termo / palavras da descrição);
+    sem termo ela é None. Com termo e o índice ainda em carga levanta
+    IndiceIndisponivel.
+    """
+    condicoes, parametros = ['t.conta_id = ?'], [conta_id]
+    if tipo is not None:
+        condicoes.append('t.tipo = ?')
+        parametros.append(tipo)
+    if minimo_centavos is not None:
+        condicoes.append('t.valor_centavos >= ?')
+        parametros.append(minimo_centavos)
+    if maximo_centavos is not None:
+        condicoes.append('t.valor_centavos <= ?')
+        parametros.append(maximo_centavos)
+    if inicio:
+        condicoes.append('t.data >= ?')
+        parametros.append(inicio)
+    if fim:
+        condicoes.append("t.data < date(?, '+1 day')")
+        parametros.append(fim)
+    filtro = ' AND '.join(condicoes)
+    pagina = max(1, min(pagina, PAGINA_MAXIMA))
+    paginacao = (por_pagina + 1, (pagina - 1) * por_pagina)
+
+    consulta = expressao(termo, conta_id)
+    if consulta:
+        if not indice_pronto(db):
+            raise IndiceIndisponivel('índice de texto em carga (migração 0012)')
+        # CROSS JOIN: o índice de texto vem primeiro e transacao é lida só pelas linhas que casam.
+        # O FTS5 entrega as linhas já em ordem de rowid (sem B-tree temporária) e para nas
+        # CANDIDATOS mais recentes; só elas são ordenadas por relevância, aqui
+        candidatas = db.execute(f'''
+            SELECT {_COLUNAS},
+                   min(1.0, ? / (length(trim(t.descricao)) - length(replace(trim(t.descricao), ' ', '')) + 1.0))
+                       AS relevancia
+            FROM transacao_busca
+            CROSS JOIN transacao t ON t.id = transacao_busca.rowid
+            WHERE transacao_busca MATCH ? AND {filtro}
+            ORDER BY transacao_busca.rowid DESC
+            LIMIT ?
+        ''', (len(palavras(termo)), consulta, *parametros, CANDIDATOS)).fetchall()
+        # sort() é estável: no empate fica a ordem do índice, da mais recente
+        candidatas.sort(key=lambda t: t['relevancia'], reverse=True)
+        limite, inicio_pagina = paginacao
+        transacoes = candidatas[inicio_pagina:inicio_pagina + limite]
+        return transacoes[:por_pagina], len(transacoes) > por_pagina and pagina < PAGINA_MAXIMA
+    elif termo is None or not termo.strip():
+        cursor = db.execute(f'''
+            SELECT {_COLUNAS}, NULL AS relevancia
+            FROM transacao t
+            WHERE {filtro}
+            ORDER BY t.data DESC, t.id DESC
+            LIMIT ? OFFSET ?
+        ''', (*parametros, *paginacao))
+    else:
+        # Termo só de pontuação: nenhuma descrição casa
+        return [], False
+    transacoes = cursor.fetchall()
+    return transacoes[:por_pagina], len(transacoes) > por_pagina and pagina < PAGINA_MAXIMA
@@ -0,0 +1,98 @@
+"""
+Cache LRU em memória com prazo de validade (TTL), por processo
+
+Cada worker do gunicorn tem o seu; o tamanho é limitado a `maximo`
+entradas (a menos usada sai primeiro) e cada entrada expira `ttl`
+segundos depois de gravada. Com `peso` (função do valor, ex.: len) o
+limite é a soma dos pesos em vez do número de entradas, e um valor que
+sozinho passa de `maximo` não é guardado. Uma entrada pode carregar uma versão: se a
+versão pedida em `obter()` for outra, ela conta como invalidada. Os
+contadores ficam disponíveis em `estatisticas()`.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+# Marca de ausência (None pode ser um valor válido no cache)
+AUSENTE = object()
+
+
+class CacheLRU:
+    def __init__(self, maximo=1024, ttl=30.0, relogio=time.monotonic, peso=None):
+        self.maximo = maximo
+        self.ttl = ttl
+        self._relogio = relogio
+        self._peso = peso or (lambda valor: 1)
+        self._itens = OrderedDict()
+        self._ocupado = 0
+        self._lock = threading.Lock()
+        self.acertos = 0
+        self.falhas = 0
+        self.expirados = 0
+        self.descartados = 0
+        self.invalidados = 0
+
+    def obter(self, chave, versao=None):
+        """Devolve o valor guardado ou AUSENTE (conta acerto/falha)"""
+        with self._lock:
+            item = self._itens.get(chave)
+            if item is None:
+                self.falhas += 1
+                return AUSENTE
+            valor, validade, versao_gravada, peso = item
+            if validade <= self._relogio() or versao_gravada != versao:
+                del self._itens[chave]
+                self._ocupado -= peso
+                if versao_gravada != versao:
+                    self.invalidados += 1
+                else:
+                    self.expirados += 1
+                self.falhas += 1
+                return AUSENTE
+            self._itens.move_to_end(chave)
+            self.acertos += 1
+            return valor
+
+    def gravar(self, chave, valor, versao=None):
+        peso = self._peso(valor)
+        with self._lock:
+            anterior = self._itens.pop(chave, None)
+            if anterior is not None:
+                self._ocupado -= anterior[3]
+            if peso > self.maximo:
+                self.descartados += 1
+                return
+            self._itens[chave] = (valor, self._relogio() + self.ttl, versao, peso)
+            self._ocupado += peso
+            while self._ocupado > self.maximo:
+                self._ocupado -= self._itens.popitem(last=False)[1][3]
+                self.descartados += 1
+
+    def invalidar(self, chave):
+        with self._lock:
+            item = self._itens.pop(chave, None)
+            if item is not None:
+                self._ocupado -= item[3]
+                self.invalidados += 1
+
+    def limpar(self):
+        with self._lock:
+            self._itens.clear()
+            self._ocupado = 0
+
+    def estatisticas(self):
+        with self._lock:
+            consultas = self.acertos + self.falhas
+            return {
+                'itens': len(self._itens),
+                'ocupado': self._ocupado,
+                'maximo': self.maximo,
+                'ttl': self.ttl,
+                'acertos': self.acertos,
+                'falhas': self.falhas,
+                'taxa_acerto': round(self.acertos / consultas, 4) if consultas else None,
+                'expirados': self.expirados,
+                'descartados': self.descartados,
+                'invalidados': self.invalidados,
+            }
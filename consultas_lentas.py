@@ -0,0 +1,85 @@
+"""
+Registro de consultas lentas e leitura de planos (EXPLAIN QUERY PLAN)
+
+Comandos que passam de `limite_ms` vão para o logger `banco.consultas_lentas`
+como uma linha JSON: o SQL, o formato dos parâmetros (só os tipos, nunca
+os valores: e-mails e hashes de senha não vão para o log), a duração e o
+plano, lido na mesma conexão logo depois do comando. O custo do EXPLAIN
+só é pago pelos comandos lentos.
+
+`problemas()` aponta num plano as varreduras completas de tabela e as
+ordenações em B-tree temporária; test_planos.py aplica a mesma regra a
+todas as consultas que o app emite.
+"""
+
+import json
+import logging
+import sqlite3
+
+logger = logging.getLogger('banco.consultas_lentas')
+
+# Comandos que têm plano de consulta
+COM_PLANO = {'SELECT', 'WITH', 'INSERT', 'UPDATE', 'DELETE', 'REPLACE'}
+
+
+def normalizar(sql):
+    """SQL numa linha só, para o log e para agrupar comandos iguais"""
+    return ' '.join(sql.split())
+
+
+def formato_parametros(parametros):
+    """Tipos dos parâmetros ligados, sem os valores"""
+    if parametros is None:
+        return None
+    if isinstance(parametros, dict):
+        return {nome: type(valor).__name__ for nome, valor in parametros.items()}
+    return [type(valor).__name__ for valor in parametros]
+
+
+def plano(db, sql, parametros=()):
+    """Linhas de detalhe do EXPLAIN QUERY PLAN do comando"""
+    # Connection.execute direto: sem passar pela medição da conexão instrumentada
+    cursor = sqlite3.Connection.execute(db, 'EXPLAIN QUERY PLAN ' + sql, parametros)
+    return [linha[3] for linha in cursor]
+
+
+def problemas(linhas):
+    """Varreduras completas de tabela e B-trees temporárias de um plano
+
+    Varrer o resultado de uma subconsulta (CO-ROUTINE/MATERIALIZE) ou uma
+    linha constante não conta, nem a tabela virtual lida pelo índice do
+    próprio módulo (o MATCH do FTS5 aparece como 'INDEX 0:M...').
+    """
+    subconsultas = {linha.split(' ', 1)[1] for linha in linhas
+                    if linha.startswith(('CO-ROUTINE ', 'MATERIALIZE '))}
+    encontrados = []
+    for linha in linhas:
+        if linha.startswith('USE TEMP B-TREE'):
+            encontrados.append(linha)
+        elif linha.startswith('SCAN ') and linha != 'SCAN CONSTANT ROW':
+            if ' VIRTUAL TABLE INDEX ' in linha and not linha.endswith(':'):
+                continue
+            if linha.split()[1] not in subconsultas:
+                encontrados.append(linha)
+    return encontrados
+
+
+class RegistroLento:
+    def __init__(self, limite_ms):
+        self.limite = limite_ms / 1000
+
+    def registrar(self, db, tipo, sql, parametros, duracao):
+        """Loga o comando lento; `parametros` None (executemany, COMMIT) pula o plano"""
+        registro = {
+            'duracao_ms': round(duracao * 1000, 3),
+            'tipo': tipo,
+            'sql': normalizar(sql),
+            'parametros': formato_parametros(parametros),
+        }
+        if tipo in COM_PLANO and parametros is not None:
+            try:
+                registro['plano'] = plano(db, sql, parametros)
+                registro['problemas'] = problemas(registro['plano'])
+            except sqlite3.Error as e:
+                registro['plano'] = f'indisponível: {e}'
+        logger.warning(json.dumps(registro, ensure_ascii=False))
@@ -0,0 +1,204 @@
+"""
+Camada de conexões com o SQLite
+
+Cada thread de cada worker mantém uma única conexão aberta por arquivo de
+banco, reaproveitada entre requisições. Dentro de uma requisição as conexões
+ficam presas ao `g` do Flask e, no teardown, qualquer transação pendente é
+desfeita para que a próxima requisição encontre a conexão limpa.
+
+Com shards (ver shards.py) cada usuário mora num arquivo: `get_db(usuario_id)`
+devolve a conexão do shard dele e `get_diretorio()` a do diretório.
+
+Rotas que só leem usam `get_leitura()`: outra conexão do pool, aberta com
+`mode=ro` (nunca vira escritora) e presa a um único instantâneo do WAL
+durante a requisição. `get_replica()` abre a cópia periódica do banco
+(ver replica.py) para relatórios pesados.
+"""
+
+import os
+import sqlite3
+import threading
+from urllib.parse import quote
+
+from flask import current_app, g, has_app_context
+
+import replica
+import shards
+
+# Arquivo padrão do banco (pode ser trocado pela variável DATABASE_PATH)
+DATABASE = os.environ.get('DATABASE_PATH', 'banco.db')
+
+# Pragmas aplicados em toda conexão nova. journal_mode=WAL é persistente no
+# arquivo; os demais valem por conexão.
+SQLITE_PRAGMAS = {
+    'journal_mode': os.environ.get('SQLITE_JOURNAL_MODE', 'WAL'),
+    'synchronous': os.environ.get('SQLITE_SYNCHRONOUS', 'NORMAL'),
+    'cache_size': int(os.environ.get('SQLITE_CACHE_SIZE', -16000)),
+    'mmap_size': int(os.environ.get('SQLITE_MMAP_SIZE', 128 * 1024 * 1024)),
+    'busy_timeout': int(os.environ.get('SQLITE_BUSY_TIMEOUT', 5000)),
+    'temp_store': os.environ.get('SQLITE_TEMP_STORE', 'MEMORY'),
+    # Depois de cada checkpoint completo o -wal volta a este tamanho (ver saude.atraso_wal)
+    'journal_size_limit': int(os.environ.get('SQLITE_JOURNAL_SIZE_LIMIT', 16 * 1024 * 1024)),
+}
+
+_local = threading.local()
+
+
+def conectar(caminho=DATABASE, pragmas=None, fabrica=None, somente_leitura=False):
+    """Abre uma conexão nova já com row_factory e pragmas aplicados
+
+    `fabrica` é uma subclasse de sqlite3.Connection (ex.: a que mede os
+    comandos para /metrics). Com `somente_leitura` o arquivo é aberto por
+    URI `mode=ro`: qualquer escrita falha e o journal_mode, que é do
+    arquivo, fica como os escritores deixaram.
+    """
+    fabrica = fabrica or sqlite3.Connection
+    if somente_leitura:
+        db = sqlite3.connect(f'file:{quote(os.path.abspath(caminho))}?mode=ro', uri=True, factory=fabrica)
+    else:
+        db = sqlite3.connect(caminho, factory=fabrica)
+    db.row_factory = sqlite3.Row
+    for nome, valor in (SQLITE_PRAGMAS if pragmas is None else pragmas).items():
+        if not (somente_leitura and nome == 'journal_mode'):
+            db.execute(f'PRAGMA {nome} = {valor}')
+    return db
+
+
+def _conexao_da_thread(caminho, pragmas, fabrica=None, somente_leitura=False):
+    """Devolve a conexão reaproveitável desta thread para o arquivo informado"""
+    # Depois de um fork (preload_app do Gunicorn) as conexões herdadas do
+    # processo pai não podem ser usadas: descarta e abre novas.
+    if getattr(_local, 'pid', None) != os.getpid():
+        _local.pid = os.getpid()
+        _local.conexoes = {}
+        _local.versoes = {}
+
+    chave = (caminho, 'ro') if somente_leitura else caminho
+    db = _local.conexoes.get(chave)
+    if db is None:
+        db = conectar(caminho, pragmas, fabrica, somente_leitura)
+        _local.conexoes[chave] = db
+    return db
+
+
+def _conexao_da_replica(caminho, pragmas, fabrica=None):
+    """Conexão somente leitura desta thread à réplica, reaberta quando o arquivo é trocado
+
+    Levanta FileNotFoundError se a réplica ainda não existe.
+    """
+    estado = os.stat(caminho)
+    versao = (estado.st_ino, estado.st_mtime_ns)
+    db = _conexao_da_thread(caminho, pragmas, fabrica, somente_leitura=True)
+    if _local.versoes.get(caminho, versao) != versao:
+        # A conexão antiga ainda lê o arquivo substituído
+        db.close()
+        del _local.conexoes[(caminho, 'ro')]
+        db = _conexao_da_thread(caminho, pragmas, fabrica, somente_leitura=True)
+    _local.versoes[caminho] = versao
+    return db
+
+
+def _conexao_da_requisicao(caminho, somente_leitura=False):
+    """Conexão do arquivo presa ao `g` da requisição"""
+    conexoes = g.setdefault('conexoes', {})
+    chave = (caminho, 'ro') if somente_leitura else caminho
+    db = conexoes.get(chave)
+    if db is None:
+        db = conexoes[chave] = _conexao_da_thread(caminho, current_app.config['SQLITE_PRAGMAS'],
+                                                  current_app.config.get('SQLITE_FABRICA'), somente_leitura)
+    return db
+
+
+def caminho_do_usuario(usuario_id=None):
+    """Arquivo com os dados do usuário: o banco único ou o shard dele
+
+    Com shards (`app.config['SHARDS']`) o shard sai do diretório, consultado
+    uma vez por requisição; levanta shards.UsuarioSemShard se o usuário não
+    existe ou se nenhum foi informado.
+    """
+    lista = current_app.config.get('SHARDS')
+    if not lista:
+        return current_app.config['DATABASE']
+
+    roteados = g.setdefault('shards_dos_usuarios', {})
+    if usuario_id not in roteados:
+        numero = shards.shard_do_usuario(get_diretorio(), usuario_id) if usuario_id is not None else None
+        if numero is None:
+            raise shards.UsuarioSemShard(usuario_id)
+        roteados[usuario_id] = numero
+    return lista[roteados[usuario_id]]
+
+
+def get_db(usuario_id=None):
+    """Conecta ao banco de dados SQLite
+
+    Com shards configurados devolve a conexão do shard de `usuario_id`.
+    """
+    if not has_app_context():
+        return _conexao_da_thread(DATABASE, SQLITE_PRAGMAS)
+    return _conexao_da_requisicao(caminho_do_usuario(usuario_id))
+
+
+def get_leitura(usuario_id=None):
+    """Conexão somente leitura (`mode=ro`) ao banco ou shard do usuário
+
+    A primeira chamada da requisição abre uma transação de leitura: todas
+    as consultas da requisição veem o mesmo instantâneo do WAL, que o
+    teardown encerra. Commits de lançamentos não esperam por ela.
+    """
+    if not has_app_context():
+        return _conexao_da_thread(DATABASE, SQLITE_PRAGMAS, somente_leitura=True)
+    db = _conexao_da_requisicao(caminho_do_usuario(usuario_id), somente_leitura=True)
+    if not db.in_transaction:
+        db.execute('BEGIN')
+    return db
+
+
+def get_replica(usuario_id=None):
+    """(conexão, data até onde está completa) da réplica do banco do usuário
+
+    None quando a réplica está desligada (`REPLICA_ATIVA`) ou ainda não foi
+    gerada; a data é comparável com `transacao.data` (replica.completa_ate).
+    """
+    if not current_app.config.get('REPLICA_ATIVA'):
+        return None
+    caminho = replica.caminho_da_replica(caminho_do_usuario(usuario_id))
+    try:
+        db = _conexao_da_replica(caminho, current_app.config['SQLITE_PRAGMAS'],
+                                 current_app.config.get('SQLITE_FABRICA'))
+    except (FileNotFoundError, sqlite3.OperationalError):
+        return None
+    return db, replica.completa_ate(caminho)
+
+
+def get_diretorio():
+    """Banco do diretório de shards (o próprio banco quando não há shards)"""
+    if not current_app.config.get('SHARDS'):
+        return _conexao_da_requisicao(current_app.config['DATABASE'])
+    return _conexao_da_requisicao(current_app.config['SHARDS_DIRETORIO'])
+
+
+def get_shards(somente_leitura=False):
+    """Conexões de todos os shards, na ordem (só o banco quando não há shards)"""
+    return [_conexao_da_requisicao(caminho, somente_leitura)
+            for caminho in current_app.config.get('SHARDS') or [current_app.config['DATABASE']]]
+
+
+def close_db(exc=None):
+    """Devolve as conexões da requisição ao pool da thread"""
+    for db in g.pop('conexoes', {}).values():
+        if db.in_transaction:
+            db.rollback()
+    g.pop('shards_dos_usuarios', None)
+
+
+def fechar_conexoes():
+    """Fecha todas as conexões mantidas pela thread atual"""
+    conexoes = getattr(_local, 'conexoes', {})
+    if getattr(_local, 'pid', None) == os.getpid():
+        for db in conexoes.values():
+            db.close()
+    _local.conexoes = {}
+    _local.versoes = {}
+    _local.pid = os.getpid()
+
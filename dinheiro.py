@@ -0,0 +1,50 @@
+"""
+Valores monetários em centavos inteiros
+
+Saldos e valores são guardados como INTEGER (centavos) no banco e como
+int no Python; a conversão de/para texto passa por Decimal, nunca por
+float, para que somas e conciliações batam ao centavo.
+"""
+
+from decimal import Decimal, InvalidOperation
+
+# Maior valor aceito num lançamento (R$ 10 bilhões): muito abaixo do INTEGER
+# de 64 bits do SQLite, para que saldos somando muitos lançamentos também caibam
+MAXIMO_CENTAVOS = 10 ** 12
+
+
+def centavos(valor):
+    """Converte um valor em reais ('12.34', '12,34', Decimal, int) para centavos
+
+    Levanta ValueError para valores inválidos, com mais de duas casas ou
+    acima de MAXIMO_CENTAVOS (em módulo).
+    """
+    if isinstance(valor, float):
+        valor = repr(valor)
+    if isinstance(valor, str):
+        valor = valor.strip().replace(',', '.')
+    try:
+        quantia = Decimal(valor)
+    except (InvalidOperation, TypeError, ValueError):
+        raise ValueError(f'valor inválido: {valor!r}') from None
+    if not quantia.is_finite():
+        raise ValueError(f'valor inválido: {valor!r}')
+
+    resultado = quantia * 100
+    if resultado != resultado.to_integral_value():
+        raise ValueError(f'valor com mais de duas casas decimais: {valor!r}')
+    if abs(resultado) > MAXIMO_CENTAVOS:
+        raise ValueError(f'valor acima do máximo: {valor!r}')
+    return int(resultado)
+
+
+def reais(centavos):
+    """Centavos -> Decimal em reais (para JSON, OFX, relatórios)"""
+    return Decimal(centavos).scaleb(-2)
+
+
+def formatar(centavos):
+    """Centavos -> '1234.56' (mesmo formato do antigo "%.2f")"""
+    sinal = '-' if centavos < 0 else ''
+    centavos = abs(centavos)
+    return f'{sinal}{centavos // 100}.{centavos % 100:02d}'
@@ -0,0 +1,151 @@
+"""
+Exportação do extrato em CSV, JSON Lines (NDJSON) e OFX
+
+Os geradores leem o cursor de `transacao` em lotes de tamanho fixo e
+produzem um bloco de texto por lote, de modo que a memória usada não
+depende do tamanho do histórico da conta. Com o diretório do arquivo o
+cursor intercala as transações arquivadas, um mês de cada vez (ver
+arquivo.py).
+"""
+
+import csv
+import io
+import json
+from datetime import datetime, timedelta
+from itertools import islice
+from xml.sax.saxutils import escape
+
+import arquivo
+from dinheiro import formatar
+from ledger import TIPOS_DEBITO
+
+# Linhas lidas do cursor (e enviadas ao cliente) por bloco
+TAMANHO_LOTE = 500
+
+FORMATOS = {
+    'csv': ('text/csv; charset=utf-8', 'csv'),
+    'ndjson': ('application/x-ndjson', 'ndjson'),
+    'ofx': ('application/x-ofx', 'ofx'),
+}
+
+
+def consultar_transacoes(db, conta_id, inicio=None, fim=None, diretorio_arquivo=None, cache=None):
+    """Abre um cursor com as transações da conta em ordem cronológica
+
+    `inicio` e `fim` são datas 'AAAA-MM-DD' inclusivas. Com
+    `diretorio_arquivo` devolve um iterador que intercala as arquivadas.
+    """
+    filtros, parametros = ['conta_id = ?'], [conta_id]
+    if inicio:
+        filtros.append('data >= ?')
+        parametros.append(inicio)
+    if fim:
+        filtros.append("data < date(?, '+1 day')")
+        parametros.append(fim)
+
+    cursor = db.execute(f'''
+        SELECT id, tipo, valor_centavos, descricao, data, saldo_apos_centavos
+        FROM transacao
+        WHERE {' AND '.join(filtros)}
+        ORDER BY data, id
+    ''', parametros)
+    if diretorio_arquivo is None:
+        return cursor
+
+    desde = (inicio, 0) if inicio else arquivo.INICIO
+    ate = arquivo.FIM
+    if fim:
+        ate = ((datetime.strptime(fim, '%Y-%m-%d') + timedelta(days=1)).strftime('%Y-%m-%d'), 0)
+    return arquivo.mesclar(cursor, arquivo.transacoes(db, diretorio_arquivo, conta_id, desde, ate, cache=cache))
+
+
+def _lotes(cursor, tamanho=TAMANHO_LOTE):
+    """Percorre o cursor (ou iterador) em lotes de no máximo `tamanho` linhas"""
+    cursor = iter(cursor)
+    while True:
+        linhas = list(islice(cursor, tamanho))
+        if not linhas:
+            return
+        yield linhas
+
+
+def _centavos_com_sinal(transacao):
+    centavos = transacao['valor_centavos']
+    return -centavos if transacao['tipo'] in TIPOS_DEBITO else centavos
+
+
+def _saldo_apos(transacao):
+    """Saldo após a transação formatado ('' em linhas anteriores ao registro)"""
+    saldo = transacao['saldo_apos_centavos']
+    return '' if saldo is None else formatar(saldo)
+
+
+def gerar_csv(cursor):
+    """Gera o extrato em CSV, um bloco por lote"""
+    buffer = io.StringIO()
+    escritor = csv.writer(buffer)
+    escritor.writerow(['id', 'data', 'tipo', 'descricao', 'valor', 'saldo'])
+    for linhas in _lotes(cursor):
+        for t in linhas:
+            escritor.writerow([t['id'], t['data'], t['tipo'], t['descricao'],
+                               formatar(_centavos_com_sinal(t)), _saldo_apos(t)])
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+
+
+def gerar_ndjson(cursor):
+    """Gera o extrato em JSON Lines, um objeto por transação"""
+    for linhas in _lotes(cursor):
+        yield ''.join(json.dumps({
+            'id': t['id'],
+            'data': t['data'],
+            'tipo': t['tipo'],
+            'descricao': t['descricao'],
+            'valor': formatar(_centavos_com_sinal(t)),
+            'valor_centavos': _centavos_com_sinal(t),
+            'saldo_apos_centavos': t['saldo_apos_centavos'],
+        }, ensure_ascii=False) + '\n' for t in linhas)
+
+
+def _data_ofx(data):
+    """'AAAA-MM-DD HH:MM:SS' -> 'AAAAMMDDHHMMSS'"""
+    return ''.join(c for c in data if c.isdigit())[:14]
+
+
+def gerar_ofx(cursor, conta, inicio=None, fim=None, saldo_final=None):
+    """Gera o extrato em OFX 2 (XML)
+
+    `saldo_final` é o saldo ao fim do período; sem ele vale o saldo atual.
+    """
+    agora = datetime.now().strftime('%Y%m%d%H%M%S')
+    if saldo_final is None:
+        saldo_final, data_saldo = conta['saldo_centavos'], agora
+    else:
+        data_saldo = _data_ofx(fim) + '235959' if fim else agora
+    yield (
+        '<?xml version="1.0" encoding="UTF-8"?>\n'
+        '<?OFX OFXHEADER="200" VERSION="220" SECURITY="NONE" OLDFILEUID="NONE" NEWFILEUID="NONE"?>\n'
+        '<OFX><BANKMSGSRSV1><STMTTRNRS><TRNUID>0</TRNUID>'
+        '<STATUS><CODE>0</CODE><SEVERITY>INFO</SEVERITY></STATUS>'
+        '<STMTRS><CURDEF>BRL</CURDEF>'
+        f'<BANKACCTFROM><BANKID>0001</BANKID><ACCTID>{conta["id"]}</ACCTID>'
+        f'<ACCTTYPE>{"SAVINGS" if conta["tipo"] == "poupanca" else "CHECKING"}</ACCTTYPE></BANKACCTFROM>'
+        '<BANKTRANLIST>'
+        f'<DTSTART>{_data_ofx(inicio) if inicio else "19700101"}</DTSTART>'
+        f'<DTEND>{_data_ofx(fim) if fim else agora}</DTEND>\n'
+    )
+    for linhas in _lotes(cursor):
+        yield ''.join(
+            '<STMTTRN>'
+            f'<TRNTYPE>{"DEBIT" if t["tipo"] in TIPOS_DEBITO else "CREDIT"}</TRNTYPE>'
+            f'<DTPOSTED>{_data_ofx(t["data"])}</DTPOSTED>'
+            f'<TRNAMT>{formatar(_centavos_com_sinal(t))}</TRNAMT>'
+            f'<FITID>{t["id"]}</FITID>'
+            f'<MEMO>{escape(t["descricao"] or "")}</MEMO>'
+            '</STMTTRN>\n' for t in linhas)
+    yield (
+        '</BANKTRANLIST>'
+        f'<LEDGERBAL><BALAMT>{formatar(saldo_final)}</BALAMT><DTASOF>{data_saldo}</DTASOF></LEDGERBAL>'
+        '</STMTRS></STMTTRNRS></BANKMSGSRSV1></OFX>\n'
+    )
@@ -0,0 +1,165 @@
+"""
+Gerador de dados sintéticos em volume (usuários, contas e transações)
+
+Para medir qualquer coisa em escala o banco precisa de milhões de linhas
+com a forma dos dados reais: poucas contas concentram a maior parte do
+movimento. O número de transações de cada conta segue pesos de Pareto
+(`cauda`: quanto menor, mais pesada a cauda), os valores seguem uma
+lognormal e as datas se espalham pelos `dias` anteriores a `ate`.
+
+A carga é feita num banco novo, do jeito mais barato para o SQLite:
+- as migrações que só criam índices (ONLINE) ficam para depois da carga,
+  que então grava só as tabelas, com ids explícitos e em ordem;
+- os gatilhos são retirados durante a carga e recriados no fim: o gerador
+  já calcula o que eles manteriam (saldo, lancamentos, ultima_transacao_id,
+  saldo_apos_centavos, os checkpoints de saldo do ledger e o resumo mensal);
+- `executemany` em lotes de `lote` linhas, um COMMIT por lote, com o
+  journal em memória e sem fsync.
+
+Com a mesma `semente` e o mesmo `ate` o conteúdo gerado é idêntico (menos
+o sal do hash de senha, calculado uma vez e repetido para todos).
+Transferências não são geradas: só depósitos e saques.
+"""
+
+import random
+from datetime import datetime, timedelta, timezone
+
+import migracoes
+from ledger import INTERVALO_CHECKPOINT
+
+# Linhas gravadas por transação (COMMIT)
+TAMANHO_LOTE = 50000
+
+# Fração dos lançamentos que tenta ser saque (vira depósito sem saldo)
+FRACAO_SAQUE = 0.4
+
+# Valores em centavos: lognormal com mediana ~R$ 49
+VALOR_MU = 8.5
+VALOR_SIGMA = 1.2
+
+TIPOS_CONTA = ('corrente', 'poupanca')
+
+_FORMATO_DATA = '%Y-%m-%d %H:%M:%S'
+
+
+def distribuir(total, pesos, sorteio):
+    """Divide `total` em inteiros proporcionais a `pesos` (soma exata)"""
+    soma = sum(pesos)
+    partes = [int(total * peso / soma) for peso in pesos]
+    resto = total - sum(partes)
+    if resto:
+        for indice in sorteio.choices(range(len(pesos)), pesos, k=resto):
+            partes[indice] += 1
+    return partes
+
+
+class _Carga:
+    """Acumula linhas por tabela e grava cada lote numa transação"""
+
+    SQL = {
+        'usuario': 'INSERT INTO usuario (id, nome, email, senha, data_criacao) VALUES (?, ?, ?, ?, ?)',
+        'conta': '''INSERT INTO conta (id, tipo, usuario_id, saldo, saldo_centavos, lancamentos,
+                                       ultima_transacao_id) VALUES (?, ?, ?, ?, ?, ?, ?)''',
+        'transacao': '''INSERT INTO transacao (id, tipo, valor, valor_centavos, descricao, data, conta_id,
+                                               saldo_apos_centavos) VALUES (?, ?, ?, ?, ?, ?, ?, ?)''',
+        'saldo_checkpoint': '''INSERT INTO saldo_checkpoint (conta_id, transacao_id, data, saldo_centavos)
+                               VALUES (?, ?, ?, ?)''',
+        'resumo_mensal': '''INSERT INTO resumo_mensal (conta_id, mes, tipo, quantidade, total_centavos)
+                            VALUES (?, ?, ?, ?, ?)''',
+    }
+
+    def __init__(self, db, tamanho, progresso):
+        self.db = db
+        self.tamanho = tamanho
+        self.progresso = progresso
+        self.linhas = {tabela: [] for tabela in self.SQL}
+        self.gravadas = dict.fromkeys(self.SQL, 0)
+
+    def adicionar(self, tabela, linha):
+        self.linhas[tabela].append(linha)
+        if len(self.linhas[tabela]) >= self.tamanho:
+            self.gravar()
+
+    def gravar(self):
+        with self.db:
+            for tabela, linhas in self.linhas.items():
+                if linhas:
+                    self.db.executemany(self.SQL[tabela], linhas)
+                    self.gravadas[tabela] += len(linhas)
+                    linhas.clear()
+        if self.progresso:
+            self.progresso(dict(self.gravadas))
+
+
+def gerar(db, usuarios, contas_por_usuario=2, transacoes=0, cauda=1.2, dias=365, ate=None,
+          semente=42, senha_hash='x', lote=TAMANHO_LOTE, progresso=None):
+    """Cria o esquema e carrega os dados sintéticos num banco vazio
+
+    `contas_por_usuario` é a média (cada usuário tem de 1 a 2x-1 contas);
+    `transacoes` é o total, repartido entre as contas pela cauda de Pareto.
+    `progresso(gravadas)` recebe as linhas gravadas por tabela a cada lote.
+    Devolve as linhas gravadas por tabela.
+    """
+    sorteio = random.Random(semente)
+    ate = ate or datetime.now(timezone.utc).replace(tzinfo=None)
+    inicio = ate - timedelta(days=dias)
+    janela = (ate - inicio).total_seconds()
+
+    # Esquema sem os índices ONLINE, que são criados depois da carga
+    migracoes.migrar(db, incluir_online=False)
+    if db.execute('SELECT EXISTS (SELECT 1 FROM usuario)').fetchone()[0]:
+        raise ValueError('o banco já tem usuários: o gerador só carrega um banco novo')
+    gatilhos = db.execute("SELECT name, sql FROM sqlite_master WHERE type = 'trigger'").fetchall()
+    for nome, _ in gatilhos:
+        db.execute(f'DROP TRIGGER {nome}')
+    db.execute('PRAGMA journal_mode = MEMORY')
+    db.execute('PRAGMA synchronous = OFF')
+    db.commit()
+
+    contas_do_usuario = [sorteio.randint(1, max(1, 2 * contas_por_usuario - 1)) for _ in range(usuarios)]
+    total_contas = sum(contas_do_usuario)
+    pesos = [sorteio.paretovariate(cauda) for _ in range(total_contas)]
+    por_conta = distribuir(transacoes, pesos, sorteio) if total_contas else []
+    del pesos
+
+    carga = _Carga(db, lote, progresso)
+    criado_em = inicio.strftime(_FORMATO_DATA)
+    conta_id = 0
+    transacao_id = 0
+    for usuario_id, quantidade in enumerate(contas_do_usuario, start=1):
+        carga.adicionar('usuario', (usuario_id, f'Usuário {usuario_id}', f'usuario{usuario_id}@exemplo.com',
+                                    senha_hash, criado_em))
+        for _ in range(quantidade):
+            conta_id += 1
+            n = por_conta[conta_id - 1]
+            saldo = 0
+            resumo = {}
+            for numero, fracao in enumerate(sorted(sorteio.random() for _ in range(n)), start=1):
+                transacao_id += 1
+                centavos = max(1, int(sorteio.lognormvariate(VALOR_MU, VALOR_SIGMA)))
+                if sorteio.random() < FRACAO_SAQUE and centavos <= saldo:
+                    tipo, descricao = 'saque', 'Saque'
+                    saldo -= centavos
+                else:
+                    tipo, descricao = 'deposito', 'Depósito'
+                    saldo += centavos
+                data = (inicio + timedelta(seconds=int(fracao * janela))).strftime(_FORMATO_DATA)
+                carga.adicionar('transacao', (transacao_id, tipo, centavos / 100, centavos, descricao, data,
+                                              conta_id, saldo))
+                if numero % INTERVALO_CHECKPOINT == 0:
+                    carga.adicionar('saldo_checkpoint', (conta_id, transacao_id, data, saldo))
+                quantidade_mes, total_mes = resumo.get((data[:7], tipo), (0, 0))
+                resumo[data[:7], tipo] = (quantidade_mes + 1, total_mes + centavos)
+            for (mes, tipo), (quantidade_mes, total_mes) in sorted(resumo.items()):
+                carga.adicionar('resumo_mensal', (conta_id, mes, tipo, quantidade_mes, total_mes))
+            carga.adicionar('conta', (conta_id, sorteio.choice(TIPOS_CONTA), usuario_id, saldo / 100, saldo, n,
+                                      transacao_id if n else 0))
+    carga.gravar()
+
+    # Gatilhos e índices voltam só depois da carga
+    with db:
+        for _, sql in gatilhos:
+            db.execute(sql)
+    migracoes.migrar(db, somente_online=True)
+    db.execute('PRAGMA journal_mode = WAL')
+    return carga.gravadas
@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+Script para popular um banco novo com dados sintéticos em volume
+Execute: python gerar_dados.py dados.db --usuarios 100000 --transacoes 10000000
+         [--contas-por-usuario 2] [--cauda 1.2] [--dias 365] [--ate 2024-12-31]
+         [--semente 42] [--lote 50000] [--senha segredo]
+
+Todos os usuários (usuario<N>@exemplo.com) entram com a mesma senha. Com a
+mesma --semente e a mesma --ate o conteúdo gerado é o mesmo.
+"""
+
+import argparse
+import os
+import sys
+import time
+from datetime import datetime
+
+import database
+import gerador
+import senhas
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Popula um banco novo com dados sintéticos')
+    parser.add_argument('banco')
+    parser.add_argument('--usuarios', type=int, default=1000)
+    parser.add_argument('--contas-por-usuario', type=int, default=2, help='média por usuário')
+    parser.add_argument('--transacoes', type=int, default=100000, help='total, repartido entre as contas')
+    parser.add_argument('--cauda', type=float, default=1.2,
+                        help='alfa de Pareto das transações por conta (menor = cauda mais pesada)')
+    parser.add_argument('--dias', type=int, default=365, help='período coberto pelas transações')
+    parser.add_argument('--ate', type=lambda texto: datetime.strptime(texto, '%Y-%m-%d'),
+                        help='fim do período (AAAA-MM-DD; padrão: agora)')
+    parser.add_argument('--semente', type=int, default=42)
+    parser.add_argument('--lote', type=int, default=gerador.TAMANHO_LOTE)
+    parser.add_argument('--senha', default='segredo')
+    parser.add_argument('--metodo', default=senhas.METODO_PADRAO, help='hash da senha')
+    args = parser.parse_args()
+
+    if os.path.exists(args.banco):
+        print(f"❌ {args.banco} já existe: o gerador só carrega um banco novo")
+        return 1
+
+    print(f"🌱 Gerando {args.usuarios} usuários e {args.transacoes} transações em {args.banco} "
+          f"(semente {args.semente})")
+    inicio = time.perf_counter()
+
+    def progresso(gravadas):
+        decorrido = time.perf_counter() - inicio
+        print(f"   {gravadas['transacao']:>12,} transações | {gravadas['conta']:>10,} contas | "
+              f"{gravadas['transacao'] / max(decorrido, 1e-9):>10,.0f}/s", end='\r')
+
+    db = database.conectar(args.banco)
+    try:
+        gravadas = gerador.gerar(db, args.usuarios, args.contas_por_usuario, args.transacoes, args.cauda,
+                                 args.dias, args.ate, args.semente, senhas.gerar(args.senha, args.metodo),
+                                 args.lote, progresso)
+    except Exception as e:
+        print(f"\n❌ Erro na geração: {e}")
+        print(f"Tipo do erro: {type(e).__name__}")
+        return 1
+    finally:
+        db.close()
+
+    print(f"\n✅ {gravadas['usuario']} usuários, {gravadas['conta']} contas, {gravadas['transacao']} transações "
+          f"e {gravadas['saldo_checkpoint']} checkpoints em {time.perf_counter() - inicio:.1f}s")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
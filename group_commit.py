@@ -0,0 +1,143 @@
+"""
+Group commit: agrupa lançamentos de várias threads num único COMMIT
+
+Com `GROUP_COMMIT` ligado, as threads de um worker não abrem transação
+própria: entregam o lançamento a uma thread escritora, que junta o que
+chegar em até `intervalo_ms` (ou `maximo_itens` lançamentos) e grava tudo
+numa transação só, pagando um fsync por grupo em vez de um por requisição.
+Cada lançamento roda dentro de um SAVEPOINT, então a recusa de um (saldo
+insuficiente, conta inexistente) não afeta os outros, e quem submeteu só
+recebe o resultado depois que o COMMIT do grupo terminou.
+
+Só faz diferença quando há várias threads por worker (gthread).
+
+A thread escritora só conta como iniciada depois de abrir a conexão (um
+erro ali chega a quem submeteu) e, se morrer, o próximo `submeter()` sobe
+outra. Quem submete espera no máximo `timeout` segundos pelo resultado.
+"""
+
+import os
+import queue
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FuturoTimeout
+
+from database import conectar
+
+
+class GroupCommit:
+    """Fila de lançamentos com uma thread escritora por processo"""
+
+    def __init__(self, caminho, pragmas=None, intervalo_ms=2, maximo_itens=64, timeout=10.0):
+        self.caminho = caminho
+        self.pragmas = pragmas
+        self.intervalo = intervalo_ms / 1000
+        self.maximo_itens = maximo_itens
+        self.timeout = timeout
+        self._fila = queue.Queue()
+        self._trava = threading.Lock()
+        self._escritor = None
+        self._pid = None
+
+    def _vivo(self):
+        # A thread escritora não sobrevive ao fork: cada worker sobe a sua
+        return self._pid == os.getpid() and self._escritor.is_alive()
+
+    def _garantir_escritor(self):
+        if self._vivo():
+            return
+        with self._trava:
+            if self._vivo():
+                return
+            fila, pronto = queue.Queue(), Future()
+            escritor = threading.Thread(target=self._executar, args=(fila, pronto),
+                                        name='group-commit', daemon=True)
+            escritor.start()
+            # Levanta o erro de conectar(); só então o escritor passa a valer
+            try:
+                pronto.result(self.timeout)
+            except FuturoTimeout:
+                raise sqlite3.OperationalError(f'group commit: conexão não abriu em {self.timeout} s') from None
+            self._fila, self._escritor, self._pid = fila, escritor, os.getpid()
+
+    def submeter(self, funcao, *args, **kwargs):
+        """Executa `funcao(db, *args, **kwargs)` no próximo grupo e devolve o resultado
+
+        Exceções levantadas pela função são repassadas a quem submeteu. Sem
+        resposta em `timeout` segundos levanta sqlite3.OperationalError; o
+        lançamento ainda pode ser gravado depois (reenvie com a mesma
+        chave de idempotência).
+        """
+        self._garantir_escritor()
+        futuro = Future()
+        self._fila.put((funcao, args, kwargs, futuro))
+        try:
+            return futuro.result(self.timeout)
+        except FuturoTimeout:
+            raise sqlite3.OperationalError(f'group commit sem resposta em {self.timeout} s') from None
+
+    def _executar(self, fila, pronto):
+        try:
+            db = conectar(self.caminho, self.pragmas)
+        except BaseException as e:
+            pronto.set_exception(e)
+            return
+        pronto.set_result(None)
+
+        grupo = []
+        try:
+            while True:
+                grupo = [fila.get()]
+                prazo = time.monotonic() + self.intervalo
+                while len(grupo) < self.maximo_itens:
+                    restante = prazo - time.monotonic()
+                    if restante <= 0:
+                        break
+                    try:
+                        grupo.append(fila.get(timeout=restante))
+                    except queue.Empty:
+                        break
+                self._gravar(db, grupo)
+                grupo = []
+        except BaseException as e:
+            # Erro fora do que _gravar trata: a thread morre e o próximo submeter() sobe outra.
+            # Quem está no grupo ou na fila recebe o erro em vez de esperar o timeout
+            while True:
+                try:
+                    grupo.append(fila.get_nowait())
+                except queue.Empty:
+                    break
+            for _, _, _, futuro in grupo:
+                if not futuro.done():
+                    futuro.set_exception(e)
+            raise
+        finally:
+            db.close()
+
+    def _gravar(self, db, grupo):
+        resultados = []
+        try:
+            db.execute('BEGIN IMMEDIATE')
+            for funcao, args, kwargs, futuro in grupo:
+                db.execute('SAVEPOINT lancamento')
+                try:
+                    resultados.append((futuro, funcao(db, *args, **kwargs), None))
+                except Exception as e:
+                    db.execute('ROLLBACK TO lancamento')
+                    resultados.append((futuro, None, e))
+                db.execute('RELEASE lancamento')
+            db.commit()
+        except Exception as e:
+            # Falha do grupo inteiro (lock, disco): ninguém foi gravado
+            if db.in_transaction:
+                db.rollback()
+            for _, _, _, futuro in grupo:
+                futuro.set_exception(e)
+            return
+
+        for futuro, resultado, erro in resultados:
+            if erro is None:
+                futuro.set_result(resultado)
+            else:
+                futuro.set_exception(erro)
@@ -1,11 +1,30 @@
 # Configuração do Gunicorn para deploy no Render
+import os
+
 bind = "0.0.0.0:10000"
 workers = 2
-worker_class = "sync"
+# Threads por worker: a espera pelo pool de senhas e pelo GROUP_COMMIT não prende o worker inteiro.
+# Precisam passar de SENHA_FILA_MAXIMA (padrão 8): acima da fila o login responde 503 na hora e as
+# threads restantes seguem atendendo as outras rotas. Com "sync" (1 requisição por worker) a fila
+# nunca enche e uma rajada de logins ocupa todos os workers
+worker_class = "gthread"
+threads = int(os.environ.get("GUNICORN_THREADS", 12))
 worker_connections = 1000
 timeout = 30
 keepalive = 2
 max_requests = 1000
 max_requests_jitter = 50
 preload_app = True
-reload = False 
\ No newline at end of file
+reload = False 
+
+def on_starting(server):
+    # Métricas começam do zero a cada subida do mestre
+    from app import metricas_app
+    metricas_app.limpar()
+
+def worker_exit(server, worker):
+    # Encerra o pool de hash de senhas criado pelo worker
+    from app import metricas_app, pool_senhas
+    pool_senhas.encerrar()
+    # Passa as métricas do worker para o acumulado antes que o arquivo dele suma
+    metricas_app.consolidar()
@@ -0,0 +1,128 @@
+"""
+Idempotência de lançamentos (cabeçalho Idempotency-Key)
+
+Um cliente que perde a resposta de um depósito ou saque e reenvia o POST
+não pode lançar o dinheiro duas vezes. Com uma chave de idempotência o
+resultado do lançamento (id da transação ou o erro do ledger) é gravado em
+`idempotencia` na mesma transação de escrita do lançamento: ou os dois
+ficam gravados, ou nenhum. Um reenvio com a mesma chave encontra o registro
+pela chave única (usuario_id, chave) e devolve o resultado original sem
+mexer em saldo; com a mesma chave e outro pedido (conta, tipo ou valor
+diferentes, comparados pela impressão) é recusado.
+
+A resposta guarda também a tabela do id devolvido (`transacao` ou
+`transferencia`): ids de transação são locais ao shard, e a mudança de
+shard (shards.mover_usuario) usa a tabela para trocar o id gravado pelo
+id novo com `renumerar()`.
+
+Chaves valem por `ttl` segundos. A cada `intervalo` registros novos um lote
+de até `lote` chaves vencidas é apagado pelo índice de `criado_em`, dentro
+da mesma transação, e a tabela não cresce sem limite.
+"""
+
+import hashlib
+import json
+
+import ledger
+
+# Tamanho máximo aceito para a chave enviada pelo cliente
+TAMANHO_MAXIMO = 255
+
+
+class ChaveInvalida(ValueError):
+    """Chave vazia ou longa demais"""
+
+
+class ChaveReutilizada(Exception):
+    """A chave já foi usada num pedido diferente"""
+
+
+def impressao(*partes):
+    """Resumo do pedido (tipo, conta, valor...) guardado junto com a chave"""
+    return hashlib.sha256(json.dumps(partes).encode()).hexdigest()
+
+
+def reproduzir(resposta):
+    """Converte a resposta gravada no resultado do lançamento
+
+    Devolve o id da transação ou levanta de novo o erro do ledger original.
+    """
+    if 'erro' in resposta:
+        erro = getattr(ledger, resposta['erro'], None)
+        if isinstance(erro, type) and issubclass(erro, ledger.ErroLancamento):
+            raise erro(*resposta.get('args', []))
+        raise ledger.ErroLancamento(resposta['erro'])
+    return resposta['resultado']
+
+
+def renumerar(resposta, ids):
+    """A resposta gravada (JSON) com o resultado trocado pelo id novo
+
+    `ids` mapeia tabela -> {id antigo: id novo}. Respostas de erro não
+    mudam. Um resultado sem tabela (gravado antes dela existir) vira None:
+    o reenvio continua reconhecido, só sem o id.
+    """
+    dados = json.loads(resposta)
+    if dados.get('resultado') is None:
+        return resposta
+    tabela = dados.get('tabela')
+    dados['resultado'] = ids[tabela][dados['resultado']] if tabela in ids else None
+    return json.dumps(dados)
+
+
+class Idempotencia:
+    def __init__(self, ttl=24 * 3600, lote=500, intervalo=100):
+        self.ttl = ttl
+        self.lote = lote
+        self.intervalo = intervalo
+
+    def _limite(self):
+        return f'-{int(self.ttl)} seconds'
+
+    def aplicar(self, db, dono_id, chave, impressao, funcao, *args, tabela=None, **kwargs):
+        """Executa `funcao(db, ...)` uma vez por chave, dentro da transação já aberta
+
+        As chaves são por usuário (`dono_id`). `tabela` é onde mora o id
+        que `funcao` devolve. Devolve a resposta gravada (a original, num
+        reenvio), para `reproduzir()`.
+        Erros do ledger não escapam daqui: são gravados como resposta, para
+        que a transação (e o registro da chave) seja confirmada.
+        """
+        if not chave or len(chave) > TAMANHO_MAXIMO:
+            raise ChaveInvalida(chave)
+
+        linha = db.execute('''
+            SELECT impressao, resposta FROM idempotencia
+            WHERE usuario_id = ? AND chave = ? AND criado_em >= datetime('now', ?)
+        ''', (dono_id, chave, self._limite())).fetchone()
+        if linha:
+            if linha[0] != impressao:
+                raise ChaveReutilizada(chave)
+            return json.loads(linha[1])
+
+        # Um erro no meio do lançamento (ex.: destino inexistente) desfaz o que já foi escrito
+        db.execute('SAVEPOINT idempotencia')
+        try:
+            resposta = {'resultado': funcao(db, *args, **kwargs), 'tabela': tabela}
+        except ledger.ErroLancamento as e:
+            db.execute('ROLLBACK TO idempotencia')
+            resposta = {'erro': type(e).__name__, 'args': list(e.args)}
+        db.execute('RELEASE idempotencia')
+
+        # REPLACE: uma chave vencida ainda não expurgada é reaproveitada
+        cursor = db.execute('''
+            INSERT OR REPLACE INTO idempotencia (usuario_id, chave, impressao, resposta)
+            VALUES (?, ?, ?, ?)
+        ''', (dono_id, chave, impressao, json.dumps(resposta)))
+        if cursor.lastrowid % self.intervalo == 0:
+            self.expurgar(db)
+        return resposta
+
+    def expurgar(self, db):
+        """Apaga um lote de chaves vencidas; devolve quantas"""
+        return db.execute('''
+            DELETE FROM idempotencia WHERE id IN (
+                SELECT id FROM idempotencia WHERE criado_em < datetime('now', ?)
+                ORDER BY criado_em LIMIT ?
+            )
+        ''', (self._limite(), self.lote)).rowcount
@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+Script para importar créditos em lote (CSV ou JSON Lines)
+Execute: python importar_lote.py arquivo.csv [--formato ndjson] [--banco banco.db] [--lote 5000]
+
+O CSV precisa do cabeçalho conta_id,valor,descricao; no JSON Lines cada
+linha é um objeto com as mesmas chaves. Com SHARDS (e sem --banco) cada
+linha vai para o shard do dono da conta, achado pelo diretório, como na
+rota /lancamentos/lote.
+"""
+
+import argparse
+import sys
+import time
+
+import database
+import ingestao
+import shards
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Importa créditos em lote')
+    parser.add_argument('arquivo')
+    parser.add_argument('--formato', choices=sorted(ingestao.LEITORES))
+    parser.add_argument('--banco', help='banco único (padrão: os SHARDS ou DATABASE_PATH)')
+    parser.add_argument('--shards', default=','.join(shards.SHARDS), help='arquivos separados por vírgula')
+    parser.add_argument('--diretorio', default=shards.DIRETORIO)
+    parser.add_argument('--lote', type=int, default=ingestao.TAMANHO_LOTE)
+    args = parser.parse_args(argv)
+
+    formato = args.formato or ('ndjson' if args.arquivo.endswith(('.ndjson', '.jsonl')) else 'csv')
+    caminhos = [] if args.banco else [caminho for caminho in args.shards.split(',') if caminho]
+    if caminhos:
+        print(f"📥 Importando {args.arquivo} ({formato}) em {len(caminhos)} shards (diretório {args.diretorio})")
+        diretorio = database.conectar(args.diretorio)
+        conexoes = [database.conectar(caminho) for caminho in caminhos]
+        db, roteador = None, shards.roteador(diretorio, conexoes)
+    else:
+        args.banco = args.banco or database.DATABASE
+        print(f"📥 Importando {args.arquivo} ({formato}) em {args.banco}")
+        diretorio, conexoes = None, [database.conectar(args.banco)]
+        db, roteador = conexoes[0], None
+
+    inicio = time.perf_counter()
+    try:
+        with open(args.arquivo, 'rb') as arquivo:
+            relatorio = ingestao.importar(db, ingestao.abrir_texto(arquivo), formato, args.lote, roteador)
+    except Exception as e:
+        print(f"❌ Erro na importação: {e}")
+        print(f"Tipo do erro: {type(e).__name__}")
+        return 1
+    finally:
+        for conexao in (diretorio, *conexoes):
+            if conexao is not None:
+                conexao.close()
+    duracao = time.perf_counter() - inicio
+
+    print(f"✅ {relatorio['importadas']} de {relatorio['processadas']} linhas importadas "
+          f"em {duracao:.2f}s (R$ {relatorio['total']})")
+    if relatorio['quantidade_erros']:
+        print(f"⚠️ {relatorio['quantidade_erros']} linhas com erro:")
+        for erro in relatorio['erros'][:20]:
+            print(f"   - linha {erro['linha']}: {erro['erro']}")
+        if relatorio['quantidade_erros'] > 20:
+            print("   ...")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,175 @@
+"""
+Importação em lote de créditos (folha de pagamento, repasses de lojistas)
+
+O arquivo (CSV com cabeçalho `conta_id,valor,descricao` ou JSON Lines com
+as mesmas chaves) é lido e validado em uma única passada. As linhas válidas
+são agrupadas em lotes; cada lote vira uma transação de escrita com um
+`executemany` para os INSERTs em `transacao` e um UPDATE por conta com a
+soma dos créditos daquela conta no lote. Linhas com erro entram no
+relatório e não interrompem a importação.
+"""
+
+import csv
+import io
+import json
+from decimal import Decimal
+
+import dinheiro
+from ledger import INTERVALO_CHECKPOINT, registrar_checkpoint
+
+# Linhas válidas gravadas por transação
+TAMANHO_LOTE = 5000
+
+# Erros detalhados no relatório (os demais só entram na contagem)
+MAXIMO_ERROS_RELATORIO = 1000
+
+DESCRICAO_PADRAO = 'Crédito em lote'
+
+
+def ler_csv(arquivo):
+    """Percorre um CSV com cabeçalho, devolvendo (registro, erro de leitura)"""
+    for registro in csv.DictReader(arquivo):
+        yield registro, None
+
+
+def ler_ndjson(arquivo):
+    """Percorre um arquivo JSON Lines, devolvendo (registro, erro de leitura)"""
+    for linha in arquivo:
+        if not linha.strip():
+            continue
+        try:
+            # Decimal evita que '0.1' vire float antes de chegar aos centavos
+            registro = json.loads(linha, parse_float=Decimal)
+        except ValueError:
+            yield None, 'JSON inválido'
+            continue
+        if not isinstance(registro, dict):
+            yield None, 'Linha deve ser um objeto JSON'
+            continue
+        yield registro, None
+
+
+LEITORES = {'csv': ler_csv, 'ndjson': ler_ndjson}
+
+
+def abrir_texto(fluxo_binario):
+    """Adapta um fluxo binário (upload, arquivo) para leitura de texto UTF-8"""
+    return io.TextIOWrapper(fluxo_binario, encoding='utf-8-sig', newline='')
+
+
+def validar(registro):
+    """Converte um registro em (conta_id, centavos, descricao) ou levanta ValueError"""
+    try:
+        conta_id = int(registro.get('conta_id'))
+    except (TypeError, ValueError):
+        raise ValueError('conta_id inválido') from None
+    try:
+        centavos = dinheiro.centavos(registro.get('valor'))
+    except ValueError:
+        raise ValueError('valor inválido') from None
+    if conta_id <= 0:
+        raise ValueError('conta_id inválido')
+    if centavos <= 0:
+        raise ValueError('valor deve ser maior que zero')
+    descricao = (registro.get('descricao') or DESCRICAO_PADRAO).strip()[:200]
+    return conta_id, centavos, descricao
+
+
+def _gravar_lote(db, lote, relatorio):
+    """Grava um lote de (linha, conta_id, centavos, descricao) numa transação"""
+    contas = {conta_id for _, conta_id, _, _ in lote}
+    db.execute('BEGIN IMMEDIATE')
+    try:
+        marcadores = ','.join('?' * len(contas))
+        # Saldo e contador de lançamentos atuais: o saldo após cada linha é
+        # calculado aqui, na ordem do arquivo (que é a ordem dos ids)
+        atuais = {linha[0]: (linha[1], linha[2]) for linha in db.execute(
+            f'SELECT id, saldo_centavos, lancamentos FROM conta WHERE id IN ({marcadores})', list(contas))}
+
+        validas, saldos, deltas, quantidades = [], {}, {}, {}
+        for numero, conta_id, centavos, descricao in lote:
+            if conta_id not in atuais:
+                _registrar_erro(relatorio, numero, 'conta não encontrada')
+                continue
+            saldos[conta_id] = saldos.get(conta_id, atuais[conta_id][0]) + centavos
+            validas.append(('deposito', centavos, centavos / 100, descricao, conta_id, saldos[conta_id]))
+            deltas[conta_id] = deltas.get(conta_id, 0) + centavos
+            quantidades[conta_id] = quantidades.get(conta_id, 0) + 1
+
+        db.executemany('''
+            INSERT INTO transacao (tipo, valor_centavos, valor, descricao, conta_id, saldo_apos_centavos)
+            VALUES (?, ?, ?, ?, ?, ?)
+        ''', validas)
+        db.executemany('''
+            UPDATE conta SET saldo_centavos = saldo_centavos + ?, saldo = (saldo_centavos + ?) / 100.0,
+                             lancamentos = lancamentos + ?
+            WHERE id = ?
+        ''', [(delta, delta, quantidades[conta_id], conta_id) for conta_id, delta in sorted(deltas.items())])
+
+        # Um checkpoint por conta que cruzou um múltiplo do intervalo neste lote
+        for conta_id, quantidade in quantidades.items():
+            anteriores = atuais[conta_id][1]
+            if (anteriores + quantidade) // INTERVALO_CHECKPOINT > anteriores // INTERVALO_CHECKPOINT:
+                registrar_checkpoint(db, conta_id)
+    except BaseException:
+        db.rollback()
+        raise
+    db.commit()
+
+    relatorio['importadas'] += len(validas)
+    relatorio['total_centavos'] += sum(deltas.values())
+
+
+def _registrar_erro(relatorio, numero, mensagem):
+    relatorio['quantidade_erros'] += 1
+    if len(relatorio['erros']) < MAXIMO_ERROS_RELATORIO:
+        relatorio['erros'].append({'linha': numero, 'erro': mensagem})
+
+
+def _gravar(db, lote, relatorio, roteador):
+    """Grava o lote no banco ou, com `roteador`, em cada shard (uma transação por shard)"""
+    if roteador is None:
+        _gravar_lote(db, lote, relatorio)
+        return
+    por_banco, conexoes = {}, {}
+    for item in lote:
+        conta_id = item[1]
+        if conta_id not in conexoes:
+            conexoes[conta_id] = roteador(conta_id)
+        if conexoes[conta_id] is None:
+            _registrar_erro(relatorio, item[0], 'conta não encontrada')
+            continue
+        por_banco.setdefault(id(conexoes[conta_id]), (conexoes[conta_id], []))[1].append(item)
+    for destino, itens in por_banco.values():
+        _gravar_lote(destino, itens, relatorio)
+
+
+def importar(db, arquivo, formato='csv', tamanho_lote=TAMANHO_LOTE, roteador=None):
+    """Valida e grava os créditos do arquivo; devolve o relatório da importação
+
+    Com shards, `roteador(conta_id)` devolve a conexão do shard da conta (ou
+    None se ela não existe) e `db` não é usado.
+    """
+    relatorio = {'processadas': 0, 'importadas': 0, 'total_centavos': 0,
+                 'quantidade_erros': 0, 'erros': []}
+    lote = []
+
+    for numero, (registro, erro) in enumerate(LEITORES[formato](arquivo), start=1):
+        relatorio['processadas'] += 1
+        if erro is None:
+            try:
+                lote.append((numero, *validar(registro)))
+            except ValueError as e:
+                erro = str(e)
+        if erro is not None:
+            _registrar_erro(relatorio, numero, erro)
+
+        if len(lote) >= tamanho_lote:
+            _gravar(db, lote, relatorio, roteador)
+            lote = []
+
+    if lote:
+        _gravar(db, lote, relatorio, roteador)
+
+    relatorio['total'] = dinheiro.formatar(relatorio['total_centavos'])
+    return relatorio
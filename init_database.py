@@ -7,6 +7,8 @@ Execute: python init_database.py
 import sqlite3
 import os
 
+import migracoes
+
 def init_database():
     """Inicializa o banco de dados SQLite"""
     database_file = 'banco.db'
@@ -20,35 +22,9 @@ def init_database():
         
         print("✅ Conexão com banco estabelecida")
         
-        # Cria as tabelas
-        db.executescript('''
-            CREATE TABLE IF NOT EXISTS usuario (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                nome TEXT NOT NULL,
-                email TEXT UNIQUE NOT NULL,
-                senha TEXT NOT NULL,
-                saldo REAL DEFAULT 0.0,
-                data_criacao TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            );
-            
-            CREATE TABLE IF NOT EXISTS conta (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                tipo TEXT NOT NULL,
-                saldo REAL DEFAULT 0.0,
-                usuario_id INTEGER NOT NULL,
-                FOREIGN KEY (usuario_id) REFERENCES usuario (id)
-            );
-            
-            CREATE TABLE IF NOT EXISTS transacao (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                tipo TEXT NOT NULL,
-                valor REAL NOT NULL,
-                descricao TEXT,
-                data TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                conta_id INTEGER NOT NULL,
-                FOREIGN KEY (conta_id) REFERENCES conta (id)
-            );
-        ''')
+        # Cria/atualiza as tabelas pelas migrações (esquema único em migracoes/)
+        aplicadas = migracoes.migrar(db)
+        print(f"✅ {len(aplicadas)} migrações aplicadas")
         
         print("✅ Tabelas criadas com sucesso")
         
@@ -0,0 +1,194 @@
+"""
+Lançamentos no razão: movimentação de saldo + registro em `transacao`
+
+Todo lançamento acontece numa única transação `BEGIN IMMEDIATE` na mesma
+conexão: o UPDATE do saldo já verifica dono da conta e saldo suficiente
+(`WHERE ... AND saldo_centavos >= ?`), então não existe janela entre ler o
+saldo e debitar, e dois saques concorrentes não conseguem deixar a conta
+negativa.
+
+Valores são sempre centavos inteiros; as colunas REAL (`saldo`, `valor`)
+são gravadas como espelho para leitores antigos.
+
+Cada transação guarda o saldo resultante (`saldo_apos_centavos`) e, a cada
+`INTERVALO_CHECKPOINT` lançamentos de uma conta, o saldo também vai para
+`saldo_checkpoint`: o saldo em qualquer data sai de uma busca indexada no
+checkpoint anterior mais a soma de no máximo um intervalo de transações.
+"""
+
+# Tipos de transação que saem da conta; os demais entram
+TIPOS_DEBITO = {'saque', 'transferencia_enviada'}
+
+# Lançamentos de uma conta entre dois checkpoints de saldo
+INTERVALO_CHECKPOINT = 100
+
+
+class ErroLancamento(Exception):
+    """Lançamento recusado; nada foi gravado"""
+
+
+class ContaNaoEncontrada(ErroLancamento):
+    """A conta não existe ou não pertence ao usuário"""
+
+
+class ContaDestinoNaoEncontrada(ContaNaoEncontrada):
+    """A conta de destino da transferência não existe"""
+
+
+class SaldoInsuficiente(ErroLancamento):
+    """O débito deixaria a conta com saldo negativo"""
+
+
+class TransferenciaInvalida(ErroLancamento):
+    """Origem e destino da transferência são a mesma conta"""
+
+
+def aplicar_lancamento(db, conta_id, tipo, centavos, descricao, usuario_id=None,
+                       transferencia_id=None):
+    """Movimenta o saldo e registra a transação, sem abrir nem fechar transação
+
+    Com `usuario_id` informado a conta precisa pertencer a esse usuário.
+    Devolve o id da transação criada.
+    """
+    filtro, parametros = 'id = ?', [conta_id]
+    if usuario_id is not None:
+        filtro += ' AND usuario_id = ?'
+        parametros.append(usuario_id)
+
+    if tipo in TIPOS_DEBITO:
+        linhas = db.execute(f'''
+            UPDATE conta SET saldo_centavos = saldo_centavos - ?, saldo = (saldo_centavos - ?) / 100.0,
+                             lancamentos = lancamentos + 1
+            WHERE {filtro} AND saldo_centavos >= ?
+            RETURNING saldo_centavos, lancamentos
+        ''', (centavos, centavos, *parametros, centavos)).fetchall()
+    else:
+        linhas = db.execute(f'''
+            UPDATE conta SET saldo_centavos = saldo_centavos + ?, saldo = (saldo_centavos + ?) / 100.0,
+                             lancamentos = lancamentos + 1
+            WHERE {filtro}
+            RETURNING saldo_centavos, lancamentos
+        ''', (centavos, centavos, *parametros)).fetchall()
+
+    # fetchall() leva o UPDATE ... RETURNING até o fim antes do INSERT
+    if not linhas:
+        # Só paga a consulta extra no caminho de erro
+        if db.execute(f'SELECT 1 FROM conta WHERE {filtro}', parametros).fetchone():
+            raise SaldoInsuficiente(conta_id)
+        raise ContaNaoEncontrada(conta_id)
+    saldo_apos, lancamentos = linhas[0]
+
+    cursor = db.execute('''
+        INSERT INTO transacao (tipo, valor_centavos, valor, descricao, conta_id, transferencia_id,
+                               saldo_apos_centavos)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+    ''', (tipo, centavos, centavos / 100, descricao, conta_id, transferencia_id, saldo_apos))
+    if lancamentos % INTERVALO_CHECKPOINT == 0:
+        registrar_checkpoint(db, conta_id, cursor.lastrowid)
+    return cursor.lastrowid
+
+
+def registrar_checkpoint(db, conta_id, transacao_id=None):
+    """Grava o saldo após a transação (por padrão a mais recente da conta)"""
+    if transacao_id is None:
+        filtro, parametros = 'conta_id = ? ORDER BY data DESC, id DESC LIMIT 1', (conta_id,)
+    else:
+        filtro, parametros = 'id = ?', (transacao_id,)
+    db.execute(f'''
+        INSERT OR IGNORE INTO saldo_checkpoint (conta_id, transacao_id, data, saldo_centavos)
+        SELECT conta_id, id, data, saldo_apos_centavos FROM transacao
+        WHERE saldo_apos_centavos IS NOT NULL AND {filtro}
+    ''', parametros)
+
+
+def checkpoint_anterior(db, conta_id, data):
+    """((data, transacao_id), saldo) do último checkpoint antes de `data`
+
+    Sem checkpoint devolve (('', 0), 0): o saldo parte do zero.
+    """
+    checkpoint = db.execute('''
+        SELECT data, transacao_id, saldo_centavos FROM saldo_checkpoint
+        WHERE conta_id = ? AND data < ?
+        ORDER BY data DESC, transacao_id DESC
+        LIMIT 1
+    ''', (conta_id, data)).fetchone()
+    return (tuple(checkpoint[:2]), checkpoint[2]) if checkpoint else (('', 0), 0)
+
+
+def movimento(db, conta_id, desde, data):
+    """Soma com sinal das transações depois da posição `desde` (data, id) e antes de `data`"""
+    marcadores = ','.join('?' * len(TIPOS_DEBITO))
+    return db.execute(f'''
+        SELECT COALESCE(SUM(CASE WHEN tipo IN ({marcadores}) THEN -valor_centavos
+                                 ELSE valor_centavos END), 0)
+        FROM transacao
+        WHERE conta_id = ? AND (data, id) > (?, ?) AND data < ?
+    ''', (*sorted(TIPOS_DEBITO), conta_id, *desde, data)).fetchone()[0]
+
+
+def saldo_em(db, conta_id, data):
+    """Saldo da conta considerando só as transações anteriores a `data`
+
+    `data` é um texto comparável com `transacao.data` ('AAAA-MM-DD' ou
+    'AAAA-MM-DD HH:MM:SS'). Parte do último checkpoint antes da data e soma
+    apenas as transações posteriores a ele. Com transações arquivadas use
+    `arquivo.saldo_em()`.
+    """
+    desde, saldo = checkpoint_anterior(db, conta_id, data)
+    return saldo + movimento(db, conta_id, desde, data)
+
+
+def em_transacao(db, funcao, *args, **kwargs):
+    """Executa `funcao(db, ...)` numa transação BEGIN IMMEDIATE própria"""
+    db.execute('BEGIN IMMEDIATE')
+    try:
+        resultado = funcao(db, *args, **kwargs)
+    except BaseException:
+        db.rollback()
+        raise
+    db.commit()
+    return resultado
+
+
+def lancar(db, conta_id, tipo, centavos, descricao, usuario_id=None):
+    """Executa um lançamento completo em uma transação de escrita própria"""
+    return em_transacao(db, aplicar_lancamento, conta_id, tipo, centavos, descricao, usuario_id)
+
+
+def aplicar_transferencia(db, origem_id, destino_id, centavos, usuario_id=None):
+    """Registra a transferência e as duas pernas, sem abrir nem fechar transação
+
+    As pernas ficam ligadas pelo id da linha em `transferencia` e as contas
+    são sempre atualizadas em ordem crescente de id.
+    """
+    if origem_id == destino_id:
+        raise TransferenciaInvalida(origem_id)
+
+    cursor = db.execute('''
+        INSERT INTO transferencia (conta_origem_id, conta_destino_id, valor_centavos, valor)
+        VALUES (?, ?, ?, ?)
+    ''', (origem_id, destino_id, centavos, centavos / 100))
+    transferencia_id = cursor.lastrowid
+
+    pernas = [
+        (origem_id, 'transferencia_enviada', f'Transferência para conta {destino_id}', usuario_id),
+        (destino_id, 'transferencia_recebida', f'Transferência da conta {origem_id}', None),
+    ]
+    for conta_id, tipo, descricao, dono in sorted(pernas, key=lambda perna: perna[0]):
+        try:
+            aplicar_lancamento(db, conta_id, tipo, centavos, descricao, dono, transferencia_id)
+        except ContaNaoEncontrada:
+            if conta_id == destino_id:
+                raise ContaDestinoNaoEncontrada(conta_id) from None
+            raise
+    return transferencia_id
+
+
+def transferir(db, origem_id, destino_id, centavos, usuario_id=None):
+    """Debita a origem e credita o destino numa única transação de escrita
+
+    O BEGIN IMMEDIATE pega o lock de escrita antes de qualquer leitura, sem
+    a promoção SHARED -> RESERVED que faz transações concorrentes receberem
+    SQLITE_BUSY sem espera.
+    """
+    return em_transacao(db, aplicar_transferencia, origem_id, destino_id, centavos, usuario_id)
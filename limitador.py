@@ -0,0 +1,142 @@
+"""
+Limitador de tentativas (token bucket) compartilhado entre workers
+
+Protege /login e /registro de força bruta e de enxurradas que só servem
+para gastar CPU com hash de senha: a decisão acontece antes de qualquer
+consulta ao banco ou cálculo de hash.
+
+O estado fica num arquivo mapeado em memória (mmap) ao lado do banco, que
+todos os workers do gunicorn abrem: uma tabela de tamanho fixo com um
+balde por chave (regra + IP ou email), endereçada por hash com sondagem
+linear. Sem espaço, a entrada parada há mais tempo é reaproveitada. Cada
+decisão é um lock (threading + flock), um hash de 8 bytes e alguns
+struct.pack: poucos microssegundos, sem SQL.
+
+O cabeçalho guarda, por regra, quantas tentativas foram aceitas e
+recusadas por todos os workers.
+"""
+
+import fcntl
+import hashlib
+import mmap
+import os
+import struct
+import threading
+import time
+
+ASSINATURA = b'LIMITE01'
+_CABECALHO = struct.Struct('<8sI')
+_CONTADOR = struct.Struct('<QQ')
+_BALDE = struct.Struct('<Qdd')  # chave, fichas, última atualização
+_TAMANHO_CABECALHO = 256
+MAXIMO_REGRAS = (_TAMANHO_CABECALHO - _CABECALHO.size) // _CONTADOR.size
+
+# Baldes consultados a partir da posição da chave antes de reaproveitar um
+SONDAGENS = 8
+
+
+def ler_regra(texto):
+    """'tentativas/segundos' -> (capacidade, fichas por segundo)"""
+    tentativas, _, segundos = texto.partition('/')
+    capacidade, periodo = int(tentativas), float(segundos or 60)
+    if capacidade <= 0 or periodo <= 0:
+        raise ValueError(f'regra inválida: {texto!r}')
+    return capacidade, capacidade / periodo
+
+
+class Limitador:
+    def __init__(self, caminho, regras, baldes=16384, relogio=time.time):
+        """`regras` é um dict nome -> (capacidade, fichas por segundo)"""
+        if len(regras) > MAXIMO_REGRAS:
+            raise ValueError(f'no máximo {MAXIMO_REGRAS} regras')
+        self.caminho = caminho
+        self.regras = dict(regras)
+        self._indices = {nome: i for i, nome in enumerate(self.regras)}
+        self.baldes = baldes
+        self._relogio = relogio
+        self._lock = threading.Lock()
+        self._pid = None
+        self._arquivo = None
+        self._mapa = None
+
+    def _abrir(self):
+        # Um descritor por processo: o flock de um descritor herdado no fork
+        # seria compartilhado com o mestre e com os outros workers
+        if self._pid == os.getpid():
+            return self._mapa
+        tamanho = _TAMANHO_CABECALHO + self.baldes * _BALDE.size
+        arquivo = open(self.caminho, 'a+b')
+        fcntl.flock(arquivo, fcntl.LOCK_EX)
+        try:
+            if os.fstat(arquivo.fileno()).st_size != tamanho:
+                arquivo.truncate(0)
+                arquivo.truncate(tamanho)
+            mapa = mmap.mmap(arquivo.fileno(), tamanho)
+            assinatura, baldes = _CABECALHO.unpack_from(mapa, 0)
+            if assinatura != ASSINATURA or baldes != self.baldes:
+                mapa[:] = bytes(tamanho)
+                _CABECALHO.pack_into(mapa, 0, ASSINATURA, self.baldes)
+        finally:
+            fcntl.flock(arquivo, fcntl.LOCK_UN)
+        self._arquivo, self._mapa, self._pid = arquivo, mapa, os.getpid()
+        return mapa
+
+    def _chave(self, regra, valor):
+        digest = hashlib.blake2b(f'{regra}\0{valor}'.encode(), digest_size=8).digest()
+        return int.from_bytes(digest, 'little') | 1  # 0 marca balde vazio
+
+    def consumir(self, regra, valor):
+        """Gasta uma ficha; devolve 0 se permitido ou os segundos até a próxima"""
+        capacidade, taxa = self.regras[regra]
+        chave = self._chave(regra, valor)
+        inicio = chave % self.baldes
+
+        with self._lock:
+            mapa = self._abrir()
+            fcntl.flock(self._arquivo, fcntl.LOCK_EX)
+            try:
+                agora = self._relogio()
+                fichas, livre, idade_livre = float(capacidade), None, None
+                for passo in range(SONDAGENS):
+                    deslocamento = _TAMANHO_CABECALHO + ((inicio + passo) % self.baldes) * _BALDE.size
+                    chave_balde, fichas_balde, atualizado = _BALDE.unpack_from(mapa, deslocamento)
+                    if chave_balde == chave:
+                        posicao = deslocamento
+                        fichas = min(capacidade, fichas_balde + (agora - atualizado) * taxa)
+                        break
+                    # Balde vazio primeiro; senão o parado há mais tempo
+                    idade = float('-inf') if chave_balde == 0 else atualizado
+                    if livre is None or idade < idade_livre:
+                        livre, idade_livre = deslocamento, idade
+                else:
+                    posicao = livre
+
+                permitido = fichas >= 1
+                if permitido:
+                    fichas -= 1
+                _BALDE.pack_into(mapa, posicao, chave, fichas, agora)
+
+                contador = _CABECALHO.size + self._indices[regra] * _CONTADOR.size
+                aceitas, recusadas = _CONTADOR.unpack_from(mapa, contador)
+                _CONTADOR.pack_into(mapa, contador, aceitas + permitido, recusadas + (not permitido))
+            finally:
+                fcntl.flock(self._arquivo, fcntl.LOCK_UN)
+
+        return 0 if permitido else (1 - fichas) / taxa
+
+    def estatisticas(self):
+        """Tentativas aceitas e recusadas por regra, somando todos os workers"""
+        with self._lock:
+            mapa = self._abrir()
+            resultado = {}
+            for nome, indice in self._indices.items():
+                aceitas, recusadas = _CONTADOR.unpack_from(mapa, _CABECALHO.size + indice * _CONTADOR.size)
+                resultado[nome] = {'aceitas': aceitas, 'recusadas': recusadas}
+            return resultado
+
+    def fechar(self):
+        with self._lock:
+            if self._pid == os.getpid():
+                self._mapa.close()
+                self._arquivo.close()
+            self._pid, self._arquivo, self._mapa = None, None, None
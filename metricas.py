@@ -0,0 +1,406 @@
+"""
+Métricas no formato texto do Prometheus, somadas entre os workers
+
+Cada worker grava seus contadores num arquivo próprio mapeado em memória
+(`worker-<pid>.metricas` dentro de `diretorio`): uma lista de entradas
+chave -> double que só cresce, atualizadas no lugar. Gravar é um lock da
+thread, uma busca num dict e um struct.pack_into, sem trava entre
+processos. `/metrics` lê todos os arquivos e soma por chave.
+
+Quando um worker sai (max_requests do gunicorn), `consolidar()` soma o
+arquivo dele em `acumulado.metricas` e o apaga, sob flock exclusivo; a
+leitura usa flock compartilhado, então nada é contado duas vezes e o
+diretório não acumula um arquivo por worker que já morreu.
+
+Histogramas guardam a contagem de cada faixa (não acumulada) e a soma; as
+faixas acumuladas e o `_count` são montados na leitura.
+
+`fabrica_conexao()` devolve uma classe de conexão SQLite que mede cada
+comando executado (e o COMMIT/ROLLBACK do `with db:`) pelo tipo, até a
+última linha lida do cursor, e entrega os lentos ao registro de consultas
+lentas: o callback de trace do sqlite3 só avisa o início de um comando,
+sem o fim.
+"""
+
+import fcntl
+import mmap
+import os
+import sqlite3
+import struct
+import threading
+import time
+from contextlib import contextmanager
+
+_CABECALHO = struct.Struct('<I4x')  # bytes usados
+_TAMANHO_CHAVE = struct.Struct('<I')
+_VALOR = struct.Struct('<d')
+TAMANHO_INICIAL = 64 * 1024
+EXTENSAO = '.metricas'
+ACUMULADO = 'acumulado' + EXTENSAO
+
+# Faixas (segundos) das requisições/templates e dos comandos SQL
+BUCKETS_HTTP = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+BUCKETS_SQL = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5)
+
+# Demais comandos viram OUTRO, para não criar uma série por texto de SQL
+TIPOS_SQL = {'SELECT', 'INSERT', 'UPDATE', 'DELETE', 'REPLACE', 'WITH', 'BEGIN', 'COMMIT',
+             'ROLLBACK', 'SAVEPOINT', 'RELEASE', 'PRAGMA', 'CREATE', 'DROP', 'ALTER'}
+
+
+def _alinhar(posicao):
+    return (posicao + 7) & ~7
+
+
+def _entradas(dados):
+    """(chave, valor, posição do valor) de cada entrada gravada"""
+    usado = _CABECALHO.unpack_from(dados, 0)[0]
+    posicao = _CABECALHO.size
+    while posicao < usado:
+        tamanho = _TAMANHO_CHAVE.unpack_from(dados, posicao)[0]
+        inicio = posicao + _TAMANHO_CHAVE.size
+        valor = _alinhar(inicio + tamanho)
+        yield bytes(dados[inicio:inicio + tamanho]).decode(), _VALOR.unpack_from(dados, valor)[0], valor
+        posicao = valor + _VALOR.size
+
+
+def _ler(caminho):
+    try:
+        with open(caminho, 'rb') as arquivo:
+            dados = arquivo.read()
+    except FileNotFoundError:
+        return {}
+    if len(dados) < _CABECALHO.size:
+        return {}
+    return {chave: valor for chave, valor, _ in _entradas(dados)}
+
+
+class _Arquivo:
+    """Valores de um processo: chave -> double num arquivo mapeado em memória"""
+
+    def __init__(self, caminho):
+        self.caminho = caminho
+        self._arquivo = open(caminho, 'a+b')
+        tamanho = os.fstat(self._arquivo.fileno()).st_size
+        if tamanho < TAMANHO_INICIAL:
+            self._arquivo.truncate(TAMANHO_INICIAL)
+            tamanho = TAMANHO_INICIAL
+        self._mapa = mmap.mmap(self._arquivo.fileno(), tamanho)
+        self._usado = _CABECALHO.unpack_from(self._mapa, 0)[0] or _CABECALHO.size
+        self._posicoes = {chave: posicao for chave, _, posicao in _entradas(self._mapa)}
+
+    def _criar(self, chave):
+        codificada = chave.encode()
+        posicao = _alinhar(self._usado + _TAMANHO_CHAVE.size + len(codificada))
+        fim = posicao + _VALOR.size
+        if fim > len(self._mapa):
+            tamanho = max(2 * len(self._mapa), _alinhar(fim))
+            self._mapa.close()
+            self._arquivo.truncate(tamanho)
+            self._mapa = mmap.mmap(self._arquivo.fileno(), tamanho)
+        _TAMANHO_CHAVE.pack_into(self._mapa, self._usado, len(codificada))
+        inicio = self._usado + _TAMANHO_CHAVE.size
+        self._mapa[inicio:inicio + len(codificada)] = codificada
+        _VALOR.pack_into(self._mapa, posicao, 0.0)
+        # O tamanho usado só avança com a entrada completa: leitores nunca veem metade
+        self._usado = fim
+        _CABECALHO.pack_into(self._mapa, 0, fim)
+        self._posicoes[chave] = posicao
+        return posicao
+
+    def somar(self, chave, valor):
+        posicao = self._posicoes.get(chave)
+        if posicao is None:
+            posicao = self._criar(chave)
+        _VALOR.pack_into(self._mapa, posicao, _VALOR.unpack_from(self._mapa, posicao)[0] + valor)
+
+    def fechar(self):
+        self._mapa.close()
+        self._arquivo.close()
+
+
+def _escapar(valor):
+    return str(valor).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n')
+
+
+def _rotulos(rotulos):
+    return ','.join(f'{nome}="{_escapar(valor)}"' for nome, valor in rotulos.items())
+
+
+def _le(limite):
+    return f'{limite:g}'
+
+
+def _serie(nome, rotulos):
+    return f'{nome}{{{rotulos}}}' if rotulos else nome
+
+
+def _numero(valor):
+    return str(int(valor)) if valor == int(valor) else repr(valor)
+
+
+@contextmanager
+def _trava(diretorio, modo):
+    with open(os.path.join(diretorio, '.trava'), 'a') as arquivo:
+        fcntl.flock(arquivo, modo)
+        try:
+            yield
+        finally:
+            fcntl.flock(arquivo, fcntl.LOCK_UN)
+
+
+class Metricas:
+    def __init__(self, diretorio):
+        self.diretorio = diretorio
+        self._familias = {}
+        self._lock = threading.Lock()
+        self._pid = None
+        self._arquivo = None
+
+    def contador(self, nome, ajuda):
+        self._familias[nome] = ('counter', ajuda, ())
+
+    def histograma(self, nome, ajuda, buckets):
+        self._familias[nome] = ('histogram', ajuda, tuple(buckets))
+
+    def _arquivo_do_processo(self):
+        # Um arquivo por processo: o do mestre não é herdado pelos workers
+        caminho = os.path.join(self.diretorio, f'worker-{os.getpid()}{EXTENSAO}')
+        if self._pid != os.getpid() or self._arquivo.caminho != caminho:
+            os.makedirs(self.diretorio, exist_ok=True)
+            self._arquivo, self._pid = _Arquivo(caminho), os.getpid()
+        return self._arquivo
+
+    def incrementar(self, nome, valor=1, **rotulos):
+        chave = f'{nome}\0{_rotulos(rotulos)}\0'
+        with self._lock:
+            self._arquivo_do_processo().somar(chave, valor)
+
+    def observar(self, nome, segundos, **rotulos):
+        limite = next((b for b in self._familias[nome][2] if segundos <= b), None)
+        base = f'{nome}\0{_rotulos(rotulos)}\0'
+        with self._lock:
+            arquivo = self._arquivo_do_processo()
+            arquivo.somar(base + ('+Inf' if limite is None else _le(limite)), 1)
+            arquivo.somar(base + 'sum', segundos)
+
+    def coletar(self):
+        """Soma, por chave, os valores de todos os workers (vivos e consolidados)"""
+        os.makedirs(self.diretorio, exist_ok=True)
+        totais = {}
+        with _trava(self.diretorio, fcntl.LOCK_SH):
+            for nome in os.listdir(self.diretorio):
+                if nome.endswith(EXTENSAO):
+                    for chave, valor in _ler(os.path.join(self.diretorio, nome)).items():
+                        totais[chave] = totais.get(chave, 0) + valor
+        return totais
+
+    def exposicao(self):
+        """Texto no formato de exposição do Prometheus (versão 0.0.4)"""
+        series = {}
+        for chave, valor in self.coletar().items():
+            nome, rotulos, extra = chave.split('\0')
+            series.setdefault(nome, {}).setdefault(rotulos, {})[extra] = valor
+
+        linhas = []
+        for nome, (tipo, ajuda, buckets) in sorted(self._familias.items()):
+            linhas += [f'# HELP {nome} {ajuda}', f'# TYPE {nome} {tipo}']
+            for rotulos, valores in sorted(series.get(nome, {}).items()):
+                if tipo == 'counter':
+                    linhas.append(f'{_serie(nome, rotulos)} {_numero(valores[""])}')
+                    continue
+                prefixo = rotulos + ',' if rotulos else ''
+                acumulado = 0
+                for limite in (*map(_le, buckets), '+Inf'):
+                    acumulado += valores.get(limite, 0)
+                    linhas.append(f'{nome}_bucket{{{prefixo}le="{limite}"}} {_numero(acumulado)}')
+                linhas.append(f'{_serie(nome + "_sum", rotulos)} {_numero(valores.get("sum", 0))}')
+                linhas.append(f'{_serie(nome + "_count", rotulos)} {_numero(acumulado)}')
+        return '\n'.join(linhas) + '\n'
+
+    def consolidar(self):
+        """Passa os valores deste processo para o arquivo acumulado (worker_exit)"""
+        with self._lock:
+            if self._pid != os.getpid():
+                return
+            with _trava(self.diretorio, fcntl.LOCK_EX):
+                acumulado = _Arquivo(os.path.join(self.diretorio, ACUMULADO))
+                for chave, valor in _ler(self._arquivo.caminho).items():
+                    acumulado.somar(chave, valor)
+                acumulado.fechar()
+                self._arquivo.fechar()
+                os.remove(self._arquivo.caminho)
+            self._pid, self._arquivo = None, None
+
+    def limpar(self):
+        """Zera as métricas (subida do mestre do gunicorn, antes dos workers)"""
+        os.makedirs(self.diretorio, exist_ok=True)
+        with _trava(self.diretorio, fcntl.LOCK_EX):
+            for nome in os.listdir(self.diretorio):
+                if nome.endswith(EXTENSAO):
+                    os.remove(os.path.join(self.diretorio, nome))
+        with self._lock:
+            self._pid, self._arquivo = None, None
+
+
+def _tipo_sql(sql):
+    partes = sql.split(None, 1)
+    tipo = partes[0].upper() if partes else ''
+    return tipo if tipo in TIPOS_SQL else 'OUTRO'
+
+
+def fabrica_conexao(metricas=None, lentas=None):
+    """Classe de conexão (`sqlite3.connect(factory=...)`) que mede os comandos
+
+    Com `metricas`, cada comando vai para `banco_sql_duracao_segundos{tipo}`;
+    o tempo de BEGIN IMMEDIATE é a espera pelo lock de escrita. Falhas por
+    banco travado contam em `banco_sql_bloqueios_total{tipo}`. Com `lentas`
+    (consultas_lentas.RegistroLento), os comandos acima do limite são
+    registrados com o plano e contados em `banco_sql_lentos_total{tipo}`.
+
+    O execute() de um SELECT só dá o primeiro passo: as linhas saem de cada
+    fetch. O tempo de um comando é a soma do execute() e das leituras do
+    cursor, e é registrado quando o cursor acaba (última linha lida) ou é
+    fechado. Um cursor descartado antes do fim (o `.fetchone()` de uma linha
+    só) é registrado no comando seguinte da conexão ou no close(): o
+    __del__ só enfileira, sem pegar locks.
+    """
+
+    def observar(conexao, tipo, sql, parametros, duracao):
+        if metricas is not None:
+            metricas.observar('banco_sql_duracao_segundos', duracao, tipo=tipo)
+        if lentas is not None and duracao >= lentas.limite:
+            if metricas is not None:
+                metricas.incrementar('banco_sql_lentos_total', tipo=tipo)
+            lentas.registrar(conexao, tipo, sql, parametros, duracao)
+
+    def contar_bloqueio(erro, tipo):
+        if metricas is not None and ('locked' in str(erro) or 'busy' in str(erro)):
+            metricas.incrementar('banco_sql_bloqueios_total', tipo=tipo)
+
+    def medir(conexao, tipo, sql, parametros, funcao, *args):
+        inicio = time.perf_counter()
+        try:
+            return funcao(*args)
+        except sqlite3.OperationalError as e:
+            contar_bloqueio(e, tipo)
+            raise
+        finally:
+            observar(conexao, tipo, sql, parametros, time.perf_counter() - inicio)
+
+    class CursorMedido(sqlite3.Cursor):
+        # [tipo, sql, parâmetros, segundos somados] do comando em andamento
+        _comando = None
+
+        def _terminar(self):
+            comando, self._comando = self._comando, None
+            if comando is not None:
+                observar(self.connection, *comando)
+
+        def _passo(self, funcao, *args):
+            inicio = time.perf_counter()
+            try:
+                resultado = funcao(*args)
+            except BaseException as e:
+                # Erro ou StopIteration: o comando acabou
+                if isinstance(e, sqlite3.OperationalError):
+                    contar_bloqueio(e, self._comando[0])
+                self._comando[3] += time.perf_counter() - inicio
+                self._terminar()
+                raise
+            self._comando[3] += time.perf_counter() - inicio
+            return resultado
+
+        def execute(self, sql, parametros=()):
+            self._terminar()
+            self._comando = [_tipo_sql(sql), sql, parametros, 0.0]
+            self._passo(super().execute, sql, parametros)
+            # Sem colunas (INSERT, BEGIN...) o comando inteiro já rodou
+            if self.description is None:
+                self._terminar()
+            return self
+
+        def executemany(self, sql, parametros):
+            self._terminar()
+            self._comando = [_tipo_sql(sql), sql, None, 0.0]
+            self._passo(super().executemany, sql, parametros)
+            self._terminar()
+            return self
+
+        def fetchone(self):
+            if self._comando is None:
+                return super().fetchone()
+            linha = self._passo(super().fetchone)
+            if linha is None:
+                self._terminar()
+            return linha
+
+        def fetchmany(self, size=None):
+            tamanho = self.arraysize if size is None else size
+            if self._comando is None:
+                return super().fetchmany(tamanho)
+            linhas = self._passo(super().fetchmany, tamanho)
+            if len(linhas) < tamanho:
+                self._terminar()
+            return linhas
+
+        def fetchall(self):
+            if self._comando is None:
+                return super().fetchall()
+            linhas = self._passo(super().fetchall)
+            self._terminar()
+            return linhas
+
+        def __next__(self):
+            if self._comando is None:
+                return super().__next__()
+            return self._passo(super().__next__)
+
+        def close(self):
+            self._terminar()
+            super().close()
+
+        def __del__(self):
+            if self._comando is not None:
+                self.connection._descartados.append(self._comando)
+
+    class ConexaoMedida(sqlite3.Connection):
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            self._descartados = []
+
+        def _registrar_descartados(self):
+            while self._descartados:
+                observar(self, *self._descartados.pop())
+
+        def cursor(self, factory=CursorMedido):
+            return super().cursor(factory)
+
+        def execute(self, sql, parametros=()):
+            self._registrar_descartados()
+            return self.cursor().execute(sql, parametros)
+
+        def executemany(self, sql, parametros):
+            self._registrar_descartados()
+            return self.cursor().executemany(sql, parametros)
+
+        def commit(self):
+            self._registrar_descartados()
+            return medir(self, 'COMMIT', 'COMMIT', None, super().commit)
+
+        def rollback(self):
+            self._registrar_descartados()
+            return medir(self, 'ROLLBACK', 'ROLLBACK', None, super().rollback)
+
+        def close(self):
+            self._registrar_descartados()
+            super().close()
+
+        def __exit__(self, tipo_erro, erro, rastro):
+            self._registrar_descartados()
+            # O `with db:` confirma/desfaz sem passar por commit()/rollback()
+            if not self.in_transaction:
+                return super().__exit__(tipo_erro, erro, rastro)
+            tipo = 'COMMIT' if tipo_erro is None else 'ROLLBACK'
+            return medir(self, tipo, tipo, None, super().__exit__, tipo_erro, erro, rastro)
+
+    return ConexaoMedida
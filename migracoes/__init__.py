@@ -0,0 +1,140 @@
+"""
+Migrações versionadas do esquema SQLite
+
+Cada módulo `mNNNN_nome.py` deste pacote é uma migração: NNNN é a versão,
+a primeira linha da docstring é a descrição e `aplicar(db, **opcoes)` faz o
+trabalho. Todo passo precisa poder rodar de novo sem efeito (CREATE ... IF
+NOT EXISTS, `adicionar_coluna`, `criar_indice`): bancos criados pelo antigo
+init_db() não têm `schema_version` e passam por todas as migrações.
+
+As versões aplicadas ficam em `schema_version`. O app não roda DDL: na
+inicialização só confere, numa leitura, se falta alguma versão
+(`verificar`). Quem aplica é o CLI (`python -m migracoes`).
+
+Migrações com `ONLINE = True` só criam índices (inclusive o de texto da
+busca, com seus gatilhos). Elas não impedem o app de subir e podem rodar
+com ele no ar, mas não de graça: no modo WAL as leituras continuam
+durante o CREATE INDEX, só que ele segura o lock de escrita do banco até
+terminar. Os lançamentos do app esperam no busy_timeout do app
+(SQLITE_BUSY_TIMEOUT, 5 s) e falham com "database is locked" se o índice
+demorar mais; numa tabela grande, rode fora do horário de pico. O CLI
+aumenta o busy_timeout só da própria conexão, para ele esperar as
+escritas em andamento (`python -m migracoes --so-online`). O índice de
+texto (0012) é carregado em lotes curtos e não tem esse problema.
+"""
+
+import importlib
+import os
+import pkgutil
+import re
+import sqlite3
+from collections import namedtuple
+from urllib.parse import quote
+
+Migracao = namedtuple('Migracao', 'versao nome descricao online modulo')
+
+_PADRAO_MODULO = re.compile(r'^m(\d{4})_(\w+)$')
+
+_TABELA_VERSAO = '''
+    CREATE TABLE IF NOT EXISTS schema_version (
+        versao INTEGER PRIMARY KEY,
+        descricao TEXT NOT NULL,
+        aplicada_em TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+'''
+
+_migracoes = None
+
+
+def listar():
+    """Todas as migrações do pacote, em ordem de versão"""
+    global _migracoes
+    if _migracoes is None:
+        encontradas = []
+        for modulo in pkgutil.iter_modules(__path__):
+            casamento = _PADRAO_MODULO.match(modulo.name)
+            if not casamento:
+                continue
+            importado = importlib.import_module(f'{__name__}.{modulo.name}')
+            descricao = (importado.__doc__ or modulo.name).strip().splitlines()[0]
+            encontradas.append(Migracao(int(casamento.group(1)), casamento.group(2), descricao,
+                                        getattr(importado, 'ONLINE', False), importado))
+        encontradas.sort()
+        versoes = [m.versao for m in encontradas]
+        if len(set(versoes)) != len(versoes):
+            raise RuntimeError(f'versões de migração repetidas: {versoes}')
+        _migracoes = encontradas
+    return _migracoes
+
+
+def adicionar_coluna(db, tabela, coluna, definicao):
+    """Adiciona a coluna se a tabela ainda não a tiver (ALTER TABLE é instantâneo)"""
+    colunas = [linha[1] for linha in db.execute(f'PRAGMA table_info({tabela})')]
+    if coluna not in colunas:
+        db.execute(f'ALTER TABLE {tabela} ADD COLUMN {coluna} {definicao}')
+        db.commit()
+        return True
+    return False
+
+
+def criar_indice(db, nome, tabela, colunas, unico=False):
+    """Cria o índice se ainda não existir; devolve True se criou"""
+    if db.execute("SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = ?", (nome,)).fetchone():
+        return False
+    db.execute(f'CREATE {"UNIQUE " if unico else ""}INDEX IF NOT EXISTS {nome} ON {tabela} ({colunas})')
+    db.commit()
+    return True
+
+
+def aplicadas(db):
+    """Versões já registradas em schema_version (vazio se a tabela não existe)"""
+    try:
+        return {linha[0] for linha in db.execute('SELECT versao FROM schema_version')}
+    except sqlite3.OperationalError as e:
+        if 'no such table' in str(e):
+            return set()
+        raise
+
+
+def pendentes(db, incluir_online=True):
+    feitas = aplicadas(db)
+    return [m for m in listar()
+            if m.versao not in feitas and (incluir_online or not m.online)]
+
+
+def migrar(db, incluir_online=True, somente_online=False, aviso=None, **opcoes):
+    """Aplica as migrações pendentes em ordem; devolve as aplicadas
+
+    `aviso(migracao)` é chamado antes de cada uma; `opcoes` vão para o
+    `aplicar()` de cada migração (ex.: tamanho_lote, progresso).
+    """
+    db.execute(_TABELA_VERSAO)
+    db.commit()
+    feitas = []
+    for migracao in pendentes(db, incluir_online):
+        if somente_online and not migracao.online:
+            continue
+        if aviso:
+            aviso(migracao)
+        migracao.modulo.aplicar(db, **opcoes)
+        db.execute('INSERT OR IGNORE INTO schema_version (versao, descricao) VALUES (?, ?)',
+                   (migracao.versao, migracao.descricao))
+        db.commit()
+        feitas.append(migracao)
+    return feitas
+
+
+def verificar(caminho):
+    """Migrações obrigatórias (não ONLINE) que faltam no banco, sem alterá-lo
+
+    Abre o arquivo só para leitura e faz uma consulta; um banco inexistente
+    tem todas pendentes.
+    """
+    try:
+        db = sqlite3.connect(f'file:{quote(os.path.abspath(caminho))}?mode=ro', uri=True)
+    except sqlite3.OperationalError:
+        return [m for m in listar() if not m.online]
+    try:
+        return pendentes(db, incluir_online=False)
+    finally:
+        db.close()
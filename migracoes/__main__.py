@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+Aplica as migrações do esquema
+Execute: python -m migracoes [--banco banco.db] [--status] [--sem-online | --so-online] [--lote 10000]
+
+--sem-online deixa de fora as migrações que só criam índices, para rodá-las
+depois com o app no ar (--so-online). Sem --banco e com SHARDS definido,
+migra todos os shards e prepara o diretório (ver shards.py).
+"""
+
+import argparse
+import sys
+import time
+from contextlib import closing
+
+import database
+import migracoes
+import shards
+
+# As migrações online esperam as escritas em andamento em vez de falhar
+BUSY_TIMEOUT_MIGRACAO = 60000
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Aplica as migrações do esquema')
+    parser.add_argument('--banco', action='append', help='repetível (padrão: os SHARDS ou DATABASE_PATH)')
+    parser.add_argument('--status', action='store_true', help='só lista as migrações')
+    grupo = parser.add_mutually_exclusive_group()
+    grupo.add_argument('--sem-online', action='store_true', help='pula as que só criam índices')
+    grupo.add_argument('--so-online', action='store_true', help='só as que criam índices')
+    parser.add_argument('--lote', type=int, help='linhas por transação nos preenchimentos')
+    args = parser.parse_args()
+
+    bancos = args.banco or shards.SHARDS or [database.DATABASE]
+    if args.status:
+        for caminho in bancos:
+            if len(bancos) > 1:
+                print(f"🗄️ {caminho}")
+            with closing(database.conectar(caminho)) as db:
+                feitas = migracoes.aplicadas(db)
+            for m in migracoes.listar():
+                marca = '✅' if m.versao in feitas else '⏳'
+                print(f"{marca} {m.versao:04d} {m.nome}{' (online)' if m.online else ''}: {m.descricao}")
+        return 0
+
+    def aviso(migracao):
+        print(f"🔧 {migracao.versao:04d} {migracao.nome}: {migracao.descricao}")
+
+    def progresso(tabela, ultimo_id, maximo):
+        print(f"   {tabela}: {ultimo_id}/{maximo}", end='\r')
+
+    inicio = time.perf_counter()
+    feitas = []
+    for caminho in bancos:
+        print(f"🗄️ Migrando {caminho}")
+        db = database.conectar(caminho, dict(database.SQLITE_PRAGMAS, busy_timeout=BUSY_TIMEOUT_MIGRACAO))
+        try:
+            feitas += migracoes.migrar(db, incluir_online=not args.sem_online, somente_online=args.so_online,
+                                       aviso=aviso, tamanho_lote=args.lote, progresso=progresso)
+        except Exception as e:
+            print(f"\n❌ Erro na migração: {e}")
+            print(f"Tipo do erro: {type(e).__name__}")
+            return 1
+        finally:
+            db.close()
+
+    if not args.banco and shards.SHARDS:
+        print(f"🗂️ Diretório dos shards: {shards.DIRETORIO}")
+        with closing(database.conectar(shards.DIRETORIO)) as db:
+            shards.preparar_diretorio(db)
+
+    print(f"🎉 {len(feitas)} migrações aplicadas em {time.perf_counter() - inicio:.2f}s" + ' ' * 20)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
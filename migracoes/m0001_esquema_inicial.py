@@ -0,0 +1,32 @@
+"""Tabelas usuario, conta e transacao"""
+
+
+def aplicar(db, **opcoes):
+    db.executescript('''
+        CREATE TABLE IF NOT EXISTS usuario (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            nome TEXT NOT NULL,
+            email TEXT UNIQUE NOT NULL,
+            senha TEXT NOT NULL,
+            saldo REAL DEFAULT 0.0,
+            data_criacao TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        );
+        
+        CREATE TABLE IF NOT EXISTS conta (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            tipo TEXT NOT NULL,
+            saldo REAL DEFAULT 0.0,
+            usuario_id INTEGER NOT NULL,
+            FOREIGN KEY (usuario_id) REFERENCES usuario (id)
+        );
+        
+        CREATE TABLE IF NOT EXISTS transacao (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            tipo TEXT NOT NULL,
+            valor REAL NOT NULL,
+            descricao TEXT,
+            data TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            conta_id INTEGER NOT NULL,
+            FOREIGN KEY (conta_id) REFERENCES conta (id)
+        );
+    ''')
@@ -0,0 +1,18 @@
+"""Tabela transferencia e ligação das pernas em transacao.transferencia_id"""
+
+from migracoes import adicionar_coluna
+
+
+def aplicar(db, **opcoes):
+    db.executescript('''
+        CREATE TABLE IF NOT EXISTS transferencia (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            conta_origem_id INTEGER NOT NULL,
+            conta_destino_id INTEGER NOT NULL,
+            valor REAL NOT NULL,
+            data TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (conta_origem_id) REFERENCES conta (id),
+            FOREIGN KEY (conta_destino_id) REFERENCES conta (id)
+        );
+    ''')
+    adicionar_coluna(db, 'transacao', 'transferencia_id', 'INTEGER REFERENCES transferencia (id)')
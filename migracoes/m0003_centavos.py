@@ -0,0 +1,113 @@
+"""
+Valores REAL convertidos para centavos inteiros (online, em lotes)
+
+1. Adiciona as colunas *_centavos (ALTER TABLE ADD COLUMN, instantâneo).
+2. Instala gatilhos que mantêm os centavos em dia quando uma versão antiga
+   do app (ou um script) grava só as colunas REAL.
+3. Preenche as linhas existentes em lotes por faixa de id, cada lote numa
+   transação curta, registrando o progresso em `migracao_centavos`: o lock
+   de escrita nunca fica preso por muito tempo e a migração pode ser
+   interrompida e retomada (`python -m migracoes --lote 10000`).
+
+As colunas REAL continuam existindo como espelho (valor / 100) para
+leitores antigos; o app lê e soma apenas as colunas em centavos.
+"""
+
+from migracoes import adicionar_coluna
+
+TAMANHO_LOTE = 10000
+
+# tabela -> (coluna REAL, coluna em centavos, definição da coluna nova)
+COLUNAS = {
+    'usuario': ('saldo', 'saldo_centavos', 'INTEGER NOT NULL DEFAULT 0'),
+    'conta': ('saldo', 'saldo_centavos', 'INTEGER NOT NULL DEFAULT 0'),
+    'transacao': ('valor', 'valor_centavos', 'INTEGER'),
+    'transferencia': ('valor', 'valor_centavos', 'INTEGER'),
+}
+
+GATILHOS = '''
+    CREATE TABLE IF NOT EXISTS migracao_centavos (
+        tabela TEXT PRIMARY KEY,
+        ultimo_id INTEGER NOT NULL DEFAULT 0,
+        concluida INTEGER NOT NULL DEFAULT 0
+    );
+
+    -- Escritores antigos só gravam o valor REAL: deriva os centavos
+    CREATE TRIGGER IF NOT EXISTS trg_transacao_centavos
+    AFTER INSERT ON transacao WHEN NEW.valor_centavos IS NULL
+    BEGIN
+        UPDATE transacao SET valor_centavos = CAST(ROUND(NEW.valor * 100) AS INTEGER)
+        WHERE id = NEW.id;
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS trg_transferencia_centavos
+    AFTER INSERT ON transferencia WHEN NEW.valor_centavos IS NULL
+    BEGIN
+        UPDATE transferencia SET valor_centavos = CAST(ROUND(NEW.valor * 100) AS INTEGER)
+        WHERE id = NEW.id;
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS trg_conta_centavos_insercao
+    AFTER INSERT ON conta WHEN NEW.saldo_centavos = 0 AND NEW.saldo != 0
+    BEGIN
+        UPDATE conta SET saldo_centavos = CAST(ROUND(NEW.saldo * 100) AS INTEGER)
+        WHERE id = NEW.id;
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS trg_conta_centavos
+    AFTER UPDATE OF saldo ON conta
+    WHEN NEW.saldo_centavos IS OLD.saldo_centavos AND NEW.saldo IS NOT OLD.saldo
+    BEGIN
+        UPDATE conta SET saldo_centavos = CAST(ROUND(NEW.saldo * 100) AS INTEGER)
+        WHERE id = NEW.id;
+    END;
+'''
+
+
+def preparar(db):
+    """Cria colunas, gatilhos e a tabela de progresso (passos instantâneos)"""
+    for tabela, (_, coluna, definicao) in COLUNAS.items():
+        adicionar_coluna(db, tabela, coluna, definicao)
+    db.executescript(GATILHOS)
+
+
+def preencher(db, tabela, tamanho_lote=TAMANHO_LOTE, progresso=None):
+    """Converte as linhas existentes de uma tabela, um lote por transação"""
+    antiga, nova, _ = COLUNAS[tabela]
+    db.execute('INSERT OR IGNORE INTO migracao_centavos (tabela) VALUES (?)', (tabela,))
+    db.commit()
+    ultimo_id, concluida = db.execute(
+        'SELECT ultimo_id, concluida FROM migracao_centavos WHERE tabela = ?', (tabela,)).fetchone()
+    if concluida:
+        return 0
+
+    # Linhas acima do maior id atual já nascem com centavos (app novo ou gatilho)
+    maximo = db.execute(f'SELECT COALESCE(MAX(id), 0) FROM {tabela}').fetchone()[0]
+    convertidas = 0
+    while ultimo_id < maximo:
+        limite = min(ultimo_id + tamanho_lote, maximo)
+        db.execute('BEGIN IMMEDIATE')
+        try:
+            cursor = db.execute(f'''
+                UPDATE {tabela} SET {nova} = CAST(ROUND({antiga} * 100) AS INTEGER)
+                WHERE id > ? AND id <= ?
+            ''', (ultimo_id, limite))
+            db.execute('UPDATE migracao_centavos SET ultimo_id = ? WHERE tabela = ?', (limite, tabela))
+        except BaseException:
+            db.rollback()
+            raise
+        db.commit()
+        convertidas += cursor.rowcount
+        ultimo_id = limite
+        if progresso:
+            progresso(tabela, ultimo_id, maximo)
+
+    db.execute('UPDATE migracao_centavos SET concluida = 1 WHERE tabela = ?', (tabela,))
+    db.commit()
+    return convertidas
+
+
+def aplicar(db, tamanho_lote=None, progresso=None, **opcoes):
+    """Executa a migração completa; seguro para rodar de novo"""
+    preparar(db)
+    return {tabela: preencher(db, tabela, tamanho_lote or TAMANHO_LOTE, progresso) for tabela in COLUNAS}
@@ -0,0 +1,19 @@
+"""Saldo após cada transação, contador de lançamentos e checkpoints de saldo"""
+
+from migracoes import adicionar_coluna
+
+
+def aplicar(db, **opcoes):
+    adicionar_coluna(db, 'transacao', 'saldo_apos_centavos', 'INTEGER')
+    adicionar_coluna(db, 'conta', 'lancamentos', 'INTEGER NOT NULL DEFAULT 0')
+    db.executescript('''
+        -- Saldo a cada ledger.INTERVALO_CHECKPOINT lançamentos da conta
+        CREATE TABLE IF NOT EXISTS saldo_checkpoint (
+            conta_id INTEGER NOT NULL,
+            transacao_id INTEGER NOT NULL,
+            data TIMESTAMP NOT NULL,
+            saldo_centavos INTEGER NOT NULL,
+            PRIMARY KEY (conta_id, transacao_id),
+            FOREIGN KEY (conta_id) REFERENCES conta (id)
+        );
+    ''')
@@ -0,0 +1,20 @@
+"""Versão por usuário, incrementada por gatilho, que invalida o cache do dashboard"""
+
+from migracoes import adicionar_coluna
+
+
+def aplicar(db, **opcoes):
+    adicionar_coluna(db, 'usuario', 'versao', 'INTEGER NOT NULL DEFAULT 0')
+    db.executescript('''
+        CREATE TRIGGER IF NOT EXISTS trg_conta_saldo_versao_usuario
+        AFTER UPDATE OF saldo_centavos ON conta
+        BEGIN
+            UPDATE usuario SET versao = versao + 1 WHERE id = NEW.usuario_id;
+        END;
+        
+        CREATE TRIGGER IF NOT EXISTS trg_conta_nova_versao_usuario
+        AFTER INSERT ON conta
+        BEGIN
+            UPDATE usuario SET versao = versao + 1 WHERE id = NEW.usuario_id;
+        END;
+    ''')
@@ -0,0 +1,15 @@
+"""Índices do extrato, das contas por usuário e dos checkpoints de saldo"""
+
+from migracoes import criar_indice
+
+# Só cria índices: o app sobe sem eles, mas cada CREATE INDEX segura o lock de escrita
+# até terminar; lançamentos que esperarem mais que o busy_timeout falham (ver migracoes.ONLINE)
+ONLINE = True
+
+
+def aplicar(db, **opcoes):
+    # Extrato paginado por (data, id) dentro de cada conta
+    criar_indice(db, 'idx_transacao_conta_data', 'transacao', 'conta_id, data, id')
+    # Contas de um usuário (dashboard, criação e checagem de dono)
+    criar_indice(db, 'idx_conta_usuario', 'conta', 'usuario_id')
+    criar_indice(db, 'idx_saldo_checkpoint_conta_data', 'saldo_checkpoint', 'conta_id, data, transacao_id')
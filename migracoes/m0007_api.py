@@ -0,0 +1,32 @@
+"""Tokens da API e última transação por conta (ETag do extrato)"""
+
+from migracoes import adicionar_coluna
+
+
+def aplicar(db, **opcoes):
+    if adicionar_coluna(db, 'conta', 'ultima_transacao_id', 'INTEGER NOT NULL DEFAULT 0'):
+        db.execute('''
+            UPDATE conta SET ultima_transacao_id = (
+                SELECT COALESCE(MAX(id), 0) FROM transacao WHERE conta_id = conta.id
+            )
+        ''')
+        db.commit()
+    db.executescript('''
+        -- Mantida por gatilho para qualquer escritor (ledger, ingestão, legado):
+        -- a API responde 304 lendo só a conta, sem tocar em transacao
+        CREATE TRIGGER IF NOT EXISTS trg_transacao_ultima_conta
+        AFTER INSERT ON transacao
+        BEGIN
+            UPDATE conta SET ultima_transacao_id = NEW.id
+            WHERE id = NEW.conta_id AND ultima_transacao_id < NEW.id;
+        END;
+
+        -- Só o hash SHA-256 do token é gravado
+        CREATE TABLE IF NOT EXISTS token_api (
+            hash TEXT PRIMARY KEY,
+            usuario_id INTEGER NOT NULL,
+            criado_em TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            expira_em TIMESTAMP NOT NULL,
+            FOREIGN KEY (usuario_id) REFERENCES usuario (id)
+        ) WITHOUT ROWID;
+    ''')
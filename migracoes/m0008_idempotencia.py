@@ -0,0 +1,19 @@
+"""Chaves de idempotência dos lançamentos (Idempotency-Key)"""
+
+
+def aplicar(db, **opcoes):
+    db.executescript('''
+        CREATE TABLE IF NOT EXISTS idempotencia (
+            id INTEGER PRIMARY KEY,
+            usuario_id INTEGER NOT NULL,
+            chave TEXT NOT NULL,
+            impressao TEXT NOT NULL,
+            resposta TEXT NOT NULL,
+            criado_em TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            UNIQUE (usuario_id, chave),
+            FOREIGN KEY (usuario_id) REFERENCES usuario (id)
+        );
+
+        -- Tabela nova: o índice da expiração nasce junto, sem custo
+        CREATE INDEX IF NOT EXISTS idx_idempotencia_criado_em ON idempotencia (criado_em);
+    ''')
@@ -0,0 +1,30 @@
+"""Saídas e entradas das transferências entre shards (ver shards.py)"""
+
+
+def aplicar(db, **opcoes):
+    db.executescript('''
+        -- Perna de débito já gravada neste shard, à espera do crédito no destino
+        CREATE TABLE IF NOT EXISTS transferencia_saida (
+            chave TEXT PRIMARY KEY,
+            transferencia_id INTEGER NOT NULL,
+            conta_origem_id INTEGER NOT NULL,
+            conta_destino_id INTEGER NOT NULL,
+            valor_centavos INTEGER NOT NULL,
+            criada_em TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            entregue_em TIMESTAMP,
+            FOREIGN KEY (transferencia_id) REFERENCES transferencia (id)
+        ) WITHOUT ROWID;
+
+        -- Chaves já creditadas neste shard: a entrega pode repetir sem creditar duas vezes
+        CREATE TABLE IF NOT EXISTS transferencia_entrada (
+            chave TEXT PRIMARY KEY,
+            conta_id INTEGER NOT NULL,
+            recebida_em TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        ) WITHOUT ROWID;
+
+        -- Tabelas novas: os índices nascem junto, sem custo
+        CREATE INDEX IF NOT EXISTS idx_transferencia_saida_pendente
+            ON transferencia_saida (criada_em) WHERE entregue_em IS NULL;
+        CREATE INDEX IF NOT EXISTS idx_transferencia_saida_origem ON transferencia_saida (conta_origem_id);
+        CREATE INDEX IF NOT EXISTS idx_transferencia_entrada_conta ON transferencia_entrada (conta_id);
+    ''')
@@ -0,0 +1,21 @@
+"""Resumo por conta e mês das transações movidas para o arquivo (ver arquivo.py)"""
+
+
+def aplicar(db, **opcoes):
+    db.executescript('''
+        -- Um lote arquivado de uma conta num mês; as linhas estão em <banco>-arquivo/<mes>.db
+        CREATE TABLE IF NOT EXISTS transacao_arquivada (
+            conta_id INTEGER NOT NULL,
+            mes TEXT NOT NULL,
+            lote INTEGER NOT NULL,
+            ultimo_id INTEGER NOT NULL,
+            linhas INTEGER NOT NULL,
+            entradas_centavos INTEGER NOT NULL,
+            saidas_centavos INTEGER NOT NULL,
+            primeira_data TIMESTAMP NOT NULL,
+            ultima_data TIMESTAMP NOT NULL,
+            arquivada_em TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (conta_id, mes, lote),
+            FOREIGN KEY (conta_id) REFERENCES conta (id)
+        ) WITHOUT ROWID;
+    ''')
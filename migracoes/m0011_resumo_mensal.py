@@ -0,0 +1,28 @@
+"""Resumo mensal por conta e tipo, mantido por gatilho (ver resumos.py)"""
+
+
+def aplicar(db, **opcoes):
+    db.executescript('''
+        CREATE TABLE IF NOT EXISTS resumo_mensal (
+            conta_id INTEGER NOT NULL,
+            mes TEXT NOT NULL,
+            tipo TEXT NOT NULL,
+            quantidade INTEGER NOT NULL,
+            total_centavos INTEGER NOT NULL,
+            PRIMARY KEY (conta_id, mes, tipo),
+            FOREIGN KEY (conta_id) REFERENCES conta (id)
+        ) WITHOUT ROWID;
+
+        -- Na mesma transação do lançamento, para qualquer escritor (ledger, ingestão, legado).
+        -- Sem gatilho de DELETE: o arquivamento tira linhas de transacao e o resumo fica
+        CREATE TRIGGER IF NOT EXISTS trg_transacao_resumo_mensal
+        AFTER INSERT ON transacao
+        BEGIN
+            INSERT INTO resumo_mensal (conta_id, mes, tipo, quantidade, total_centavos)
+            VALUES (NEW.conta_id, substr(NEW.data, 1, 7), NEW.tipo, 1,
+                    COALESCE(NEW.valor_centavos, CAST(round(NEW.valor * 100) AS INTEGER)))
+            ON CONFLICT (conta_id, mes, tipo) DO UPDATE SET
+                quantidade = quantidade + 1,
+                total_centavos = total_centavos + excluded.total_centavos;
+        END;
+    ''')
@@ -0,0 +1,109 @@
+"""Índice de texto (FTS5) da descrição das transações, mantido por gatilhos (ver busca.py)"""
+
+# É um índice: criado com o app no ar e preenchido em lotes curtos (ver migracoes.ONLINE)
+ONLINE = True
+
+TAMANHO_LOTE = 10000
+
+# Tabela, gatilhos e a faixa a carregar nascem na mesma transação. As linhas
+# com id em (indexado_ate, limite] já estavam em transacao e ainda não foram
+# indexadas: os gatilhos não mexem nelas (a carga lê o valor atual de cada
+# uma) e cuidam de todo o resto, inclusive das linhas novas.
+ESQUEMA = '''
+    BEGIN IMMEDIATE;
+
+    -- Conteúdo externo: o índice guarda só os termos e lê o texto de transacao.
+    -- conta_id também é indexado, para a busca cruzar o termo com a conta no índice
+    CREATE VIRTUAL TABLE transacao_busca USING fts5 (
+        descricao, conta_id,
+        content = 'transacao', content_rowid = 'id',
+        tokenize = 'unicode61 remove_diacritics 2'
+    );
+
+    -- Uma linha enquanto a carga não termina (busca.indice_pronto)
+    CREATE TABLE IF NOT EXISTS transacao_busca_carga (
+        id INTEGER PRIMARY KEY CHECK (id = 1),
+        limite INTEGER NOT NULL,
+        indexado_ate INTEGER NOT NULL
+    );
+    INSERT OR REPLACE INTO transacao_busca_carga (id, limite, indexado_ate)
+    SELECT 1, COALESCE(MAX(id), 0), 0 FROM transacao;
+
+    -- Inclusive o DELETE do arquivamento e da mudança de shard: linha fora de transacao sai da busca
+    CREATE TRIGGER IF NOT EXISTS trg_transacao_busca_insert
+    AFTER INSERT ON transacao
+    WHEN NOT EXISTS (SELECT 1 FROM transacao_busca_carga
+                     WHERE id = 1 AND NEW.id > indexado_ate AND NEW.id <= limite)
+    BEGIN
+        INSERT INTO transacao_busca (rowid, descricao, conta_id) VALUES (NEW.id, NEW.descricao, NEW.conta_id);
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS trg_transacao_busca_delete
+    AFTER DELETE ON transacao
+    WHEN NOT EXISTS (SELECT 1 FROM transacao_busca_carga
+                     WHERE id = 1 AND OLD.id > indexado_ate AND OLD.id <= limite)
+    BEGIN
+        INSERT INTO transacao_busca (transacao_busca, rowid, descricao, conta_id)
+        VALUES ('delete', OLD.id, OLD.descricao, OLD.conta_id);
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS trg_transacao_busca_update
+    AFTER UPDATE OF descricao, conta_id ON transacao
+    WHEN NOT EXISTS (SELECT 1 FROM transacao_busca_carga
+                     WHERE id = 1 AND OLD.id > indexado_ate AND OLD.id <= limite)
+    BEGIN
+        INSERT INTO transacao_busca (transacao_busca, rowid, descricao, conta_id)
+        VALUES ('delete', OLD.id, OLD.descricao, OLD.conta_id);
+        INSERT INTO transacao_busca (rowid, descricao, conta_id) VALUES (NEW.id, NEW.descricao, NEW.conta_id);
+    END;
+
+    COMMIT;
+'''
+
+
+def preparar(db):
+    """Cria o índice vazio, os gatilhos e a faixa a carregar (passo instantâneo)"""
+    if db.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'transacao_busca'").fetchone():
+        return
+    try:
+        db.executescript(ESQUEMA)
+    except BaseException:
+        db.rollback()
+        raise
+
+
+def preencher(db, tamanho_lote=TAMANHO_LOTE, progresso=None):
+    """Indexa as linhas antigas, um lote por transação; retoma de onde parou"""
+    carga = db.execute('SELECT limite, indexado_ate FROM transacao_busca_carga WHERE id = 1').fetchone()
+    if carga is None:
+        return 0
+    maximo, ultimo_id = carga
+    indexadas = 0
+    while ultimo_id < maximo:
+        limite = min(ultimo_id + tamanho_lote, maximo)
+        db.execute('BEGIN IMMEDIATE')
+        try:
+            cursor = db.execute('''
+                INSERT INTO transacao_busca (rowid, descricao, conta_id)
+                SELECT id, descricao, conta_id FROM transacao WHERE id > ? AND id <= ?
+            ''', (ultimo_id, limite))
+            db.execute('UPDATE transacao_busca_carga SET indexado_ate = ? WHERE id = 1', (limite,))
+        except BaseException:
+            db.rollback()
+            raise
+        db.commit()
+        indexadas += cursor.rowcount
+        ultimo_id = limite
+        if progresso:
+            progresso('transacao_busca', ultimo_id, maximo)
+
+    # Sem a linha os gatilhos valem para todos os ids e a busca por termo é liberada
+    db.execute('DELETE FROM transacao_busca_carga WHERE id = 1')
+    db.commit()
+    return indexadas
+
+
+def aplicar(db, tamanho_lote=None, progresso=None, **opcoes):
+    """Executa a migração completa; seguro para rodar de novo"""
+    preparar(db)
+    return preencher(db, tamanho_lote or TAMANHO_LOTE, progresso)
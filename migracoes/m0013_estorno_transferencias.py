@@ -0,0 +1,15 @@
+"""Tentativas e estorno das saídas de transferência entre shards"""
+
+from migracoes import adicionar_coluna
+
+
+def aplicar(db, **opcoes):
+    adicionar_coluna(db, 'transferencia_saida', 'tentativas', 'INTEGER NOT NULL DEFAULT 0')
+    adicionar_coluna(db, 'transferencia_saida', 'estornada_em', 'TIMESTAMP')
+    db.executescript('''
+        -- A fila sai pelas que falharam menos vezes: uma saída que sempre falha não trava as outras.
+        -- Estornadas saem do índice como as entregues
+        DROP INDEX IF EXISTS idx_transferencia_saida_pendente;
+        CREATE INDEX IF NOT EXISTS idx_transferencia_saida_fila
+            ON transferencia_saida (tentativas, criada_em) WHERE entregue_em IS NULL AND estornada_em IS NULL;
+    ''')
@@ -0,0 +1,88 @@
+"""
+Dados do dashboard em uma consulta, com cache por usuário
+
+`consultar()` traz usuário, contas, última movimentação e totais do mês de
+cada conta numa única consulta indexada (`conta.usuario_id`,
+`transacao (conta_id, data, id)` e a chave de `resumo_mensal`; o resumo do
+arquivo só é lido quando a conta não tem mais transações em `transacao`),
+e os últimos meses do usuário numa segunda, também pelo resumo mensal.
+
+`carregar()` guarda o resultado num CacheLRU por usuário. A invalidação
+vale entre workers: um gatilho (migração 0005) incrementa `usuario.versao`
+na mesma transação que altera o saldo de qualquer conta do usuário (ou cria
+uma conta), e o cache só é usado se a versão gravada for a atual — conferida
+por uma leitura pela chave primária.
+"""
+
+import resumos
+from cache import AUSENTE
+from ledger import TIPOS_DEBITO
+
+_MARCADORES_DEBITO = ','.join('?' * len(TIPOS_DEBITO))
+
+_CONSULTA = f'''
+    SELECT u.id AS usuario_id, u.nome, u.email, u.versao,
+           c.id, c.tipo, c.saldo_centavos,
+           strftime('%d/%m/%Y %H:%M', COALESCE(
+               (SELECT MAX(t.data) FROM transacao t WHERE t.conta_id = c.id),
+               (SELECT MAX(a.ultima_data) FROM transacao_arquivada a WHERE a.conta_id = c.id)))
+               AS ultima_movimentacao,
+           COALESCE(m.entradas_mes_centavos, 0) AS entradas_mes_centavos,
+           COALESCE(m.saidas_mes_centavos, 0) AS saidas_mes_centavos
+    FROM usuario u
+    LEFT JOIN conta c ON c.usuario_id = u.id
+    LEFT JOIN (
+        SELECT c2.id AS conta_id,
+               SUM(CASE WHEN r.tipo IN ({_MARCADORES_DEBITO}) THEN 0 ELSE r.total_centavos END)
+                   AS entradas_mes_centavos,
+               SUM(CASE WHEN r.tipo IN ({_MARCADORES_DEBITO}) THEN r.total_centavos ELSE 0 END)
+                   AS saidas_mes_centavos
+        FROM conta c2
+        JOIN resumo_mensal r ON r.conta_id = c2.id AND r.mes = strftime('%Y-%m', 'now')
+        WHERE c2.usuario_id = ?
+        GROUP BY c2.id
+    ) m ON m.conta_id = c.id
+    WHERE u.id = ?
+    ORDER BY c.id
+'''
+
+
+def consultar(db, usuario_id):
+    """Monta o dashboard do usuário; None se ele não existir"""
+    linhas = db.execute(_CONSULTA, (*sorted(TIPOS_DEBITO), *sorted(TIPOS_DEBITO),
+                                    usuario_id, usuario_id)).fetchall()
+    if not linhas:
+        return None
+    primeira = linhas[0]
+    return {
+        'versao': primeira['versao'],
+        'usuario': {'id': primeira['usuario_id'], 'nome': primeira['nome'], 'email': primeira['email']},
+        'contas': [{
+            'id': l['id'],
+            'tipo': l['tipo'],
+            'saldo_centavos': l['saldo_centavos'],
+            'ultima_movimentacao': l['ultima_movimentacao'],
+            'entradas_mes_centavos': l['entradas_mes_centavos'],
+            'saidas_mes_centavos': l['saidas_mes_centavos'],
+        } for l in linhas if l['id'] is not None],
+        'meses': resumos.meses_do_usuario(db, usuario_id),
+    }
+
+
+def carregar(db, usuario_id, cache, chave=None):
+    """Devolve o dashboard do cache se ainda estiver na versão atual
+
+    `chave` identifica o usuário no cache (padrão: o próprio id).
+    """
+    chave = usuario_id if chave is None else chave
+    linha = db.execute('SELECT versao FROM usuario WHERE id = ?', (usuario_id,)).fetchone()
+    if linha is None:
+        cache.invalidar(chave)
+        return None
+
+    dados = cache.obter(chave, linha[0])
+    if dados is AUSENTE:
+        dados = consultar(db, usuario_id)
+        if dados is not None:
+            cache.gravar(chave, dados, dados['versao'])
+    return dados
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Script para mover usuários entre shards e entregar transferências pendentes
+Execute: python rebalancear_shards.py [--simular] [--limite 100] [--usuario 7 --para 2] [--entregar]
+
+Sem --usuario, move para o shard `id % N` todo usuário que está em outro:
+depois de acrescentar um arquivo em SHARDS, é isso que espalha os usuários
+antigos pelo shard novo (os novos já nascem em `id % N`). Cada usuário é
+movido numa cópia própria (ver shards.mover_usuario) com o app no ar: os
+lançamentos dele esperam a cópia terminar.
+
+--entregar credita as transferências entre shards que ficaram pendentes
+(processo que caiu entre o débito e o crédito) e estorna as que iam para
+uma conta inexistente.
+"""
+
+import argparse
+import sys
+import time
+
+import database
+import shards
+
+# Busy timeout das conexões do script: a cópia espera os lançamentos em andamento
+BUSY_TIMEOUT_REBALANCEAMENTO = 60000
+
+
+def planejar(diretorio, total_shards, limite=None):
+    """(usuario_id, shard atual, shard de destino) de quem está fora de `id % N`"""
+    cursor = diretorio.execute('SELECT id, shard FROM diretorio_usuario WHERE shard != id % ? ORDER BY id',
+                               (total_shards,))
+    plano = [(usuario_id, atual, usuario_id % total_shards) for usuario_id, atual in cursor]
+    return plano[:limite] if limite else plano
+
+
+def entregar_pendentes(diretorio, conexoes):
+    """Entrega (ou estorna) as saídas pendentes de todos os shards; devolve quantas
+
+    Cada shard é lido em lotes até um lote não tirar nenhuma saída da fila:
+    as que falham de novo vão para o fim e não interrompem as outras.
+    """
+    conexao_da_conta = shards.roteador(diretorio, conexoes)
+    entregues = 0
+    for db in conexoes:
+        while True:
+            lote = shards.entregar_transferencias(db, conexao_da_conta)
+            entregues += lote
+            if not lote:
+                break
+    return entregues
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Move usuários entre shards')
+    parser.add_argument('--shards', default=','.join(shards.SHARDS), help='arquivos separados por vírgula')
+    parser.add_argument('--diretorio', default=shards.DIRETORIO)
+    parser.add_argument('--simular', action='store_true', help='só mostra quem seria movido')
+    parser.add_argument('--limite', type=int, help='move no máximo N usuários')
+    parser.add_argument('--usuario', type=int, help='move só este usuário (com --para)')
+    parser.add_argument('--para', type=int, help='número do shard de destino')
+    parser.add_argument('--entregar', action='store_true', help='entrega as transferências pendentes')
+    args = parser.parse_args()
+
+    caminhos = [caminho for caminho in args.shards.split(',') if caminho]
+    if not caminhos:
+        print("❌ Informe os shards (--shards ou a variável SHARDS)")
+        return 1
+    if (args.usuario is None) != (args.para is None) or (args.para is not None and
+                                                          not 0 <= args.para < len(caminhos)):
+        print("❌ --usuario e --para vão juntos, com --para entre 0 e o número de shards - 1")
+        return 1
+
+    pragmas = dict(database.SQLITE_PRAGMAS, busy_timeout=BUSY_TIMEOUT_REBALANCEAMENTO)
+    diretorio = database.conectar(args.diretorio, pragmas)
+    conexoes = [database.conectar(caminho, pragmas) for caminho in caminhos]
+    try:
+        if args.usuario is not None:
+            plano = [(args.usuario, shards.shard_do_usuario(diretorio, args.usuario), args.para)]
+        else:
+            plano = planejar(diretorio, len(caminhos), args.limite)
+        print(f"🗂️ {len(plano)} usuários para mover entre {len(caminhos)} shards")
+
+        inicio = time.perf_counter()
+        for numero, (usuario_id, atual, destino) in enumerate(plano, start=1):
+            if args.simular:
+                print(f"   usuário {usuario_id}: shard {atual} -> {destino}")
+                continue
+            shards.mover_usuario(diretorio, conexoes, usuario_id, destino)
+            print(f"   {numero}/{len(plano)} usuário {usuario_id}: shard {atual} -> {destino}", end='\r')
+        if plano and not args.simular:
+            print(f"\n✅ {len(plano)} usuários movidos em {time.perf_counter() - inicio:.2f}s")
+
+        if args.entregar:
+            print(f"📬 {entregar_pendentes(diretorio, conexoes)} transferências pendentes entregues ou estornadas")
+    except Exception as e:
+        print(f"\n❌ Erro no rebalanceamento: {e}")
+        print(f"Tipo do erro: {type(e).__name__}")
+        return 1
+    finally:
+        for db in (diretorio, *conexoes):
+            db.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
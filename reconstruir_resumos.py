@@ -0,0 +1,45 @@
+#!/usr/bin/env python3
+"""
+Script para refazer o resumo mensal das contas (backfill)
+Execute: python reconstruir_resumos.py [--banco banco.db] [--contas-por-lote 100]
+
+Soma `transacao` e o arquivo (`<banco>-arquivo/`) de cada banco (ou shard)
+em lotes de contas, cada lote numa transação curta; pode rodar com o app
+no ar (ver resumos.py).
+"""
+
+import argparse
+import sys
+import time
+
+import arquivo
+import database
+import resumos
+import shards
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Refaz o resumo mensal das contas')
+    parser.add_argument('--banco', action='append', help='repetível (padrão: os SHARDS ou DATABASE_PATH)')
+    parser.add_argument('--contas-por-lote', type=int, default=resumos.CONTAS_POR_LOTE)
+    args = parser.parse_args()
+
+    bancos = args.banco or shards.SHARDS or [database.DATABASE]
+    try:
+        for caminho in bancos:
+            db = database.conectar(caminho)
+            try:
+                inicio = time.perf_counter()
+                total = resumos.reconstruir_tudo(db, arquivo.diretorio_do_banco(caminho), args.contas_por_lote)
+                print(f"✅ {caminho}: resumo de {total} contas refeito em {time.perf_counter() - inicio:.2f}s")
+            finally:
+                db.close()
+    except Exception as e:
+        print(f"❌ Erro ao refazer o resumo: {e}")
+        print(f"Tipo do erro: {type(e).__name__}")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,60 @@
+"""
+Réplica de leitura: cópia do banco refeita periodicamente para relatórios
+
+Exportações de períodos longos leem milhares de linhas; na réplica elas não
+seguram um instantâneo do WAL do banco principal (o que atrasa o checkpoint)
+nem disputam o cache de páginas com os lançamentos.
+
+`atualizar()` copia o banco com a API de backup do SQLite (um instantâneo
+consistente, sem bloquear escritores), converte a cópia para o journal
+DELETE (lida por `mode=ro` sem -wal/-shm) e troca o arquivo de uma vez com
+os.replace: leitores com a cópia anterior aberta continuam nela até
+reabrir. A hora da modificação do arquivo é o início da cópia; tudo o que
+foi lançado antes disso (menos `MARGEM_SEGUNDOS`, o intervalo entre o
+INSERT e o COMMIT) está na réplica.
+
+Quem refaz a réplica é `python atualizar_replica.py`, de tempos em tempos.
+"""
+
+import os
+import sqlite3
+import time
+from datetime import datetime, timezone
+from urllib.parse import quote
+
+# A réplica de `banco.db` é `banco.db-replica`
+SUFIXO = '-replica'
+
+# Lançamentos com data até este tanto antes da cópia podem ter feito COMMIT depois dela
+MARGEM_SEGUNDOS = 5
+
+
+def caminho_da_replica(caminho):
+    return caminho + SUFIXO
+
+
+def atualizar(caminho):
+    """Refaz a réplica do banco `caminho`; devolve o instante (epoch) da cópia"""
+    destino = caminho_da_replica(caminho)
+    temporario = destino + '.tmp'
+    if os.path.exists(temporario):
+        os.remove(temporario)
+
+    inicio = time.time()
+    origem = sqlite3.connect(f'file:{quote(os.path.abspath(caminho))}?mode=ro', uri=True)
+    copia = sqlite3.connect(temporario)
+    try:
+        origem.backup(copia)
+        copia.execute('PRAGMA journal_mode = DELETE')
+    finally:
+        copia.close()
+        origem.close()
+    os.utime(temporario, (inicio, inicio))
+    os.replace(temporario, destino)
+    return inicio
+
+
+def completa_ate(caminho_replica):
+    """Data ('AAAA-MM-DD HH:MM:SS', UTC como transacao.data) até onde a réplica tem tudo"""
+    instante = os.stat(caminho_replica).st_mtime - MARGEM_SEGUNDOS
+    return datetime.fromtimestamp(instante, timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
@@ -0,0 +1,104 @@
+"""
+Resumo mensal por conta: quantidade e total de cada tipo de transação
+
+`resumo_mensal` (migração 0011) tem uma linha por (conta, mês, tipo),
+mantida por um gatilho AFTER INSERT em `transacao` na mesma transação do
+lançamento. Os painéis de resumo do extrato e do dashboard leem algumas
+linhas por mês pela chave primária em vez de somar `transacao`.
+
+O arquivamento (arquivo.py) tira linhas de `transacao` sem mexer no resumo,
+que continua cobrindo o histórico inteiro. `reconstruir()` refaz o resumo
+de um lote de contas a partir de `transacao` e do arquivo: bancos de antes
+da migração e correções manuais (`python reconstruir_resumos.py`).
+"""
+
+import arquivo
+import ledger
+
+# Meses (com o corrente) no painel do extrato e no do dashboard
+MESES_EXTRATO = 12
+MESES_DASHBOARD = 6
+
+# Contas refeitas por transação em reconstruir_tudo()
+CONTAS_POR_LOTE = 100
+
+
+def _desde(meses):
+    """Modificador do strftime do SQLite para o primeiro dos `meses` meses"""
+    return f'-{meses - 1} months'
+
+
+def _por_mes(linhas):
+    """Linhas (mes, tipo, quantidade, total) -> um item por mês, do mais recente"""
+    meses = {}
+    for mes, tipo, quantidade, total in linhas:
+        item = meses.setdefault(mes, {'mes': mes, 'rotulo': f'{mes[5:7]}/{mes[:4]}', 'quantidade': 0,
+                                      'entradas_centavos': 0, 'saidas_centavos': 0})
+        item['quantidade'] += quantidade
+        item['saidas_centavos' if tipo in ledger.TIPOS_DEBITO else 'entradas_centavos'] += total
+    for item in meses.values():
+        item['resultado_centavos'] = item['entradas_centavos'] - item['saidas_centavos']
+    return sorted(meses.values(), key=lambda item: item['mes'], reverse=True)
+
+
+def meses_da_conta(db, conta_id, meses=MESES_EXTRATO):
+    """Entradas, saídas e lançamentos da conta nos últimos `meses` meses"""
+    return _por_mes(db.execute('''
+        SELECT mes, tipo, quantidade, total_centavos FROM resumo_mensal
+        WHERE conta_id = ? AND mes >= strftime('%Y-%m', 'now', 'start of month', ?)
+    ''', (conta_id, _desde(meses))))
+
+
+def meses_do_usuario(db, usuario_id, meses=MESES_DASHBOARD):
+    """Entradas, saídas e lançamentos somados entre as contas do usuário"""
+    return _por_mes(db.execute('''
+        SELECT r.mes, r.tipo, r.quantidade, r.total_centavos
+        FROM conta c
+        JOIN resumo_mensal r ON r.conta_id = c.id
+            AND r.mes >= strftime('%Y-%m', 'now', 'start of month', ?)
+        WHERE c.usuario_id = ?
+    ''', (_desde(meses), usuario_id)))
+
+
+def reconstruir(db, diretorio_arquivo, contas):
+    """Refaz o resumo das `contas` a partir de `transacao` e do arquivo (sem abrir transação)
+
+    Rode dentro de BEGIN IMMEDIATE: lançamentos e arquivamento dessas contas
+    esperam, e o resumo sai de um instantâneo só.
+    """
+    marcadores = ','.join('?' * len(contas))
+    db.execute(f'DELETE FROM resumo_mensal WHERE conta_id IN ({marcadores})', contas)
+    db.execute(f'''
+        INSERT INTO resumo_mensal (conta_id, mes, tipo, quantidade, total_centavos)
+        SELECT conta_id, substr(data, 1, 7), tipo, COUNT(*),
+               SUM(COALESCE(valor_centavos, CAST(round(valor * 100) AS INTEGER)))
+        FROM transacao
+        WHERE conta_id IN ({marcadores})
+        GROUP BY conta_id, substr(data, 1, 7), tipo
+    ''', contas)
+    for conta_id in contas:
+        totais = {}
+        for transacao in arquivo.transacoes(db, diretorio_arquivo, conta_id):
+            chave = (transacao['data'][:7], transacao['tipo'])
+            quantidade, total = totais.get(chave, (0, 0))
+            totais[chave] = (quantidade + 1, total + transacao['valor_centavos'])
+        db.executemany('''
+            INSERT INTO resumo_mensal (conta_id, mes, tipo, quantidade, total_centavos)
+            VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT (conta_id, mes, tipo) DO UPDATE SET
+                quantidade = quantidade + excluded.quantidade,
+                total_centavos = total_centavos + excluded.total_centavos
+        ''', [(conta_id, mes, tipo, quantidade, total) for (mes, tipo), (quantidade, total) in totais.items()])
+
+
+def reconstruir_tudo(db, diretorio_arquivo, contas_por_lote=CONTAS_POR_LOTE):
+    """Refaz o resumo de todas as contas, um lote por transação; devolve quantas"""
+    total, ultima_conta = 0, 0
+    while True:
+        contas = [linha[0] for linha in db.execute('SELECT id FROM conta WHERE id > ? ORDER BY id LIMIT ?',
+                                                   (ultima_conta, contas_por_lote))]
+        if not contas:
+            return total
+        ledger.em_transacao(db, reconstruir, diretorio_arquivo, contas)
+        total += len(contas)
+        ultima_conta = contas[-1]
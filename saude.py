@@ -0,0 +1,67 @@
+"""
+Sondas de saúde: vivacidade (liveness) e prontidão (readiness)
+
+A plataforma chama as sondas o tempo todo, então nenhuma pode custar
+proporcionalmente ao tamanho do banco. A de vivacidade nem toca no banco.
+A de prontidão confere, cada item em tempo constante:
+- a conexão do pool da thread (SELECT 1);
+- a versão do esquema (schema_version tem uma linha por migração);
+- o atraso do checkpoint do WAL, pelo tamanho do arquivo -wal (um stat,
+  sem checkpoint: a sonda não faz I/O no banco). Com journal_size_limit o
+  arquivo volta ao limite a cada checkpoint completo; leitores longos que
+  seguram o checkpoint o fazem crescer;
+- o espaço livre no disco do banco.
+
+Contagens de usuários e contas não entram nas sondas: vêm de um instantâneo
+por worker, refeito a cada `SAUDE_CONTAGENS_TTL` segundos (`contagens()`).
+"""
+
+import os
+import shutil
+from datetime import datetime, timezone
+
+import migracoes
+
+
+def atraso_wal(db, caminho):
+    """Quadros no arquivo -wal do banco (0 fora do modo WAL)"""
+    try:
+        tamanho = os.stat(f'{caminho}-wal').st_size
+    except FileNotFoundError:
+        return 0
+    pagina = db.execute('PRAGMA page_size').fetchone()[0]
+    # Cabeçalho de 32 bytes e, por quadro, 24 bytes mais a página
+    return max(tamanho - 32, 0) // (pagina + 24)
+
+
+def verificar_prontidao(db, caminho, wal_maximo, disco_minimo):
+    """(pronto, verificações) do worker para receber tráfego
+
+    `wal_maximo` é o atraso aceito em quadros do WAL; `disco_minimo`, o
+    espaço livre mínimo em bytes. Erros do SQLite sobem para quem chamou.
+    """
+    db.execute('SELECT 1').fetchone()
+    faltando = [m.versao for m in migracoes.pendentes(db, incluir_online=False)]
+    atraso = atraso_wal(db, caminho)
+    livre = shutil.disk_usage(os.path.dirname(os.path.abspath(caminho))).free
+    verificacoes = {
+        'banco': {'ok': True},
+        'esquema': {'ok': not faltando, 'pendentes': faltando},
+        'wal': {'ok': atraso <= wal_maximo, 'atraso_quadros': atraso},
+        'disco': {'ok': livre >= disco_minimo, 'livre_bytes': livre},
+    }
+    return all(item['ok'] for item in verificacoes.values()), verificacoes
+
+
+def contagens(*bancos):
+    """Instantâneo das contagens, somadas entre os bancos (shards)
+
+    Varre as tabelas: só para o cache periódico.
+    """
+    usuarios = contas = 0
+    for db in bancos:
+        linha = db.execute('SELECT (SELECT COUNT(*) FROM usuario), (SELECT COUNT(*) FROM conta)').fetchone()
+        usuarios += linha[0]
+        contas += linha[1]
+    return {'usuarios': usuarios, 'contas': contas,
+            'atualizado_em': datetime.now(timezone.utc).isoformat(timespec='seconds')}
@@ -0,0 +1,124 @@
+"""
+Hash de senhas fora do worker, num pool de processos limitado
+
+PBKDF2/scrypt são caros de propósito; feitos dentro da requisição, uma
+rajada de logins ocupa todos os workers do gunicorn. Aqui o cálculo vai
+para um ProcessPoolExecutor por worker com `processos` processos e no
+máximo `fila_maxima` pedidos em andamento: acima disso `PoolSaturado` é
+levantado na hora (a rota responde 503) em vez de enfileirar sem limite.
+
+O custo vem de `metodo` (formato do Werkzeug, ex.: 'pbkdf2:sha256:600000'
+ou 'scrypt:32768:8:1'). Um hash gravado com outro método é refeito no
+próximo login bem-sucedido, no mesmo pedido ao pool da verificação.
+"""
+
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import TimeoutError as FuturoTimeout
+from concurrent.futures.process import BrokenProcessPool
+
+from werkzeug.security import DEFAULT_PBKDF2_ITERATIONS, check_password_hash, generate_password_hash
+
+METODO_PADRAO = f'pbkdf2:sha256:{DEFAULT_PBKDF2_ITERATIONS}'
+
+
+class PoolSaturado(Exception):
+    """Pedidos demais aguardando hash; tente de novo em instantes"""
+
+
+def normalizar_metodo(metodo):
+    """Completa os parâmetros omitidos com os padrões do Werkzeug"""
+    partes = metodo.split(':')
+    if partes[0] == 'pbkdf2':
+        partes += ['sha256', str(DEFAULT_PBKDF2_ITERATIONS)][len(partes) - 1:]
+    elif partes[0] == 'scrypt':
+        partes += ['32768', '8', '1'][len(partes) - 1:]
+    return ':'.join(partes)
+
+
+def precisa_rehash(senha_hash, metodo):
+    """O hash gravado usa um método (ou custo) diferente do configurado?"""
+    return senha_hash.split('$', 1)[0] != normalizar_metodo(metodo)
+
+
+def gerar(senha, metodo):
+    return generate_password_hash(senha, normalizar_metodo(metodo))
+
+
+def verificar(senha_hash, senha, metodo):
+    """Devolve (confere, hash novo ou None se o atual já está no custo certo)"""
+    if not check_password_hash(senha_hash, senha):
+        return False, None
+    if precisa_rehash(senha_hash, metodo):
+        return True, gerar(senha, metodo)
+    return True, None
+
+
+class PoolSenhas:
+    def __init__(self, metodo=METODO_PADRAO, processos=1, fila_maxima=8, timeout=10.0):
+        self.metodo = metodo
+        self.processos = processos
+        self.fila_maxima = fila_maxima
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._executor = None
+        self._pid = None
+        self._em_andamento = 0
+        self.recusados = 0
+
+    def _obter_executor(self):
+        # Um pool por processo: o do mestre não sobrevive ao fork dos workers
+        if self._pid != os.getpid():
+            self._executor = ProcessPoolExecutor(
+                self.processos, mp_context=multiprocessing.get_context('spawn'))
+            self._pid = os.getpid()
+        return self._executor
+
+    def _executar(self, funcao, *args):
+        if self.processos <= 0:
+            return funcao(*args)
+
+        with self._lock:
+            if self._em_andamento >= self.fila_maxima:
+                self.recusados += 1
+                raise PoolSaturado()
+            try:
+                futuro = self._obter_executor().submit(funcao, *args)
+            except BrokenProcessPool:
+                self._pid = None
+                raise
+            self._em_andamento += 1
+        # A vaga só é liberada quando o processo termina, mesmo após um timeout
+        futuro.add_done_callback(self._concluido)
+        try:
+            return futuro.result(self.timeout)
+        except FuturoTimeout:
+            raise PoolSaturado() from None
+        except BrokenProcessPool:
+            with self._lock:
+                self._pid = None
+            raise
+
+    def _concluido(self, futuro):
+        with self._lock:
+            self._em_andamento -= 1
+
+    def gerar(self, senha):
+        return self._executar(gerar, senha, self.metodo)
+
+    def verificar(self, senha_hash, senha):
+        return self._executar(verificar, senha_hash, senha, self.metodo)
+
+    def encerrar(self):
+        with self._lock:
+            if self._executor is not None and self._pid == os.getpid():
+                self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor, self._pid = None, None
+
+    def estatisticas(self):
+        with self._lock:
+            return {'metodo': normalizar_metodo(self.metodo), 'processos': self.processos,
+                    'fila_maxima': self.fila_maxima, 'em_andamento': self._em_andamento,
+                    'recusados': self.recusados}
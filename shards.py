@@ -0,0 +1,341 @@
+"""
+Shards: os dados de cada usuário num de N arquivos SQLite
+
+Com um arquivo só, todas as escritas de todos os clientes disputam o mesmo
+lock de escrita do SQLite. Com `SHARDS=banco-0.db,banco-1.db,...` cada
+usuário (com as suas contas, transações, checkpoints e chaves de
+idempotência) mora num dos arquivos, e lançamentos de usuários em shards
+diferentes gravam em paralelo.
+
+Um banco pequeno de diretório (`SHARDS_DIRETORIO`) é a fonte da verdade do
+roteamento e dos ids globais:
+- `diretorio_usuario`: email -> id do usuário e número do shard (login e
+  registro consultam só o diretório antes de ir ao shard);
+- `diretorio_conta`: id da conta -> usuário (transferências para contas
+  de terceiros e importação em lote);
+- `token_api`: tokens da API, resolvidos antes de saber o shard.
+Ids de usuário e de conta saem do diretório e são gravados explicitamente
+nos shards; ids de transação são locais a cada shard.
+
+Transferência entre shards não cabe numa transação só (no modo WAL uma
+transação com bancos anexados não é atômica entre eles). Ela é feita em
+duas pernas explícitas:
+1. no shard da origem, na mesma transação: débito, linha em `transferencia`
+   e uma saída pendente em `transferencia_saida` com uma chave única;
+2. no shard do destino: o crédito e a chave em `transferencia_entrada`,
+   que impede creditar duas vezes; depois a saída é marcada como entregue.
+Se o processo cair entre as pernas, a saída continua pendente e
+`entregar_transferencias()` (chamada nas transferências seguintes do shard
+e pelo `rebalancear_shards.py --entregar`) completa o crédito. Enquanto
+isso o dinheiro está "em trânsito": debitado e ainda não creditado. Uma
+saída para uma conta que não existe é estornada: o valor volta à origem.
+
+`mover_usuario()` muda um usuário de shard (ver rebalancear_shards.py).
+"""
+
+import os
+import sqlite3
+import uuid
+
+import arquivo
+import idempotencia
+import ledger
+
+# Arquivos dos shards, na ordem (o número do shard é a posição na lista)
+SHARDS = [caminho for caminho in os.environ.get('SHARDS', '').split(',') if caminho]
+
+# Banco do diretório (email/conta -> usuário -> shard)
+DIRETORIO = os.environ.get('SHARDS_DIRETORIO', 'banco-diretorio.db')
+
+# Saídas pendentes entregues por chamada de entregar_transferencias()
+ENTREGAS_POR_VEZ = 10
+
+_ESQUEMA_DIRETORIO = '''
+    CREATE TABLE IF NOT EXISTS diretorio_usuario (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        email TEXT UNIQUE NOT NULL,
+        shard INTEGER NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS diretorio_conta (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        usuario_id INTEGER NOT NULL REFERENCES diretorio_usuario (id)
+    );
+    CREATE INDEX IF NOT EXISTS idx_diretorio_conta_usuario ON diretorio_conta (usuario_id);
+    CREATE TABLE IF NOT EXISTS token_api (
+        hash TEXT PRIMARY KEY,
+        usuario_id INTEGER NOT NULL,
+        criado_em TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        expira_em TIMESTAMP NOT NULL
+    ) WITHOUT ROWID;
+'''
+
+
+class UsuarioSemShard(LookupError):
+    """O usuário não está no diretório"""
+
+
+def preparar_diretorio(db):
+    """Cria as tabelas do diretório (pode rodar de novo)"""
+    db.executescript(_ESQUEMA_DIRETORIO)
+
+
+def shard_do_usuario(diretorio, usuario_id):
+    """Número do shard do usuário, ou None"""
+    linha = diretorio.execute('SELECT shard FROM diretorio_usuario WHERE id = ?', (usuario_id,)).fetchone()
+    return linha[0] if linha else None
+
+
+def usuario_do_email(diretorio, email):
+    """Id do usuário com o email, ou None"""
+    linha = diretorio.execute('SELECT id FROM diretorio_usuario WHERE email = ?', (email,)).fetchone()
+    return linha[0] if linha else None
+
+
+def usuario_da_conta(diretorio, conta_id):
+    """Id do dono da conta, ou None"""
+    linha = diretorio.execute('SELECT usuario_id FROM diretorio_conta WHERE id = ?', (conta_id,)).fetchone()
+    return linha[0] if linha else None
+
+
+def roteador(diretorio, conexoes):
+    """Função conta_id -> conexão do shard do dono da conta (None se ela não existe)
+
+    Para scripts fora do app: `conexoes` é uma conexão por shard, na ordem
+    dos SHARDS.
+    """
+    def conexao_da_conta(conta_id):
+        dono = usuario_da_conta(diretorio, conta_id)
+        numero = shard_do_usuario(diretorio, dono) if dono is not None else None
+        return conexoes[numero] if numero is not None else None
+    return conexao_da_conta
+
+
+def reservar_usuario(diretorio, email, total_shards):
+    """Reserva o id do usuário novo e escolhe o shard (id % total); sem COMMIT
+
+    Levanta sqlite3.IntegrityError se o email já existe.
+    """
+    usuario_id = diretorio.execute('INSERT INTO diretorio_usuario (email, shard) VALUES (?, -1)',
+                                   (email,)).lastrowid
+    diretorio.execute('UPDATE diretorio_usuario SET shard = ? WHERE id = ?', (usuario_id % total_shards, usuario_id))
+    return usuario_id
+
+
+def reservar_conta(diretorio, usuario_id):
+    """Reserva o id de uma conta nova do usuário; sem COMMIT"""
+    return diretorio.execute('INSERT INTO diretorio_conta (usuario_id) VALUES (?)', (usuario_id,)).lastrowid
+
+
+def iniciar_transferencia(db, origem_id, destino_id, centavos, usuario_id=None):
+    """Primeira perna de uma transferência entre shards, no shard da origem
+
+    Debita a origem e grava a saída pendente na transação já aberta. Só o
+    diretório é consultado antes (a conta de destino tem dono); se ela não
+    existir no shard do dono, a entrega estorna o valor à origem (ver
+    entregar_transferencias). Devolve o id da linha em `transferencia`.
+    """
+    if origem_id == destino_id:
+        raise ledger.TransferenciaInvalida(origem_id)
+    transferencia_id = db.execute('''
+        INSERT INTO transferencia (conta_origem_id, conta_destino_id, valor_centavos, valor)
+        VALUES (?, ?, ?, ?)
+    ''', (origem_id, destino_id, centavos, centavos / 100)).lastrowid
+    ledger.aplicar_lancamento(db, origem_id, 'transferencia_enviada', centavos,
+                              f'Transferência para conta {destino_id}', usuario_id, transferencia_id)
+    db.execute('''
+        INSERT INTO transferencia_saida (chave, transferencia_id, conta_origem_id, conta_destino_id,
+                                         valor_centavos)
+        VALUES (?, ?, ?, ?, ?)
+    ''', (uuid.uuid4().hex, transferencia_id, origem_id, destino_id, centavos))
+    return transferencia_id
+
+
+def receber_transferencia(db, chave, origem_id, destino_id, centavos):
+    """Segunda perna, no shard do destino; uma chave já recebida não credita de novo
+
+    O crédito fica ligado a uma cópia local da linha de `transferencia`.
+    Devolve o id da transação de crédito, ou None se a chave já foi recebida.
+    """
+    if not db.execute('INSERT OR IGNORE INTO transferencia_entrada (chave, conta_id) VALUES (?, ?)',
+                      (chave, destino_id)).rowcount:
+        return None
+    transferencia_id = db.execute('''
+        INSERT INTO transferencia (conta_origem_id, conta_destino_id, valor_centavos, valor)
+        VALUES (?, ?, ?, ?)
+    ''', (origem_id, destino_id, centavos, centavos / 100)).lastrowid
+    return ledger.aplicar_lancamento(db, destino_id, 'transferencia_recebida', centavos,
+                                     f'Transferência da conta {origem_id}', None, transferencia_id)
+
+
+def estornar_transferencia(db, chave, transferencia_id, origem_id, destino_id, centavos):
+    """Devolve à origem uma saída cujo destino não existe; sem COMMIT
+
+    O estorno é um crédito ligado à mesma linha de `transferencia`. Devolve
+    o id da transação de estorno, ou None se a saída já saiu da fila.
+    """
+    if not db.execute('''
+        UPDATE transferencia_saida SET estornada_em = CURRENT_TIMESTAMP
+        WHERE chave = ? AND entregue_em IS NULL AND estornada_em IS NULL
+    ''', (chave,)).rowcount:
+        return None
+    return ledger.aplicar_lancamento(db, origem_id, 'transferencia_recebida', centavos,
+                                     f'Estorno da transferência para conta {destino_id}', None, transferencia_id)
+
+
+def _adiar_entrega(db, chave):
+    """Soma uma tentativa à saída: ela vai para o fim da fila (com COMMIT)"""
+    with db:
+        db.execute('UPDATE transferencia_saida SET tentativas = tentativas + 1 WHERE chave = ?', (chave,))
+
+
+def entregar_transferencias(db, conexao_da_conta, limite=ENTREGAS_POR_VEZ):
+    """Credita as saídas pendentes do shard `db` no shard de cada destino
+
+    `conexao_da_conta(conta_id)` devolve a conexão do shard da conta (ou
+    None se a conta não existe). Uma saída para conta inexistente é
+    estornada na origem. Uma entrega que falha por erro do SQLite (shard
+    ocupado ou fora do ar) soma uma tentativa e vai para o fim da fila, atrás
+    das que falharam menos: ela não impede a entrega das outras. Devolve
+    quantas saíram da fila (entregues ou estornadas).
+    """
+    pendentes = db.execute('''
+        SELECT chave, transferencia_id, conta_origem_id, conta_destino_id, valor_centavos
+        FROM transferencia_saida
+        WHERE entregue_em IS NULL AND estornada_em IS NULL
+        ORDER BY tentativas, criada_em LIMIT ?
+    ''', (limite,)).fetchall()
+    resolvidas = 0
+    for chave, transferencia_id, origem_id, destino_id, centavos in pendentes:
+        destino = None
+        try:
+            destino = conexao_da_conta(destino_id)
+            if destino is None:
+                raise ledger.ContaDestinoNaoEncontrada(destino_id)
+            ledger.em_transacao(destino, receber_transferencia, chave, origem_id, destino_id, centavos)
+        except ledger.ContaNaoEncontrada:
+            # A conta mudou de shard durante a entrega: existe, só está em outro arquivo
+            if destino is not None and conexao_da_conta(destino_id) is not destino:
+                _adiar_entrega(db, chave)
+                continue
+            ledger.em_transacao(db, estornar_transferencia, chave, transferencia_id, origem_id, destino_id,
+                                centavos)
+        except sqlite3.OperationalError:
+            _adiar_entrega(db, chave)
+            continue
+        else:
+            with db:
+                db.execute('UPDATE transferencia_saida SET entregue_em = CURRENT_TIMESTAMP WHERE chave = ?',
+                           (chave,))
+        resolvidas += 1
+    return resolvidas
+
+
+def _copiar_linhas(origem, destino, tabela, filtro, parametros, trocas=None, sem=()):
+    """Copia as linhas de `tabela` que atendem `filtro`; devolve {id antigo: id novo}
+
+    `trocas` mapeia coluna -> {valor antigo: valor novo} (ou uma função do
+    valor antigo); colunas em `sem`
+    não são copiadas (o destino gera outro valor, ex.: ids locais).
+    """
+    # Primeira coluna: o id (ou a chave das tabelas WITHOUT ROWID); ids novos saem na mesma ordem
+    cursor = origem.execute(f'SELECT * FROM {tabela} WHERE {filtro} ORDER BY 1', parametros)
+    colunas = [descricao[0] for descricao in cursor.description]
+    copiadas = [coluna for coluna in colunas if coluna not in sem]
+    sql = (f'INSERT INTO {tabela} ({", ".join(copiadas)}) '
+           f'VALUES ({", ".join("?" * len(copiadas))})')
+    ids = {}
+    for linha in cursor.fetchall():
+        valores = dict(zip(colunas, linha))
+        for coluna, troca in (trocas or {}).items():
+            if valores[coluna] is not None:
+                valores[coluna] = troca(valores[coluna]) if callable(troca) else troca[valores[coluna]]
+        novo = destino.execute(sql, [valores[coluna] for coluna in copiadas]).lastrowid
+        if 'id' in valores:
+            ids[valores['id']] = novo
+    return ids
+
+
+def _avancar_sequencia(origem, destino, tabela):
+    """Faz os próximos ids de `tabela` no destino passarem de todos os da origem
+
+    Transações renumeradas ficam acima das antigas: `ultima_transacao_id`
+    (e os ETags da API) só crescem, também para quem mudou de shard.
+    """
+    linha = origem.execute('SELECT seq FROM sqlite_sequence WHERE name = ?', (tabela,)).fetchone()
+    if linha is None:
+        return
+    if not destino.execute('UPDATE sqlite_sequence SET seq = MAX(seq, ?) WHERE name = ?',
+                           (linha[0], tabela)).rowcount:
+        destino.execute('INSERT INTO sqlite_sequence (name, seq) VALUES (?, ?)', (tabela, linha[0]))
+
+
+def _apagar_usuario(db, usuario_id):
+    """Remove do shard o usuário e tudo o que é só dele (sem COMMIT)"""
+    contas = 'SELECT id FROM conta WHERE usuario_id = ?'
+    for tabela, coluna in (('saldo_checkpoint', 'conta_id'), ('transacao', 'conta_id'),
+                           ('transacao_arquivada', 'conta_id'), ('resumo_mensal', 'conta_id'),
+                           ('transferencia_saida', 'conta_origem_id'), ('transferencia_entrada', 'conta_id')):
+        db.execute(f'DELETE FROM {tabela} WHERE {coluna} IN ({contas})', (usuario_id,))
+    db.execute('DELETE FROM conta WHERE usuario_id = ?', (usuario_id,))
+    db.execute('DELETE FROM idempotencia WHERE usuario_id = ?', (usuario_id,))
+    db.execute('DELETE FROM usuario WHERE id = ?', (usuario_id,))
+
+
+def mover_usuario(diretorio, conexoes, usuario_id, destino):
+    """Move o usuário para o shard `destino`; devolve False se ele já estava lá
+
+    `conexoes` são as conexões dos shards, na ordem. O shard de origem fica
+    com o lock de escrita durante a cópia: lançamentos do usuário esperam
+    (busy_timeout) e, se chegarem depois da troca no diretório, não acham
+    mais a conta na origem e falham sem gravar nada. Transações arquivadas
+    voltam para `transacao` antes da cópia (o próximo `arquivar.py` no
+    destino as arquiva de novo). Ids de transação e de transferência são
+    renumerados no destino, inclusive nas respostas gravadas das chaves de
+    idempotência; restos de uma cópia interrompida no destino são apagados
+    antes. Seguro para rodar de novo.
+    """
+    origem = shard_do_usuario(diretorio, usuario_id)
+    if origem is None:
+        raise UsuarioSemShard(usuario_id)
+    if origem == destino:
+        return False
+    db_origem, db_destino = conexoes[origem], conexoes[destino]
+    contas = 'conta_id IN (SELECT id FROM conta WHERE usuario_id = ?)'
+
+    db_origem.execute('BEGIN IMMEDIATE')
+    try:
+        arquivo.restaurar(db_origem, arquivo.diretorio_da_conexao(db_origem), usuario_id)
+        db_destino.execute('BEGIN IMMEDIATE')
+        try:
+            _apagar_usuario(db_destino, usuario_id)
+            _avancar_sequencia(db_origem, db_destino, 'transacao')
+            _copiar_linhas(db_origem, db_destino, 'usuario', 'id = ?', (usuario_id,))
+            _copiar_linhas(db_origem, db_destino, 'conta', 'usuario_id = ?', (usuario_id,))
+            referenciadas = f'id IN (SELECT transferencia_id FROM transacao WHERE {contas})'
+            novas_transferencias = _copiar_linhas(db_origem, db_destino, 'transferencia', referenciadas,
+                                                  (usuario_id,), sem=('id',))
+            # Com a sequência avançada o gatilho leva ultima_transacao_id aos ids novos
+            novas_transacoes = _copiar_linhas(db_origem, db_destino, 'transacao', contas, (usuario_id,),
+                                              {'transferencia_id': novas_transferencias}, sem=('id',))
+            _copiar_linhas(db_origem, db_destino, 'saldo_checkpoint', contas, (usuario_id,),
+                           {'transacao_id': novas_transacoes})
+            _copiar_linhas(db_origem, db_destino, 'transferencia_saida',
+                           'conta_origem_id IN (SELECT id FROM conta WHERE usuario_id = ?)', (usuario_id,),
+                           {'transferencia_id': novas_transferencias})
+            _copiar_linhas(db_origem, db_destino, 'transferencia_entrada', contas, (usuario_id,))
+            ids = {'transacao': novas_transacoes, 'transferencia': novas_transferencias}
+            _copiar_linhas(db_origem, db_destino, 'idempotencia', 'usuario_id = ?', (usuario_id,),
+                           {'resposta': lambda resposta: idempotencia.renumerar(resposta, ids)}, sem=('id',))
+        except BaseException:
+            db_destino.rollback()
+            raise
+        db_destino.commit()
+
+        with diretorio:
+            diretorio.execute('UPDATE diretorio_usuario SET shard = ? WHERE id = ?', (destino, usuario_id))
+        _apagar_usuario(db_origem, usuario_id)
+    except BaseException:
+        db_origem.rollback()
+        raise
+    db_origem.commit()
+    return True
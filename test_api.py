@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+Script para testar a API JSON (/api/v1): tokens, ETags e 304
+Execute: python test_api.py
+"""
+
+import os
+import re
+import tempfile
+
+import database
+import ledger
+import senhas
+from app import app, init_db
+
+
+def _preparar(caminho):
+    app.config['DATABASE'] = caminho
+    init_db()
+    db = database.conectar(caminho)
+    db.executemany("INSERT INTO usuario (nome, email, senha) VALUES (?, ?, ?)",
+                   [('Teste', 't@t.com', senhas.gerar('segredo', 'pbkdf2:sha256:1000')),
+                    ('Outro', 'o@o.com', 'x')])
+    db.executemany("INSERT INTO conta (tipo, usuario_id) VALUES (?, ?)", [('corrente', 1), ('corrente', 2)])
+    db.commit()
+    for i in range(5):
+        ledger.lancar(db, 1, 'deposito', 1000 + i, f'Depósito {i}')
+    return db
+
+
+def test_tokens():
+    """Emissão, uso e revogação do token Bearer"""
+    print("🔍 Testando tokens da API...")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        try:
+            _preparar(os.path.join(tmp, 'teste.db')).close()
+            cliente = app.test_client()
+
+            resposta = cliente.get('/api/v1/contas')
+            assert resposta.status_code == 401 and resposta.headers['WWW-Authenticate'] == 'Bearer'
+            resposta = cliente.post('/api/v1/tokens', json={'email': 't@t.com', 'senha': 'errada'})
+            assert resposta.status_code == 401
+            resposta = cliente.post('/api/v1/tokens', json={'email': 't@t.com', 'senha': 'segredo'})
+            assert resposta.status_code == 201
+            cabecalho = {'Authorization': f"Bearer {resposta.get_json()['token']}"}
+            print("✅ Token emitido só com a senha certa")
+
+            assert cliente.get('/api/v1/contas', headers=cabecalho).get_json()['contas'][0]['id'] == 1
+            assert cliente.get('/api/v1/contas/2', headers=cabecalho).status_code == 404
+            assert cliente.delete('/api/v1/tokens', headers=cabecalho).status_code == 204
+            assert cliente.get('/api/v1/contas', headers=cabecalho).status_code == 401
+            print("✅ Conta de outro usuário negada e token revogado")
+        finally:
+            database.fechar_conexoes()
+            app.config['DATABASE'] = database.DATABASE
+
+
+def test_etag_extrato():
+    """304 sem consultar transacao; um lançamento muda a ETag"""
+    print("🔍 Testando GET condicional do extrato...")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        caminho = os.path.join(tmp, 'teste.db')
+        try:
+            db = _preparar(caminho)
+            cliente = app.test_client()
+            token = cliente.post('/api/v1/tokens', data={'email': 't@t.com', 'senha': 'segredo'}).get_json()['token']
+            cabecalho = {'Authorization': f'Bearer {token}'}
+
+            resposta = cliente.get('/api/v1/contas/1/extrato?limite=2', headers=cabecalho)
+            corpo, etag = resposta.get_json(), resposta.headers['ETag']
+            assert resposta.status_code == 200 and not etag.startswith('W/')
+            assert [t['id'] for t in corpo['transacoes']] == [5, 4]
+            assert corpo['conta']['saldo_centavos'] == 5010 and corpo['paginacao']['antes']
+            antigas = cliente.get('/api/v1/contas/1/extrato', headers=cabecalho,
+                                  query_string={'limite': 2, 'antes': corpo['paginacao']['antes']})
+            assert [t['id'] for t in antigas.get_json()['transacoes']] == [3, 2]
+            assert antigas.headers['ETag'] != etag
+            print("✅ Página do extrato com ETag forte")
+
+            # A conexão da thread é a mesma que o app usa nas requisições do cliente de teste
+            comandos = []
+            database._conexao_da_thread(caminho, app.config['SQLITE_PRAGMAS']).set_trace_callback(comandos.append)
+            resposta = cliente.get('/api/v1/contas/1/extrato?limite=2',
+                                   headers={**cabecalho, 'If-None-Match': etag})
+            assert resposta.status_code == 304 and resposta.data == b''
+            assert comandos and not any(re.search(r'\btransacao\b', c) for c in comandos)
+            print("✅ 304 respondido sem tocar em transacao")
+
+            ledger.lancar(db, 1, 'saque', 10, 'Saque')
+            resposta = cliente.get('/api/v1/contas/1/extrato?limite=2',
+                                   headers={**cabecalho, 'If-None-Match': etag})
+            assert resposta.status_code == 200 and resposta.headers['ETag'] != etag
+            assert resposta.get_json()['transacoes'][0]['id'] == 6
+
+            lista = cliente.get('/api/v1/contas', headers=cabecalho)
+            assert cliente.get('/api/v1/contas', headers={
+                **cabecalho, 'If-None-Match': lista.headers['ETag']}).status_code == 304
+            db.execute("INSERT INTO conta (tipo, usuario_id) VALUES ('poupanca', 1)")
+            db.commit()
+            assert cliente.get('/api/v1/contas', headers={
+                **cabecalho, 'If-None-Match': lista.headers['ETag']}).status_code == 200
+            db.close()
+            print("✅ Lançamento e conta nova mudam a ETag")
+        finally:
+            database.fechar_conexoes()
+            app.config['DATABASE'] = database.DATABASE
+
+
+if __name__ == '__main__':
+    print("🚀 Iniciando testes da API...\n")
+
+    test_tokens()
+    test_etag_extrato()
+
+    print("\n🎉 Testes da API passaram!")
@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+"""
+Script para testar o arquivamento das transações antigas
+Execute: python test_arquivo.py
+"""
+
+import os
+import sqlite3
+import tempfile
+
+import arquivo
+import database
+import ledger
+import resumos
+from app import app, cache_arquivo, init_db, pool_senhas
+
+MESES = ['2020-01', '2020-02', '2020-03', '2020-04', '2020-05', '2020-06']
+POR_MES = 40
+
+
+def _popular(caminho):
+    """Conta 1 com POR_MES transações por mês de MESES e mais 5 de hoje"""
+    db = database.conectar(caminho)
+    db.execute("INSERT INTO usuario (nome, email, senha) VALUES ('Teste', 't@t.com', ?)",
+               (pool_senhas.gerar('segredo'),))
+    db.execute("INSERT INTO conta (tipo, usuario_id) VALUES ('corrente', 1)")
+    db.commit()
+
+    def lancar_todos(db):
+        for numero in range(len(MESES) * POR_MES + 5):
+            tipo = 'saque' if numero % 3 == 2 else 'deposito'
+            ledger.aplicar_lancamento(db, 1, tipo, 100 + numero, f'Lançamento {numero}')
+    ledger.em_transacao(db, lancar_todos)
+
+    # Datas antigas na ordem dos ids, como se os lançamentos tivessem sido feitos lá
+    with db:
+        for indice, mes in enumerate(MESES):
+            for posicao in range(POR_MES):
+                transacao_id = indice * POR_MES + posicao + 1
+                db.execute('UPDATE transacao SET data = ? WHERE id = ?',
+                           (f'{mes}-{posicao * 27 // POR_MES + 1:02d} {posicao % 24:02d}:00:00', transacao_id))
+        db.execute('UPDATE saldo_checkpoint SET data = (SELECT data FROM transacao WHERE id = transacao_id)')
+    # As datas mudaram por UPDATE, que o gatilho do resumo mensal não vê
+    resumos.reconstruir_tudo(db, arquivo.diretorio_do_banco(caminho))
+    return db
+
+
+def _paginas(cliente, rota):
+    """Ids de todas as páginas do extrato da API, seguindo os cursores 'antes'"""
+    ids, consulta = [], ''
+    while True:
+        corpo = cliente.get(rota + consulta).get_json()
+        ids += [t['id'] for t in corpo['transacoes']]
+        if not corpo['paginacao']['antes']:
+            return ids
+        consulta = f"&antes={corpo['paginacao']['antes']}"
+
+
+def test_arquivamento_transparente():
+    """Extrato, API e exportação iguais antes e depois de arquivar"""
+    print("🔍 Testando o arquivamento de transações...")
+
+    metodo = pool_senhas.metodo
+    pool_senhas.metodo = 'pbkdf2:sha256:1000'
+    with tempfile.TemporaryDirectory() as tmp:
+        caminho = os.path.join(tmp, 'teste.db')
+        app.config['DATABASE'] = caminho
+        app.config['LIMITE_ATIVO'] = False
+        try:
+            init_db()
+            db = _popular(caminho)
+            diretorio = arquivo.diretorio_do_banco(caminho)
+
+            cliente = app.test_client()
+            cliente.post('/login', data={'email': 't@t.com', 'senha': 'segredo'})
+            cliente.get('/dashboard')  # consome o flash do login
+            token = cliente.post('/api/v1/tokens', json={'email': 't@t.com', 'senha': 'segredo'}).get_json()['token']
+            api = app.test_client()
+            api.environ_base['HTTP_AUTHORIZATION'] = f'Bearer {token}'
+
+            rota_api = '/api/v1/contas/1/extrato?limite=15'
+            exportacoes = ['/extrato/1/exportar?formato=csv',
+                           '/extrato/1/exportar?formato=ndjson&inicio=2020-02-10&fim=2020-05-20',
+                           '/extrato/1/exportar?formato=ofx&fim=2020-03-15',
+                           '/extrato/1/exportar?formato=ofx&fim=2999-12-31']
+            antes = {rota: cliente.get(rota).get_data(as_text=True) for rota in exportacoes}
+            paginas = _paginas(api, rota_api)
+            assert len(paginas) == len(MESES) * POR_MES + 5
+            etag = api.get(rota_api).headers['ETag']
+            dashboard = cliente.get('/dashboard').get_data(as_text=True)
+
+            assert arquivo.arquivar(db, diretorio, '2020-05-01', contas_por_lote=1) == 4 * POR_MES
+            assert db.execute('SELECT COUNT(*) FROM transacao').fetchone()[0] == 2 * POR_MES + 5
+            resumos = db.execute('SELECT mes, linhas FROM transacao_arquivada ORDER BY mes').fetchall()
+            assert [tuple(r) for r in resumos] == [(mes, POR_MES) for mes in MESES[:4]]
+            assert sorted(os.listdir(diretorio)) == [f'{mes}.db' for mes in MESES[:4]]
+            assert arquivo.arquivar(db, diretorio, '2020-05-01') == 0
+            print("✅ 4 meses arquivados, um resumo por conta e mês; de novo não faz nada")
+
+            for rota in exportacoes:
+                assert cliente.get(rota).get_data(as_text=True) == antes[rota], rota
+            assert _paginas(api, rota_api) == paginas
+            assert api.get(rota_api, headers={'If-None-Match': etag}).status_code == 304
+            assert cliente.get('/dashboard').get_data(as_text=True) == dashboard
+            pagina = cliente.get(f'/extrato/1?antes=2020-05-01 00:00:00|{4 * POR_MES + 1}').get_data(as_text=True)
+            assert 'Lançamento 159' in pagina and 'Lançamento 140' in pagina
+            print("✅ Extrato, API (mesma ETag), exportação e saldo do OFX iguais aos de antes")
+
+            cache_arquivo.limpar()
+            abertos = []
+            linhas_do_mes = arquivo._linhas_do_mes
+            arquivo._linhas_do_mes = lambda diretorio, conta_id, mes, *args: abertos.append(mes) or \
+                linhas_do_mes(diretorio, conta_id, mes, *args)
+            try:
+                cliente.get('/extrato/1')
+                cliente.get('/extrato/1/exportar?formato=csv&inicio=2020-05-01').get_data()
+                assert abertos == []
+                cliente.get('/extrato/1/exportar?formato=csv&inicio=2020-04-01&fim=2020-04-30').get_data()
+                assert abertos == ['2020-04']
+                cliente.get('/extrato/1/exportar?formato=csv').get_data()
+                assert abertos[1:] == MESES[:4] and cache_arquivo.estatisticas()['itens'] == 0
+                cliente.get(f'/extrato/1?antes=2020-05-01 00:00:00|{4 * POR_MES + 1}')
+                assert abertos[-1] == '2020-04' and cache_arquivo.estatisticas()['ocupado'] == POR_MES
+            finally:
+                arquivo._linhas_do_mes = linhas_do_mes
+            print("✅ Segmentos só são abertos quando a faixa pedida chega neles; a exportação não guarda nenhum")
+
+            saldos = [arquivo.saldo_em(db, diretorio, 1, data) for data in ('2020-03-16', '2020-06-01')]
+            resumo = db.execute('SELECT * FROM resumo_mensal ORDER BY 1, 2, 3').fetchall()
+            with db:
+                db.execute('BEGIN IMMEDIATE')
+                assert arquivo.restaurar(db, diretorio, 1) == 4 * POR_MES
+            assert db.execute('SELECT COUNT(*) FROM transacao').fetchone()[0] == len(MESES) * POR_MES + 5
+            assert [ledger.saldo_em(db, 1, data) for data in ('2020-03-16', '2020-06-01')] == saldos
+            assert db.execute('SELECT COUNT(*) FROM transacao_arquivada').fetchone()[0] == 0
+            assert db.execute('SELECT * FROM resumo_mensal ORDER BY 1, 2, 3').fetchall() == resumo
+            assert _paginas(api, rota_api) == paginas
+            print("✅ Restaurar devolve as linhas com os ids originais")
+            db.close()
+        finally:
+            pool_senhas.metodo = metodo
+            app.config['LIMITE_ATIVO'] = True
+            database.fechar_conexoes()
+            cache_arquivo.limpar()
+            app.config['DATABASE'] = database.DATABASE
+
+
+def test_segmento_ausente():
+    """Resumo sem segmento é erro, não extrato incompleto"""
+    print("🔍 Testando segmento ausente...")
+
+    metodo = pool_senhas.metodo
+    pool_senhas.metodo = 'pbkdf2:sha256:1000'
+    with tempfile.TemporaryDirectory() as tmp:
+        caminho = os.path.join(tmp, 'teste.db')
+        app.config['DATABASE'] = caminho
+        try:
+            init_db()
+            db = _popular(caminho)
+            diretorio = arquivo.diretorio_do_banco(caminho)
+            arquivo.arquivar(db, diretorio, '2020-02-01')
+            os.remove(os.path.join(diretorio, '2020-01.db'))
+            try:
+                list(arquivo.transacoes(db, diretorio, 1))
+                raise AssertionError('deveria faltar o arquivo de 2020-01')
+            except sqlite3.OperationalError:
+                pass
+            try:
+                arquivo.arquivar(db, diretorio, '2020-01-15')
+                raise AssertionError('só meses inteiros')
+            except ValueError:
+                pass
+            print("✅ Arquivo ausente e limite fora do dia 1 são recusados")
+            db.close()
+        finally:
+            pool_senhas.metodo = metodo
+            database.fechar_conexoes()
+            app.config['DATABASE'] = database.DATABASE
+
+
+if __name__ == '__main__':
+    print("🚀 Iniciando testes do arquivo...\n")
+
+    test_arquivamento_transparente()
+    test_segmento_ausente()
+
+    print("\n🎉 Testes do arquivo passaram!")
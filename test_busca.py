@@ -0,0 +1,253 @@
+#!/usr/bin/env python3
+"""
+Script para testar a busca nas transações (FTS5 e filtros)
+Execute: python test_busca.py
+"""
+
+import os
+import tempfile
+from datetime import datetime
+
+import arquivo
+import busca
+import consultas_lentas
+import database
+import gerador
+import ledger
+import migracoes
+from app import app, init_db, pool_senhas
+
+DESCRICOES = ['PIX João Silva', 'Transferência aluguel', 'Depósito salário']
+
+
+def _popular(caminho):
+    """Usuário 1 com as contas 1 e 2, usuário 2 com a conta 3; 30 lançamentos por conta"""
+    db = database.conectar(caminho)
+    for numero in (1, 2):
+        db.execute("INSERT INTO usuario (nome, email, senha) VALUES (?, ?, ?)",
+                   (f'Teste {numero}', f't{numero}@t.com', pool_senhas.gerar('segredo')))
+    db.executemany("INSERT INTO conta (tipo, usuario_id) VALUES (?, ?)",
+                   [('corrente', 1), ('poupanca', 1), ('corrente', 2)])
+    db.commit()
+
+    def lancar_todos(db):
+        for numero in range(90):
+            conta_id = 1 + numero % 3
+            if numero % 4 == 3 and numero >= 12:
+                tipo, centavos = 'saque', 100 * (numero % 7 + 1)
+            else:
+                tipo, centavos = 'deposito', 100 * (numero + 1)
+            ledger.aplicar_lancamento(db, conta_id, tipo, centavos, f'{DESCRICOES[numero // 3 % 3]} {numero}')
+    ledger.em_transacao(db, lancar_todos)
+    return db
+
+
+def _ids(transacoes):
+    return [t['id'] for t in transacoes]
+
+
+def test_busca_transacoes():
+    """Termo sem acento e por prefixo, filtros, paginação e índice em dia com transacao"""
+    print("🔍 Testando a busca nas transações...")
+
+    metodo = pool_senhas.metodo
+    pool_senhas.metodo = 'pbkdf2:sha256:1000'
+    with tempfile.TemporaryDirectory() as tmp:
+        caminho = os.path.join(tmp, 'teste.db')
+        app.config['DATABASE'] = caminho
+        app.config['LIMITE_ATIVO'] = False
+        app.config['BUSCA_POR_PAGINA'] = 3
+        try:
+            init_db()
+            db = _popular(caminho)
+
+            joao = db.execute("SELECT id FROM transacao WHERE conta_id = 1 AND descricao LIKE 'PIX%'").fetchall()
+            encontradas, tem_mais = busca.buscar(db, 1, 'joao', por_pagina=100)
+            assert sorted(_ids(encontradas)) == sorted(r[0] for r in joao) and not tem_mais
+            assert all(t['conta_id'] == 1 and t['relevancia'] == 0.25 for t in encontradas)
+            assert _ids(busca.buscar(db, 1, 'TRANSFERENCIA aluguel', por_pagina=100)[0]) == _ids(
+                busca.buscar(db, 1, 'aluguel', por_pagina=100)[0])
+            assert busca.buscar(db, 1, 'transf')[0] == []
+            assert busca.buscar(db, 1, 'joão" (silva')[0] and busca.buscar(db, 1, '?!')[0] == []
+            print("✅ Palavras inteiras sem acento, só na conta pedida e sem sintaxe do FTS5 vinda do usuário")
+
+            todas = db.execute('SELECT * FROM transacao WHERE conta_id = 1').fetchall()
+            filtros = {'tipo': 'saque', 'minimo_centavos': 300, 'maximo_centavos': 600}
+            esperadas = [t['id'] for t in todas if t['tipo'] == 'saque' and 300 <= t['valor_centavos'] <= 600]
+            assert esperadas and sorted(_ids(busca.buscar(db, 1, **filtros)[0])) == sorted(esperadas)
+            hoje = datetime.utcnow().strftime('%Y-%m-%d')
+            assert len(busca.buscar(db, 1, inicio=hoje, fim=hoje, por_pagina=100)[0]) == len(todas)
+            assert busca.buscar(db, 1, inicio='2000-01-01', fim='2000-12-31')[0] == []
+            paginas, pagina = [], 1
+            while True:
+                transacoes, tem_mais = busca.buscar(db, 1, 'deposito', pagina=pagina, por_pagina=3)
+                paginas += _ids(transacoes)
+                if not tem_mais:
+                    break
+                pagina += 1
+            assert paginas == _ids(busca.buscar(db, 1, 'deposito', por_pagina=100)[0]) and len(paginas) == 10
+            print("✅ Tipo, faixa de valor e de data; páginas sem repetir nem pular")
+
+            comum = f'SELECT * FROM transacao t WHERE t.conta_id = 1 AND t.data >= \'{hoje}\' ORDER BY t.data DESC, t.id DESC'
+            assert consultas_lentas.problemas(consultas_lentas.plano(db, comum)) == []
+            traco = []
+            db.set_trace_callback(traco.append)
+            busca.buscar(db, 1, 'joao', tipo='deposito', minimo_centavos=1, inicio='2000-01-01')
+            db.set_trace_callback(None)
+            plano = consultas_lentas.plano(db, next(sql for sql in traco if 'relevancia' in sql))
+            assert plano[0].startswith('SCAN transacao_busca VIRTUAL TABLE INDEX') and ':M' in plano[0], plano
+            assert consultas_lentas.problemas(plano) == [], plano
+            candidatos = busca.CANDIDATOS
+            busca.CANDIDATOS = 4
+            try:
+                recentes, tem_mais = busca.buscar(db, 1, 'deposito', por_pagina=3)
+                assert not busca.buscar(db, 1, 'deposito', pagina=2, por_pagina=3)[1]
+            finally:
+                busca.CANDIDATOS = candidatos
+            depositos = db.execute("""
+                SELECT id FROM transacao WHERE conta_id = 1 AND descricao LIKE 'Depósito%' ORDER BY id DESC LIMIT 4
+            """).fetchall()
+            assert _ids(recentes) == [r[0] for r in depositos][:3] and tem_mais
+            print("✅ O termo e a ordem vêm do índice de texto; a relevância ordena só as candidatas mais recentes")
+
+            with db:
+                db.execute("UPDATE transacao SET descricao = 'Estorno' WHERE id = ?", (joao[0][0],))
+                db.execute("UPDATE transacao SET descricao = 'Estorno tarifa' WHERE id = ?", (joao[1][0],))
+                db.execute("UPDATE transacao SET data = '2020-01-10 10:00:00' WHERE conta_id = 2")
+            estornos = busca.buscar(db, 1, 'estorno')[0]
+            assert _ids(estornos) == [joao[0][0], joao[1][0]] and [t['relevancia'] for t in estornos] == [1.0, 0.5]
+            assert joao[0][0] not in _ids(busca.buscar(db, 1, 'joao', por_pagina=100)[0])
+            diretorio = arquivo.diretorio_do_banco(caminho)
+            assert arquivo.arquivar(db, diretorio, '2020-02-01') == 30
+            assert busca.buscar(db, 2, 'aluguel')[0] == []
+            with db:
+                db.execute('BEGIN IMMEDIATE')
+                arquivo.restaurar(db, diretorio, 1)
+            assert len(busca.buscar(db, 2, 'aluguel', por_pagina=100)[0]) == 10
+            db.execute("INSERT INTO transacao_busca (transacao_busca) VALUES ('integrity-check')")
+            print("✅ Gatilhos acompanham UPDATE, arquivamento e restauração; descrição mais justa primeiro")
+
+            cliente = app.test_client()
+            cliente.post('/login', data={'email': 't1@t.com', 'senha': 'segredo'})
+            cliente.get('/dashboard')  # consome o flash do login
+            pagina = cliente.get('/extrato/1/busca?q=salario&tipo=deposito').get_data(as_text=True)
+            assert 'Depósito salário' in pagina and 'PIX' not in pagina
+            pagina = cliente.get('/extrato/1/busca?q=deposito&pagina=2').get_data(as_text=True)
+            assert 'pagina=1' in pagina and 'q=deposito' in pagina
+            assert cliente.get('/extrato/3/busca?q=joao').status_code == 302
+            resposta = cliente.get('/extrato/1/busca?valor_min=abc', follow_redirects=True)
+            assert 'Filtro de busca inválido' in resposta.get_data(as_text=True)
+            print("✅ Página de busca do extrato, só nas contas do usuário")
+
+            suporte = app.test_client()
+            assert suporte.get('/suporte/contas/3/busca?q=joao').status_code == 404
+            app.config['SUPORTE_TOKEN'] = 'segredo-suporte'
+            assert suporte.get('/suporte/contas/3/busca?q=joao').status_code == 401
+            suporte.environ_base['HTTP_AUTHORIZATION'] = 'Bearer segredo-suporte'
+            corpo = suporte.get('/suporte/contas/3/busca?q=joao&valor_max=50,00&limite=2').get_json()
+            assert corpo['conta']['id'] == 3 and len(corpo['transacoes']) == 2
+            assert corpo['paginacao'] == {'pagina': 1, 'proxima': 2}
+            assert all(t['valor_centavos'] <= 5000 and t['relevancia'] == 0.25 for t in corpo['transacoes'])
+            assert suporte.get('/suporte/contas/99/busca?q=joao').status_code == 404
+            assert suporte.get('/suporte/contas/3/busca?tipo=estorno').status_code == 400
+            print("✅ Busca do suporte em qualquer conta, com o token do suporte")
+            db.close()
+        finally:
+            pool_senhas.metodo = metodo
+            app.config['LIMITE_ATIVO'] = True
+            app.config['SUPORTE_TOKEN'] = None
+            app.config['BUSCA_POR_PAGINA'] = busca.POR_PAGINA
+            database.fechar_conexoes()
+            app.config['DATABASE'] = database.DATABASE
+
+
+def test_carga_em_lotes():
+    """Busca por termo indisponível até a carga acabar; lotes e gatilhos formam o mesmo índice"""
+    print("🔍 Testando a carga do índice de texto em lotes...")
+
+    metodo = pool_senhas.metodo
+    pool_senhas.metodo = 'pbkdf2:sha256:1000'
+    with tempfile.TemporaryDirectory() as tmp:
+        caminho = os.path.join(tmp, 'teste.db')
+        app.config['DATABASE'] = caminho
+        app.config['LIMITE_ATIVO'] = False
+        app.config['SUPORTE_TOKEN'] = 'segredo-suporte'
+        try:
+            db = database.conectar(caminho)
+            migracoes.migrar(db, incluir_online=False)
+            db.close()
+            db = _popular(caminho)
+
+            cliente = app.test_client()
+            cliente.post('/login', data={'email': 't1@t.com', 'senha': 'segredo'})
+            cliente.get('/dashboard')  # consome o flash do login
+            resposta = cliente.get('/extrato/1/busca?q=joao')
+            assert resposta.status_code == 200
+            assert 'Busca por descrição indisponível' in resposta.get_data(as_text=True)
+            assert 'Depósito salário' in cliente.get('/extrato/1/busca?tipo=deposito').get_data(as_text=True)
+            suporte = app.test_client()
+            suporte.environ_base['HTTP_AUTHORIZATION'] = 'Bearer segredo-suporte'
+            resposta = suporte.get('/suporte/contas/3/busca?q=joao')
+            assert resposta.status_code == 503 and resposta.headers['Retry-After']
+            assert suporte.get('/suporte/contas/3/busca?tipo=deposito').status_code == 200
+            print("✅ Sem o índice a busca por termo avisa (503 no suporte) e os filtros funcionam")
+
+            m0012 = next(m for m in migracoes.listar() if m.versao == 12).modulo
+            m0012.preparar(db)
+            assert not busca.indice_pronto(db)
+            assert suporte.get('/suporte/contas/3/busca?q=joao').status_code == 503
+
+            novas = []
+
+            def progresso(tabela, ultimo_id, maximo):
+                if novas:
+                    return
+                # Depois do 1º lote (ids 1-10): escritas em linhas já indexadas, pendentes e novas
+                with db:
+                    db.execute("UPDATE transacao SET descricao = 'Estorno' WHERE id IN (2, 50)")
+                    db.execute('DELETE FROM transacao WHERE id IN (3, 60)')
+                novas.append(ledger.em_transacao(
+                    db, lambda db: ledger.aplicar_lancamento(db, 1, 'deposito', 100, 'Estorno novo')))
+
+            assert m0012.preencher(db, tamanho_lote=10, progresso=progresso) == 89
+            assert m0012.preencher(db, tamanho_lote=10) == 0
+            assert busca.indice_pronto(db)
+            db.execute("INSERT INTO transacao_busca (transacao_busca) VALUES ('integrity-check')")
+            assert sorted(_ids(busca.buscar(db, 2, 'estorno')[0])) == [2, 50]
+            assert [t['descricao'] for t in busca.buscar(db, 1, 'estorno')[0]] == ['Estorno novo']
+            joao = db.execute("SELECT COUNT(*) FROM transacao WHERE conta_id = 3 AND descricao LIKE 'PIX%'").fetchone()[0]
+            assert len(suporte.get('/suporte/contas/3/busca?q=joao&limite=100').get_json()['transacoes']) == joao
+            print("✅ Lotes de 10 com escritas no meio: índice íntegro e a busca liberada no fim")
+            db.close()
+        finally:
+            pool_senhas.metodo = metodo
+            app.config['LIMITE_ATIVO'] = True
+            app.config['SUPORTE_TOKEN'] = None
+            database.fechar_conexoes()
+            app.config['DATABASE'] = database.DATABASE
+
+
+def test_busca_do_gerador():
+    """A carga sem gatilhos termina com o índice de texto completo"""
+    print("🔍 Testando a busca num banco gerado...")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db = database.conectar(os.path.join(tmp, 'gerado.db'))
+        gerador.gerar(db, 10, transacoes=500, ate=datetime(2024, 6, 30), semente=5, lote=100)
+        conta_id, saques = db.execute('''
+            SELECT conta_id, COUNT(*) FROM transacao WHERE tipo = 'saque' GROUP BY conta_id ORDER BY 2 DESC LIMIT 1
+        ''').fetchone()
+        assert len(busca.buscar(db, conta_id, 'saque', por_pagina=1000)[0]) == saques
+        db.execute("INSERT INTO transacao_busca (transacao_busca) VALUES ('integrity-check')")
+        print(f"✅ {saques} saques da conta {conta_id} encontrados pelo índice refeito depois da carga")
+        db.close()
+
+
+if __name__ == '__main__':
+    print("🚀 Iniciando testes da busca...\n")
+
+    test_busca_transacoes()
+    test_carga_em_lotes()
+    test_busca_do_gerador()
+
+    print("\n🎉 Testes da busca passaram!")
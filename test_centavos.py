@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Script para testar o dinheiro em centavos e a migração de bancos antigos
+Execute: python test_centavos.py
+"""
+
+import os
+import sqlite3
+import tempfile
+from decimal import Decimal
+
+import dinheiro
+from migracoes import m0003_centavos
+
+
+def test_conversao():
+    """Valores de formulário viram centavos exatos, sem float"""
+    print("🔍 Testando conversão para centavos...")
+
+    assert dinheiro.centavos('10') == 1000
+    assert dinheiro.centavos('0.1') == 10
+    assert dinheiro.centavos('1234,56') == 123456
+    assert dinheiro.centavos(Decimal('2.50')) == 250
+    assert dinheiro.centavos(0.29) == 29
+    assert dinheiro.centavos(dinheiro.MAXIMO_CENTAVOS // 100) == dinheiro.MAXIMO_CENTAVOS
+    for invalido in ('abc', '1.005', '', 'nan', 'inf', '1e20', 1e20, dinheiro.MAXIMO_CENTAVOS):
+        try:
+            dinheiro.centavos(invalido)
+        except ValueError:
+            continue
+        raise AssertionError(invalido)
+    assert dinheiro.formatar(123456) == '1234.56'
+    assert dinheiro.formatar(-5) == '-0.05'
+    print("✅ Conversão e formatação exatas")
+
+
+def _banco_antigo(caminho, linhas):
+    """Esquema anterior aos centavos: só colunas REAL"""
+    db = sqlite3.connect(caminho)
+    db.executescript('''
+        CREATE TABLE usuario (id INTEGER PRIMARY KEY AUTOINCREMENT, nome TEXT, email TEXT,
+                              senha TEXT, saldo REAL DEFAULT 0.0);
+        CREATE TABLE conta (id INTEGER PRIMARY KEY AUTOINCREMENT, tipo TEXT,
+                            saldo REAL DEFAULT 0.0, usuario_id INTEGER);
+        CREATE TABLE transferencia (id INTEGER PRIMARY KEY AUTOINCREMENT, conta_origem_id INTEGER,
+                                    conta_destino_id INTEGER, valor REAL);
+        CREATE TABLE transacao (id INTEGER PRIMARY KEY AUTOINCREMENT, tipo TEXT, valor REAL,
+                                descricao TEXT, conta_id INTEGER);
+    ''')
+    db.execute("INSERT INTO usuario (nome, email, senha) VALUES ('Teste', 't@t.com', 'x')")
+    db.execute("INSERT INTO conta (tipo, saldo, usuario_id) VALUES ('corrente', 0.3, 1)")
+    db.executemany("INSERT INTO transacao (tipo, valor, descricao, conta_id) VALUES ('deposito', 0.1, 'x', 1)",
+                   [()] * linhas)
+    db.commit()
+    return db
+
+
+def test_migracao_em_lotes():
+    """A migração converte em lotes, registra o progresso e é idempotente"""
+    print("🔍 Testando migração em lotes...")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db = _banco_antigo(os.path.join(tmp, 'antigo.db'), 25)
+        try:
+            lotes = []
+            convertidas = m0003_centavos.aplicar(db, tamanho_lote=10,
+                                                  progresso=lambda *a: lotes.append(a))
+            assert convertidas['transacao'] == 25 and convertidas['conta'] == 1
+            assert [a[1] for a in lotes if a[0] == 'transacao'] == [10, 20, 25]
+            assert db.execute('SELECT SUM(valor_centavos) FROM transacao').fetchone()[0] == 250
+            assert db.execute('SELECT saldo_centavos FROM conta').fetchone()[0] == 30
+            assert m0003_centavos.aplicar(db) == dict.fromkeys(m0003_centavos.COLUNAS, 0)
+            print("✅ 25 transações convertidas em 3 lotes")
+
+            # Um escritor antigo que só conhece as colunas REAL continua consistente
+            db.execute("INSERT INTO transacao (tipo, valor, descricao, conta_id) VALUES ('saque', 0.07, 'y', 1)")
+            db.execute('UPDATE conta SET saldo = saldo - 0.07 WHERE id = 1')
+            db.execute("INSERT INTO conta (tipo, saldo, usuario_id) VALUES ('poupanca', 12.34, 1)")
+            db.commit()
+            assert db.execute('SELECT valor_centavos FROM transacao ORDER BY id DESC').fetchone()[0] == 7
+            saldos = [l[0] for l in db.execute('SELECT saldo_centavos FROM conta ORDER BY id')]
+            assert saldos == [23, 1234]
+            print("✅ Gatilhos mantêm os centavos para escritores antigos")
+        finally:
+            db.close()
+
+
+if __name__ == '__main__':
+    print("🚀 Iniciando testes de centavos...\n")
+
+    test_conversao()
+    test_migracao_em_lotes()
+
+    print("\n🎉 Testes de centavos passaram!")
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Script para testar a camada de conexões (pool por thread, WAL e pragmas)
+Execute: python test_conexoes.py
+"""
+
+import os
+import tempfile
+import threading
+
+import database
+from app import app, init_db
+
+
+def test_conexao_reutilizada():
+    """A mesma thread reaproveita a conexão entre requisições"""
+    print("🔍 Testando reaproveitamento de conexões...")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        app.config['DATABASE'] = os.path.join(tmp, 'teste.db')
+        try:
+            init_db()
+
+            with app.app_context():
+                primeira = database.get_db()
+                assert database.get_db() is primeira
+            with app.app_context():
+                assert database.get_db() is primeira
+            print("✅ Conexão reaproveitada entre requisições")
+
+            outras = []
+            def em_outra_thread():
+                with app.app_context():
+                    outras.append(database.get_db())
+                database.fechar_conexoes()
+            t = threading.Thread(target=em_outra_thread)
+            t.start()
+            t.join()
+            assert outras[0] is not primeira
+            print("✅ Cada thread tem sua própria conexão")
+        finally:
+            database.fechar_conexoes()
+            app.config['DATABASE'] = database.DATABASE
+
+
+def test_pragmas_aplicados():
+    """WAL e pragmas configurados valem para a conexão do pool"""
+    print("🔍 Testando pragmas...")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        app.config['DATABASE'] = os.path.join(tmp, 'teste.db')
+        try:
+            init_db()
+            with app.app_context():
+                db = database.get_db()
+                assert db.execute('PRAGMA journal_mode').fetchone()[0] == 'wal'
+                assert db.execute('PRAGMA busy_timeout').fetchone()[0] == \
+                    app.config['SQLITE_PRAGMAS']['busy_timeout']
+                assert db.execute('PRAGMA synchronous').fetchone()[0] == 1  # NORMAL
+            print("✅ Pragmas aplicados")
+        finally:
+            database.fechar_conexoes()
+            app.config['DATABASE'] = database.DATABASE
+
+
+def test_teardown_desfaz_transacao():
+    """Transação esquecida aberta não vaza para a próxima requisição"""
+    print("🔍 Testando teardown...")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        app.config['DATABASE'] = os.path.join(tmp, 'teste.db')
+        try:
+            init_db()
+            with app.app_context():
+                db = database.get_db()
+                db.execute("INSERT INTO conta (tipo, usuario_id) VALUES ('corrente', 1)")
+                assert db.in_transaction
+            assert not db.in_transaction
+            assert db.execute('SELECT COUNT(*) FROM conta').fetchone()[0] == 0
+            print("✅ Transação pendente desfeita no teardown")
+        finally:
+            database.fechar_conexoes()
+            app.config['DATABASE'] = database.DATABASE
+
+
+if __name__ == '__main__':
+    print("🚀 Iniciando testes da camada de conexões...\n")
+
+    test_conexao_reutilizada()
+    test_pragmas_aplicados()
+    test_teardown_desfaz_transacao()
+
+    print("\n🎉 Todos os testes de conexão passaram!")
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Script para testar a exportação do extrato (CSV, NDJSON e OFX)
+Execute: python test_exportacao.py
+"""
+
+import csv
+import io
+import json
+import os
+import sqlite3
+import tempfile
+from xml.dom import minidom
+
+import database
+import exportacao
+from app import app, init_db
+
+
+def _preparar(caminho):
+    app.config['DATABASE'] = caminho
+    init_db()
+    db = sqlite3.connect(caminho)
+    db.execute("INSERT INTO usuario (nome, email, senha) VALUES ('Teste', 't@t.com', 'x')")
+    db.execute("INSERT INTO conta (tipo, saldo_centavos, usuario_id) VALUES ('corrente', 5000, 1)")
+    db.executemany(
+        "INSERT INTO transacao (tipo, valor, descricao, conta_id, data) VALUES (?, ?, ?, 1, ?)",
+        [('saque' if i % 3 == 0 else 'deposito', 1.5, f'Lançamento <{i}> & cia',
+          f'2024-{1 + i // 500:02d}-10 12:00:00') for i in range(1200)])
+    db.commit()
+    db.close()
+
+    cliente = app.test_client()
+    with cliente.session_transaction() as sessao:
+        sessao['usuario_id'] = 1
+    return cliente
+
+
+def test_exportacao_formatos():
+    """Testa os três formatos e o filtro por período"""
+    print("🔍 Testando exportação do extrato...")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        try:
+            cliente = _preparar(os.path.join(tmp, 'teste.db'))
+
+            resposta = cliente.get('/extrato/1/exportar?formato=csv')
+            assert resposta.is_streamed
+            blocos = list(resposta.response)
+            assert len(blocos) > 1200 // exportacao.TAMANHO_LOTE
+            linhas = list(csv.reader(io.StringIO(b''.join(blocos).decode())))
+            assert linhas[0] == ['id', 'data', 'tipo', 'descricao', 'valor', 'saldo']
+            assert len(linhas) == 1201
+            assert linhas[1][4] == '-1.50' and linhas[2][4] == '1.50'
+            print("✅ CSV exportado em blocos")
+
+            resposta = cliente.get('/extrato/1/exportar?formato=ndjson&inicio=2024-02-01&fim=2024-02-28')
+            objetos = [json.loads(l) for l in resposta.get_data(as_text=True).splitlines()]
+            assert len(objetos) == 500
+            assert all(o['data'].startswith('2024-02') for o in objetos)
+            print("✅ NDJSON com filtro de período")
+
+            resposta = cliente.get('/extrato/1/exportar?formato=ofx&fim=2024-01-31')
+            documento = minidom.parseString(resposta.get_data())
+            assert len(documento.getElementsByTagName('STMTTRN')) == 500
+            # Saldo ao fim do período: 333 depósitos e 167 saques de 1,50 em janeiro
+            assert documento.getElementsByTagName('BALAMT')[0].firstChild.data == '249.00'
+            print("✅ OFX bem formado")
+
+            resposta = cliente.get('/extrato/1/exportar?formato=xls')
+            assert resposta.status_code == 302
+            resposta = cliente.get('/extrato/2/exportar?formato=csv')
+            assert resposta.status_code == 302
+            print("✅ Formato inválido e conta alheia recusados")
+        finally:
+            database.fechar_conexoes()
+            app.config['DATABASE'] = database.DATABASE
+
+
+if __name__ == '__main__':
+    print("🚀 Iniciando testes de exportação...\n")
+
+    test_exportacao_formatos()
+
+    print("\n🎉 Testes de exportação passaram!")
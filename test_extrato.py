@@ -4,7 +4,10 @@ Script para testar a funcionalidade do extrato
 Execute: python test_extrato.py
 """
 
+import os
+import re
 import sqlite3
+import tempfile
 from datetime import datetime
 
 def test_extrato():
@@ -96,9 +99,63 @@ def test_extrato():
         print(f"Tipo do erro: {type(e).__name__}")
         return False
 
+def test_extrato_paginado():
+    """Testa a paginação por cursor (data, id) do extrato"""
+    print("🔍 Testando paginação do extrato...")
+    
+    import database
+    from app import app, init_db
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        app.config['DATABASE'] = os.path.join(tmp, 'teste.db')
+        try:
+            init_db()
+            db = sqlite3.connect(app.config['DATABASE'])
+            db.execute("INSERT INTO usuario (nome, email, senha) VALUES ('Teste', 't@t.com', 'x')")
+            db.execute("INSERT INTO conta (tipo, usuario_id) VALUES ('corrente', 1)")
+            # 45 transações, várias com a mesma data para exercitar o desempate por id
+            db.executemany(
+                "INSERT INTO transacao (tipo, valor, descricao, conta_id, data) VALUES ('deposito', ?, ?, 1, ?)",
+                [(i, f'Transação {i}', f'2024-01-{1 + i // 4:02d} 10:00:00') for i in range(45)])
+            db.commit()
+            db.close()
+            
+            plano = sqlite3.connect(app.config['DATABASE']).execute(
+                "EXPLAIN QUERY PLAN SELECT id FROM transacao WHERE conta_id = 1 "
+                "AND (data, id) < ('2024-01-05', 10) ORDER BY data DESC, id DESC LIMIT 21").fetchall()
+            assert 'idx_transacao_conta_data' in plano[0][3]
+            print("✅ Extrato usa o índice (conta_id, data, id)")
+            
+            app.config['EXTRATO_POR_PAGINA'] = 20
+            cliente = app.test_client()
+            with cliente.session_transaction() as sessao:
+                sessao['usuario_id'] = 1
+            
+            vistas = []
+            url = '/extrato/1'
+            while url:
+                html = cliente.get(url).get_data(as_text=True)
+                vistas += [int(n) for n in re.findall(r'<td>Transação (\d+)</td>', html)]
+                proximas = re.findall(r'href="([^"]*antes=[^"]*)"', html)
+                url = proximas[0].replace('&amp;', '&') if proximas else None
+            assert sorted(vistas) == list(range(45)), vistas
+            assert vistas == list(range(44, -1, -1))
+            print("✅ Três páginas percorridas sem repetir nem pular transações")
+            
+            html = cliente.get('/extrato/1?antes=2024-01-07 10:00:00|26').get_data(as_text=True)
+            recentes = re.findall(r'href="([^"]*depois=[^"]*)"', html)[0].replace('&amp;', '&')
+            html = cliente.get(recentes).get_data(as_text=True)
+            assert [int(n) for n in re.findall(r'<td>Transação (\d+)</td>', html)] == list(range(44, 24, -1))
+            print("✅ Link 'Mais recentes' volta para a página anterior")
+        finally:
+            database.fechar_conexoes()
+            app.config['DATABASE'] = database.DATABASE
+
 if __name__ == '__main__':
     print("🚀 Iniciando teste do extrato...\n")
     
+    test_extrato_paginado()
+    
     if test_extrato():
         print("\n🎉 Teste do extrato passou!")
         print("📋 O extrato deve funcionar corretamente agora.")
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+Script para testar o gerador de dados sintéticos
+Execute: python test_gerador.py
+"""
+
+import hashlib
+import os
+import tempfile
+from datetime import datetime
+
+import database
+import gerador
+import ledger
+import migracoes
+
+
+def _gerar(caminho, semente=7):
+    db = database.conectar(caminho)
+    gravadas = gerador.gerar(db, 50, contas_por_usuario=2, transacoes=3000, cauda=1.1,
+                             ate=datetime(2024, 6, 30), semente=semente, lote=500)
+    return db, gravadas
+
+
+def _conteudo(db):
+    resumo = hashlib.sha256()
+    for tabela in ('usuario', 'conta', 'transacao', 'saldo_checkpoint'):
+        for linha in db.execute(f'SELECT * FROM {tabela} ORDER BY rowid'):
+            resumo.update(repr(tuple(linha)).encode())
+    return resumo.hexdigest()
+
+
+def test_gerador():
+    """Carga consistente com o ledger, determinística e com índices e gatilhos no fim"""
+    print("🔍 Testando o gerador de dados...")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db, gravadas = _gerar(os.path.join(tmp, 'a.db'))
+        assert gravadas['usuario'] == 50 and gravadas['transacao'] == 3000
+        assert db.execute('SELECT COUNT(*) FROM conta').fetchone()[0] == gravadas['conta']
+
+        # Saldo, contador e última transação batem com o histórico; checkpoints com saldo_em
+        contas = db.execute('''
+            SELECT c.id, c.saldo_centavos, c.lancamentos, c.ultima_transacao_id,
+                   COUNT(t.id), COALESCE(MAX(t.id), 0),
+                   COALESCE(SUM(CASE WHEN t.tipo = 'saque' THEN -t.valor_centavos ELSE t.valor_centavos END), 0)
+            FROM conta c LEFT JOIN transacao t ON t.conta_id = c.id GROUP BY c.id
+        ''').fetchall()
+        for conta_id, saldo, lancamentos, ultima, quantidade, maximo, soma in contas:
+            assert (saldo, lancamentos, ultima) == (soma, quantidade, maximo)
+            assert ledger.saldo_em(db, conta_id, '2999-01-01') == saldo
+        assert db.execute('SELECT MIN(saldo_apos_centavos) FROM transacao').fetchone()[0] >= 0
+        quantidades = sorted((linha[4] for linha in contas), reverse=True)
+        assert sum(quantidades[:len(quantidades) // 10]) > 3000 * 0.3
+        print(f"✅ {gravadas['conta']} contas consistentes, 10% delas com {sum(quantidades[:len(quantidades) // 10])} "
+              f"das 3000 transações")
+
+        assert migracoes.pendentes(db) == []
+        objetos = {linha[0] for linha in db.execute("SELECT name FROM sqlite_master WHERE type IN ('index', 'trigger')")}
+        assert {'idx_transacao_conta_data', 'idx_conta_usuario', 'trg_transacao_ultima_conta'} <= objetos
+        assert db.execute('PRAGMA journal_mode').fetchone()[0] == 'wal'
+        print("✅ Índices e gatilhos recriados depois da carga")
+
+        db2, _ = _gerar(os.path.join(tmp, 'b.db'))
+        db3, _ = _gerar(os.path.join(tmp, 'c.db'), semente=8)
+        assert _conteudo(db) == _conteudo(db2) != _conteudo(db3)
+        print("✅ Mesma semente, mesmos dados")
+
+        try:
+            gerador.gerar(db, 1)
+            raise AssertionError('deveria recusar banco com dados')
+        except ValueError:
+            pass
+        for conexao in (db, db2, db3):
+            conexao.close()
+
+
+if __name__ == '__main__':
+    print("🚀 Iniciando testes do gerador de dados...\n")
+
+    test_gerador()
+
+    print("\n🎉 Testes do gerador de dados passaram!")
@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+"""
+Script para testar o group commit dos lançamentos
+Execute: python test_group_commit.py
+"""
+
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+
+import app as modulo_app
+import database
+import ledger
+from app import app, init_db
+from group_commit import GroupCommit
+
+
+def _preparar(caminho):
+    app.config['DATABASE'] = caminho
+    init_db()
+    db = database.conectar(caminho)
+    db.execute("INSERT INTO usuario (nome, email, senha) VALUES ('Teste', 't@t.com', 'x')")
+    db.execute("INSERT INTO conta (tipo, saldo_centavos, usuario_id) VALUES ('corrente', 1000, 1)")
+    db.commit()
+    return db
+
+
+def test_grupo_isola_falhas():
+    """Lançamentos recusados no grupo não desfazem os demais"""
+    print("🔍 Testando group commit...")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        caminho = os.path.join(tmp, 'teste.db')
+        db = _preparar(caminho)
+        grupo = GroupCommit(caminho, intervalo_ms=20, maximo_itens=100)
+        resultados = []
+
+        def sacar():
+            try:
+                resultados.append(grupo.submeter(ledger.aplicar_lancamento, 1, 'saque', 100, 'Saque'))
+            except ledger.SaldoInsuficiente as e:
+                resultados.append(e)
+
+        threads = [threading.Thread(target=sacar) for _ in range(15)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        aceitos = [r for r in resultados if isinstance(r, int)]
+        assert len(aceitos) == 10 and len(resultados) == 15
+        assert db.execute('SELECT saldo_centavos FROM conta WHERE id = 1').fetchone()[0] == 0
+        assert sorted(aceitos) == [l['id'] for l in db.execute('SELECT id FROM transacao ORDER BY id')]
+
+        try:
+            grupo.submeter(ledger.aplicar_lancamento, 99, 'deposito', 100, 'Depósito')
+            assert False, 'conta inexistente aceita'
+        except ledger.ContaNaoEncontrada:
+            pass
+        db.close()
+        app.config['DATABASE'] = database.DATABASE
+        print("✅ 10 saques aceitos, 5 recusados, cada um com seu resultado")
+
+
+def test_escritor_que_falha():
+    """Conexão que não abre, escritor que morre e resultado que não chega não prendem quem submeteu"""
+    print("🔍 Testando falhas do escritor do group commit...")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        caminho = os.path.join(tmp, 'ainda-nao', 'teste.db')
+        grupo = GroupCommit(caminho, intervalo_ms=1, timeout=1)
+        try:
+            grupo.submeter(ledger.aplicar_lancamento, 1, 'deposito', 100, 'Depósito')
+            assert False, 'escritor sem conexão aceito'
+        except sqlite3.OperationalError:
+            pass
+        os.mkdir(os.path.dirname(caminho))
+        db = _preparar(caminho)
+        assert grupo.submeter(ledger.aplicar_lancamento, 1, 'deposito', 100, 'Depósito')
+        print("✅ Falha ao conectar chega a quem submeteu; a próxima submissão sobe o escritor")
+
+        def derrubar(db):
+            raise SystemExit('escritor derrubado')
+
+        escritor = grupo._escritor
+        try:
+            grupo.submeter(derrubar)
+            assert False, 'escritor não caiu'
+        except SystemExit:
+            pass
+        escritor.join(1)
+        assert not escritor.is_alive()
+        assert grupo.submeter(ledger.aplicar_lancamento, 1, 'deposito', 100, 'Depósito')
+        assert grupo._escritor is not escritor
+        print("✅ Escritor morto é substituído na submissão seguinte")
+
+        grupo.timeout = 0.1
+        inicio = time.perf_counter()
+        try:
+            grupo.submeter(lambda db: time.sleep(0.5))
+            assert False, 'espera sem limite'
+        except sqlite3.OperationalError:
+            assert time.perf_counter() - inicio < 0.4
+        assert db.execute('SELECT saldo_centavos FROM conta WHERE id = 1').fetchone()[0] == 1200
+        db.close()
+        app.config['DATABASE'] = database.DATABASE
+        print("✅ Sem resposta em `timeout` segundos, erro de banco em vez de espera sem fim")
+
+
+def test_rotas_com_group_commit():
+    """Depósito pela rota com GROUP_COMMIT ligado"""
+    print("🔍 Testando rotas com group commit...")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        _preparar(os.path.join(tmp, 'teste.db')).close()
+        app.config['GROUP_COMMIT'] = True
+        try:
+            cliente = app.test_client()
+            with cliente.session_transaction() as sessao:
+                sessao['usuario_id'] = 1
+            cliente.post('/deposito/1', data={'valor': '5'})
+            resposta = cliente.post('/saque/1', data={'valor': '100'}, follow_redirects=True)
+            assert 'saldo insuficiente' in resposta.get_data(as_text=True)
+            with app.app_context():
+                saldo = database.get_db().execute('SELECT saldo_centavos FROM conta WHERE id = 1').fetchone()[0]
+            assert saldo == 1500
+            print("✅ Rotas usam o group commit")
+        finally:
+            app.config['GROUP_COMMIT'] = False
+            database.fechar_conexoes()
+            app.config['DATABASE'] = database.DATABASE
+
+
+def test_primeiras_requisicoes_concorrentes():
+    """Threads que chegam juntas ao mesmo arquivo dividem um único GroupCommit"""
+    print("🔍 Testando a criação do group commit por threads concorrentes...")
+
+    criados = []
+
+    class GroupCommitContado(GroupCommit):
+        def __init__(self, *args, **kwargs):
+            criados.append(self)
+            # Alarga a janela entre procurar no cache e gravar nele
+            time.sleep(0.05)
+            super().__init__(*args, **kwargs)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        _preparar(os.path.join(tmp, 'teste.db')).close()
+        app.config['GROUP_COMMIT'] = True
+        modulo_app.GroupCommit = GroupCommitContado
+        try:
+            barreira = threading.Barrier(8)
+
+            def depositar():
+                cliente = app.test_client()
+                with cliente.session_transaction() as sessao:
+                    sessao['usuario_id'] = 1
+                barreira.wait()
+                cliente.post('/deposito/1', data={'valor': '1'})
+                database.fechar_conexoes()
+
+            threads = [threading.Thread(target=depositar) for _ in range(8)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            assert len(criados) == 1, len(criados)
+            with app.app_context():
+                saldo = database.get_db().execute('SELECT saldo_centavos FROM conta WHERE id = 1').fetchone()[0]
+            assert saldo == 1800
+            print("✅ Um GroupCommit (e um escritor) por arquivo")
+        finally:
+            modulo_app.GroupCommit = GroupCommit
+            app.config['GROUP_COMMIT'] = False
+            database.fechar_conexoes()
+            app.config['DATABASE'] = database.DATABASE
+
+
+if __name__ == '__main__':
+    print("🚀 Iniciando testes de group commit...\n")
+
+    test_grupo_isola_falhas()
+    test_escritor_que_falha()
+    test_rotas_com_group_commit()
+    test_primeiras_requisicoes_concorrentes()
+
+    print("\n🎉 Testes de group commit passaram!")
@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+Script para testar a Idempotency-Key de depósitos, saques e transferências
+Execute: python test_idempotencia.py
+"""
+
+import os
+import re
+import tempfile
+
+import database
+import idempotencia
+import ledger
+from app import app, init_db
+
+
+def _preparar(caminho):
+    app.config['DATABASE'] = caminho
+    init_db()
+    db = database.conectar(caminho)
+    db.execute("INSERT INTO usuario (nome, email, senha) VALUES ('Teste', 't@t.com', 'x')")
+    db.executemany("INSERT INTO conta (tipo, usuario_id) VALUES (?, 1)", [('corrente',), ('poupanca',)])
+    db.commit()
+    cliente = app.test_client()
+    with cliente.session_transaction() as sessao:
+        sessao['usuario_id'] = 1
+    return db, cliente
+
+
+def _estado(db):
+    saldos = [linha[0] for linha in db.execute('SELECT saldo_centavos FROM conta ORDER BY id')]
+    return saldos, db.execute('SELECT COUNT(*) FROM transacao').fetchone()[0]
+
+
+def test_reenvio():
+    """O mesmo POST reenviado lança uma vez só, com ou sem group commit"""
+    print("🔍 Testando reenvio com Idempotency-Key...")
+
+    for group_commit in (False, True):
+        with tempfile.TemporaryDirectory() as tmp:
+            app.config['GROUP_COMMIT'] = group_commit
+            try:
+                db, cliente = _preparar(os.path.join(tmp, 'teste.db'))
+                chave = {'Idempotency-Key': 'dep-1'}
+                for _ in range(3):
+                    resposta = cliente.post('/deposito/1', data={'valor': '50.00'}, headers=chave,
+                                            follow_redirects=True)
+                    assert 'Depósito realizado com sucesso!' in resposta.get_data(as_text=True)
+                assert _estado(db) == ([5000, 0], 1)
+
+                resposta = cliente.post('/deposito/1', data={'valor': '60.00'}, headers=chave,
+                                        follow_redirects=True)
+                assert 'já foi enviada com outros dados' in resposta.get_data(as_text=True)
+                assert _estado(db) == ([5000, 0], 1)
+
+                # Recusa também é o resultado gravado: o reenvio não saca depois do novo depósito
+                resposta = cliente.post('/saque/1', data={'valor': '80.00'}, headers={'Idempotency-Key': 's-1'},
+                                        follow_redirects=True)
+                assert 'saldo insuficiente' in resposta.get_data(as_text=True)
+                ledger.lancar(db, 1, 'deposito', 5000, 'Depósito')
+                resposta = cliente.post('/saque/1', data={'valor': '80.00'}, headers={'Idempotency-Key': 's-1'},
+                                        follow_redirects=True)
+                assert 'saldo insuficiente' in resposta.get_data(as_text=True)
+                assert _estado(db) == ([10000, 0], 2)
+
+                # Campo do formulário: chave nova a cada exibição
+                formulario = cliente.get('/transferencia/1').get_data(as_text=True)
+                campo = re.search(r'name="idempotency_key" value="([^"]+)"', formulario).group(1)
+                for _ in range(2):
+                    cliente.post('/transferencia/1', data={'valor': '10.00', 'conta_destino': '2',
+                                                           'idempotency_key': campo})
+                assert _estado(db) == ([9000, 1000], 4)
+                assert db.execute('SELECT COUNT(*) FROM transferencia').fetchone()[0] == 1
+                db.close()
+            finally:
+                app.config['GROUP_COMMIT'] = False
+                database.fechar_conexoes()
+                app.config['DATABASE'] = database.DATABASE
+        print(f"✅ Reenvios sem lançamento duplicado (group commit {'ligado' if group_commit else 'desligado'})")
+
+
+def test_erro_desfeito_e_expurgo():
+    """Erro no meio do lançamento não deixa rastro; chaves vencidas saem em lotes"""
+    print("🔍 Testando erro parcial e expurgo...")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        try:
+            db, _ = _preparar(os.path.join(tmp, 'teste.db'))
+            ledger.lancar(db, 1, 'deposito', 1000, 'Depósito')
+            registro = idempotencia.Idempotencia(ttl=3600, lote=2, intervalo=1000)
+
+            # Destino inexistente: a linha de transferencia já inserida é desfeita
+            resposta = ledger.em_transacao(db, registro.aplicar, 1, 't-1', 'x', ledger.aplicar_transferencia,
+                                           1, 99, 100, usuario_id=1)
+            assert resposta['erro'] == 'ContaDestinoNaoEncontrada'
+            assert db.execute('SELECT COUNT(*) FROM transferencia').fetchone()[0] == 0
+            try:
+                idempotencia.reproduzir(resposta)
+                raise AssertionError('deveria levantar')
+            except ledger.ContaDestinoNaoEncontrada:
+                pass
+            print("✅ Erro gravado como resposta, sem escrita parcial")
+
+            db.executemany("INSERT INTO idempotencia (usuario_id, chave, impressao, resposta, criado_em) "
+                           "VALUES (1, ?, 'x', '{}', datetime('now', '-2 hours'))",
+                           [(f'velha-{i}',) for i in range(5)])
+            db.commit()
+            assert registro.expurgar(db) == 2 and registro.expurgar(db) == 2
+            assert registro.expurgar(db) == 1 and registro.expurgar(db) == 0
+            assert [l[0] for l in db.execute('SELECT chave FROM idempotencia')] == ['t-1']
+            db.close()
+            print("✅ Chaves vencidas expurgadas em lotes")
+        finally:
+            database.fechar_conexoes()
+            app.config['DATABASE'] = database.DATABASE
+
+
+if __name__ == '__main__':
+    print("🚀 Iniciando testes de idempotência...\n")
+
+    test_reenvio()
+    test_erro_desfeito_e_expurgo()
+
+    print("\n🎉 Testes de idempotência passaram!")
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Script para testar a importação de créditos em lote
+Execute: python test_ingestao.py
+"""
+
+import io
+import json
+import os
+import tempfile
+
+import database
+import ingestao
+from app import app, init_db
+
+
+def _preparar(caminho):
+    app.config['DATABASE'] = caminho
+    init_db()
+    db = database.conectar(caminho)
+    db.execute("INSERT INTO usuario (nome, email, senha) VALUES ('Teste', 't@t.com', 'x')")
+    db.executemany("INSERT INTO conta (tipo, usuario_id) VALUES ('corrente', 1)", [()] * 3)
+    db.commit()
+    return db
+
+
+def test_importacao_csv():
+    """Linhas válidas entram em lotes; as inválidas vão para o relatório"""
+    print("🔍 Testando importação CSV...")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db = _preparar(os.path.join(tmp, 'teste.db'))
+        try:
+            linhas = ['conta_id,valor,descricao']
+            linhas += [f'{1 + i % 3},10.00,Salário {i}' for i in range(25)]
+            linhas += ['9,5.00,Conta inexistente', 'x,5.00,', '1,-3,Negativo', '2,1.005,', '3,1e20,Enorme']
+            arquivo = io.StringIO('\n'.join(linhas) + '\n')
+
+            relatorio = ingestao.importar(db, arquivo, 'csv', tamanho_lote=10)
+            assert relatorio['processadas'] == 30
+            assert relatorio['importadas'] == 25
+            assert relatorio['total_centavos'] == 25000 and relatorio['total'] == '250.00'
+            assert sorted(e['linha'] for e in relatorio['erros']) == [26, 27, 28, 29, 30]
+            assert {'linha': 30, 'erro': 'valor inválido'} in relatorio['erros']
+            saldos = [l[0] for l in db.execute('SELECT saldo_centavos FROM conta ORDER BY id')]
+            assert saldos == [9000, 8000, 8000]
+            assert db.execute('SELECT COUNT(*) FROM transacao').fetchone()[0] == 25
+            ultimos = db.execute('''
+                SELECT saldo_apos_centavos FROM transacao WHERE id IN (SELECT MAX(id) FROM transacao GROUP BY conta_id)
+                ORDER BY conta_id
+            ''').fetchall()
+            assert [l[0] for l in ultimos] == saldos
+            print("✅ 25 créditos importados, 5 erros reportados (inclusive valor acima do máximo)")
+        finally:
+            db.close()
+            app.config['DATABASE'] = database.DATABASE
+
+
+def test_rota_lote():
+    """A rota exige o token e aceita JSON Lines"""
+    print("🔍 Testando rota de importação em lote...")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        _preparar(os.path.join(tmp, 'teste.db')).close()
+        app.config['LOTE_TOKEN'] = 'segredo'
+        try:
+            cliente = app.test_client()
+            corpo = '\n'.join(json.dumps({'conta_id': 2, 'valor': 1.25}) for _ in range(4)) + '\n{quebrado\n'
+            corpo += json.dumps({'conta_id': 2, 'valor': 1e20}) + '\n'
+
+            resposta = cliente.post('/lancamentos/lote?formato=ndjson', data=corpo)
+            assert resposta.status_code == 401
+
+            resposta = cliente.post('/lancamentos/lote?formato=ndjson', data=corpo,
+                                    headers={'Authorization': 'Bearer segredo'})
+            dados = resposta.get_json()
+            assert resposta.status_code == 200
+            assert dados['importadas'] == 4 and dados['total_centavos'] == 500
+            assert dados['erros'] == [{'linha': 5, 'erro': 'JSON inválido'}, {'linha': 6, 'erro': 'valor inválido'}]
+            print("✅ Rota protegida por token importa NDJSON")
+        finally:
+            database.fechar_conexoes()
+            app.config['LOTE_TOKEN'] = None
+            app.config['DATABASE'] = database.DATABASE
+
+
+if __name__ == '__main__':
+    print("🚀 Iniciando testes de importação em lote...\n")
+
+    test_importacao_csv()
+    test_rota_lote()
+
+    print("\n🎉 Testes de importação em lote passaram!")
@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+"""
+Script para testar os lançamentos atômicos de depósito e saque
+Execute: python test_ledger.py
+"""
+
+import os
+import sqlite3
+import tempfile
+import threading
+
+import database
+import ledger
+from app import app, init_db
+
+
+def _preparar(caminho):
+    app.config['DATABASE'] = caminho
+    init_db()
+    db = database.conectar(caminho)
+    db.execute("INSERT INTO usuario (nome, email, senha) VALUES ('Teste', 't@t.com', 'x')")
+    db.execute("INSERT INTO usuario (nome, email, senha) VALUES ('Outro', 'o@o.com', 'x')")
+    db.execute("INSERT INTO conta (tipo, saldo_centavos, usuario_id) VALUES ('corrente', 10000, 1)")
+    db.execute("INSERT INTO conta (tipo, saldo_centavos, usuario_id) VALUES ('corrente', 0, 2)")
+    db.commit()
+    return db
+
+
+def test_lancamentos():
+    """Testa depósito, saque, saldo insuficiente e dono da conta"""
+    print("🔍 Testando lançamentos...")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db = _preparar(os.path.join(tmp, 'teste.db'))
+        try:
+            ledger.lancar(db, 1, 'deposito', 5000, 'Depósito', usuario_id=1)
+            ledger.lancar(db, 1, 'saque', 15000, 'Saque', usuario_id=1)
+            assert db.execute('SELECT saldo_centavos FROM conta WHERE id = 1').fetchone()[0] == 0
+            print("✅ Depósito e saque aplicados")
+
+            try:
+                ledger.lancar(db, 1, 'saque', 1, 'Saque', usuario_id=1)
+                assert False, 'saque sem saldo foi aceito'
+            except ledger.SaldoInsuficiente:
+                pass
+            try:
+                ledger.lancar(db, 2, 'deposito', 1000, 'Depósito', usuario_id=1)
+                assert False, 'depósito em conta alheia foi aceito'
+            except ledger.ContaNaoEncontrada:
+                pass
+            assert not db.in_transaction
+            assert db.execute('SELECT COUNT(*) FROM transacao').fetchone()[0] == 2
+            assert db.execute('SELECT saldo_centavos FROM conta WHERE id = 2').fetchone()[0] == 0
+            print("✅ Lançamentos recusados não gravam nada")
+        finally:
+            db.close()
+            app.config['DATABASE'] = database.DATABASE
+
+
+def test_saques_concorrentes():
+    """Saques simultâneos nunca deixam a conta negativa"""
+    print("🔍 Testando saques concorrentes...")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        caminho = os.path.join(tmp, 'teste.db')
+        _preparar(caminho).close()
+        aceitos = []
+
+        def sacar():
+            db = database.conectar(caminho)
+            for _ in range(20):
+                try:
+                    ledger.lancar(db, 1, 'saque', 700, 'Saque', usuario_id=1)
+                    aceitos.append(700)
+                except ledger.SaldoInsuficiente:
+                    pass
+            db.close()
+
+        threads = [threading.Thread(target=sacar) for _ in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        db = sqlite3.connect(caminho)
+        saldo = db.execute('SELECT saldo_centavos FROM conta WHERE id = 1').fetchone()[0]
+        db.close()
+        app.config['DATABASE'] = database.DATABASE
+        assert len(aceitos) == 14
+        assert saldo == 10000 - sum(aceitos) >= 0
+        print("✅ Exatamente 14 saques de 7,00 aceitos sobre 100,00")
+
+
+def test_rotas_deposito_saque():
+    """As rotas usam o lançamento atômico"""
+    print("🔍 Testando rotas de depósito e saque...")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        _preparar(os.path.join(tmp, 'teste.db')).close()
+        try:
+            cliente = app.test_client()
+            with cliente.session_transaction() as sessao:
+                sessao['usuario_id'] = 1
+
+            cliente.post('/deposito/1', data={'valor': '25.50'})
+            cliente.post('/saque/1', data={'valor': '500'})
+            cliente.post('/deposito/2', data={'valor': '10'})
+            cliente.get('/dashboard')  # consome os flashes anteriores
+            resposta = cliente.post('/deposito/1', data={'valor': '1e20'}, follow_redirects=True)
+            assert 'Valor inválido' in resposta.get_data(as_text=True)
+            with app.app_context():
+                db = database.get_db()
+                assert db.execute('SELECT saldo_centavos FROM conta WHERE id = 1').fetchone()[0] == 12550
+                assert db.execute('SELECT saldo_centavos FROM conta WHERE id = 2').fetchone()[0] == 0
+            assert cliente.get('/saque/2').status_code == 302
+            print("✅ Rotas aplicam e recusam lançamentos corretamente")
+        finally:
+            database.fechar_conexoes()
+            app.config['DATABASE'] = database.DATABASE
+
+
+def test_transferencia():
+    """Testa transferência entre contas de usuários diferentes"""
+    print("🔍 Testando transferências...")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db = _preparar(os.path.join(tmp, 'teste.db'))
+        try:
+            transferencia_id = ledger.transferir(db, 1, 2, 4000, usuario_id=1)
+            saldos = [linha[0] for linha in db.execute('SELECT saldo_centavos FROM conta ORDER BY id')]
+            assert saldos == [6000, 4000]
+            pernas = db.execute('SELECT conta_id, tipo FROM transacao WHERE transferencia_id = ? ORDER BY conta_id',
+                                (transferencia_id,)).fetchall()
+            assert [tuple(p) for p in pernas] == [(1, 'transferencia_enviada'), (2, 'transferencia_recebida')]
+            print("✅ Débito e crédito ligados pela mesma transferência")
+
+            for origem, destino, valor, usuario_id, erro in [
+                    (1, 1, 100, 1, ledger.TransferenciaInvalida),
+                    (1, 99, 100, 1, ledger.ContaDestinoNaoEncontrada),
+                    (2, 1, 100, 1, ledger.ContaNaoEncontrada),
+                    (1, 2, 6001, 1, ledger.SaldoInsuficiente)]:
+                try:
+                    ledger.transferir(db, origem, destino, valor, usuario_id=usuario_id)
+                    assert False, f'{erro.__name__} não levantado'
+                except erro:
+                    pass
+            assert db.execute('SELECT COUNT(*) FROM transferencia').fetchone()[0] == 1
+            assert db.execute('SELECT SUM(saldo_centavos) FROM conta').fetchone()[0] == 10000
+            print("✅ Transferências inválidas não deixam rastro")
+        finally:
+            db.close()
+            app.config['DATABASE'] = database.DATABASE
+
+
+def test_saldo_historico():
+    """Saldo após cada transação, checkpoints e saldo em uma data"""
+    print("🔍 Testando saldo histórico...")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db = _preparar(os.path.join(tmp, 'teste.db'))
+        intervalo, ledger.INTERVALO_CHECKPOINT = ledger.INTERVALO_CHECKPOINT, 10
+        try:
+            for i in range(25):
+                ledger.lancar(db, 2, 'saque' if i % 5 == 4 else 'deposito', 100, 'x')
+            saldos = [l[0] for l in db.execute(
+                'SELECT saldo_apos_centavos FROM transacao WHERE conta_id = 2 ORDER BY id')]
+            assert saldos[:5] == [100, 200, 300, 400, 300] and saldos[-1] == 1500
+            checkpoints = db.execute('SELECT transacao_id, saldo_centavos FROM saldo_checkpoint').fetchall()
+            assert [tuple(c) for c in checkpoints] == [(10, 600), (20, 1200)]
+            print("✅ Saldo gravado em cada transação e checkpoint a cada 10")
+
+            # Um dia por transação, para consultar o saldo em datas distintas
+            db.execute("UPDATE transacao SET data = datetime('2024-01-01', '+' || id || ' days')")
+            db.execute('UPDATE saldo_checkpoint SET data = (SELECT data FROM transacao WHERE id = transacao_id)')
+            db.commit()
+            for dia, esperado in [(1, 0), (2, 100), (11, 600), (16, 900), (21, 1200), (24, 1500), (30, 1500)]:
+                data = db.execute("SELECT date('2024-01-01', '+' || ? || ' days')", (dia,)).fetchone()[0]
+                assert ledger.saldo_em(db, 2, data) == esperado, (dia, esperado)
+            print("✅ Saldo em data = checkpoint + transações seguintes")
+        finally:
+            ledger.INTERVALO_CHECKPOINT = intervalo
+            db.close()
+            app.config['DATABASE'] = database.DATABASE
+
+
+if __name__ == '__main__':
+    print("🚀 Iniciando testes de lançamentos...\n")
+
+    test_lancamentos()
+    test_saques_concorrentes()
+    test_rotas_deposito_saque()
+    test_transferencia()
+    test_saldo_historico()
+
+    print("\n🎉 Testes de lançamentos passaram!")
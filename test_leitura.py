@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+Script para testar as conexões somente leitura e a réplica de leitura
+Execute: python test_leitura.py
+"""
+
+import os
+import sqlite3
+import tempfile
+
+import database
+import ledger
+import replica
+from app import app, init_db, pool_senhas
+
+
+def _popular(caminho):
+    db = database.conectar(caminho)
+    db.execute("INSERT INTO usuario (nome, email, senha) VALUES ('Teste', 't@t.com', ?)",
+               (pool_senhas.gerar('segredo'),))
+    db.execute("INSERT INTO conta (tipo, usuario_id) VALUES ('corrente', 1)")
+    db.commit()
+    ledger.lancar(db, 1, 'deposito', 1000, 'Depósito')
+    return db
+
+
+def test_leitura_somente_leitura():
+    """GETs leem por mode=ro num instantâneo só, sem segurar os lançamentos"""
+    print("🔍 Testando conexões somente leitura...")
+
+    metodo = pool_senhas.metodo
+    pool_senhas.metodo = 'pbkdf2:sha256:1000'
+    with tempfile.TemporaryDirectory() as tmp:
+        caminho = os.path.join(tmp, 'teste.db')
+        app.config['DATABASE'] = caminho
+        app.config['LIMITE_ATIVO'] = False
+        try:
+            init_db()
+            escritor = _popular(caminho)
+
+            with app.test_request_context():
+                leitura = database.get_leitura()
+                assert leitura is not database.get_db() and leitura.in_transaction
+                try:
+                    leitura.execute("UPDATE conta SET saldo_centavos = 0")
+                    raise AssertionError('conexão de leitura não deveria escrever')
+                except sqlite3.OperationalError as e:
+                    assert 'readonly' in str(e)
+                leitura.rollback()
+                leitura = database.get_leitura()
+                assert leitura.execute('SELECT saldo_centavos FROM conta').fetchone()[0] == 1000
+                # O COMMIT não espera o leitor; o leitor segue no seu instantâneo
+                ledger.lancar(escritor, 1, 'deposito', 500, 'Depósito')
+                assert leitura.execute('SELECT saldo_centavos FROM conta').fetchone()[0] == 1000
+            with app.test_request_context():
+                assert database.get_leitura().execute('SELECT saldo_centavos FROM conta').fetchone()[0] == 1500
+            print("✅ mode=ro recusa escrita e a requisição lê um instantâneo só")
+
+            cliente = app.test_client()
+            cliente.post('/login', data={'email': 't@t.com', 'senha': 'segredo'})
+            escritas, leituras = [], []
+            pragmas, fabrica = app.config['SQLITE_PRAGMAS'], app.config.get('SQLITE_FABRICA')
+            database._conexao_da_thread(caminho, pragmas, fabrica).set_trace_callback(escritas.append)
+            database._conexao_da_thread(caminho, pragmas, fabrica, True).set_trace_callback(leituras.append)
+            for rota in ('/dashboard', '/extrato/1', '/deposito/1', '/extrato/1/exportar?formato=csv'):
+                assert cliente.get(rota).status_code == 200, rota
+            assert escritas == [] and any('FROM transacao' in c for c in leituras)
+            cliente.post('/deposito/1', data={'valor': '1.00'})
+            assert any('UPDATE conta' in c for c in escritas)
+            print("✅ Rotas GET usam só a conexão de leitura; lançamentos, a de escrita")
+            escritor.close()
+        finally:
+            pool_senhas.metodo = metodo
+            app.config['LIMITE_ATIVO'] = True
+            database.fechar_conexoes()
+            app.config['DATABASE'] = database.DATABASE
+
+
+def test_replica():
+    """Exportação de período já copiado lê da réplica, que é trocada sem derrubar leitores"""
+    print("🔍 Testando a réplica de leitura...")
+
+    metodo = pool_senhas.metodo
+    pool_senhas.metodo = 'pbkdf2:sha256:1000'
+    with tempfile.TemporaryDirectory() as tmp:
+        caminho = os.path.join(tmp, 'teste.db')
+        app.config['DATABASE'] = caminho
+        app.config['LIMITE_ATIVO'] = False
+        app.config['REPLICA_ATIVA'] = True
+        try:
+            init_db()
+            escritor = _popular(caminho)
+            escritor.execute("UPDATE transacao SET data = '2020-01-10 12:00:00'")
+            escritor.commit()
+
+            cliente = app.test_client()
+            cliente.post('/login', data={'email': 't@t.com', 'senha': 'segredo'})
+            exportar = '/extrato/1/exportar?formato=csv&inicio=2020-01-01&fim=2020-01-31'
+            assert '10.00' in cliente.get(exportar).get_data(as_text=True)  # sem réplica: banco principal
+
+            replica.atualizar(caminho)
+            copia = database.conectar(replica.caminho_da_replica(caminho), somente_leitura=True)
+            assert copia.execute('PRAGMA journal_mode').fetchone()[0] == 'delete'
+            copia.close()
+            # Lançamento retroativo depois da cópia: só o banco principal tem
+            escritor.execute('''INSERT INTO transacao (tipo, valor, valor_centavos, descricao, conta_id, data)
+                                VALUES ('deposito', 7.77, 777, 'Retroativo', 1, '2020-01-11 12:00:00')''')
+            escritor.commit()
+            assert 'Retroativo' not in cliente.get(exportar).get_data(as_text=True)
+            hoje = '/extrato/1/exportar?formato=csv&inicio=2020-01-01&fim=2999-12-31'
+            assert 'Retroativo' in cliente.get(hoje).get_data(as_text=True)
+            print("✅ Período coberto pela cópia vem da réplica; o resto, do banco")
+
+            replica.atualizar(caminho)
+            assert 'Retroativo' in cliente.get(exportar).get_data(as_text=True)
+            print("✅ Réplica refeita é reaberta na requisição seguinte")
+            escritor.close()
+        finally:
+            pool_senhas.metodo = metodo
+            app.config['LIMITE_ATIVO'] = True
+            app.config['REPLICA_ATIVA'] = False
+            database.fechar_conexoes()
+            app.config['DATABASE'] = database.DATABASE
+
+
+if __name__ == '__main__':
+    print("🚀 Iniciando testes de leitura...\n")
+
+    test_leitura_somente_leitura()
+    test_replica()
+
+    print("\n🎉 Testes de leitura passaram!")
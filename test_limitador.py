@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Script para testar o limitador de tentativas de login e registro
+Execute: python test_limitador.py
+"""
+
+import multiprocessing
+import os
+import tempfile
+import time
+
+import database
+from app import app, init_db, pool_senhas
+from limitador import Limitador, ler_regra
+
+
+def test_token_bucket():
+    """Capacidade, reposição no tempo e chaves independentes"""
+    print("🔍 Testando token bucket...")
+
+    agora = [1000.0]
+    with tempfile.TemporaryDirectory() as tmp:
+        limitador = Limitador(os.path.join(tmp, 'limites'), {'login': ler_regra('3/60')},
+                              baldes=64, relogio=lambda: agora[0])
+        try:
+            assert [limitador.consumir('login', 'a') for _ in range(3)] == [0, 0, 0]
+            assert limitador.consumir('login', 'a') == 20
+            assert limitador.consumir('login', 'b') == 0
+            agora[0] += 20
+            assert limitador.consumir('login', 'a') == 0
+            assert limitador.estatisticas() == {'login': {'aceitas': 5, 'recusadas': 1}}
+            print("✅ Fichas gastas e repostas a 1 a cada 20s")
+
+            # Tabela cheia: as chaves novas reaproveitam os baldes mais antigos
+            for i in range(500):
+                agora[0] += 1
+                assert limitador.consumir('login', f'ip{i}') == 0
+            print("✅ Tabela de tamanho fixo reaproveita baldes")
+        finally:
+            limitador.fechar()
+
+
+def _consumir_em_processo(caminho, vezes):
+    limitador = Limitador(caminho, {'login': ler_regra('50/3600')})
+    return sum(limitador.consumir('login', 'compartilhado') == 0 for _ in range(vezes))
+
+
+def test_compartilhado_entre_processos():
+    """Workers diferentes dividem o mesmo balde; decisão em microssegundos"""
+    print("🔍 Testando limitador entre processos...")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        caminho = os.path.join(tmp, 'limites')
+        with multiprocessing.get_context('fork').Pool(4) as pool:
+            aceitas = sum(pool.starmap(_consumir_em_processo, [(caminho, 40)] * 4))
+        assert aceitas == 50
+        print("✅ 160 tentativas em 4 processos, 50 aceitas")
+
+        limitador = Limitador(caminho, {'login': ler_regra('1000000/1')})
+        inicio = time.perf_counter()
+        for i in range(5000):
+            limitador.consumir('login', f'10.0.{i % 256}.{i // 256}')
+        media = (time.perf_counter() - inicio) / 5000 * 1e6
+        limitador.fechar()
+        assert media < 200, media
+        print(f"✅ {media:.1f} µs por decisão")
+
+
+def test_rota_login_limitada():
+    """A tentativa recusada não chega ao banco nem ao hash"""
+    print("🔍 Testando limite na rota de login...")
+
+    regras = app.config['LIMITE_REGRAS']
+    verificar = pool_senhas.verificar
+    chamadas = []
+    with tempfile.TemporaryDirectory() as tmp:
+        app.config['DATABASE'] = os.path.join(tmp, 'teste.db')
+        app.config['LIMITE_REGRAS'] = dict(regras, login_email=ler_regra('2/60'))
+        pool_senhas.verificar = lambda *args: chamadas.append(args) or (False, None)
+        try:
+            init_db()
+            database.conectar(app.config['DATABASE']).execute(
+                "INSERT INTO usuario (nome, email, senha) VALUES ('T', 't@t.com', 'x')").connection.commit()
+            cliente = app.test_client()
+            codigos = [cliente.post('/login', data={'email': email, 'senha': 'errada'}).status_code
+                       for email in ('t@t.com', 't@t.com', 'T@t.com ')]
+            assert codigos == [200, 200, 429]
+            assert len(chamadas) == 2
+            resposta = cliente.post('/login', data={'email': 't@t.com', 'senha': 'errada'})
+            assert resposta.status_code == 429 and int(resposta.headers['Retry-After']) == 30
+            limites = cliente.get('/health').get_json()['limites']
+            assert limites['login_email'] == {'aceitas': 2, 'recusadas': 2}
+            print("✅ 429 por email antes do hash")
+        finally:
+            pool_senhas.verificar = verificar
+            app.config['LIMITE_REGRAS'] = regras
+            database.fechar_conexoes()
+            app.config['DATABASE'] = database.DATABASE
+
+
+if __name__ == '__main__':
+    print("🚀 Iniciando testes do limitador...\n")
+
+    test_token_bucket()
+    test_compartilhado_entre_processos()
+    test_rota_login_limitada()
+
+    print("\n🎉 Testes do limitador passaram!")
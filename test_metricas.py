@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+"""
+Script para testar as métricas em /metrics e a soma entre processos
+Execute: python test_metricas.py
+"""
+
+import io
+import json
+import logging
+import multiprocessing
+import os
+import re
+import sqlite3
+import tempfile
+
+import consultas_lentas
+import database
+import metricas
+from app import app, init_db, metricas_app
+
+
+def _novas_metricas(diretorio):
+    registro = metricas.Metricas(diretorio)
+    registro.contador('teste_total', 'Contador de teste')
+    registro.histograma('teste_segundos', 'Histograma de teste', (0.1, 1))
+    return registro
+
+
+def _trabalhador(diretorio, consolidar):
+    registro = _novas_metricas(diretorio)
+    for _ in range(10):
+        registro.incrementar('teste_total', rota='a"b')
+    registro.observar('teste_segundos', 0.5)
+    if consolidar:
+        registro.consolidar()
+
+
+def test_soma_entre_processos():
+    """Processos diferentes gravam em arquivos próprios; a leitura soma todos"""
+    print("🔍 Testando soma entre processos...")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        contexto = multiprocessing.get_context('fork')
+        processos = [contexto.Process(target=_trabalhador, args=(tmp, i % 2 == 0)) for i in range(4)]
+        for processo in processos:
+            processo.start()
+        for processo in processos:
+            processo.join()
+            assert processo.exitcode == 0
+
+        registro = _novas_metricas(tmp)
+        registro.observar('teste_segundos', 0.05)
+        registro.observar('teste_segundos', 5)
+        texto = registro.exposicao()
+        assert 'teste_total{rota="a\\"b"} 40' in texto
+        assert 'teste_segundos_bucket{le="0.1"} 1' in texto
+        assert 'teste_segundos_bucket{le="1"} 5' in texto
+        assert 'teste_segundos_bucket{le="+Inf"} 6' in texto
+        assert 'teste_segundos_count 6' in texto and '# TYPE teste_segundos histogram' in texto
+        arquivos = sorted(n for n in os.listdir(tmp) if n.endswith(metricas.EXTENSAO))
+        assert len(arquivos) == 4 and metricas.ACUMULADO in arquivos
+        print("✅ 4 processos somados, 2 deles já consolidados")
+
+        registro.limpar()
+        assert 'teste_total{' not in registro.exposicao()
+        print("✅ Métricas zeradas na subida")
+
+
+def test_endpoint_metrics():
+    """Rotas, templates e comandos SQL aparecem em /metrics"""
+    print("🔍 Testando /metrics...")
+
+    diretorio = metricas_app.diretorio
+    with tempfile.TemporaryDirectory() as tmp:
+        app.config['DATABASE'] = os.path.join(tmp, 'teste.db')
+        metricas_app.diretorio = os.path.join(tmp, 'metricas')
+        try:
+            init_db()
+            cliente = app.test_client()
+            assert cliente.get('/health').status_code == 200
+            assert cliente.get('/login').status_code == 200
+            assert cliente.get('/nao-existe').status_code == 404
+
+            resposta = cliente.get('/metrics')
+            assert resposta.content_type.startswith('text/plain; version=0.0.4')
+            texto = resposta.get_data(as_text=True)
+            assert 'banco_http_requisicoes_total{endpoint="health_check",metodo="GET",status="200"} 1' in texto
+            assert 'banco_http_requisicoes_total{endpoint="nao_encontrado",metodo="GET",status="404"} 1' in texto
+            assert re.search(r'banco_template_duracao_segundos_count\{template="login.html"\} 1\b', texto)
+            assert re.search(r'banco_sql_duracao_segundos_count\{tipo="SELECT"\} [1-9]', texto)
+            print("✅ Requisições, templates e SQL medidos")
+
+            # Outra conexão segura o lock de escrita: a medida conta o 'database is locked'
+            bloqueio = sqlite3.connect(app.config['DATABASE'])
+            bloqueio.execute('BEGIN IMMEDIATE')
+            db = database.conectar(app.config['DATABASE'], {'busy_timeout': 0},
+                                   app.config['SQLITE_FABRICA'])
+            try:
+                db.execute('BEGIN IMMEDIATE')
+                raise AssertionError('deveria estar travado')
+            except sqlite3.OperationalError:
+                pass
+            bloqueio.rollback()
+            bloqueio.close()
+            db.close()
+            assert 'banco_sql_bloqueios_total{tipo="BEGIN"} 1' in cliente.get('/metrics').get_data(as_text=True)
+            print("✅ Banco travado contado")
+        finally:
+            metricas_app.diretorio = diretorio
+            database.fechar_conexoes()
+            app.config['DATABASE'] = database.DATABASE
+
+
+def test_sql_medido_ate_a_ultima_linha():
+    """O tempo de um SELECT inclui as linhas lidas depois do execute()"""
+    print("🔍 Testando a medida das leituras do cursor...")
+
+    saida = io.StringIO()
+    manipulador = logging.StreamHandler(saida)
+    consultas_lentas.logger.addHandler(manipulador)
+    with tempfile.TemporaryDirectory() as tmp:
+        registro = metricas.Metricas(tmp)
+        registro.histograma('banco_sql_duracao_segundos', 'Comandos SQL', metricas.BUCKETS_SQL)
+        registro.contador('banco_sql_lentos_total', 'Comandos SQL lentos')
+        fabrica = metricas.fabrica_conexao(registro, consultas_lentas.RegistroLento(20))
+        db = database.conectar(':memory:', fabrica=fabrica)
+        try:
+            db.execute('CREATE TABLE t (id INTEGER PRIMARY KEY, descricao TEXT)')
+            db.executemany('INSERT INTO t (descricao) VALUES (?)', ((f'item {i}',) for i in range(300000)))
+            db.commit()
+
+            # A primeira linha sai no primeiro passo; a varredura inteira, só lendo o cursor
+            linhas = sum(1 for _ in db.execute('SELECT id, descricao FROM t WHERE descricao LIKE ?', ('%1%',)))
+            assert linhas > 100000
+            texto = registro.exposicao()
+            soma = float(re.search(r'banco_sql_duracao_segundos_sum\{tipo="SELECT"\} (\S+)', texto).group(1))
+            assert soma >= 0.02, soma
+            assert 'banco_sql_lentos_total{tipo="SELECT"} 1' in texto
+            lento = next(json.loads(linha) for linha in saida.getvalue().splitlines() if 'LIKE' in linha)
+            assert lento['plano'] == ['SCAN t'] and lento['duracao_ms'] >= 20
+
+            # Cursor largado depois de uma linha: registrado no comando seguinte da conexão
+            db.execute('SELECT id FROM t WHERE id = 1').fetchone()
+            antes = registro.exposicao()
+            db.execute('SELECT 1').fetchall()
+            depois = registro.exposicao()
+            contagem = r'banco_sql_duracao_segundos_count\{tipo="SELECT"\} (\d+)'
+            assert int(re.search(contagem, depois).group(1)) == int(re.search(contagem, antes).group(1)) + 2
+            print("✅ Varredura lida pelo cursor medida inteira e registrada como lenta")
+        finally:
+            db.close()
+            consultas_lentas.logger.removeHandler(manipulador)
+
+
+if __name__ == '__main__':
+    print("🚀 Iniciando testes de métricas...\n")
+
+    test_soma_entre_processos()
+    test_sql_medido_ate_a_ultima_linha()
+    test_endpoint_metrics()
+
+    print("\n🎉 Testes de métricas passaram!")
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Script para testar as migrações versionadas e a verificação na subida
+Execute: python test_migracoes.py
+"""
+
+import os
+import sqlite3
+import tempfile
+
+import database
+import migracoes
+from app import app, verificar_esquema
+
+
+def test_banco_novo():
+    """Todas as migrações em ordem, uma vez só"""
+    print("🔍 Testando migração de banco novo...")
+
+    versoes = [m.versao for m in migracoes.listar()]
+    assert versoes == list(range(1, len(versoes) + 1))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        caminho = os.path.join(tmp, 'novo.db')
+        assert [m.versao for m in migracoes.verificar(caminho)] == \
+            [m.versao for m in migracoes.listar() if not m.online]
+        assert not os.path.exists(caminho)
+
+        db = database.conectar(caminho)
+        assert len(migracoes.migrar(db)) == len(versoes)
+        assert migracoes.migrar(db) == []
+        assert migracoes.aplicadas(db) == set(versoes)
+        indices = {l[0] for l in db.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+        assert {'idx_transacao_conta_data', 'idx_conta_usuario'} <= indices
+        db.close()
+        assert migracoes.verificar(caminho) == []
+        print(f"✅ {len(versoes)} migrações aplicadas e registradas em schema_version")
+
+
+def test_banco_antigo_e_online():
+    """Banco do antigo init_db() é atualizado; índices ficam para depois"""
+    print("🔍 Testando banco sem schema_version...")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        caminho = os.path.join(tmp, 'antigo.db')
+        db = sqlite3.connect(caminho)
+        migracoes.listar()[0].modulo.aplicar(db)
+        db.execute("INSERT INTO usuario (nome, email, senha) VALUES ('T', 't@t.com', 'x')")
+        db.execute("INSERT INTO conta (tipo, saldo, usuario_id) VALUES ('corrente', 12.5, 1)")
+        db.execute("INSERT INTO transacao (tipo, valor, descricao, conta_id) VALUES ('deposito', 12.5, 'x', 1)")
+        db.commit()
+
+        migracoes.migrar(db, incluir_online=False)
+        assert db.execute('SELECT saldo_centavos FROM conta').fetchone()[0] == 1250
+        assert db.execute('SELECT valor_centavos FROM transacao').fetchone()[0] == 1250
+        assert migracoes.verificar(caminho) == []
+        assert [m.online for m in migracoes.pendentes(db)] == [True, True]
+        print("✅ Só faltam migrações online: o app já pode subir")
+
+        feitas = migracoes.migrar(db, somente_online=True)
+        assert [m.online for m in feitas] == [True, True] and migracoes.pendentes(db) == []
+        assert db.execute("SELECT rowid FROM transacao_busca WHERE transacao_busca MATCH 'x'").fetchall() == [(1,)]
+        db.close()
+        print("✅ Índices (e o de texto, com as linhas antigas) criados depois, com o banco em uso")
+
+
+def test_subida_sem_ddl():
+    """A subida só confere a versão, sem criar tabelas nem o arquivo"""
+    print("🔍 Testando verificação na subida...")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        app.config['DATABASE'] = os.path.join(tmp, 'faltando.db')
+        try:
+            assert verificar_esquema() is False
+            assert not os.path.exists(app.config['DATABASE'])
+            app.config['MIGRAR_AO_INICIAR'] = True
+            assert verificar_esquema() is True
+            print("✅ Esquema conferido; MIGRAR_AO_INICIAR=1 aplica as migrações")
+        finally:
+            app.config['MIGRAR_AO_INICIAR'] = False
+            database.fechar_conexoes()
+            app.config['DATABASE'] = database.DATABASE
+
+
+if __name__ == '__main__':
+    print("🚀 Iniciando testes de migrações...\n")
+
+    test_banco_novo()
+    test_banco_antigo_e_online()
+    test_subida_sem_ddl()
+
+    print("\n🎉 Testes de migrações passaram!")
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Script para testar o dashboard em uma consulta e o cache por usuário
+Execute: python test_painel.py
+"""
+
+import os
+import tempfile
+
+import database
+import ledger
+import painel
+from app import app, cache_painel, init_db
+from cache import AUSENTE, CacheLRU
+
+
+def test_cache_lru():
+    """Limite de entradas (ou de peso), validade e versão"""
+    print("🔍 Testando CacheLRU...")
+
+    agora = [0.0]
+    cache = CacheLRU(maximo=2, ttl=10, relogio=lambda: agora[0])
+    cache.gravar('a', 1)
+    cache.gravar('b', 2)
+    assert cache.obter('a') == 1
+    cache.gravar('c', 3)
+    assert cache.obter('b') is AUSENTE
+    print("✅ Entrada menos usada descartada")
+
+    agora[0] = 11
+    assert cache.obter('a') is AUSENTE
+    cache.gravar('v', 'x', versao=1)
+    assert cache.obter('v', 1) == 'x'
+    assert cache.obter('v', 2) is AUSENTE and cache.obter('v', 1) is AUSENTE
+    estatisticas = cache.estatisticas()
+    assert (estatisticas['acertos'], estatisticas['falhas']) == (2, 4)
+    assert (estatisticas['descartados'], estatisticas['expirados'], estatisticas['invalidados']) == (1, 1, 1)
+    print("✅ Expiração, versão e contadores")
+
+    pesado = CacheLRU(maximo=10, ttl=10, peso=len)
+    pesado.gravar('a', [1] * 4)
+    pesado.gravar('b', [1] * 5)
+    pesado.gravar('c', [1] * 3)
+    assert pesado.obter('a') is AUSENTE and pesado.obter('b') is not AUSENTE
+    pesado.gravar('d', [1] * 11)
+    assert pesado.obter('d') is AUSENTE and pesado.estatisticas()['ocupado'] == 8
+    print("✅ Limite pela soma dos pesos; valor maior que o limite não entra")
+
+
+def test_dashboard_cache():
+    """O dashboard vem do cache até um lançamento em qualquer conexão"""
+    print("🔍 Testando cache do dashboard...")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        caminho = os.path.join(tmp, 'teste.db')
+        app.config['DATABASE'] = caminho
+        try:
+            init_db()
+            db = database.conectar(caminho)
+            db.execute("INSERT INTO usuario (nome, email, senha) VALUES ('Teste', 't@t.com', 'x')")
+            db.executemany("INSERT INTO conta (tipo, usuario_id) VALUES (?, 1)", [('corrente',), ('poupanca',)])
+            db.commit()
+            ledger.lancar(db, 1, 'deposito', 10000, 'Depósito')
+            ledger.lancar(db, 1, 'saque', 2500, 'Saque')
+
+            dados = painel.consultar(db, 1)
+            assert [c['saldo_centavos'] for c in dados['contas']] == [7500, 0]
+            assert dados['contas'][0]['entradas_mes_centavos'] == 10000
+            assert dados['contas'][0]['saidas_mes_centavos'] == 2500
+            assert dados['contas'][0]['ultima_movimentacao'] and dados['contas'][1]['ultima_movimentacao'] is None
+            print("✅ Contas, totais do mês e última movimentação")
+
+            cliente = app.test_client()
+            with cliente.session_transaction() as sessao:
+                sessao['usuario_id'] = 1
+            cache_painel.limpar()
+            antes = cache_painel.estatisticas()
+            assert b'75.00' in cliente.get('/dashboard').data
+            assert b'75.00' in cliente.get('/dashboard').data
+            depois = cache_painel.estatisticas()
+            assert depois['falhas'] - antes['falhas'] == 1 and depois['acertos'] - antes['acertos'] == 1
+            print("✅ Segunda visita servida pelo cache")
+
+            # Lançamento por outra conexão (outro worker): a versão do usuário muda
+            ledger.lancar(db, 2, 'deposito', 123, 'Depósito')
+            assert b'1.23' in cliente.get('/dashboard').data
+            assert cache_painel.estatisticas()['invalidados'] == depois['invalidados'] + 1
+            assert 'cache_painel' in cliente.get('/health').get_json()
+            print("✅ Cache invalidado pelo lançamento")
+            db.close()
+        finally:
+            database.fechar_conexoes()
+            app.config['DATABASE'] = database.DATABASE
+
+
+if __name__ == '__main__':
+    print("🚀 Iniciando testes do dashboard...\n")
+
+    test_cache_lru()
+    test_dashboard_cache()
+
+    print("\n🎉 Testes do dashboard passaram!")
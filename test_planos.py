@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+"""
+Script para conferir os planos (EXPLAIN QUERY PLAN) de todas as consultas do app
+Execute: python test_planos.py
+
+Percorre as rotas num banco populado, captura cada comando SQL emitido e
+falha se algum plano varrer uma tabela inteira ou ordenar numa B-tree
+temporária. Um índice removido ou uma consulta nova sem índice quebra aqui,
+antes de virar lentidão em produção.
+"""
+
+import io
+import json
+import logging
+import os
+import tempfile
+
+import consultas_lentas
+import database
+import ledger
+import metricas
+import senhas
+from app import app, init_db, pool_senhas, registro_idempotencia
+
+# Varreduras conhecidas e intencionais, com o motivo
+PERMITIDOS = {
+    'SELECT (SELECT COUNT(*) FROM usuario), (SELECT COUNT(*) FROM conta)':
+        'instantâneo de /health, refeito só a cada SAUDE_CONTAGENS_TTL',
+    'SELECT versao FROM schema_version': 'uma linha por migração (prontidão)',
+    "SELECT k, v FROM 'main'.'transacao_busca_config'":
+        'configuração do FTS5 (poucas linhas), lida por ele uma vez por conexão',
+}
+
+
+def _popular(caminho):
+    app.config['DATABASE'] = caminho
+    init_db()
+    db = database.conectar(caminho)
+    db.executemany("INSERT INTO usuario (nome, email, senha) VALUES (?, ?, ?)",
+                   [(f'Usuário {i}', f'u{i}@t.com', senhas.gerar('segredo', 'pbkdf2:sha256:1000'))
+                    for i in range(50)])
+    db.executemany("INSERT INTO conta (tipo, usuario_id) VALUES (?, ?)",
+                   [(tipo, u) for u in range(1, 51) for tipo in ('corrente', 'poupanca')])
+    db.commit()
+    for i in range(2000):
+        ledger.lancar(db, 1 + i % 100, 'deposito', 1000 + i, f'Depósito {i}')
+    return db
+
+
+def _capturar(cliente, db):
+    """Percorre as rotas e funções do app; devolve os comandos SQL emitidos"""
+    comandos = []
+    for somente_leitura in (False, True):
+        database._conexao_da_thread(app.config['DATABASE'], app.config['SQLITE_PRAGMAS'],
+                                    app.config.get('SQLITE_FABRICA'), somente_leitura).set_trace_callback(comandos.append)
+    db.set_trace_callback(comandos.append)
+
+    cliente.get('/health')
+    cliente.get('/health/ready')
+    cliente.post('/registro', data={'nome': 'Novo', 'email': 'novo@t.com', 'senha': 'segredo'})
+    cliente.post('/login', data={'email': 'u0@t.com', 'senha': 'segredo'})
+    cliente.get('/dashboard')
+    cliente.post('/criar_conta', data={'tipo': 'corrente'})
+    cliente.post('/deposito/1', data={'valor': '10.00'}, headers={'Idempotency-Key': 'd-1'})
+    cliente.post('/saque/1', data={'valor': '1.00'}, headers={'Idempotency-Key': 's-1'})
+    cliente.post('/transferencia/1', data={'valor': '1.00', 'conta_destino': '3'},
+                 headers={'Idempotency-Key': 't-1'})
+    cliente.post('/transferencia/1', data={'valor': '1.00', 'conta_destino': '2'})
+
+    pagina = cliente.get('/extrato/1').get_data(as_text=True)
+    assert 'antes=' in pagina
+    antes = pagina.split('antes=', 1)[1].split('"', 1)[0].replace('&amp;', '&')
+    cliente.get(f'/extrato/1?antes={antes}')
+    cliente.get(f'/extrato/1?depois={antes}')
+    cliente.get('/extrato/1/busca?tipo=deposito&valor_min=1,00&inicio=2000-01-01&fim=2999-12-31')
+    cliente.get('/extrato/1/busca?q=deposito&tipo=deposito&valor_min=1,00&inicio=2000-01-01&pagina=2')
+    for formato in ('csv', 'ndjson', 'ofx'):
+        cliente.get(f'/extrato/1/exportar?formato={formato}&inicio=2000-01-01&fim=2999-12-31').get_data()
+
+    token = cliente.post('/api/v1/tokens', json={'email': 'u0@t.com', 'senha': 'segredo'}).get_json()['token']
+    cabecalho = {'Authorization': f'Bearer {token}'}
+    cliente.get('/api/v1/contas', headers=cabecalho)
+    cliente.get('/api/v1/contas/1', headers=cabecalho)
+    resposta = cliente.get('/api/v1/contas/1/extrato?limite=5', headers=cabecalho)
+    antes = resposta.get_json()['paginacao']['antes']
+    cliente.get(f'/api/v1/contas/1/extrato?limite=5&antes={antes}', headers=cabecalho)
+    cliente.get(f'/api/v1/contas/1/extrato?limite=5&depois={antes}', headers=cabecalho)
+    cliente.delete('/api/v1/tokens', headers=cabecalho)
+
+    corpo = '\n'.join(json.dumps({'conta_id': 2, 'valor': 1.25}) for _ in range(3))
+    cliente.post('/lancamentos/lote?formato=ndjson', data=corpo, headers={'Authorization': 'Bearer segredo'})
+
+    # Caminhos que nenhuma rota deste roteiro alcança
+    ledger.saldo_em(db, 1, '2999-01-01')
+    with db:
+        ledger.registrar_checkpoint(db, 1)
+        registro_idempotencia.expurgar(db)
+    return comandos
+
+
+def test_planos_sem_varredura():
+    """Nenhuma consulta do app varre tabela inteira nem ordena em B-tree temporária"""
+    print("🔍 Conferindo planos das consultas do app...")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        caminho = os.path.join(tmp, 'teste.db')
+        app.config['LOTE_TOKEN'] = 'segredo'
+        app.config['LIMITE_ATIVO'] = False
+        metodo = pool_senhas.metodo
+        pool_senhas.metodo = 'pbkdf2:sha256:1000'
+        try:
+            db = _popular(caminho)
+            comandos = _capturar(app.test_client(), db)
+
+            vistos, encontrados = set(), {}
+            verificador = database.conectar(caminho)
+            for comando in comandos:
+                # '--' são os comandos internos dos gatilhos
+                sql = consultas_lentas.normalizar(comando)
+                if sql.split(' ', 1)[0].upper() not in consultas_lentas.COM_PLANO or sql in vistos:
+                    continue
+                vistos.add(sql)
+                ruins = consultas_lentas.problemas(consultas_lentas.plano(verificador, sql))
+                if ruins and sql not in PERMITIDOS:
+                    encontrados[sql] = ruins
+            verificador.close()
+            db.close()
+
+            assert len(vistos) > 30, f'poucas consultas capturadas: {len(vistos)}'
+            assert not encontrados, 'planos com varredura:\n' + '\n'.join(
+                f'{sql}\n    {ruins}' for sql, ruins in encontrados.items())
+            print(f"✅ {len(vistos)} consultas sem varredura completa nem B-tree temporária")
+        finally:
+            pool_senhas.metodo = metodo
+            app.config['LOTE_TOKEN'] = None
+            app.config['LIMITE_ATIVO'] = True
+            database.fechar_conexoes()
+            app.config['DATABASE'] = database.DATABASE
+
+
+def test_problemas_do_plano():
+    """A regra aponta varredura e B-tree temporária, mas não subconsulta nem índice"""
+    print("🔍 Testando a leitura de planos...")
+
+    db = database.conectar(':memory:')
+    db.execute('CREATE TABLE t (id INTEGER PRIMARY KEY, a INTEGER, b TEXT)')
+    db.execute('CREATE INDEX idx_t_a ON t (a)')
+    plano = consultas_lentas.plano
+    problemas = consultas_lentas.problemas
+    assert problemas(plano(db, 'SELECT * FROM t WHERE b = ?', ('x',))) == ['SCAN t']
+    assert problemas(plano(db, 'SELECT * FROM t WHERE a = 1 ORDER BY b')) == ['USE TEMP B-TREE FOR ORDER BY']
+    assert problemas(plano(db, 'SELECT * FROM t WHERE a = ? ORDER BY a', (1,))) == []
+    assert problemas(plano(db, 'SELECT * FROM (SELECT * FROM t WHERE id = 1 LIMIT 5) m')) == []
+    db.execute('CREATE VIRTUAL TABLE f USING fts5 (texto)')
+    assert problemas(plano(db, 'SELECT * FROM f')) == ['SCAN f VIRTUAL TABLE INDEX 0:']
+    assert problemas(plano(db, 'SELECT * FROM f WHERE f MATCH ?', ('x',))) == []
+    db.close()
+    print("✅ Varreduras e ordenações temporárias reconhecidas")
+
+
+def test_registro_lento():
+    """Comando acima do limite vai para o log com tipos dos parâmetros e plano"""
+    print("🔍 Testando o registro de consultas lentas...")
+
+    saida = io.StringIO()
+    manipulador = logging.StreamHandler(saida)
+    consultas_lentas.logger.addHandler(manipulador)
+    try:
+        fabrica = metricas.fabrica_conexao(lentas=consultas_lentas.RegistroLento(0))
+        db = database.conectar(':memory:', fabrica=fabrica)
+        db.execute('CREATE TABLE t (id INTEGER PRIMARY KEY, email TEXT)')
+        db.execute('SELECT id FROM t WHERE email = ?', ('segredo@t.com',)).fetchall()
+        db.close()
+    finally:
+        consultas_lentas.logger.removeHandler(manipulador)
+
+    registros = [json.loads(linha) for linha in saida.getvalue().splitlines()]
+    registro = next(r for r in registros if r['sql'].startswith('SELECT'))
+    assert registro['parametros'] == ['str'] and 'segredo' not in saida.getvalue()
+    assert registro['plano'] == ['SCAN t'] and registro['problemas'] == ['SCAN t']
+    assert registro['tipo'] == 'SELECT' and registro['duracao_ms'] >= 0
+    print("✅ Consulta lenta registrada sem os valores, com o plano")
+
+
+def test_varredura_lenta_registrada():
+    """SELECT cujo custo está nas linhas lidas depois do primeiro passo também é registrado"""
+    print("🔍 Testando o registro de uma varredura lenta lida com fetchall...")
+
+    saida = io.StringIO()
+    manipulador = logging.StreamHandler(saida)
+    consultas_lentas.logger.addHandler(manipulador)
+    try:
+        fabrica = metricas.fabrica_conexao(lentas=consultas_lentas.RegistroLento(20))
+        db = database.conectar(':memory:', fabrica=fabrica)
+        db.execute('CREATE TABLE t (id INTEGER PRIMARY KEY, descricao TEXT)')
+        db.executemany('INSERT INTO t (descricao) VALUES (?)', ((f'Depósito {i}',) for i in range(300000)))
+        db.commit()
+        # A primeira linha casa logo: quase todo o custo fica no fetchall
+        linhas = db.execute('SELECT id, descricao FROM t WHERE descricao LIKE ?', ('%1%',)).fetchall()
+        db.close()
+    finally:
+        consultas_lentas.logger.removeHandler(manipulador)
+
+    assert len(linhas) > 100000
+    registros = [json.loads(linha) for linha in saida.getvalue().splitlines()]
+    registro = next(r for r in registros if r['tipo'] == 'SELECT')
+    assert registro['sql'] == 'SELECT id, descricao FROM t WHERE descricao LIKE ?'
+    assert registro['duracao_ms'] >= 20 and registro['parametros'] == ['str']
+    assert registro['plano'] == ['SCAN t'] and registro['problemas'] == ['SCAN t']
+    print(f"✅ Varredura de {registro['duracao_ms']:.0f} ms registrada com o plano")
+
+
+if __name__ == '__main__':
+    print("🚀 Iniciando testes de planos de consulta...\n")
+
+    test_problemas_do_plano()
+    test_registro_lento()
+    test_varredura_lenta_registrada()
+    test_planos_sem_varredura()
+
+    print("\n🎉 Testes de planos de consulta passaram!")
@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+Script para testar o resumo mensal por conta
+Execute: python test_resumos.py
+"""
+
+import os
+import tempfile
+from datetime import datetime
+
+import arquivo
+import database
+import gerador
+import ledger
+import resumos
+from app import app, init_db, pool_senhas
+
+# Tudo o que está em `transacao`, agrupado como o resumo
+_AGRUPADO = '''
+    SELECT conta_id, substr(data, 1, 7), tipo, COUNT(*), SUM(valor_centavos)
+    FROM transacao GROUP BY 1, 2, 3 ORDER BY 1, 2, 3
+'''
+
+
+def _resumo(db):
+    return [tuple(linha) for linha in db.execute('SELECT * FROM resumo_mensal ORDER BY 1, 2, 3')]
+
+
+def test_resumo_mensal():
+    """Gatilho na transação do lançamento, painéis e reconstrução com o arquivo"""
+    print("🔍 Testando o resumo mensal...")
+
+    metodo = pool_senhas.metodo
+    pool_senhas.metodo = 'pbkdf2:sha256:1000'
+    with tempfile.TemporaryDirectory() as tmp:
+        caminho = os.path.join(tmp, 'teste.db')
+        app.config['DATABASE'] = caminho
+        app.config['LIMITE_ATIVO'] = False
+        try:
+            init_db()
+            db = database.conectar(caminho)
+            db.execute("INSERT INTO usuario (nome, email, senha) VALUES ('Teste', 't@t.com', ?)",
+                       (pool_senhas.gerar('segredo'),))
+            db.execute("INSERT INTO conta (tipo, usuario_id) VALUES ('corrente', 1)")
+            db.execute("INSERT INTO conta (tipo, usuario_id) VALUES ('poupanca', 1)")
+            db.commit()
+            # Histórico antigo gravado direto, com data explícita
+            with db:
+                for mes in range(1, 7):
+                    for dia in (5, 20):
+                        db.execute('''INSERT INTO transacao (tipo, valor, valor_centavos, descricao, conta_id, data)
+                                      VALUES ('deposito', 10, 1000, 'Antigo', 1, ?)''', (f'2020-{mes:02d}-{dia} 10:00:00',))
+                    db.execute('''INSERT INTO transacao (tipo, valor, valor_centavos, descricao, conta_id, data)
+                                  VALUES ('saque', 3, 300, 'Antigo', 1, ?)''', (f'2020-{mes:02d}-25 10:00:00',))
+                db.execute('UPDATE conta SET saldo_centavos = 6 * 1700, saldo = 6 * 17 WHERE id = 1')
+
+            cliente = app.test_client()
+            cliente.post('/login', data={'email': 't@t.com', 'senha': 'segredo'})
+            cliente.get('/dashboard')
+            cliente.post('/deposito/1', data={'valor': '50.00'})
+            cliente.post('/saque/1', data={'valor': '20.00'})
+            cliente.post('/transferencia/1', data={'conta_destino': '2', 'valor': '5.00'})
+            try:
+                ledger.lancar(db, 1, 'saque', 10 ** 9, 'Saque')
+            except ledger.SaldoInsuficiente:
+                pass
+            assert _resumo(db) == [tuple(linha) for linha in db.execute(_AGRUPADO)]
+            mes = datetime.utcnow().strftime('%Y-%m')
+            assert (1, mes, 'deposito', 1, 5000) in _resumo(db)
+            print("✅ Cada lançamento (e só os gravados) entra no resumo na mesma transação")
+
+            assert [m['mes'] for m in resumos.meses_da_conta(db, 1, meses=1000)] == \
+                [mes] + [f'2020-{numero:02d}' for numero in range(6, 0, -1)]
+            junho = resumos.meses_da_conta(db, 1, meses=1000)[1]
+            assert (junho['entradas_centavos'], junho['saidas_centavos'], junho['quantidade']) == (2000, 300, 3)
+            atual = resumos.meses_do_usuario(db, 1)[0]
+            assert (atual['entradas_centavos'], atual['saidas_centavos'], atual['quantidade']) == (5500, 2500, 4)
+            painel = cliente.get('/dashboard').get_data(as_text=True)
+            assert 'Resumo Mensal' in painel and '+R$ 50.00' in painel and '+R$ 55.00' in painel
+            extrato = cliente.get('/extrato/1').get_data(as_text=True)
+            assert 'Resumo Mensal' in extrato and '-R$ 25.00' in extrato
+            print("✅ Painéis do dashboard e do extrato saem do resumo")
+
+            antes = _resumo(db)
+            diretorio = arquivo.diretorio_do_banco(caminho)
+            assert arquivo.arquivar(db, diretorio, '2020-04-01') == 9
+            assert _resumo(db) == antes
+            with db:
+                db.execute("DELETE FROM resumo_mensal")
+            assert resumos.reconstruir_tudo(db, diretorio, contas_por_lote=1) == 2
+            assert _resumo(db) == antes
+            print("✅ Arquivar não mexe no resumo; reconstruir soma banco e arquivo")
+            db.close()
+        finally:
+            pool_senhas.metodo = metodo
+            app.config['LIMITE_ATIVO'] = True
+            database.fechar_conexoes()
+            app.config['DATABASE'] = database.DATABASE
+
+
+def test_resumo_do_gerador():
+    """A carga sem gatilhos grava o mesmo resumo que o gatilho manteria"""
+    print("🔍 Testando o resumo do gerador...")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        caminho = os.path.join(tmp, 'gerado.db')
+        db = database.conectar(caminho)
+        gerador.gerar(db, 20, transacoes=2000, ate=datetime(2024, 6, 30), semente=3, lote=300)
+        gerado = _resumo(db)
+        assert gerado and gerado == [tuple(linha) for linha in db.execute(_AGRUPADO)]
+        resumos.reconstruir_tudo(db, arquivo.diretorio_do_banco(caminho))
+        assert _resumo(db) == gerado
+        print(f"✅ {len(gerado)} linhas de resumo iguais às da reconstrução")
+        db.close()
+
+
+if __name__ == '__main__':
+    print("🚀 Iniciando testes do resumo mensal...\n")
+
+    test_resumo_mensal()
+    test_resumo_do_gerador()
+
+    print("\n🎉 Testes do resumo mensal passaram!")
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+Script para testar as sondas de saúde (/health/live, /health/ready, /health)
+Execute: python test_saude.py
+"""
+
+import os
+import tempfile
+
+import database
+from app import app, cache_contagens, init_db
+
+
+def test_sondas():
+    """Vivacidade sem banco, prontidão com as verificações e contagens em cache"""
+    print("🔍 Testando sondas de saúde...")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        caminho = os.path.join(tmp, 'teste.db')
+        app.config['DATABASE'] = caminho
+        try:
+            init_db()
+            cliente = app.test_client()
+            comandos = []
+            for somente_leitura in (False, True):
+                database._conexao_da_thread(caminho, app.config['SQLITE_PRAGMAS'], app.config.get('SQLITE_FABRICA'),
+                                            somente_leitura).set_trace_callback(comandos.append)
+
+            assert cliente.get('/health/live').get_json() == {'status': 'alive'}
+            assert comandos == []
+            print("✅ Vivacidade responde sem tocar no banco")
+
+            resposta = cliente.get('/health/ready')
+            dados = resposta.get_json()
+            assert resposta.status_code == 200 and dados['status'] == 'ready'
+            assert set(dados['verificacoes']) == {'banco', 'esquema', 'wal', 'disco'}
+            assert not any('COUNT' in c or 'wal_checkpoint' in c for c in comandos)
+            print("✅ Prontidão confere banco, esquema, WAL e disco sem contar linhas nem fazer checkpoint")
+
+            app.config['SAUDE_DISCO_MINIMO_MB'] = 10 ** 12
+            resposta = cliente.get('/health/ready')
+            assert resposta.status_code == 503 and not resposta.get_json()['verificacoes']['disco']['ok']
+            app.config['SAUDE_DISCO_MINIMO_MB'] = 100
+
+            db = database.conectar(caminho)
+            db.execute('DELETE FROM schema_version WHERE versao = 1')
+            db.commit()
+            resposta = cliente.get('/health/ready')
+            assert resposta.status_code == 503
+            assert resposta.get_json()['verificacoes']['esquema']['pendentes'] == [1]
+            db.execute("INSERT INTO schema_version (versao, descricao) VALUES (1, 'x')")
+            db.commit()
+            assert cliente.get('/health/ready').get_json()['verificacoes']['wal']['atraso_quadros'] > 0
+            app.config['SAUDE_WAL_MAXIMO_QUADROS'] = 0
+            assert cliente.get('/health/ready').status_code == 503
+            app.config['SAUDE_WAL_MAXIMO_QUADROS'] = 10000
+            print("✅ Disco cheio, migração pendente e WAL acima do limite tiram o worker do ar")
+
+            assert cliente.get('/health').get_json()['users_count'] == 0
+            db.execute("INSERT INTO usuario (nome, email, senha) VALUES ('Teste', 't@t.com', 'x')")
+            db.commit()
+            assert cliente.get('/health').get_json()['users_count'] == 0
+            cache_contagens.limpar()
+            assert cliente.get('/health').get_json()['users_count'] == 1
+            assert sum('COUNT' in c for c in comandos) == 2
+            db.close()
+            print("✅ Contagens vêm do instantâneo, refeito só quando vence")
+        finally:
+            app.config['SAUDE_DISCO_MINIMO_MB'] = 100
+            app.config['SAUDE_WAL_MAXIMO_QUADROS'] = 10000
+            cache_contagens.limpar()
+            database.fechar_conexoes()
+            app.config['DATABASE'] = database.DATABASE
+
+
+if __name__ == '__main__':
+    print("🚀 Iniciando testes das sondas de saúde...\n")
+
+    test_sondas()
+
+    print("\n🎉 Testes das sondas de saúde passaram!")
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+Script para testar o pool de hash de senhas, o 503 e o rehash no login
+Execute: python test_senhas.py
+"""
+
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+
+import database
+import senhas
+from app import app, init_db, pool_senhas
+
+
+def test_metodo_e_rehash():
+    """Métodos são comparados já com os parâmetros padrão preenchidos"""
+    print("🔍 Testando método de hash...")
+
+    assert senhas.normalizar_metodo('pbkdf2') == senhas.METODO_PADRAO
+    assert senhas.normalizar_metodo('scrypt:16384') == 'scrypt:16384:8:1'
+    antigo = senhas.gerar('segredo', 'pbkdf2:sha256:1000')
+    assert senhas.precisa_rehash(antigo, 'pbkdf2:sha256:2000')
+    assert not senhas.precisa_rehash(antigo, 'pbkdf2:sha256:1000')
+    assert senhas.verificar(antigo, 'errada', 'pbkdf2:sha256:2000') == (False, None)
+    confere, novo = senhas.verificar(antigo, 'segredo', 'pbkdf2:sha256:2000')
+    assert confere and novo.startswith('pbkdf2:sha256:2000$')
+    print("✅ Rehash detectado só quando o custo muda")
+
+
+def test_pool_saturado():
+    """Acima da fila máxima o pedido é recusado na hora"""
+    print("🔍 Testando saturação do pool...")
+
+    pool = senhas.PoolSenhas('pbkdf2:sha256:1000', processos=1, fila_maxima=1)
+    try:
+        assert pool.verificar(pool.gerar('segredo'), 'segredo') == (True, None)
+        lento = threading.Thread(target=pool._executar, args=(time.sleep, 0.5))
+        lento.start()
+        while pool.estatisticas()['em_andamento'] == 0:
+            time.sleep(0.01)
+        inicio = time.perf_counter()
+        try:
+            pool.gerar('outra')
+            raise AssertionError('deveria recusar')
+        except senhas.PoolSaturado:
+            pass
+        assert time.perf_counter() - inicio < 0.1
+        lento.join()
+        assert pool.estatisticas()['recusados'] == 1
+        print("✅ Pool cheio recusa sem esperar")
+    finally:
+        pool.encerrar()
+
+
+def test_login_rehash_e_503():
+    """Login troca hash antigo; pool cheio responde 503"""
+    print("🔍 Testando rotas de login e registro...")
+
+    metodo, fila = pool_senhas.metodo, pool_senhas.fila_maxima
+    with tempfile.TemporaryDirectory() as tmp:
+        caminho = os.path.join(tmp, 'teste.db')
+        app.config['DATABASE'] = caminho
+        pool_senhas.metodo = 'pbkdf2:sha256:2000'
+        try:
+            init_db()
+            cliente = app.test_client()
+            resposta = cliente.post('/registro', data={'nome': 'N', 'email': 'n@n.com', 'senha': 'segredo'})
+            assert resposta.status_code == 302
+
+            db = sqlite3.connect(caminho)
+            db.execute("UPDATE usuario SET senha = ?", (senhas.gerar('segredo', 'pbkdf2:sha256:1000'),))
+            db.commit()
+            resposta = cliente.post('/login', data={'email': 'n@n.com', 'senha': 'segredo'})
+            assert resposta.status_code == 302 and resposta.location.endswith('/dashboard')
+            assert db.execute('SELECT senha FROM usuario').fetchone()[0].startswith('pbkdf2:sha256:2000$')
+            db.close()
+            print("✅ Hash antigo atualizado no login")
+
+            pool_senhas.fila_maxima = 0
+            resposta = cliente.post('/login', data={'email': 'n@n.com', 'senha': 'segredo'})
+            assert resposta.status_code == 503 and resposta.headers['Retry-After'] == '1'
+            print("✅ 503 com Retry-After quando saturado")
+        finally:
+            pool_senhas.metodo, pool_senhas.fila_maxima = metodo, fila
+            database.fechar_conexoes()
+            app.config['DATABASE'] = database.DATABASE
+
+
+if __name__ == '__main__':
+    print("🚀 Iniciando testes de senhas...\n")
+
+    test_metodo_e_rehash()
+    test_pool_saturado()
+    test_login_rehash_e_503()
+
+    print("\n🎉 Testes de senhas passaram!")
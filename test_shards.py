@@ -0,0 +1,321 @@
+#!/usr/bin/env python3
+"""
+Script para testar os shards (roteamento por usuário, transferências entre
+shards e mudança de shard)
+Execute: python test_shards.py
+"""
+
+import json
+import os
+import sqlite3
+import tempfile
+
+import database
+import importar_lote
+import ledger
+import migracoes
+import shards
+from app import app, cache_contagens, init_db, pool_senhas
+
+
+def _configurar(tmp, total=2):
+    caminhos = [os.path.join(tmp, f'shard-{numero}.db') for numero in range(total)]
+    app.config['SHARDS'] = caminhos
+    app.config['SHARDS_DIRETORIO'] = os.path.join(tmp, 'diretorio.db')
+    app.config['LIMITE_ATIVO'] = False
+    init_db()
+    return caminhos
+
+
+def _restaurar(metodo):
+    pool_senhas.metodo = metodo
+    app.config['SHARDS'] = list(shards.SHARDS)
+    app.config['SHARDS_DIRETORIO'] = shards.DIRETORIO
+    app.config['LIMITE_ATIVO'] = True
+    app.config['LOTE_TOKEN'] = None
+    cache_contagens.limpar()
+    database.fechar_conexoes()
+
+
+def _entrar(cliente, email):
+    cliente.get('/logout')
+    cliente.post('/login', data={'email': email, 'senha': 'segredo'})
+
+
+def _saldo(caminho, conta_id):
+    db = database.conectar(caminho)
+    try:
+        return db.execute('SELECT saldo_centavos FROM conta WHERE id = ?', (conta_id,)).fetchone()[0]
+    finally:
+        db.close()
+
+
+def test_rotas_com_shards():
+    """Registro, login, lançamentos, transferência entre shards, API, lote e saúde"""
+    print("🔍 Testando as rotas com dois shards...")
+
+    metodo = pool_senhas.metodo
+    pool_senhas.metodo = 'pbkdf2:sha256:1000'
+    with tempfile.TemporaryDirectory() as tmp:
+        try:
+            caminhos = _configurar(tmp)
+            cliente = app.test_client()
+            for numero in range(1, 5):
+                cliente.post('/registro', data={'nome': f'U{numero}', 'email': f'u{numero}@t.com',
+                                                'senha': 'segredo'})
+            resposta = cliente.post('/registro', data={'nome': 'X', 'email': 'u1@t.com', 'senha': 'segredo'},
+                                    follow_redirects=True)
+            assert 'Email já cadastrado' in resposta.get_data(as_text=True)
+
+            # Usuário n no shard n % 2, sem cópia no outro
+            for numero, caminho in enumerate(caminhos):
+                db = database.conectar(caminho)
+                ids = [linha[0] for linha in db.execute('SELECT id FROM usuario ORDER BY id')]
+                db.close()
+                assert ids == [i for i in range(1, 5) if i % 2 == numero], ids
+            print("✅ Cada usuário gravado só no shard id % 2")
+
+            # Contas com ids únicos entre os shards: 1 e 2 do u1 (shard 1), 3 do u2 (shard 0)
+            _entrar(cliente, 'u1@t.com')
+            cliente.post('/criar_conta', data={'tipo': 'corrente'})
+            cliente.post('/criar_conta', data={'tipo': 'poupanca'})
+            cliente.post('/deposito/1', data={'valor': '100.00'})
+            _entrar(cliente, 'u2@t.com')
+            cliente.post('/criar_conta', data={'tipo': 'corrente'})
+            assert 'Acesso negado' in cliente.post('/deposito/1', data={'valor': '1.00'},
+                                                   follow_redirects=True).get_data(as_text=True)
+            _entrar(cliente, 'u1@t.com')
+            assert _saldo(caminhos[1], 1) == 10000
+
+            # Conta que não chega ao shard não fica reservada no diretório
+            db = database.conectar(caminhos[1])
+            db.execute("CREATE TRIGGER falhar_conta BEFORE INSERT ON conta BEGIN SELECT RAISE(ABORT, 'falhou'); END")
+            db.commit()
+            cliente.post('/criar_conta', data={'tipo': 'corrente'})
+            db.execute('DROP TRIGGER falhar_conta')
+            db.commit()
+            db.close()
+            db = database.conectar(app.config['SHARDS_DIRETORIO'])
+            assert db.execute('SELECT COUNT(*) FROM diretorio_conta').fetchone()[0] == 3
+            db.close()
+            cliente.get('/dashboard')
+
+            cliente.post('/transferencia/1', data={'valor': '10.00', 'conta_destino': '2'})
+            cliente.post('/transferencia/1', data={'valor': '25.00', 'conta_destino': '3'},
+                         headers={'Idempotency-Key': 't-1'})
+            cliente.post('/transferencia/1', data={'valor': '25.00', 'conta_destino': '3'},
+                         headers={'Idempotency-Key': 't-1'})
+            resposta = cliente.post('/transferencia/1', data={'valor': '1.00', 'conta_destino': '99'},
+                                    follow_redirects=True)
+            assert 'Conta de destino não encontrada' in resposta.get_data(as_text=True)
+            assert (_saldo(caminhos[1], 1), _saldo(caminhos[1], 2), _saldo(caminhos[0], 3)) == (6500, 1000, 2500)
+            db = database.conectar(caminhos[1])
+            assert db.execute('SELECT COUNT(*) FROM transferencia_saida WHERE entregue_em IS NULL').fetchone()[0] == 0
+            db.close()
+            print("✅ Transferência no mesmo shard e entre shards, com a chave de idempotência")
+
+            pagina = cliente.get('/dashboard').get_data(as_text=True)
+            assert 'U1' in pagina and cliente.get('/extrato/1').status_code == 200
+
+            token = cliente.post('/api/v1/tokens', json={'email': 'u2@t.com', 'senha': 'segredo'}).get_json()['token']
+            cabecalho = {'Authorization': f'Bearer {token}'}
+            contas = cliente.get('/api/v1/contas', headers=cabecalho).get_json()['contas']
+            assert [(c['id'], c['saldo_centavos']) for c in contas] == [(3, 2500)]
+            assert cliente.get('/api/v1/contas/1', headers=cabecalho).status_code == 404
+            assert cliente.delete('/api/v1/tokens', headers=cabecalho).status_code == 204
+            assert cliente.get('/api/v1/contas', headers=cabecalho).status_code == 401
+            print("✅ API resolve o token no diretório e lê do shard do usuário")
+
+            app.config['LOTE_TOKEN'] = 'segredo'
+            corpo = '\n'.join(json.dumps({'conta_id': conta_id, 'valor': 1}) for conta_id in (1, 3, 3, 42))
+            relatorio = cliente.post('/lancamentos/lote?formato=ndjson', data=corpo,
+                                     headers={'Authorization': 'Bearer segredo'}).get_json()
+            assert relatorio['importadas'] == 3 and relatorio['erros'] == [{'linha': 4, 'erro': 'conta não encontrada'}]
+            assert (_saldo(caminhos[1], 1), _saldo(caminhos[0], 3)) == (6600, 2700)
+            creditos = os.path.join(tmp, 'creditos.csv')
+            with open(creditos, 'w') as arquivo:
+                arquivo.write('conta_id,valor,descricao\n1,2.00,Lote\n3,3.00,Lote\n42,1.00,Lote\n')
+            assert importar_lote.main([creditos, '--shards', ','.join(caminhos),
+                                       '--diretorio', app.config['SHARDS_DIRETORIO']]) == 0
+            assert (_saldo(caminhos[1], 1), _saldo(caminhos[0], 3)) == (6800, 3000)
+            print("✅ Importação em lote (rota e script) roteada pelo dono de cada conta")
+
+            dados = cliente.get('/health').get_json()
+            assert dados['status'] == 'healthy' and set(dados['verificacoes']['shards']) == set(caminhos)
+            assert dados['contagens']['usuarios'] == 4 and dados['contagens']['contas'] == 3
+            assert cliente.get('/health/ready').status_code == 200
+            print("✅ Saúde confere todos os shards e soma as contagens")
+        finally:
+            _restaurar(metodo)
+
+
+def _fora_do_ar(conta_id):
+    raise sqlite3.OperationalError('database is locked')
+
+
+def test_transferencia_em_duas_pernas():
+    """O crédito pendente é entregue uma única vez, mesmo repetido"""
+    print("🔍 Testando as pernas da transferência entre shards...")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        origem, destino = (database.conectar(os.path.join(tmp, f'{nome}.db')) for nome in ('a', 'b'))
+        try:
+            for db, conta_id in ((origem, 1), (destino, 2)):
+                migracoes.migrar(db)
+                db.execute("INSERT INTO usuario (id, nome, email, senha) VALUES (?, 'U', ?, 'x')",
+                           (conta_id, f'u{conta_id}@t.com'))
+                db.execute("INSERT INTO conta (id, tipo, usuario_id) VALUES (?, 'corrente', ?)", (conta_id, conta_id))
+                db.commit()
+            ledger.lancar(origem, 1, 'deposito', 5000, 'Depósito')
+
+            ledger.em_transacao(origem, shards.iniciar_transferencia, 1, 2, 1200, usuario_id=1)
+            try:
+                ledger.em_transacao(origem, shards.iniciar_transferencia, 1, 2, 9999, usuario_id=1)
+                raise AssertionError('deveria recusar sem saldo')
+            except ledger.SaldoInsuficiente:
+                pass
+
+            # Destino fora do ar: a saída fica pendente, com uma tentativa a mais
+            assert shards.entregar_transferencias(origem, _fora_do_ar) == 0
+            chave, tentativas = origem.execute('''
+                SELECT chave, tentativas FROM transferencia_saida WHERE entregue_em IS NULL
+            ''').fetchone()
+            assert tentativas == 1
+            assert shards.entregar_transferencias(origem, lambda conta_id: destino) == 1
+            assert shards.entregar_transferencias(origem, lambda conta_id: destino) == 0
+            # Crédito repetido (processo caiu antes de marcar a entrega) não credita de novo
+            assert ledger.em_transacao(destino, shards.receber_transferencia, chave, 1, 2, 1200) is None
+
+            assert origem.execute('SELECT saldo_centavos FROM conta WHERE id = 1').fetchone()[0] == 3800
+            assert destino.execute('SELECT saldo_centavos FROM conta WHERE id = 2').fetchone()[0] == 1200
+            credito = destino.execute("SELECT descricao, transferencia_id FROM transacao").fetchone()
+            assert credito[0] == 'Transferência da conta 1' and credito[1] is not None
+            print("✅ Débito com saída pendente, crédito entregue uma vez")
+        finally:
+            origem.close()
+            destino.close()
+
+
+def test_destino_inexistente_nao_trava_a_fila():
+    """Saídas para conta inexistente são estornadas e as que falham não travam as seguintes"""
+    print("🔍 Testando a fila de entregas com destinos inexistentes...")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        origem, destino = (database.conectar(os.path.join(tmp, f'{nome}.db')) for nome in ('a', 'b'))
+        try:
+            for db, conta_id in ((origem, 1), (destino, 2)):
+                migracoes.migrar(db)
+                db.execute("INSERT INTO usuario (id, nome, email, senha) VALUES (?, 'U', ?, 'x')",
+                           (conta_id, f'u{conta_id}@t.com'))
+                db.execute("INSERT INTO conta (id, tipo, usuario_id) VALUES (?, 'corrente', ?)", (conta_id, conta_id))
+                db.commit()
+            ledger.lancar(origem, 1, 'deposito', 5000, 'Depósito')
+            # 42 está no diretório mas não em shard nenhum; 99 nem no diretório
+            roteamento = {2: destino, 42: destino}
+            for destino_id in [42] * shards.ENTREGAS_POR_VEZ + [99, 2]:
+                ledger.em_transacao(origem, shards.iniciar_transferencia, 1, destino_id, 100, usuario_id=1)
+            assert origem.execute('SELECT saldo_centavos FROM conta WHERE id = 1').fetchone()[0] == 3800
+
+            resolvidas = 0
+            while lote := shards.entregar_transferencias(origem, roteamento.get):
+                resolvidas += lote
+            assert resolvidas == shards.ENTREGAS_POR_VEZ + 2
+            assert origem.execute('SELECT saldo_centavos FROM conta WHERE id = 1').fetchone()[0] == 4900
+            assert destino.execute('SELECT saldo_centavos FROM conta WHERE id = 2').fetchone()[0] == 100
+            estornos = origem.execute('''
+                SELECT COUNT(*) FROM transferencia_saida WHERE estornada_em IS NOT NULL AND entregue_em IS NULL
+            ''').fetchone()[0]
+            assert estornos == shards.ENTREGAS_POR_VEZ + 1
+            descricao = origem.execute("SELECT descricao FROM transacao ORDER BY id DESC LIMIT 1").fetchone()[0]
+            assert descricao.startswith('Estorno da transferência para conta')
+            print("✅ Destino inexistente estornado na origem; a entrega válida atrás dele é creditada")
+
+            # Falha transitória repetida vai para o fim da fila, atrás das saídas novas
+            ledger.em_transacao(origem, shards.iniciar_transferencia, 1, 2, 100, usuario_id=1)
+            for _ in range(shards.ENTREGAS_POR_VEZ):
+                shards.entregar_transferencias(origem, _fora_do_ar)
+            ledger.em_transacao(origem, shards.iniciar_transferencia, 1, 2, 200, usuario_id=1)
+            assert shards.entregar_transferencias(origem, roteamento.get, limite=1) == 1
+            assert destino.execute('SELECT saldo_centavos FROM conta WHERE id = 2').fetchone()[0] == 300
+            assert shards.entregar_transferencias(origem, roteamento.get) == 1
+            assert destino.execute('SELECT saldo_centavos FROM conta WHERE id = 2').fetchone()[0] == 400
+            print("✅ Entrega que falha sempre não passa na frente das novas")
+        finally:
+            origem.close()
+            destino.close()
+
+
+def test_mover_usuario():
+    """Mudar de shard leva contas, histórico e checkpoints; ids só crescem"""
+    print("🔍 Testando a mudança de shard...")
+
+    metodo = pool_senhas.metodo
+    pool_senhas.metodo = 'pbkdf2:sha256:1000'
+    with tempfile.TemporaryDirectory() as tmp:
+        try:
+            caminhos = _configurar(tmp)
+            cliente = app.test_client()
+            for numero in (1, 2):
+                cliente.post('/registro', data={'nome': f'U{numero}', 'email': f'u{numero}@t.com',
+                                                'senha': 'segredo'})
+                _entrar(cliente, f'u{numero}@t.com')
+                cliente.post('/criar_conta', data={'tipo': 'corrente'})
+            _entrar(cliente, 'u1@t.com')
+            for i in range(ledger.INTERVALO_CHECKPOINT + 5):
+                cliente.post('/deposito/1', data={'valor': f'{1 + i}.00'}, headers={'Idempotency-Key': f'd-{i}'})
+            cliente.post('/transferencia/1', data={'valor': '3.00', 'conta_destino': '2'},
+                         headers={'Idempotency-Key': 't-0'})
+
+            diretorio = database.conectar(app.config['SHARDS_DIRETORIO'])
+            conexoes = [database.conectar(caminho) for caminho in caminhos]
+            antes = conexoes[1].execute('SELECT * FROM conta WHERE id = 1').fetchone()
+            saldo_meio = ledger.saldo_em(conexoes[1], 1, '2999-01-01')
+            assert shards.mover_usuario(diretorio, conexoes, 1, 0)
+            assert not shards.mover_usuario(diretorio, conexoes, 1, 0)
+            database.fechar_conexoes()
+
+            depois = conexoes[0].execute('SELECT * FROM conta WHERE id = 1').fetchone()
+            assert (depois['saldo_centavos'], depois['lancamentos']) == (antes['saldo_centavos'], antes['lancamentos'])
+            assert depois['ultima_transacao_id'] > antes['ultima_transacao_id']
+            assert ledger.saldo_em(conexoes[0], 1, '2999-01-01') == saldo_meio == antes['saldo_centavos']
+            assert conexoes[0].execute('SELECT COUNT(*) FROM saldo_checkpoint WHERE conta_id = 1').fetchone()[0] == 1
+            assert conexoes[0].execute('SELECT COUNT(*) FROM idempotencia WHERE usuario_id = 1').fetchone()[0] == 106
+            # As respostas gravadas apontam para os ids novos
+            for chave, resposta in conexoes[0].execute('SELECT chave, resposta FROM idempotencia WHERE usuario_id = 1'):
+                resposta = json.loads(resposta)
+                if chave == 't-0':
+                    linha = conexoes[0].execute('SELECT valor_centavos FROM transferencia WHERE id = ?',
+                                                (resposta['resultado'],)).fetchone()
+                    assert resposta['tabela'] == 'transferencia' and linha[0] == 300
+                else:
+                    linha = conexoes[0].execute('SELECT tipo, valor_centavos FROM transacao WHERE id = ?',
+                                                (resposta['resultado'],)).fetchone()
+                    assert tuple(linha) == ('deposito', (1 + int(chave[2:])) * 100)
+            for tabela, filtro in (('usuario', 'id = 1'), ('conta', 'usuario_id = 1'), ('transacao', 'conta_id = 1'),
+                                   ('idempotencia', 'usuario_id = 1')):
+                assert conexoes[1].execute(f'SELECT COUNT(*) FROM {tabela} WHERE {filtro}').fetchone()[0] == 0
+            assert shards.shard_do_usuario(diretorio, 1) == 0
+            print("✅ Conta, histórico, checkpoints e chaves (com os ids novos) copiados; origem limpa")
+
+            # A sessão continua valendo e a chave já usada continua reconhecida
+            cliente.post('/deposito/1', data={'valor': '1.00'}, headers={'Idempotency-Key': 'd-0'})
+            cliente.post('/deposito/1', data={'valor': '2.00'})
+            assert _saldo(caminhos[0], 1) == antes['saldo_centavos'] + 200
+            assert 'U1' in cliente.get('/dashboard').get_data(as_text=True)
+            print("✅ Rotas seguem o usuário para o shard novo")
+
+            for db in (diretorio, *conexoes):
+                db.close()
+        finally:
+            _restaurar(metodo)
+
+
+if __name__ == '__main__':
+    print("🚀 Iniciando testes dos shards...\n")
+
+    test_transferencia_em_duas_pernas()
+    test_destino_inexistente_nao_trava_a_fila()
+    test_rotas_com_shards()
+    test_mover_usuario()
+
+    print("\n🎉 Testes dos shards passaram!")